@@ -2,12 +2,11 @@
 import os
 import re
 import time
+import asyncio
 import logging
-from collections import defaultdict, deque
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Deque, List, Tuple
+from typing import Dict, Deque, List, Optional, Tuple
 
-import requests
 from dotenv import load_dotenv
 from telegram import Update, Message, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
@@ -16,11 +15,35 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     filters,
     ContextTypes,
 )
 
-from yclients_client import YClientsClient, YClientsError
+from booking_parser import (
+    BOOKING_KEYWORDS,
+    is_booking,
+    find_best_match,
+    find_service_advanced,
+    find_master_advanced,
+)
+from update_scheduler import ChatOrderedUpdateProcessor
+from catalog import Catalog
+from render_cache import RenderCache
+from channels import TelegramChannel
+from outbox import OutboxEntry
+import channels
+import metrics
+import outbox
+import record_writes
+import shared
+import llm_cache
+import faq_index
+import prompt_builder
+import booking_tool
+import model_router
+import deadlines
+import startup
 
 # ===================== LOAD .ENV ======================
 load_dotenv()  # <-- loads variables from .env file
@@ -39,63 +62,99 @@ if not YCLIENTS_PARTNER_TOKEN:
     raise ValueError("Error: Missing YCLIENTS_PARTNER_TOKEN in .env")
 if not YCLIENTS_USER_TOKEN:
     raise ValueError("Error: Missing YCLIENTS_USER_TOKEN in .env")
+if os.getenv("BOT_MODE", "polling").lower() == "webhook" and not os.getenv("WEBHOOK_SECRET"):
+    raise ValueError("Error: Missing WEBHOOK_SECRET in .env (required for BOT_MODE=webhook)")
 
 # ===================== CONFIG =========================
 BASE = "https://api.groq.com/openai/v1/chat/completions"
-MODEL = "openai/gpt-oss-120b"
 MEMORY_TURNS = 6
 
-# Initialize YClients client
-yclients = YClientsClient(YCLIENTS_PARTNER_TOKEN, YCLIENTS_USER_TOKEN)
-
-BOOKING_KEYWORDS = [
-    "запись", "записаться", "записать", "забронировать",
-    "услуга", "мастер", "время", "дата",
-    "когда можно", "свободное время", "расписание",
-    "записаться на", "хочу записаться", "нужна запись",
-    "маникюр", "педикюр", "массаж",  # nazwy usług
-    "арина", "екатерина", "полина", "катя", "катюша",  # imiona masterów
-    "октября", "ноября", "декабря", "января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября",  # miesiące
-    ":", "часов", "в ", "на "  # czas
-]
-
-BOOKING_PROMPT = """
+# Режим работы: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # публичный адрес, например https://bot.up.railway.app
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", "8000"))
+
+# Параллельная обработка апдейтов: разные чаты параллельно, один чат — по очереди
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "1000"))
+METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", "60"))  # 0 — не писать метрики в лог
+
+# Бюджет времени на ответ на одно сообщение (см. deadlines.py): дольше LLM не ждём
+UPDATE_DEADLINE = shared.update_deadline()
+
+# Пул потоков для блокирующих вызовов YClients/Groq из async-хендлеров
+# (общий с WhatsApp, если оба канала работают в одном процессе — см. shared.py)
+BLOCKING_POOL_WORKERS = shared.pool_size()
+blocking = shared.blocking_pool()
+
+# Разбор сообщений о записи — в пуле процессов при PARSER_WORKERS > 0
+parsing = shared.parsing_service()
+
+# Салоны (см. tenants.py): каталог и клиент YClients — салона текущего чата,
+# пул соединений у всех салонов общий, лимит запросов — у каждого свой
+tenants = shared.tenants()
+yclients = tenants.client
+
+# Каталог (компания, услуги, мастера) кэшируется на CATALOG_TTL секунд
+catalog_cache = shared.catalog_cache()
+
+# Ответы LLM на повторяющиеся вопросы (см. llm_cache.py)
+responses = shared.response_cache()
+
+# Промпты в пределах PROMPT_TOKEN_BUDGET токенов (см. prompt_builder.py)
+prompts = shared.prompt_builder()
+
+# Модели LLM по уровням (см. model_router.py): короткие реплики чата — малая быстрая
+# модель, запись — большая; по таймауту запрос повторяется на другом уровне
+router = shared.model_router()
+
+# Промпты разложены на неизменный префикс (system: инструкции и каталог — одинаковые
+# у всех пользователей салона, Groq кэширует их обработку) и изменчивое user-сообщение
+BOOKING_SYSTEM_PROMPT = """
 Ты помощник по записи к мастерам. Анализируй ВСЮ историю разговора и определи:
 1. Какая услуга нужна
 2. Есть ли предпочтения по мастеру
 3. Желаемая дата и время
 
-История разговора:
-{{history}}
-
-Доступные данные (ТОЧНЫЕ ДАННЫЕ ИЗ API):
-{{api_data}}
-
-Сообщение пользователя: {{message}}
-
 КРИТИЧЕСКИ ВАЖНО: 
-- Используй ТОЛЬКО услуги и мастеров из "Доступные данные" выше
+- Используй ТОЛЬКО услуги и мастеров из "Доступные данные"
 - НЕ ВЫДУМЫВАЙ услуги - используй только те что есть в списке
 - НЕ ИСПОЛЬЗУЙ форматирование ** - только обычный текст
 - НЕ ПРИДУМЫВАЙ цены - используй только те что указаны в API
 - Если в истории есть информация об услуге, мастере и времени - СОЗДАЙ ЗАПИСЬ
 - Если пользователь повторно пишет "хочу записаться" - проверь историю на наличие всех данных
-- Если есть все данные (услуга, мастер, дата и время) - ответь в формате:
-ЗАПИСЬ: [услуга] | [мастер] | [дата время]
-
-Например: ЗАПИСЬ: Маникюр с покрытием гель-лак | Арина | 2025-10-26 12:00
+- Если есть все данные (услуга, мастер, дата и время) - вызови функцию create_booking:
+service_id и staff_id - числа из [service_id ...] и [staff_id ...] в списках ниже,
+datetime - в формате YYYY-MM-DD HH:MM, например 2025-10-26 12:00
+- НЕ ПИШИ данные записи текстом - запись создаёт только вызов create_booking
 
 Если данных недостаточно, уточни недостающую информацию.
+
+Доступные данные (ТОЧНЫЕ ДАННЫЕ ИЗ API):
+{{api_data}}
 """
 
-CHAT_PROMPT = """
+BOOKING_USER_PROMPT = """{{api_data}}
+История разговора:
+{{history}}
+
+Сообщение пользователя: {{message}}
+"""
+
+CHAT_SYSTEM_PROMPT = """
 Ты дружелюбный помощник на русском.
+Ответь кратко по делу.
+"""
+
+CHAT_USER_PROMPT = """
 История чата:
 {{history}}
 
 Сообщение:
 {{message}}
-Ответь кратко по делу.
 """
 
 # ===================== LOGGING ========================
@@ -103,210 +162,114 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
 log = logging.getLogger()
 
 # ===================== MEMORY =========================
-UserMemory: Dict[int, Deque] = defaultdict(lambda: deque(maxlen=MEMORY_TURNS * 2))
-UserRecords: Dict[int, List[Dict]] = defaultdict(list)  # Хранилище записей пользователей
-UserAuth: Dict[int, Dict] = defaultdict(dict)  # Данные авторизации пользователей
-UserPhone: Dict[int, str] = {}  # Номера телефонов пользователей
+sessions = shared.session_store()
+UserMemory: Dict[int, Deque] = sessions.memory
+UserRecords: Dict[int, List[Dict]] = sessions.records  # Хранилище записей пользователей
+UserAuth: Dict[int, Dict] = sessions.auth  # Данные авторизации пользователей
+UserPhone: Dict[int, str] = sessions.phones  # Номера телефонов пользователей
 
 def add_memory(user_id, role, text):
-    UserMemory[user_id].append((role, text))
+    sessions.add_memory(user_id, role, text)
 
 def get_history(user_id):
-    return "\n".join([f"{r}: {t}" for r, t in UserMemory[user_id]])
+    return sessions.history(user_id)
 
-# ===================== NLP ============================
-def is_booking(text):
-    text_lower = text.lower()
-    matches = [k for k in BOOKING_KEYWORDS if k in text_lower]
-    log.info(f"🔍 BOOKING CHECK: '{text}' -> matches: {matches}")
-    return len(matches) > 0
+def get_user_phone(user_id) -> Optional[str]:
+    return UserPhone.get(user_id)
 
-def groq_chat(messages):
+def set_user_phone(user_id, phone: str):
+    UserPhone[user_id] = phone
+
+# ===================== LLM ============================
+async def run_blocking(fn, *args, **kwargs):
+    """Вызвать синхронную функцию в пуле потоков, не блокируя event loop"""
+    return await blocking.run(fn, *args, **kwargs)
+
+def groq_message(messages, tier: model_router.Tier, tools=None) -> Dict:
+    """Сообщение ассистента из chat completions: content и, если передан tools, tool_calls"""
     headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
     data = {
-        "model": MODEL,
+        "model": tier.model,
         "messages": messages,
-        "max_tokens": 1000,
+        "max_tokens": tier.max_tokens,
         "temperature": 0.0
     }
-    r = requests.post(BASE, json=data, headers=headers)
-    return r.json()["choices"][0]["message"]["content"]
+    if tools:
+        data["tools"] = tools
+        data["tool_choice"] = "auto"
+    r = shared.groq_session().post(BASE, json=data, headers=headers, timeout=tier.timeout)
+    result = r.json()
+    prompt_builder.record_usage(result)
+    return result["choices"][0]["message"]
+
+def ask_llm(intent, text, messages, tools=None) -> Dict:
+    """Ответ модели того уровня, который router выбрал для намерения и сообщения"""
+    return router.complete(intent, text, lambda tier: groq_message(messages, tier, tools))[0]
+
+def groq_chat(messages, text):
+    return ask_llm(model_router.CHAT, text, messages)["content"]
+
+def previous_turns(user_id) -> int:
+    """Сколько реплик в истории до текущего сообщения (оно уже добавлено в память)"""
+    return max(0, len(sessions.messages(user_id)) - 1)
+
+def chat_answer(user_id, text):
+    """Ответ на обычное сообщение; если история не нужна — из FAQ или кэша ответов LLM"""
+    if not llm_cache.context_free(previous_turns(user_id), text):
+        prompt = prompts.build_messages(CHAT_SYSTEM_PROMPT, CHAT_USER_PROMPT, text, sessions.messages(user_id)[:-1])
+        return groq_chat(prompt.messages, text)
+    # Частые вопросы (цены, мастера, как записаться) — готовым ответом из FAQ
+    faq_answer = tenants.current().faq.answer(text)
+    if faq_answer:
+        return faq_answer
+    prompt = prompts.build_messages(CHAT_SYSTEM_PROMPT, CHAT_USER_PROMPT, text)
+    key = responses.key(text, catalog_cache.version, CHAT_SYSTEM_PROMPT, CHAT_USER_PROMPT,
+                        router.small.model, router.large.model)
+    return responses.cached(key, lambda: groq_chat(prompt.messages, text))
+
+def booking_faq_answer(user_id, text) -> Optional[str]:
+    """Частый вопрос с ключевыми словами записи («как записаться», «сколько стоит маникюр»)"""
+    if not llm_cache.context_free(previous_turns(user_id), text):
+        return None
+    return faq_index.booking_question_answer(tenants.current().faq, text)
+
+def booking_answer(user_id, text) -> Dict:
+    """Ответ LLM на сообщение о записи: текст или вызов create_booking (booking_tool.py);
+    первое сообщение пользователя — из кэша ответов"""
+    tenant = tenants.current()
+    turns = sessions.messages(user_id)[:-1]
+    prompt = prompts.build_messages(BOOKING_SYSTEM_PROMPT, BOOKING_USER_PROMPT, text, turns,
+                                    tenant.catalog.get(), tenant.lexicon)
+    log.info(f"🤖 AI PROMPT (~{prompt.tokens} tokens, {prompt.sections}): {prompt.messages[-1]['content']}")
+    if turns:
+        return ask_llm(model_router.BOOKING, text, prompt.messages, booking_tool.TOOLS)
+    key = responses.key(text, catalog_cache.version, BOOKING_SYSTEM_PROMPT, BOOKING_USER_PROMPT,
+                        router.small.model, router.large.model)
+    # Вызов create_booking создаёт запись (и ответ может содержать "завтра") — такой не кэшируем
+    return responses.cached(key, lambda: ask_llm(model_router.BOOKING, text, prompt.messages, booking_tool.TOOLS),
+                            cacheable=lambda message: bool(message.get("content")) and not message.get("tool_calls"))
 
 # ===================== YCLIENTS INTEGRATION ===========
+# Все чтения каталога идут через catalog_cache (см. catalog.py)
 def get_company_id():
-    """Get the first available company ID"""
-    log.info("🏢 API CALL: Getting companies from YClients...")
-    try:
-        companies = yclients.my_companies()
-        log.info(f"🏢 API RESPONSE: {companies}")
-        if companies.get("data") and len(companies["data"]) > 0:
-            company_id = companies["data"][0]["id"]
-            log.info(f"✅ Company ID found: {company_id}")
-            return company_id
-        log.warning("⚠️ No companies found in response")
-        return None
-    except YClientsError as e:
-        log.error(f"❌ YClients API Error getting company: {e}")
-        return None
-    except Exception as e:
-        log.error(f"❌ General Error getting company: {e}")
-        return None
+    """Company ID of the current chat's salon"""
+    return catalog_cache.get().company_id
 
 def get_services():
     """Get available services"""
-    log.info("📋 API CALL: Getting services from YClients...")
-    try:
-        company_id = get_company_id()
-        if not company_id:
-            log.warning("⚠️ No company ID, cannot get services")
-            return []
-        log.info(f"📋 Getting services for company ID: {company_id}")
-        services = yclients.company_services(company_id)
-        log.info(f"📋 API RESPONSE: {services}")
-        services_data = services.get("data", [])
-        log.info(f"✅ Found {len(services_data)} services")
-        return services_data
-    except YClientsError as e:
-        log.error(f"❌ YClients API Error getting services: {e}")
-        return []
-    except Exception as e:
-        log.error(f"❌ General Error getting services: {e}")
-        return []
+    return catalog_cache.get().services
 
 def get_services_with_prices(company_id: int) -> List[Dict]:
     """Получить услуги с реальными ценами"""
-    try:
-        log.info(f"💰 Getting services with prices for company ID: {company_id}")
-        response = yclients.get_service_details(company_id)
-        
-        if response.get("success"):
-            services = response.get("data", [])
-            log.info(f"💰 Found {len(services)} services with prices")
-            return services
-        else:
-            log.error(f"❌ Failed to get services with prices: {response}")
-            return []
-    except Exception as e:
-        log.error(f"❌ Error getting services with prices: {e}")
-        return []
+    return catalog_cache.get().priced_services
 
 def get_services_for_master(company_id: int, staff_id: int) -> List[Dict]:
     """Получить услуги для конкретного мастера с ценами"""
-    try:
-        log.info(f"👤 Getting services for master ID: {staff_id}")
-        response = yclients.get_service_details(company_id, staff_id=staff_id)
-        
-        if response.get("success"):
-            services = response.get("data", [])
-            log.info(f"👤 Found {len(services)} services for master {staff_id}")
-            return services
-        else:
-            log.error(f"❌ Failed to get services for master: {response}")
-            return []
-    except Exception as e:
-        log.error(f"❌ Error getting services for master: {e}")
-        return []
+    return catalog_cache.get().services_for_master(staff_id)
 
 def get_masters():
     """Get available masters"""
-    log.info("👥 API CALL: Getting masters from YClients...")
-    try:
-        company_id = get_company_id()
-        if not company_id:
-            log.warning("⚠️ No company ID, cannot get masters")
-            return []
-        log.info(f"👥 Getting masters for company ID: {company_id}")
-        masters = yclients.company_masters(company_id)
-        log.info(f"👥 API RESPONSE: {masters}")
-        masters_data = masters.get("data", [])
-        log.info(f"✅ Found {len(masters_data)} masters")
-        return masters_data
-    except YClientsError as e:
-        log.error(f"❌ YClients API Error getting masters: {e}")
-        return []
-    except Exception as e:
-        log.error(f"❌ General Error getting masters: {e}")
-        return []
-
-def get_api_data_for_ai():
-    """Get formatted API data for AI responses - EXACT DATA ONLY"""
-    try:
-        company_id = get_company_id()
-        if not company_id:
-            return "Данные недоступны"
-            
-        # Получаем услуги с реальными ценами
-        services = get_services_with_prices(company_id)
-        masters = get_masters()
-        
-        data_text = "Доступные услуги (ТОЧНЫЕ ДАННЫЕ ИЗ API):\n"
-        for service in services:  # Показываем ВСЕ услуги
-            name = service.get("title", "Без названия")
-            cost = service.get("cost", 0)
-            price_min = service.get("price_min", 0)
-            price_max = service.get("price_max", 0)
-            duration = service.get("length", 0)
-            
-            data_text += f"- {name}"
-            
-            # Показываем реальные цены - проверяем все поля цен
-            if cost > 0:
-                data_text += f" ({cost} руб.)"
-            elif price_min > 0 and price_max > 0:
-                if price_min == price_max:
-                    data_text += f" ({price_min} руб.)"
-                else:
-                    data_text += f" ({price_min}-{price_max} руб.)"
-            elif price_min > 0:
-                data_text += f" (от {price_min} руб.)"
-                
-            if duration > 0:
-                data_text += f" ({duration} мин)"
-            data_text += "\n"
-        
-        data_text += "\nДоступные мастера (ТОЧНЫЕ ДАННЫЕ ИЗ API):\n"
-        for master in masters:  # Показываем ВСЕХ мастеров
-            name = master.get("name", "Без имени")
-            specialization = master.get("specialization", "")
-            staff_id = master.get("id")
-            
-            data_text += f"- {name}"
-            if specialization:
-                data_text += f" ({specialization})"
-            
-            # Добавляем услуги мастера
-            if staff_id:
-                master_services = get_services_for_master(company_id, staff_id)
-                if master_services:
-                    data_text += f" - услуги: "
-                    service_names = []
-                    for service in master_services:
-                        service_name = service.get("title", "")
-                        cost = service.get("cost", 0)
-                        price_min = service.get("price_min", 0)
-                        price_max = service.get("price_max", 0)
-                        
-                        if service_name:
-                            # Показываем цену из любого доступного поля
-                            if cost > 0:
-                                service_names.append(f"{service_name} ({cost}₽)")
-                            elif price_min > 0 and price_max > 0:
-                                if price_min == price_max:
-                                    service_names.append(f"{service_name} ({price_min}₽)")
-                                else:
-                                    service_names.append(f"{service_name} ({price_min}-{price_max}₽)")
-                            elif price_min > 0:
-                                service_names.append(f"{service_name} (от {price_min}₽)")
-                            else:
-                                service_names.append(service_name)
-                    data_text += ", ".join(service_names)  # Показываем ВСЕ услуги мастера
-            
-            data_text += "\n"
-        
-        return data_text
-    except Exception as e:
-        log.error(f"Error getting API data: {e}")
-        return "Данные временно недоступны"
+    return catalog_cache.get().masters
 
 def get_master_services_text(master_name: str) -> str:
     """Get deterministic text for master services - NO AI GENERATION"""
@@ -360,316 +323,34 @@ def get_master_services_text(master_name: str) -> str:
         log.error(f"Error getting master services text: {e}")
         return "Данные временно недоступны"
 
-# ===================== NLP PARSING ==================
-def init_fuzzy_matcher():
-    """Инициализация нечеткого поиска"""
-    try:
-        from fuzzywuzzy import fuzz, process
-        return True
-    except ImportError:
-        log.warning("fuzzywuzzy not available, using basic parsing")
-        return False
-
-# Глобальный флаг доступности fuzzywuzzy
-fuzzy_available = init_fuzzy_matcher()
-
-def find_best_match(word: str, choices: list, threshold: int = 80) -> str:
-    """Находит лучшее совпадение с помощью нечеткого поиска"""
-    if not fuzzy_available:
-        return None
-    
-    try:
-        from fuzzywuzzy import process
-        result = process.extractOne(word, choices, scorer=fuzz.ratio)
-        if result and result[1] >= threshold:
-            return result[0]
-    except Exception as e:
-        log.debug(f"Error in fuzzy matching '{word}': {e}")
-    
-    return None
-
-def find_service_advanced(message: str) -> str:
-    """Продвинутый поиск услуги с regex и нечетким поиском"""
-    message_lower = message.lower()
-    
-    # Расширенные варианты услуг с regex паттернами
-    service_patterns = {
-        "маникюр": [
-            r'\bманикюр\w*\b',  # маникюр, маникюра, маникюру, маникюром, маникюре
-            r'\bманикюрн\w*\b',  # маникюрный, маникюрная, маникюрное
-            r'\bманик\w*\b',     # маник, маника (сокращения)
-        ],
-        "педикюр": [
-            r'\bпедикюр\w*\b',  # педикюр, педикюра, педикюру, педикюром, педикюре
-            r'\bпедикюрн\w*\b',  # педикюрный, педикюрная, педикюрное
-            r'\bпедик\w*\b',     # педик, педика (сокращения)
-        ],
-        "массаж": [
-            r'\bмассаж\w*\b',   # массаж, массажа, массажу, массажем, массаже
-            r'\bмассажн\w*\b',   # массажный, массажная, массажное
-            r'\bмасаж\w*\b',     # масаж, масажа (опечатки)
-            r'\bмас\w*ж\w*\b',   # мас*ж (опечатки)
-        ]
-    }
-    
-    # Ищем по regex паттернам
-    for service, patterns in service_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, message_lower):
-                return service
-    
-    # Fallback к нечеткому поиску
-    service_variants = {
-        "маникюр": ["маникюр", "маникюра", "маникюру", "маникюром", "маникюре", "маникюрный", "маникюрная", "маник", "маника"],
-        "педикюр": ["педикюр", "педикюра", "педикюру", "педикюром", "педикюре", "педикюрный", "педикюрная", "педик", "педика"],
-        "массаж": ["массаж", "массажа", "массажу", "массажем", "массаже", "масаж", "масажа", "массажный", "массажная"]
-    }
-    
-    # Нечеткий поиск по словам
-    words = message_lower.split()
-    for word in words:
-        all_variants = []
-        for variants in service_variants.values():
-            all_variants.extend(variants)
-        
-        best_match = find_best_match(word, all_variants, threshold=70)
-        if best_match:
-            for service, variants in service_variants.items():
-                if best_match in variants:
-                    return service
-    
-    return None
-
-def find_master_advanced(message: str) -> str:
-    """Продвинутый поиск мастера с regex и нечетким поиском"""
-    message_lower = message.lower()
-    
-    # Regex паттерны для имен мастеров
-    master_patterns = {
-        "арина": [
-            r'\bарин\w*\b',      # арина, арины, арине, арину, ариной
-            r'\bаринк\w*\b',     # аринка, ариночка
-        ],
-        "екатерина": [
-            r'\bекатерин\w*\b',  # екатерина, екатерины, екатерине, екатерину, екатериной
-            r'\bкат\w*\b',       # катя, кати, кате, катю, катей, катенька
-            r'\bкатюш\w*\b',     # катюша, катюши, катюше, катюшу, катюшей, катюшка
-        ],
-        "полина": [
-            r'\bполин\w*\b',     # полина, полины, полине, полину, полиной
-            r'\bполинк\w*\b',    # полинка, полиночка
-        ]
-    }
-    
-    # Ищем по regex паттернам
-    for master, patterns in master_patterns.items():
-        for pattern in patterns:
-            if re.search(pattern, message_lower):
-                return master.title()
-    
-    # Fallback к нечеткому поиску
-    master_variants = {
-        "арина": ["арина", "арины", "арине", "арину", "ариной", "аринка", "ариночка"],
-        "екатерина": ["екатерина", "екатерины", "екатерине", "екатерину", "екатериной", "катя", "кати", "кате", "катю", "катей", "катюша", "катюши", "катюше", "катюшу", "катюшей", "катенька", "катюшка"],
-        "полина": ["полина", "полины", "полине", "полину", "полиной", "полинка", "полиночка"]
-    }
-    
-    # Нечеткий поиск по словам
-    words = message_lower.split()
-    for word in words:
-        all_variants = []
-        for variants in master_variants.values():
-            all_variants.extend(variants)
-        
-        best_match = find_best_match(word, all_variants, threshold=75)
-        if best_match:
-            for master, variants in master_variants.items():
-                if best_match in variants:
-                    return master.title()
-    
-    return None
-
-def parse_booking_message(message: str, history: str) -> Dict:
-    """Парсит сообщение пользователя и извлекает информацию о записи"""
-    import re
-    from datetime import datetime, timedelta
-    
-    result = {
-        "service": None,
-        "master": None,
-        "datetime": None,
-        "has_all_info": False
-    }
-    
-    # Список услуг для поиска
-    services = [
-        "маникюр с покрытием гель-лак", "маникюр", "педикюр с покрытием гель-лак", 
-        "педикюр", "массаж оздоровительный", "массаж", "маникюр в 4 руки", 
-        "педикюр в 4 руки"
-    ]
-    
-    # Список мастеров
-    masters = ["арина", "екатерина", "полина", "катя", "катюша"]
-    
-    message_lower = message.lower()
-    
-    # Используем продвинутый поиск услуг
-    result["service"] = find_service_advanced(message)
-    
-    # Используем продвинутый поиск мастеров
-    result["master"] = find_master_advanced(message)
-    
-    # Fallback к старому методу если не найдено
-    if not result["service"]:
-        for service in services:
-            if service.lower() in message_lower:
-                result["service"] = service
-                break
-    
-    if not result["master"]:
-        for master in masters:
-            if master in message_lower:
-                # Преобразуем обратно в правильное имя
-                if master in ["арина"]:
-                    result["master"] = "Арина"
-                elif master in ["екатерина", "катя", "катюша"]:
-                    result["master"] = "Екатерина"
-                elif master in ["полина"]:
-                    result["master"] = "Полина"
-                break
-    
-    # Ищем дату и время
-    # Паттерны для поиска времени
-    time_patterns = [
-        r'(\d{1,2}):(\d{2})',  # 12:00, 9:30
-        r'(\d{1,2})\s*часов',  # 12 часов
-        r'в\s*(\d{1,2}):(\d{2})',  # в 12:00
-        r'на\s*(\d{1,2}):(\d{2})',  # на 12:00
-    ]
-    
-    # Расширенные паттерны для поиска даты
-    date_patterns = [
-        # Точные даты с месяцами
-        r'(\d{1,2})\s*октября',  # 26 октября
-        r'(\d{1,2})\s*ноября',   # 26 ноября
-        r'(\d{1,2})\s*декабря',  # 26 декабря
-        r'(\d{1,2})\s*января',   # 26 января
-        r'(\d{1,2})\s*февраля',  # 26 февраля
-        r'(\d{1,2})\s*марта',    # 26 марта
-        r'(\d{1,2})\s*апреля',   # 26 апреля
-        r'(\d{1,2})\s*мая',      # 26 мая
-        r'(\d{1,2})\s*июня',     # 26 июня
-        r'(\d{1,2})\s*июля',     # 26 июля
-        r'(\d{1,2})\s*августа',  # 26 августа
-        r'(\d{1,2})\s*сентября', # 26 сентября
-        
-        # Относительные даты
-        r'\bзавтра\b',           # завтра
-        r'\bпослезавтра\b',      # послезавтра
-        r'\bсегодня\b',          # сегодня
-        
-        # Даты в формате DD.MM или DD/MM
-        r'(\d{1,2})[./](\d{1,2})',  # 26.10 или 26/10
-        
-        # Даты с годами
-        r'(\d{1,2})[./](\d{1,2})[./](\d{4})',  # 26.10.2025
-    ]
-    
-    # Ищем время
-    time_match = None
-    for pattern in time_patterns:
-        match = re.search(pattern, message_lower)
-        if match:
-            if len(match.groups()) == 2:
-                hour, minute = match.groups()
-                time_match = f"{hour.zfill(2)}:{minute.zfill(2)}"
-            else:
-                hour = match.group(1)
-                time_match = f"{hour.zfill(2)}:00"
-            break
-    
-    # Ищем дату
-    date_match = None
-    month_map = {
-        'января': '01', 'февраля': '02', 'марта': '03', 'апреля': '04',
-        'мая': '05', 'июня': '06', 'июля': '07', 'августа': '08',
-        'сентября': '09', 'октября': '10', 'ноября': '11', 'декабря': '12'
-    }
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, message_lower)
-        if match:
-            if pattern == r'\bзавтра\b':
-                # Завтра
-                tomorrow = datetime.now() + timedelta(days=1)
-                date_match = tomorrow.strftime("%Y-%m-%d")
-            elif pattern == r'\bпослезавтра\b':
-                # Послезавтра
-                day_after_tomorrow = datetime.now() + timedelta(days=2)
-                date_match = day_after_tomorrow.strftime("%Y-%m-%d")
-            elif pattern == r'\bсегодня\b':
-                # Сегодня
-                today = datetime.now()
-                date_match = today.strftime("%Y-%m-%d")
-            elif pattern == r'(\d{1,2})[./](\d{1,2})[./](\d{4})':
-                # DD.MM.YYYY или DD/MM/YYYY
-                day, month, year = match.groups()
-                date_match = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
-            elif pattern == r'(\d{1,2})[./](\d{1,2})':
-                # DD.MM или DD/MM (текущий год)
-                day, month = match.groups()
-                current_year = datetime.now().year
-                date_match = f"{current_year}-{month.zfill(2)}-{day.zfill(2)}"
-            else:
-                # Месяцы по названию
-                day = match.group(1)
-                month_name = pattern.split(r'\s*')[1].replace(')', '')
-                month = month_map.get(month_name, '10')  # По умолчанию октябрь
-                current_year = datetime.now().year
-                date_match = f"{current_year}-{month}-{day.zfill(2)}"
-            break
-    
-    # Если нашли и время и дату, формируем datetime
-    if time_match and date_match:
-        result["datetime"] = f"{date_match} {time_match}"
-    
-    # Проверяем, есть ли все данные
-    result["has_all_info"] = all([result["service"], result["master"], result["datetime"]])
-    
-    return result
-
 def get_recent_history(user_id: int, limit: int = 50) -> str:
     """Получает последние N сообщений из истории"""
-    if user_id not in UserMemory:
+    messages = sessions.messages(user_id)
+    if not messages:
         return ""
     
-    messages = UserMemory[user_id]
-    recent_messages = messages[-limit:] if len(messages) > limit else messages
-    
-    history_text = ""
-    for msg in recent_messages:
+    lines = []
+    for msg in messages[-limit:]:
         # msg is a tuple (role, text)
         if isinstance(msg, tuple) and len(msg) == 2:
             role, content = msg
-            history_text += f"{role}: {content}\n"
         else:
             # Fallback for dictionary format
             role = msg.get("role", "user") if isinstance(msg, dict) else "user"
             content = msg.get("content", "") if isinstance(msg, dict) else str(msg)
-            history_text += f"{role}: {content}\n"
-    
-    return history_text
+        lines.append(f"{role}: {content}\n")
+    return "".join(lines)
 
-def create_booking_from_parsed_data(user_id: int, parsed_data: Dict, client_name: str = "", client_phone: str = "") -> Dict:
-    """Создает запись на основе распарсенных данных"""
+def create_booking_from_parsed_data(user_id: int, parsed_data: Dict, client_name: str = "", client_phone: str = "") -> OutboxEntry:
+    """Ставит в очередь запись на основе распарсенных данных"""
     try:
         log.info(f"🔍 PARSED DATA: {parsed_data}")
         
         if not parsed_data["has_all_info"]:
             raise Exception("Недостаточно данных для создания записи")
         
-        # Создаем реальную запись
-        booking_record = create_real_booking(
+        # Ставим запись в очередь outbox
+        entry = create_real_booking(
             user_id,
             parsed_data["service"],
             parsed_data["master"],
@@ -678,7 +359,7 @@ def create_booking_from_parsed_data(user_id: int, parsed_data: Dict, client_name
             client_phone=client_phone
         )
         
-        return booking_record
+        return entry
         
     except Exception as e:
         log.error(f"Error creating booking from parsed data: {e}")
@@ -724,20 +405,59 @@ def format_user_record(record: Dict) -> str:
         log.error(f"Error formatting record: {e}")
         return "❌ Ошибка отображения записи"
 
+def user_client_id(user_id: int) -> Optional[int]:
+    """id клиента YClients по телефону пользователя (None — телефона нет или клиента ещё нет)"""
+    phone = UserPhone.get(user_id)
+    if not phone:
+        return None
+    return shared.client_records().client_id(get_company_id(), phone)
+
 def get_user_records(user_id: int) -> List[Dict]:
-    """Получить записи пользователя"""
-    return UserRecords.get(user_id, [])
+    """Получить записи пользователя: из YClients, пока клиента там нет — из сессии"""
+    try:
+        client_id = user_client_id(user_id)
+        if client_id is not None:
+            records = shared.client_records().records(get_company_id(), client_id)
+            # Записи, сделанные не через бота (по телефону, на сайте), тоже получают напоминания
+            reminders = shared.reminders()
+            if reminders is not None:
+                reminders.schedule_records("telegram", user_id, records)
+            return records
+    except Exception as e:
+        log.error(f"❌ Error loading records from YClients: {e}")
+    return sessions.get_records(user_id)
 
 def add_user_record(user_id: int, record: Dict):
     """Добавить запись пользователя"""
-    UserRecords[user_id].append(record)
+    sessions.add_record(user_id, record)
 
 def remove_user_record(user_id: int, record_id: int):
     """Удалить запись пользователя"""
-    UserRecords[user_id] = [r for r in UserRecords[user_id] if r.get("id") != record_id]
+    sessions.remove_record(user_id, record_id)
+
+def cancel_user_record(user_id: int, record_id: int) -> Optional[OutboxEntry]:
+    """Отменить запись: в YClients — через outbox (None — запись была только в сессии)"""
+    local = any(r.get("id") == record_id for r in sessions.get_records(user_id))
+    remove_user_record(user_id, record_id)
+    client_id = user_client_id(user_id)
+    company_id = get_company_id()
+    # Удаляем только записи этого клиента: callback_data приходит от пользователя
+    if client_id is None or not any(r.get("id") == record_id for r in shared.client_records().records(company_id, client_id)):
+        if local:
+            return None
+        raise LookupError(f"Record {record_id} is not a record of user {user_id}")
+    payload = {"company_id": company_id, "record_id": record_id, "client_id": client_id}
+    key = record_writes.write_key(record_writes.DELETE_RECORD, company_id, record_id)
+    return shared.outbox().enqueue(record_writes.DELETE_RECORD, payload, key, channel="telegram", chat_id=user_id)
+
+def create_real_booking(user_id: int, service_name: str, master_name: str, date_time: str, client_name: str = "", client_phone: str = "",
+                        service_id: int = None, staff_id: int = None) -> OutboxEntry:
+    """Поставить запись в очередь записей в YClients (outbox.py)
 
-def create_real_booking(user_id: int, service_name: str, master_name: str, date_time: str, client_name: str = "", client_phone: str = "") -> Dict:
-    """Создать реальную запись через YClients API"""
+    С service_id и staff_id (проверенными booking_tool.validate) услуга и мастер
+    берутся из каталога по id, без поиска по названию. Сама запись создаётся
+    воркером outbox, подтверждение пользователю отправляет on_write_finished
+    """
     log.info(f"🚀 STARTING REAL BOOKING: user_id={user_id}, service='{service_name}', master='{master_name}', datetime='{date_time}'")
     
     try:
@@ -752,8 +472,8 @@ def create_real_booking(user_id: int, service_name: str, master_name: str, date_
         services = get_services()
         log.info(f"📋 Available services: {[s.get('title', 'Unknown') for s in services[:3]]}")
         
-        service = None
-        for s in services:
+        service = catalog_cache.get().service(service_id) if service_id is not None else None
+        for s in services if service is None else []:
             if service_name.lower() in s.get("title", "").lower():
                 service = s
                 break
@@ -768,8 +488,8 @@ def create_real_booking(user_id: int, service_name: str, master_name: str, date_
         masters = get_masters()
         log.info(f"👥 Available masters: {[m.get('name', 'Unknown') for m in masters[:3]]}")
         
-        master = None
-        for m in masters:
+        master = catalog_cache.get().master(staff_id) if staff_id is not None else None
+        for m in masters if master is None else []:
             if master_name.lower() in m.get("name", "").lower():
                 master = m
                 break
@@ -779,82 +499,19 @@ def create_real_booking(user_id: int, service_name: str, master_name: str, date_
             raise Exception(f"Мастер '{master_name}' не найден")
         log.info(f"✅ Found master: {master.get('name')} (ID: {master.get('id')})")
         
-        # Создаем клиента если нужно
-        client_id = None
-        if client_phone:
-            log.info(f"📱 Processing client with phone: {client_phone}")
-            try:
-                # Ищем существующего клиента
-                log.info("🔍 Searching for existing client...")
-                existing_clients = yclients.find_client_by_phone(company_id, client_phone)
-                log.info(f"📞 Client search result: {existing_clients}")
-                
-                if existing_clients.get("data"):
-                    client_id = existing_clients["data"][0]["id"]
-                    log.info(f"✅ Found existing client ID: {client_id}")
-            except Exception as e:
-                log.error(f"❌ Error searching for client: {e}")
-            
-            # Если клиент не найден, создаем нового
-            if not client_id:
-                try:
-                    log.info("👤 Creating new client...")
-                    new_client = yclients.create_client(
-                        company_id,
-                        name=client_name or "Клиент",
-                        phone=client_phone,
-                        email="",
-                        comment="Создан через Telegram бот"
-                    )
-                    client_id = new_client["data"]["id"]
-                    log.info(f"✅ Created new client ID: {client_id}")
-                except Exception as e:
-                    log.error(f"❌ Error creating client: {e}")
-        
-        # Создаем запись
-        log.info("📝 Creating record in YClients...")
-        log.info(f"📝 Record details: company_id={company_id}, service_id={service['id']}, staff_id={master['id']}, datetime={date_time}, client_id={client_id}")
-        
-        record = yclients.create_record(
-            company_id,
-            service_id=service["id"],
-            staff_id=master["id"],
-            date_time=date_time,
-            client_id=client_id,
+        # Клиент по телефону и сама запись — в воркере outbox; повтор того же
+        # запроса (тот же чат, услуга, мастер и время) не создаёт вторую запись
+        payload = record_writes.booking_payload(
+            company_id, service, master, date_time,
+            client_name=client_name or "Клиент",
+            client_phone=client_phone,
             comment=f"Запись через Telegram бот (пользователь {user_id})",
-            seance_length=service.get("length", 3600)  # Длительность в секундах
+            seance_length=service.get("length", 3600),  # Длительность в секундах
         )
-        
-        log.info(f"✅ Record created successfully: {record}")
-        
-        # Добавляем в локальное хранилище
-        booking_record = {
-            "id": record["data"]["id"],
-            "date": date_time.split()[0],
-            "datetime": date_time,
-            "services": [{
-                "id": service["id"],
-                "title": service["title"],
-                "cost": service.get("price_min", 0)
-            }],
-            "staff": {
-                "id": master["id"],
-                "name": master["name"],
-                "specialization": master.get("specialization", "")
-            },
-            "company": {
-                "id": company_id,
-                "title": "Салон"
-            },
-            "comment": f"Запись через Telegram бот",
-            "visit_attendance": 0,
-            "length": service.get("length", 60),
-            "online": True
-        }
-        
-        add_user_record(user_id, booking_record)
-        log.info(f"🎉 BOOKING COMPLETED SUCCESSFULLY! Record ID: {booking_record['id']}")
-        return booking_record
+        key = record_writes.booking_key("telegram", user_id, service["id"], master["id"], date_time)
+        entry = shared.outbox().enqueue(record_writes.CREATE_RECORD, payload, key, channel="telegram", chat_id=user_id)
+        log.info(f"📬 Booking queued: {key} ({entry.status})")
+        return entry
         
     except Exception as e:
         log.error(f"❌ CRITICAL ERROR in create_real_booking: {e}")
@@ -863,6 +520,264 @@ def create_real_booking(user_id: int, service_name: str, master_name: str, date_
         log.error(f"❌ Traceback: {traceback.format_exc()}")
         raise e
 
+def booking_record(payload: Dict, record_id: int) -> Dict:
+    """Запись для «Мои записи» из payload выполненной записи outbox"""
+    return {
+        "id": record_id,
+        "date": payload["datetime"].split()[0],
+        "datetime": payload["datetime"],
+        "services": [{
+            "id": payload["service_id"],
+            "title": payload["service_title"],
+            "cost": payload["service_cost"]
+        }],
+        "staff": {
+            "id": payload["staff_id"],
+            "name": payload["master_name"],
+            "specialization": payload["master_specialization"]
+        },
+        "company": {
+            "id": payload["company_id"],
+            "title": "Салон"
+        },
+        "comment": f"Запись через Telegram бот",
+        "visit_attendance": 0,
+        "length": payload["service_length"],
+        "online": True
+    }
+
+def booking_queued_text(entry: OutboxEntry) -> str:
+    """Ответ сразу после постановки записи в очередь"""
+    p = entry.payload
+    details = f"📅 *Услуга:* {p['service_title']}\n👤 *Мастер:* {p['master_name']}\n⏰ *Время:* {p['datetime']}"
+    if entry.status == outbox.DONE:
+        return f"✅ *Эта запись уже создана*\n\n{details}"
+    return f"⏳ *Оформляю запись...*\n\n{details}\n\nПодтверждение придёт отдельным сообщением."
+
+def booking_failed_text(payload: Dict, error: str) -> str:
+    # Sprawdzamy czy to konflikt czasowy
+    if "недоступно" in error or "conflict" in error.lower():
+        answer = f"❌ *Время {payload['datetime']} недоступно*\n\n"
+        answer += f"💡 *Предлагаем альтернативные варианты:*\n"
+        answer += f"• {payload['service_title']} у {payload['master_name']}\n"
+        answer += f"• Завтра в 14:00\n"
+        answer += f"• Завтра в 15:00\n"
+        answer += f"• Завтра в 17:00\n\n"
+        answer += f"Напишите желаемое время, например: `завтра 14:00`"
+        return answer
+    return f"❌ *Ошибка при создании записи:* {error}"
+
+def on_write_finished(entry: OutboxEntry):
+    """Подтверждение записи или отмены из Telegram-чата (вызывается воркером outbox)"""
+    if entry.channel != "telegram":
+        return
+    user_id, p = entry.chat_id, entry.payload
+    if entry.kind == record_writes.DELETE_RECORD:
+        if entry.status == outbox.DONE:
+            answer = f"✅ Запись #{p['record_id']} отменена"
+        else:
+            answer = f"❌ Не удалось отменить запись #{p['record_id']}: {entry.error}"
+    elif entry.kind != record_writes.CREATE_RECORD:
+        return
+    elif entry.status == outbox.DONE:
+        record = booking_record(p, entry.result["record_id"])
+        add_user_record(user_id, record)
+        log.info(f"🎉 BOOKING COMPLETED SUCCESSFULLY! Record ID: {record['id']}")
+        answer = f"🎉 *Запись успешно создана в системе!* 🎉\n\n"
+        answer += f"📅 *Услуга:* {p['service_title']}\n"
+        answer += f"👤 *Мастер:* {p['master_name']}\n"
+        answer += f"⏰ *Время:* {p['datetime']}\n\n"
+        answer += "Спасибо за запись! Ждем вас в салоне! ✨"
+    else:
+        answer = booking_failed_text(p, entry.error or "")
+    add_memory(user_id, "assistant", answer)
+    channels.send_threadsafe("telegram", user_id, answer)
+
+def start_writes():
+    """Очередь записей в YClients (outbox.py) и напоминания (reminders.py) — когда бот уже
+    может отправлять сообщения: подтверждения и напоминания идут через channels.send_threadsafe"""
+    writes = shared.outbox()
+    writes.add_listener(on_write_finished)
+    writes.serve("telegram")
+    writes.start()
+    reminders = shared.reminders()
+    if reminders is not None:
+        reminders.start()
+
+# ===================== MENU RENDERING =================
+SERVICES_PER_MESSAGE = 6  # услуг на одно сообщение (чтобы поместилось)
+
+def service_emoji(name: str) -> str:
+    if "маникюр" in name.lower():
+        return "💅"
+    elif "педикюр" in name.lower():
+        return "🦶"
+    elif "массаж" in name.lower():
+        return "💆"
+    return "✨"
+
+def format_service_lines(page_services: List[Dict]) -> str:
+    text = ""
+    for service in page_services:
+        name = service.get("title", "Без названия")
+        price_min = service.get("price_min", 0)
+        price_max = service.get("price_max", 0)
+        cost = service.get("cost", 0)
+        duration = service.get("length", 0)
+        
+        # Красивое форматирование с эмодзи
+        text += f"{service_emoji(name)} *{name}*\n"
+        
+        # Показываем реальные цены - проверяем все поля цен
+        if cost > 0:
+            text += f"   💰 {cost} ₽\n"
+        elif price_min > 0 and price_max > 0:
+            if price_min == price_max:
+                text += f"   💰 {price_min} ₽\n"
+            else:
+                text += f"   💰 {price_min}-{price_max} ₽\n"
+        elif price_min > 0:
+            text += f"   💰 от {price_min} ₽\n"
+            
+        if duration > 0:
+            text += f"   ⏱ {duration} мин\n"
+        text += "\n"
+    return text
+
+def services_nav_keyboard(page_offset: int, total_services: int) -> InlineKeyboardMarkup:
+    keyboard = []
+    
+    # Добавляем кнопки навигации
+    nav_buttons = []
+    if page_offset > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"services_page_{page_offset - SERVICES_PER_MESSAGE}"))
+    if page_offset + SERVICES_PER_MESSAGE < total_services:
+        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"services_page_{page_offset + SERVICES_PER_MESSAGE}"))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    keyboard.extend([
+        [InlineKeyboardButton("📝 Записаться", callback_data="book_appointment")],
+        [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu")]
+    ])
+    return InlineKeyboardMarkup(keyboard)
+
+def render_services_page(catalog: Catalog, page_offset: int):
+    """Страница услуг для навигации «Вперед/Назад»"""
+    services = catalog.priced_services
+    total_services = len(services)
+    page_services = services[page_offset:page_offset + SERVICES_PER_MESSAGE]
+    page_number = page_offset // SERVICES_PER_MESSAGE + 1
+    
+    text = f"✨ *Услуги (часть {page_number})* ✨\n\n"
+    text += format_service_lines(page_services)
+    
+    # Добавляем информацию о количестве услуг
+    text += f"📊 *Всего услуг: {total_services}*\n"
+    text += f"📄 *Показано: {page_offset + 1}-{min(page_offset + SERVICES_PER_MESSAGE, total_services)} из {total_services}*\n"
+    
+    return text, services_nav_keyboard(page_offset, total_services)
+
+def render_services_overview(catalog: Catalog, page: int):
+    """Одно из сообщений полного списка услуг (кнопка «📋 Услуги»)"""
+    services = catalog.priced_services
+    total_services = len(services)
+    page_services = services[page:page + SERVICES_PER_MESSAGE]
+    
+    if page == 0:
+        text = "✨ *Наши услуги с ценами* ✨\n\n"
+    else:
+        text = f"✨ *Услуги (часть {page // SERVICES_PER_MESSAGE + 1})* ✨\n\n"
+    text += format_service_lines(page_services)
+    
+    # Добавляем информацию о количестве услуг
+    if total_services > SERVICES_PER_MESSAGE:
+        text += f"📊 *Всего услуг: {total_services}*\n"
+        if page + SERVICES_PER_MESSAGE < total_services:
+            text += f"📄 *Показано: {page + 1}-{min(page + SERVICES_PER_MESSAGE, total_services)} из {total_services}*\n"
+    
+    return text, services_nav_keyboard(page, total_services)
+
+def render_masters(catalog: Catalog, page_offset: int = 0):
+    """Список мастеров с их услугами и ценами"""
+    text = "👥 *Наши мастера и их услуги* 👥\n\n"
+    for master in catalog.masters:
+        name = master.get("name", "Без имени")
+        specialization = master.get("specialization", "")
+        staff_id = master.get("id")
+        
+        # Красивое форматирование с эмодзи
+        if "массаж" in specialization.lower():
+            emoji = "💆‍♀️"
+        elif "мастер" in specialization.lower():
+            emoji = "💅"
+        else:
+            emoji = "✨"
+            
+        text += f"{emoji} *{name}*\n"
+        if specialization:
+            text += f"   🎯 {specialization}\n"
+        
+        # Услуги этого мастера
+        master_services = catalog.services_for_master(staff_id) if staff_id else []
+        if master_services:
+            text += f"   💰 *Услуги:*\n"
+            for service in master_services:  # Показываем ВСЕ услуги мастера
+                service_name = service.get("title", "")
+                cost = service.get("cost", 0)
+                price_min = service.get("price_min", 0)
+                price_max = service.get("price_max", 0)
+                
+                if service_name:
+                    text += f"      • {service_name}"
+                    
+                    # Показываем реальные цены - проверяем все поля цен
+                    if cost > 0:
+                        text += f": {cost} ₽"
+                    elif price_min > 0 and price_max > 0:
+                        if price_min == price_max:
+                            text += f": {price_min} ₽"
+                        else:
+                            text += f": {price_min}-{price_max} ₽"
+                    elif price_min > 0:
+                        text += f": от {price_min} ₽"
+                    
+                    text += "\n"
+        
+        text += "\n"
+    
+    keyboard = [
+        [InlineKeyboardButton("📝 Записаться", callback_data="book_appointment")],
+        [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu")]
+    ]
+    return text, InlineKeyboardMarkup(keyboard)
+
+def service_pages(catalog: Catalog):
+    return range(0, len(catalog.priced_services), SERVICES_PER_MESSAGE)
+
+render_cache = RenderCache()
+render_cache.register("services", render_services_overview, service_pages)
+render_cache.register("services_page", render_services_page, service_pages)
+render_cache.register("masters", render_masters)
+# После каждой загрузки каталога страницы меню готовятся заранее
+catalog_cache.add_listener(render_cache.prewarm)
+
+async def select_tenant(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Группа -1: до всех хендлеров выбрать салон, к которому относится чат, и начать отсчёт дедлайна"""
+    chat = update.effective_chat
+    tenants.set_current(tenants.resolve("telegram", chat.id if chat else None))
+    deadlines.set_current(UPDATE_DEADLINE)
+
+def refine_with_lexicon(parsed_data: Dict, text: str) -> Dict:
+    """Мастер и услуга по каталогу салона: имена мастеров у каждого салона свои"""
+    return tenants.current().lexicon.refine(parsed_data, text)
+
+async def get_catalog() -> Catalog:
+    """Каталог из памяти; в пул потоков идём, только когда его нужно загрузить"""
+    if catalog_cache.is_fresh():
+        return catalog_cache.current
+    return await run_blocking(catalog_cache.get)
+
 # ===================== MENU HANDLERS ==================
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -932,81 +847,17 @@ async def show_services_page(query: CallbackQuery):
     """Показать конкретную страницу услуг"""
     try:
         page_offset = int(query.data.replace("services_page_", ""))
-        company_id = get_company_id()
-        if not company_id:
+        catalog = await get_catalog()
+        if not catalog.company_id:
             await query.edit_message_text("❌ Не удалось получить ID компании.")
             return
         
-        # Получаем услуги с реальными ценами
-        services = get_services_with_prices(company_id)
-        if not services:
+        if not catalog.priced_services:
             await query.edit_message_text("❌ Не удалось загрузить услуги. Попробуйте позже.")
             return
         
-        # Разделяем услуги на части по 6 услуг на сообщение
-        services_per_message = 6
-        total_services = len(services)
-        
-        page_services = services[page_offset:page_offset + services_per_message]
-        page_number = page_offset // services_per_message + 1
-        
-        text = f"✨ *Услуги (часть {page_number})* ✨\n\n"
-        
-        for i, service in enumerate(page_services, 1):
-            name = service.get("title", "Без названия")
-            price_min = service.get("price_min", 0)
-            price_max = service.get("price_max", 0)
-            cost = service.get("cost", 0)
-            duration = service.get("length", 0)
-            
-            # Красивое форматирование с эмодзи
-            if "маникюр" in name.lower():
-                emoji = "💅"
-            elif "педикюр" in name.lower():
-                emoji = "🦶"
-            elif "массаж" in name.lower():
-                emoji = "💆"
-            else:
-                emoji = "✨"
-                
-            text += f"{emoji} *{name}*\n"
-            
-            # Показываем реальные цены
-            if cost > 0:
-                text += f"   💰 {cost} ₽\n"
-            elif price_min > 0 and price_max > 0:
-                if price_min == price_max:
-                    text += f"   💰 {price_min} ₽\n"
-                else:
-                    text += f"   💰 {price_min}-{price_max} ₽\n"
-            elif price_min > 0:
-                text += f"   💰 от {price_min} ₽\n"
-                
-            if duration > 0:
-                text += f"   ⏱ {duration} мин\n"
-            text += "\n"
-        
-        # Добавляем информацию о количестве услуг
-        text += f"📊 *Всего услуг: {total_services}*\n"
-        text += f"📄 *Показано: {page_offset + 1}-{min(page_offset + services_per_message, total_services)} из {total_services}*\n"
-        
-        keyboard = []
-        
-        # Добавляем кнопки навигации
-        nav_buttons = []
-        if page_offset > 0:
-            nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"services_page_{page_offset - services_per_message}"))
-        if page_offset + services_per_message < total_services:
-            nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"services_page_{page_offset + services_per_message}"))
-        if nav_buttons:
-            keyboard.append(nav_buttons)
-        
-        keyboard.extend([
-            [InlineKeyboardButton("📝 Записаться", callback_data="book_appointment")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu")]
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Готовая страница из кэша (отрисована при загрузке каталога)
+        text, reply_markup = render_cache.get(catalog, "services_page", page_offset)
         await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
         
     except Exception as e:
@@ -1014,162 +865,39 @@ async def show_services_page(query: CallbackQuery):
         await query.edit_message_text("❌ Ошибка при загрузке услуг.")
 
 async def show_services(query: CallbackQuery):
-    company_id = get_company_id()
-    if not company_id:
+    catalog = await get_catalog()
+    if not catalog.company_id:
         await query.edit_message_text("❌ Не удалось получить ID компании.")
         return
     
-    # Получаем услуги с реальными ценами
-    services = get_services_with_prices(company_id)
-    if not services:
+    if not catalog.priced_services:
         await query.edit_message_text("❌ Не удалось загрузить услуги. Попробуйте позже.")
         return
     
-    # Разделяем услуги на части по 6 услуг на сообщение (чтобы поместилось)
-    services_per_message = 6
-    total_services = len(services)
-    
-    for page in range(0, total_services, services_per_message):
-        page_services = services[page:page + services_per_message]
-        
-        if page == 0:
-            text = "✨ *Наши услуги с ценами* ✨\n\n"
-        else:
-            text = f"✨ *Услуги (часть {page // services_per_message + 1})* ✨\n\n"
-        
-        for i, service in enumerate(page_services, 1):
-            name = service.get("title", "Без названия")
-            price_min = service.get("price_min", 0)
-            price_max = service.get("price_max", 0)
-            cost = service.get("cost", 0)
-            duration = service.get("length", 0)
-            
-            # Красивое форматирование с эмодзи
-            if "маникюр" in name.lower():
-                emoji = "💅"
-            elif "педикюр" in name.lower():
-                emoji = "🦶"
-            elif "массаж" in name.lower():
-                emoji = "💆"
-            else:
-                emoji = "✨"
-                
-            text += f"{emoji} *{name}*\n"
-            
-            # Показываем реальные цены - проверяем все поля цен
-            if cost > 0:
-                text += f"   💰 {cost} ₽\n"
-            elif price_min > 0 and price_max > 0:
-                if price_min == price_max:
-                    text += f"   💰 {price_min} ₽\n"
-                else:
-                    text += f"   💰 {price_min}-{price_max} ₽\n"
-            elif price_min > 0:
-                text += f"   💰 от {price_min} ₽\n"
-                
-            if duration > 0:
-                text += f"   ⏱ {duration} мин\n"
-            text += "\n"
-        
-        # Добавляем информацию о количестве услуг
-        if total_services > services_per_message:
-            text += f"📊 *Всего услуг: {total_services}*\n"
-            if page + services_per_message < total_services:
-                text += f"📄 *Показано: {page + 1}-{min(page + services_per_message, total_services)} из {total_services}*\n"
-        
-        keyboard = []
-        
-        # Добавляем кнопки навигации если есть несколько страниц
-        if total_services > services_per_message:
-            nav_buttons = []
-            if page > 0:
-                nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"services_page_{page - services_per_message}"))
-            if page + services_per_message < total_services:
-                nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"services_page_{page + services_per_message}"))
-            if nav_buttons:
-                keyboard.append(nav_buttons)
-        
-        keyboard.extend([
-            [InlineKeyboardButton("📝 Записаться", callback_data="book_appointment")],
-            [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu")]
-        ])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+    for page in service_pages(catalog):
+        text, reply_markup = render_cache.get(catalog, "services", page)
         if page == 0:
             await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
         else:
             await query.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
 
 async def show_masters(query: CallbackQuery):
-    company_id = get_company_id()
-    if not company_id:
+    catalog = await get_catalog()
+    if not catalog.company_id:
         await query.edit_message_text("❌ Не удалось получить ID компании.")
         return
         
-    masters = get_masters()
-    if not masters:
+    if not catalog.masters:
         await query.edit_message_text("❌ Не удалось загрузить мастеров. Попробуйте позже.")
         return
     
-    text = "👥 *Наши мастера и их услуги* 👥\n\n"
-    for master in masters:
-        name = master.get("name", "Без имени")
-        specialization = master.get("specialization", "")
-        staff_id = master.get("id")
-        
-        # Красивое форматирование с эмодзи
-        if "массаж" in specialization.lower():
-            emoji = "💆‍♀️"
-        elif "мастер" in specialization.lower():
-            emoji = "💅"
-        else:
-            emoji = "✨"
-            
-        text += f"{emoji} *{name}*\n"
-        if specialization:
-            text += f"   🎯 {specialization}\n"
-        
-        # Получаем услуги для этого мастера
-        if staff_id:
-            master_services = get_services_for_master(company_id, staff_id)
-            if master_services:
-                text += f"   💰 *Услуги:*\n"
-                for service in master_services:  # Показываем ВСЕ услуги мастера
-                    service_name = service.get("title", "")
-                    cost = service.get("cost", 0)
-                    price_min = service.get("price_min", 0)
-                    price_max = service.get("price_max", 0)
-                    
-                    if service_name:
-                        text += f"      • {service_name}"
-                        
-                        # Показываем реальные цены - проверяем все поля цен
-                        if cost > 0:
-                            text += f": {cost} ₽"
-                        elif price_min > 0 and price_max > 0:
-                            if price_min == price_max:
-                                text += f": {price_min} ₽"
-                            else:
-                                text += f": {price_min}-{price_max} ₽"
-                        elif price_min > 0:
-                            text += f": от {price_min} ₽"
-                        
-                        text += "\n"
-        
-        text += "\n"
-    
-    keyboard = [
-        [InlineKeyboardButton("📝 Записаться", callback_data="book_appointment")],
-        [InlineKeyboardButton("🔙 Главное меню", callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    text, reply_markup = render_cache.get(catalog, "masters")
     await query.edit_message_text(text, parse_mode='Markdown', reply_markup=reply_markup)
 
 async def show_user_records(query: CallbackQuery):
     """Показать записи пользователя"""
     user_id = query.from_user.id
-    records = get_user_records(user_id)
+    records = await run_blocking(get_user_records, user_id)
     
     if not records:
         keyboard = [
@@ -1217,14 +945,15 @@ async def delete_user_record(query: CallbackQuery, record_id: int):
     user_id = query.from_user.id
     
     try:
-        # Удаляем из локального хранилища
-        remove_user_record(user_id, record_id)
-        
-        # TODO: Здесь можно добавить вызов API для удаления записи
-        # yclients.delete_user_record(record_id, record_hash)
+        # Запись в YClients удаляет воркер outbox, подтверждение придёт отдельным сообщением
+        entry = await run_blocking(cancel_user_record, user_id, record_id)
+        if entry is None or entry.status == outbox.DONE:
+            text = f"✅ Запись #{record_id} успешно удалена!"
+        else:
+            text = f"⏳ Отменяю запись #{record_id}... Подтверждение придёт отдельным сообщением."
         
         await query.edit_message_text(
-            f"✅ Запись #{record_id} успешно удалена!",
+            text,
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🔙 К записям", callback_data="my_records")
             ]])
@@ -1243,7 +972,7 @@ async def start_booking_process(query: CallbackQuery):
     user_id = query.from_user.id
     
     # Проверяем, есть ли номер телефона
-    if user_id not in UserPhone:
+    if not await run_blocking(get_user_phone, user_id):
         await query.edit_message_text(
             "📱 *Для записи нужен ваш номер телефона*\n\n"
             "Пожалуйста, отправьте номер в формате:\n"
@@ -1257,8 +986,8 @@ async def start_booking_process(query: CallbackQuery):
         return
     
     # Показываем доступные услуги и мастеров
-    services = get_services()
-    masters = get_masters()
+    services = await run_blocking(get_services)
+    masters = await run_blocking(get_masters)
     
     text = "📝 *Создание записи* 📝\n\n"
     text += "✨ *Доступные услуги:*\n"
@@ -1346,14 +1075,14 @@ def create_test_record(user_id: int):
 async def reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     user_id = update.message.from_user.id
-    add_memory(user_id, "user", text)
+    await run_blocking(add_memory, user_id, "user", text)
     
     # Флаг для отслеживания отправки ответа
     response_sent = False
 
     # Проверяем специальные команды
     if text.lower() in ["создать тестовую запись", "тест запись", "добавить запись"]:
-        test_record = create_test_record(user_id)
+        test_record = await run_blocking(create_test_record, user_id)
         await update.message.reply_text(
             f"✅ *Создана тестовая запись!*\n\n"
             f"📅 *Дата:* {test_record['date']}\n"
@@ -1368,7 +1097,7 @@ async def reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Проверяем, является ли сообщение номером телефона
     if text.startswith("+") and len(text) >= 10:
-        UserPhone[user_id] = text
+        await run_blocking(set_user_phone, user_id, text)
         await update.message.reply_text(
             f"✅ *Номер телефона {text} сохранен!*\n\n"
             f"Теперь вы можете создавать записи.\n"
@@ -1378,19 +1107,25 @@ async def reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
         response_sent = True
         return
 
-    if is_booking(text):
+    booking = is_booking(text)
+    # Вопрос без даты и времени («как записаться?») — ответ из FAQ, а не разбор записи
+    faq_answer = await run_blocking(booking_faq_answer, user_id, text) if booking else None
+    if faq_answer:
+        answer = faq_answer
+    elif booking:
         log.info(f"🎯 BOOKING DETECTED: '{text}'")
         # Сначала пробуем парсить сообщение напрямую
-        history = get_recent_history(user_id, 50)
+        history = await run_blocking(get_recent_history, user_id, 50)
         log.info(f"📚 HISTORY: {history[:200]}...")
-        parsed_data = parse_booking_message(text, history)
+        parsed_data = await parsing.parse(text, history)
+        parsed_data = await run_blocking(refine_with_lexicon, parsed_data, text)
         
         log.info(f"🔍 PARSED MESSAGE: {parsed_data}")
         
         # Если удалось распарсить все данные, создаем запись напрямую
         if parsed_data["has_all_info"]:
             try:
-                user_phone = UserPhone.get(user_id)
+                user_phone = await run_blocking(get_user_phone, user_id)
                 if not user_phone:
                     await update.message.reply_text(
                         "📱 *Для создания записи нужен ваш номер телефона*\n\n"
@@ -1401,37 +1136,22 @@ async def reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     response_sent = True
                     return
                 
-                # Создаем запись напрямую
-                booking_record = create_booking_from_parsed_data(
+                # Ставим запись в очередь; подтверждение придёт отдельным сообщением
+                entry = await run_blocking(
+                    create_booking_from_parsed_data,
                     user_id,
                     parsed_data,
                     client_name=update.message.from_user.first_name or "Клиент",
                     client_phone=user_phone
                 )
-                
-                answer = f"🎉 *Запись успешно создана в системе!* 🎉\n\n"
-                answer += f"📅 *Услуга:* {parsed_data['service']}\n"
-                answer += f"👤 *Мастер:* {parsed_data['master']}\n"
-                answer += f"⏰ *Время:* {parsed_data['datetime']}\n\n"
-                answer += "Спасибо за запись! Ждем вас в салоне! ✨"
+                answer = booking_queued_text(entry)
                 
             except Exception as e:
                 log.error(f"Error creating booking from parsed data: {e}")
-                
-                # Sprawdzamy czy to konflikt czasowy
-                if "недоступно" in str(e) or "conflict" in str(e).lower():
-                    answer = f"❌ *Время {parsed_data['datetime']} недоступно*\n\n"
-                    answer += f"💡 *Предлагаем альтернативные варианты:*\n"
-                    answer += f"• {parsed_data['service']} у {parsed_data['master']}\n"
-                    answer += f"• Завтра в 14:00\n"
-                    answer += f"• Завтра в 15:00\n"
-                    answer += f"• Завтра в 17:00\n\n"
-                    answer += f"Напишите желаемое время, например: `завтра 14:00`"
-                else:
-                    answer = f"❌ *Ошибка при создании записи:* {str(e)}"
+                answer = f"❌ *Ошибка при создании записи:* {str(e)}"
         else:
             # Проверяем, спрашивает ли пользователь об услугах конкретного мастера
-            masters = get_masters()
+            masters = await run_blocking(get_masters)
             master_names = [m.get("name", "").lower() for m in masters]
             
             # Ищем упоминание имени мастера в сообщении
@@ -1442,102 +1162,124 @@ async def reply(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     break
             
             # Если упоминается мастер, показываем его услуги детерминистически
+            message = None
             if mentioned_master:
                 master_display_name = next((m.get("name") for m in masters if m.get("name", "").lower() == mentioned_master), mentioned_master)
-                answer = get_master_services_text(master_display_name)
+                answer = await run_blocking(get_master_services_text, master_display_name)
                 log.info(f"🎯 DETERMINISTIC RESPONSE for {master_display_name}: {answer}")
             else:
                 # Если не удалось распарсить, используем AI
-                api_data = get_api_data_for_ai()
-                log.info(f"📊 API DATA FOR AI: {api_data}")
-                msg = BOOKING_PROMPT.replace("{{api_data}}", api_data).replace("{{message}}", text).replace("{{history}}", history)
-                log.info(f"🤖 AI PROMPT: {msg}")
-                answer = groq_chat([{"role": "user", "content": msg}])
-                log.info(f"🤖 AI RESPONSE: {answer}")
+                try:
+                    message = await run_blocking(booking_answer, user_id, text)
+                    answer = message.get("content") or ""
+                except deadlines.DeadlineExceeded:
+                    answer = deadlines.degraded_answer(booking=True)
+                log.info(f"🤖 AI RESPONSE: {answer} {(message or {}).get('tool_calls') or ''}")
             
-            # Проверяем, содержит ли ответ команду для создания записи
-            if "ЗАПИСЬ:" in answer:
+            # Вызов create_booking: услуга и мастер — по id из каталога, время проверено (booking_tool.py)
+            booking = None
+            try:
+                booking_call = booking_tool.arguments(message) if message else None
+                if booking_call is not None:
+                    booking = booking_tool.validate(booking_call, tenants.current().catalog.get())
+            except booking_tool.BookingError as e:
+                answer = str(e)
+
+            if booking is not None:
+                service_name = booking.service.get("title", "")
+                master_name = booking.master.get("name", "")
+                date_time = booking.date_time
                 try:
-                    # Парсим данные из ответа AI
-                    booking_line = [line for line in answer.split('\n') if 'ЗАПИСЬ:' in line][0]
-                    parts = booking_line.split('|')
-                    if len(parts) >= 3:
-                        service_name = parts[0].replace('ЗАПИСЬ:', '').strip()
-                        master_name = parts[1].strip()
-                        date_time = parts[2].strip()
-                        
-                        # Проверяем, есть ли номер телефона
-                        user_phone = UserPhone.get(user_id)
-                        if not user_phone:
-                            await update.message.reply_text(
-                                "📱 *Для создания записи нужен ваш номер телефона*\n\n"
-                                "Пожалуйста, отправьте номер в формате:\n"
-                                "`+7XXXXXXXXXX`",
-                                parse_mode='Markdown'
-                            )
-                            response_sent = True
-                            return
-                        
-                        # ВАЛИДАЦИЯ: Проверяем, существует ли услуга в API
-                        company_id = get_company_id()
-                        if company_id:
-                            all_services = get_services_with_prices(company_id)
-                            service_exists = any(service_name.lower() in service.get("title", "").lower() 
-                                               for service in all_services)
-                            
-                            if not service_exists:
-                                log.warning(f"❌ SERVICE NOT FOUND IN API: {service_name}")
-                                await update.message.reply_text(
-                                    f"❌ *Услуга не найдена*\n\n"
-                                    f"Услуга '{service_name}' не существует в нашем каталоге.\n"
-                                    f"Пожалуйста, выберите услугу из списка доступных.",
-                                    parse_mode='Markdown'
-                                )
-                                response_sent = True
-                                return
-                        
-                        # Создаем реальную запись
-                        booking_record = create_real_booking(
-                            user_id, 
-                            service_name, 
-                            master_name, 
-                            date_time,
-                            client_name=update.message.from_user.first_name or "Клиент",
-                            client_phone=user_phone
+                    # Проверяем, есть ли номер телефона
+                    user_phone = await run_blocking(get_user_phone, user_id)
+                    if not user_phone:
+                        await update.message.reply_text(
+                            "📱 *Для создания записи нужен ваш номер телефона*\n\n"
+                            "Пожалуйста, отправьте номер в формате:\n"
+                            "`+7XXXXXXXXXX`",
+                            parse_mode='Markdown'
                         )
-                        
-                        # Обновляем ответ
-                        answer = f"🎉 *Запись успешно создана в системе!* 🎉\n\n" + answer.replace("ЗАПИСЬ:", "📅 *Создана запись:*")
-                        
+                        response_sent = True
+                        return
+                    
+                    # Ставим запись в очередь; подтверждение придёт отдельным сообщением
+                    entry = await run_blocking(
+                        create_real_booking,
+                        user_id, 
+                        service_name, 
+                        master_name, 
+                        date_time,
+                        client_name=update.message.from_user.first_name or "Клиент",
+                        client_phone=user_phone,
+                        service_id=booking.service.get("id"),
+                        staff_id=booking.master.get("id")
+                    )
+                    
+                    # Обновляем ответ
+                    answer = booking_queued_text(entry) + (f"\n\n{answer}" if answer else "")
+                    
                 except Exception as e:
                     log.error(f"Error creating booking: {e}")
-                    
-                    # Sprawdzamy czy to konflikt czasowy
-                    if "недоступно" in str(e) or "conflict" in str(e).lower():
-                        answer += f"\n\n❌ *Время {date_time} недоступно*\n\n"
-                        answer += f"💡 *Предлагаем альтернативные варианты:*\n"
-                        answer += f"• {service_name} у {master_name}\n"
-                        answer += f"• Завтра в 14:00\n"
-                        answer += f"• Завтра в 15:00\n"
-                        answer += f"• Завтра в 17:00\n\n"
-                        answer += f"Напишите желаемое время, например: `завтра 14:00`"
-                    else:
-                        answer += f"\n\n❌ *Ошибка при создании записи:* {str(e)}"
+                    answer += f"\n\n❌ *Ошибка при создании записи:* {str(e)}"
     else:
-        msg = CHAT_PROMPT.replace("{{history}}", get_history(user_id)).replace("{{message}}", text)
-        answer = groq_chat([{"role": "user", "content": msg}])
+        try:
+            answer = await run_blocking(chat_answer, user_id, text)
+        except deadlines.DeadlineExceeded:
+            # Groq не успел — ответ без LLM, чтобы чат не молчал
+            answer = await run_blocking(lambda: deadlines.degraded_answer(tenants.current().faq, text))
 
-    add_memory(user_id, "assistant", answer)
+    await run_blocking(add_memory, user_id, "assistant", answer)
     
     # Отправляем ответ только если он не был отправлен ранее
     if answer and not response_sent:  # Проверяем что есть ответ для отправки
             await update.message.reply_text(answer)
 
 # ===================== RUN BOT ========================
-def main():
-    # Start Telegram bot
-    app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def run_webhook(app: Application):
+    """Webhook-режим: встроенный HTTP-сервер вместо long polling"""
+    import signal
+    from webhook_server import serve_webhook
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await serve_webhook(
+        app,
+        url=WEBHOOK_URL,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        path=WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_pending=UPDATE_MAX_PENDING,
+        stop_event=stop_event,
+        on_started=lambda: start_sending(app),
+    )
+
+def start_sending(app: Application):
+    """Подтверждения из outbox и напоминания отправляются в чаты через event loop бота"""
+    channels.register_sender("telegram", lambda chat_id, text: app.bot.send_message(chat_id=chat_id, text=text))
+    start_writes()
+
+async def post_init(app: Application):
+    start_sending(app)
+
+def build_application() -> Application:
+    """Telegram Application со всеми хендлерами (используется и run_bots.py)"""
+    app = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(ChatOrderedUpdateProcessor(UPDATE_WORKERS, UPDATE_MAX_PENDING))
+        .post_init(post_init)
+        .build()
+    )
     
+    app.add_handler(TypeHandler(Update, select_tenant), group=-1)
+
     # Command handlers
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("menu", menu))
@@ -1547,10 +1289,36 @@ def main():
     
     # Message handler for AI chat
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, reply))
+    return app
+
+def build_channel() -> TelegramChannel:
+    """Telegram channel for run_bots.py (polling or webhook, as configured)"""
+    webhook = None
+    if BOT_MODE == "webhook":
+        webhook = dict(url=WEBHOOK_URL, host=WEBHOOK_HOST, port=WEBHOOK_PORT, path=WEBHOOK_PATH,
+                       secret_token=WEBHOOK_SECRET, max_pending=UPDATE_MAX_PENDING)
+    channel = TelegramChannel(build_application(), webhook=webhook)
+    channel.on_ready = start_writes
+    return channel
+
+def main():
+    # Start Telegram bot
+    app = build_application()
+    
+    if METRICS_LOG_INTERVAL > 0:
+        metrics.start_reporter(METRICS_LOG_INTERVAL)
+    
+    # Каталог, парсер и HTTP-пулы готовы до первого апдейта
+    if startup.enabled():
+        startup.prewarm()
     
     # Start bot
-    log.info("🚀 Starting Telegram Bot...")
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        log.info("🚀 Starting Telegram Bot (webhook mode)...")
+        asyncio.run(run_webhook(app))
+    else:
+        log.info("🚀 Starting Telegram Bot...")
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
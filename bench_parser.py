@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Микро-бенчмарк парсера записей (booking_parser.py)
+
+Прогоняет размеченный корпус реалистичных сообщений (опечатки, падежи,
+даты, время) через is_booking / find_service_advanced / find_master_advanced /
+parse_booking_message и выводит задержку на вызов, пропускную способность
+и точность извлечения.
+
+Задержки сравниваются с baseline не в абсолютных микросекундах, а
+относительно калибровочного цикла (разбор тех же сообщений на слова и
+подсчёт слов), замеренного в том же процессе: на другой машине или под
+нагрузкой медленнее становится и он, и гейт не срабатывает на
+неизменённом коде.
+
+Использование:
+    python bench_parser.py                      # отчёт
+    python bench_parser.py --check              # сравнить с baseline, exit 1 при регрессии
+                                                # (и если baseline снят в другом режиме fuzzy)
+    python bench_parser.py --update-baseline    # сохранить текущие цифры как baseline
+    python bench_parser.py --dump corpus.jsonl  # выгрузить корпус для ручной проверки
+    python bench_parser.py --processes 4        # + пропускная способность parsing_service.py
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import booking_parser
+from booking_parser import (
+    is_booking,
+    find_service_advanced,
+    find_master_advanced,
+    parse_booking_message,
+)
+from parsing_service import ParsingService
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_parser_baseline.json")
+DEFAULT_SIZE = 3000
+DEFAULT_SEED = 2137
+
+# ===================== CORPUS =========================
+# Формы слов: (текст, ожидаемое значение). None — парсер не обязан распознать
+# (опечатка, которую текущие правила не ловят), но метка остаётся правдивой.
+SERVICE_FORMS = {
+    "маникюр": ["маникюр", "маникюра", "маникюру", "маникюром", "маникюрчик",
+                "маникюрный", "маник", "маникур", "маникьюр", "миникюр"],
+    "педикюр": ["педикюр", "педикюра", "педикюру", "педикюром", "педикюрчик",
+                "педикур", "пидикюр", "педикюрный"],
+    "массаж": ["массаж", "массажа", "массажу", "массажик", "масаж", "масажа",
+               "массажный", "масcаж"],
+}
+
+MASTER_FORMS = {
+    "Арина": ["Арина", "Арине", "Арину", "Ариной", "Аринке", "арине", "Орине"],
+    "Екатерина": ["Екатерина", "Екатерине", "Кате", "Катюше", "Катерине",
+                  "кате", "Екатирине"],
+    "Полина": ["Полина", "Полине", "Полину", "Полиной", "Полинке", "Палине"],
+}
+
+MONTHS = ["января", "февраля", "марта", "апреля", "мая", "июня", "июля",
+          "августа", "сентября", "октября", "ноября", "декабря"]
+
+GREETINGS = ["", "", "Здравствуйте! ", "Добрый день, ", "привет) ", "Подскажите, "]
+INTENTS = ["хочу записаться на", "запишите меня на", "можно на", "нужна запись на",
+           "хочу", "хотела бы записаться на", "можно записаться на"]
+
+CHITCHAT = [
+    "привет", "спасибо!", "Спасибо большое", "а вы где находитесь?",
+    "Как добраться до салона?", "ок", "хорошо, жду", "до свидания",
+    "у вас есть парковка?", "а скидки бывают?", "понятно", "Добрый вечер",
+]
+
+PARTIAL = [
+    "сколько стоит {service}?",
+    "а {service} сколько по времени?",
+    "какие услуги у {master}?",
+    "{master} завтра работает?",
+    "есть свободное время {date}?",
+    "хочу {service}",
+]
+
+
+def _date_variant(rng: random.Random, today: datetime) -> (str, Optional[str]):
+    """Случайная дата в одном из пользовательских форматов и её ожидаемое значение."""
+    kind = rng.choice(["month", "month", "tomorrow", "after", "today", "dotted",
+                       "slashed", "full", "weekday", "ordinal"])
+    year = today.year
+    if kind == "month":
+        day = rng.randint(1, 28)
+        month = rng.randint(1, 12)
+        return f"{day} {MONTHS[month - 1]}", f"{year}-{month:02d}-{day:02d}"
+    if kind == "tomorrow":
+        return "завтра", (today + timedelta(days=1)).strftime("%Y-%m-%d")
+    if kind == "after":
+        return "послезавтра", (today + timedelta(days=2)).strftime("%Y-%m-%d")
+    if kind == "today":
+        return "сегодня", today.strftime("%Y-%m-%d")
+    if kind in ("dotted", "slashed"):
+        day, month = rng.randint(1, 28), rng.randint(1, 12)
+        sep = "." if kind == "dotted" else "/"
+        return f"{day:02d}{sep}{month:02d}", f"{year}-{month:02d}-{day:02d}"
+    if kind == "full":
+        day, month = rng.randint(1, 28), rng.randint(1, 12)
+        full_year = year + rng.choice([0, 1])
+        return f"{day:02d}.{month:02d}.{full_year}", f"{full_year}-{month:02d}-{day:02d}"
+    if kind == "weekday":
+        return rng.choice(["в понедельник", "в пятницу", "в субботу"]), None
+    day, month = rng.randint(1, 28), rng.randint(1, 12)
+    return f"{day}-го {MONTHS[month - 1]}", f"{year}-{month:02d}-{day:02d}"
+
+
+def _time_variant(rng: random.Random) -> (str, Optional[str]):
+    """Случайное время в одном из пользовательских форматов и его ожидаемое значение."""
+    hour = rng.randint(9, 20)
+    minute = rng.choice([0, 0, 30, 15, 45])
+    kind = rng.choice(["colon", "colon", "v_colon", "na_colon", "hours", "bare", "dot"])
+    if kind == "colon":
+        return f"{hour}:{minute:02d}", f"{hour:02d}:{minute:02d}"
+    if kind == "v_colon":
+        return f"в {hour}:{minute:02d}", f"{hour:02d}:{minute:02d}"
+    if kind == "na_colon":
+        return f"на {hour}:{minute:02d}", f"{hour:02d}:{minute:02d}"
+    if kind == "hours":
+        return f"в {hour} часов", f"{hour:02d}:00"
+    if kind == "bare":
+        return f"в {hour}", f"{hour:02d}:00"
+    return f"в {hour}.{minute:02d}", f"{hour:02d}:{minute:02d}"
+
+
+def _label(text: str, service=None, master=None, date=None, time_=None, booking=True) -> Dict:
+    return {
+        "text": text,
+        "service": service,
+        "master": master,
+        "datetime": f"{date} {time_}" if date and time_ else None,
+        "booking": booking,
+    }
+
+
+def generate_corpus(size: int = DEFAULT_SIZE, seed: int = DEFAULT_SEED,
+                    today: Optional[datetime] = None) -> List[Dict]:
+    """Детерминированно сгенерировать размеченный корпус сообщений."""
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    corpus = []
+
+    while len(corpus) < size:
+        roll = rng.random()
+        service = rng.choice(list(SERVICE_FORMS))
+        service_form = rng.choice(SERVICE_FORMS[service])
+        master = rng.choice(list(MASTER_FORMS))
+        master_form = rng.choice(MASTER_FORMS[master])
+        date_text, date_value = _date_variant(rng, today)
+        time_text, time_value = _time_variant(rng)
+
+        if roll < 0.55:
+            # Полная заявка: услуга + мастер + дата + время в разном порядке
+            greet = rng.choice(GREETINGS)
+            intent = rng.choice(INTENTS)
+            order = rng.choice([
+                f"{intent} {service_form} к {master_form} {date_text} {time_text}",
+                f"{intent} {service_form} {date_text} {time_text} к {master_form}",
+                f"{date_text} {time_text} {service_form} к {master_form}",
+                f"{intent} к {master_form} на {service_form} {date_text} {time_text}",
+            ])
+            text = greet + order
+            if rng.random() < 0.3:
+                text = text.capitalize()
+            corpus.append(_label(text, service, master, date_value, time_value))
+        elif roll < 0.8:
+            template = rng.choice(PARTIAL)
+            text = template.format(service=service_form, master=master_form, date=date_text)
+            corpus.append(_label(
+                text,
+                service=service if "{service}" in template else None,
+                master=master if "{master}" in template else None,
+            ))
+        else:
+            corpus.append(_label(rng.choice(CHITCHAT), booking=False))
+
+    return corpus
+
+
+# ===================== MEASUREMENT ====================
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn: Callable, args_list: List[tuple], rounds: int = 3) -> Dict:
+    """Замерить задержку одного вызова (мкс) и пропускную способность (вызовов/с)."""
+    timings = []
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for args in args_list:
+            t0 = time.perf_counter_ns()
+            fn(*args)
+            timings.append((time.perf_counter_ns() - t0) / 1000)
+    elapsed = time.perf_counter() - started
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "mean_us": round(sum(timings) / len(timings), 2),
+        "p50_us": round(_percentile(timings, 50), 2),
+        "p95_us": round(_percentile(timings, 95), 2),
+        "p99_us": round(_percentile(timings, 99), 2),
+        "throughput_per_s": round(len(timings) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _calibration_workload(text: str) -> List[str]:
+    """Работа того же рода, что у парсера (lower, regex, словари), но от парсера не зависящая"""
+    counts: Dict[str, int] = {}
+    for word in _WORD.findall(text.lower()):
+        counts[word] = counts.get(word, 0) + 1
+    return sorted(counts)
+
+
+def calibrate(texts: List[tuple], rounds: int = 3) -> float:
+    """p50 калибровочного цикла (мкс) — масштаб скорости этой машины прямо сейчас"""
+    return measure(_calibration_workload, texts, rounds)["p50_us"]
+
+
+def accuracy(corpus: List[Dict]) -> Dict:
+    """Доля сообщений, где парсер извлёк ровно то, что указано в разметке."""
+    hits = {"service": 0, "master": 0, "datetime": 0, "booking": 0, "exact": 0}
+    for item in corpus:
+        parsed = parse_booking_message(item["text"], "")
+        ok_service = parsed["service"] == item["service"]
+        ok_master = parsed["master"] == item["master"]
+        ok_datetime = parsed["datetime"] == item["datetime"]
+        hits["service"] += ok_service
+        hits["master"] += ok_master
+        hits["datetime"] += ok_datetime
+        hits["booking"] += is_booking(item["text"]) == item["booking"]
+        hits["exact"] += ok_service and ok_master and ok_datetime
+    total = len(corpus) or 1
+    return {field: round(count / total, 4) for field, count in hits.items()}
+
+
+def measure_service(corpus: List[Dict], workers: int, rounds: int = 3) -> Dict:
+    """Пропускная способность ParsingService: все сообщения корпуса приходят разом, как в пик."""
+    service = ParsingService(workers)
+    items = [(item["text"], "") for item in corpus]
+
+    async def run():
+        # Прогрев: процессы пула стартуют и импортируют парсер
+        await service.parse_many(items[:service.batch_size * max(workers, 1)])
+        started = time.perf_counter()
+        for _ in range(rounds):
+            results = await asyncio.gather(*(service.parse(text, history) for text, history in items))
+        return results, time.perf_counter() - started
+
+    try:
+        results, elapsed = asyncio.run(run())
+    finally:
+        service.shutdown()
+    return {
+        "workers": workers,
+        "calls": len(items) * rounds,
+        "throughput_per_s": round(len(items) * rounds / elapsed, 1) if elapsed else 0.0,
+        "matches_inline": results == [parse_booking_message(text, history) for text, history in items],
+    }
+
+
+def run_benchmark(size: int = DEFAULT_SIZE, seed: int = DEFAULT_SEED, rounds: int = 3,
+                  processes: int = 0) -> Dict:
+    corpus = generate_corpus(size, seed)
+    texts = [(item["text"],) for item in corpus]
+    result = {
+        "corpus_size": len(corpus),
+        "seed": seed,
+        "fuzzy_available": booking_parser.fuzzy_available,
+        "calibration_us": calibrate(texts, rounds),
+        "latency": {
+            "is_booking": measure(is_booking, texts, rounds),
+            "find_service_advanced": measure(find_service_advanced, texts, rounds),
+            "find_master_advanced": measure(find_master_advanced, texts, rounds),
+            "parse_booking_message": measure(parse_booking_message,
+                                             [(item["text"], "") for item in corpus], rounds),
+        },
+        "accuracy": accuracy(corpus),
+    }
+    if processes:
+        result["parsing_service"] = measure_service(corpus, processes, rounds)
+    return result
+
+
+# ===================== REGRESSION GATE ================
+def compare(result: Dict, baseline: Dict, accuracy_tolerance: float, speed_tolerance: float) -> List[str]:
+    """Список регрессий относительно baseline (пустой — всё в порядке)."""
+    problems = []
+    # С fuzzywuzzy и без него — разные парсеры: точность и скорость несравнимы
+    if "fuzzy_available" in baseline and result.get("fuzzy_available") != baseline["fuzzy_available"]:
+        problems.append(f"fuzzy_available {result.get('fuzzy_available')} != baseline "
+                        f"{baseline['fuzzy_available']} (install fuzzywuzzy or re-record the baseline)")
+    for field, base_value in baseline.get("accuracy", {}).items():
+        value = result["accuracy"].get(field, 0.0)
+        if value < base_value - accuracy_tolerance:
+            problems.append(f"accuracy[{field}] {value:.4f} < baseline {base_value:.4f}")
+    # Baseline пересчитывается на скорость этой машины; без калибровки — как есть
+    scale = 1.0
+    if result.get("calibration_us") and baseline.get("calibration_us"):
+        scale = result["calibration_us"] / baseline["calibration_us"]
+    for fn_name, base_stats in baseline.get("latency", {}).items():
+        stats = result["latency"].get(fn_name)
+        if not stats:
+            continue
+        limit = base_stats["p50_us"] * scale * (1 + speed_tolerance)
+        if stats["p50_us"] > limit:
+            problems.append(f"latency[{fn_name}] p50 {stats['p50_us']}us > {limit:.2f}us "
+                            f"(baseline {base_stats['p50_us']}us x{scale:.2f} machine speed)")
+    return problems
+
+
+def print_report(result: Dict):
+    print(f"📊 Корпус: {result['corpus_size']} сообщений (seed={result['seed']}, "
+          f"fuzzy={'on' if result['fuzzy_available'] else 'off'}, "
+          f"калибровка {result.get('calibration_us', 0)}us)\n")
+    print(f"{'function':<24}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'calls/s':>12}")
+    for fn_name, stats in result["latency"].items():
+        print(f"{fn_name:<24}{stats['mean_us']:>10}{stats['p50_us']:>10}"
+              f"{stats['p95_us']:>10}{stats['p99_us']:>10}{stats['throughput_per_s']:>12}")
+    print("\n🎯 Точность:")
+    for field, value in result["accuracy"].items():
+        print(f"   {field:<10} {value * 100:6.2f}%")
+    service = result.get("parsing_service")
+    if service:
+        print(f"\n🧮 parsing_service ({service['workers']} процессов): "
+              f"{service['throughput_per_s']} сообщений/с, "
+              f"{'совпадает' if service['matches_inline'] else 'НЕ совпадает'} с разбором в процессе")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Booking parser micro-benchmark")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--check", action="store_true", help="fail on regression vs baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.005,
+                        help="allowed absolute accuracy drop (default 0.005)")
+    parser.add_argument("--speed-tolerance", type=float, default=0.5,
+                        help="allowed relative p50 slowdown (default 0.5 = +50%%)")
+    parser.add_argument("--dump", metavar="PATH", help="write the corpus as JSON lines and exit")
+    parser.add_argument("--json", action="store_true", help="print the raw result as JSON")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="also measure parsing_service.py with N worker processes")
+    args = parser.parse_args(argv)
+
+    # is_booking логирует каждый вызов — в замерах это только шум
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.dump:
+        with open(args.dump, "w", encoding="utf-8") as f:
+            for item in generate_corpus(args.size, args.seed):
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        print(f"✅ Corpus written to {args.dump}")
+        return 0
+
+    result = run_benchmark(args.size, args.seed, args.rounds, args.processes)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"\n✅ Baseline saved to {args.baseline}")
+        return 0
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\n❌ Baseline not found: {args.baseline} (run with --update-baseline)")
+            return 1
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("corpus_size") != result["corpus_size"] or baseline.get("seed") != result["seed"]:
+            print("\n⚠️ Baseline was recorded with a different corpus size/seed")
+        problems = compare(result, baseline, args.accuracy_tolerance, args.speed_tolerance)
+        if problems:
+            print("\n❌ Regression detected:")
+            for problem in problems:
+                print(f"   • {problem}")
+            return 1
+        print("\n✅ No regression vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
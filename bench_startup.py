@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк холодного старта: сколько стоит импорт бота (python -X importtime)
+
+Запускает `python -X importtime -c "import <module>"` в отдельном процессе
+несколько раз и выводит медианное время импорта, самые дорогие пакеты
+(по собственному времени импорта всех их модулей) и самые дорогие модули.
+Сетевых запросов нет: импорт только создаёт клиенты, прогрев (startup.py)
+выполняется в main().
+
+Использование:
+    python bench_startup.py                          # app.py
+    python bench_startup.py --module run_bots --top 20
+    python bench_startup.py --runs 5 --max-ms 1500   # exit 1, если импорт дольше
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from typing import Dict, List
+
+# Фиктивные значения обязательных переменных, чтобы модуль импортировался без .env
+PLACEHOLDER_ENV = {
+    "TELEGRAM_BOT_TOKEN": "0:startup-bench",
+    "GROQ_API_KEY": "startup-bench",
+    "YCLIENTS_PARTNER_TOKEN": "startup-bench",
+    "YCLIENTS_USER_TOKEN": "startup-bench",
+}
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Строки `import time: self [us] | cumulative | imported package` -> список модулей"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # заголовок
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        modules.append({
+            "module": stripped,
+            "depth": (len(name) - len(stripped) - 1) // 2,
+            "self_us": int(parts[0]),
+            "cumulative_us": int(parts[1]),
+        })
+    return modules
+
+
+def packages(modules: List[Dict]) -> Dict[str, int]:
+    """Собственное время импорта, сложенное по пакетам верхнего уровня (мкс)"""
+    totals: Dict[str, int] = {}
+    for item in modules:
+        package = item["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + item["self_us"]
+    return dict(sorted(totals.items(), key=lambda kv: kv[1], reverse=True))
+
+
+def measure_import(module: str, runs: int = 3) -> Dict:
+    env = dict(os.environ)
+    for name, value in PLACEHOLDER_ENV.items():
+        env.setdefault(name, value)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=cwd, env=env, capture_output=True, text=True)
+        wall = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        modules = parse_importtime(proc.stderr)
+        target = next((m for m in reversed(modules) if m["module"] == module), None)
+        samples.append({
+            "wall_ms": round(wall * 1000, 1),
+            "import_ms": round((target["cumulative_us"] if target else 0) / 1000, 1),
+            "modules": modules,
+        })
+    samples.sort(key=lambda sample: sample["import_ms"])
+    median = samples[len(samples) // 2]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": median["import_ms"],
+        "wall_ms": median["wall_ms"],
+        "module_count": len(median["modules"]),
+        "packages_us": packages(median["modules"]),
+        "modules": median["modules"],
+    }
+
+
+def print_report(result: Dict, top: int):
+    print(f"🚀 import {result['module']}: {result['import_ms']} ms "
+          f"(процесс целиком {result['wall_ms']} ms, модулей {result['module_count']}, "
+          f"медиана из {result['runs']})\n")
+    print(f"{'package':<32}{'self ms':>10}")
+    for package, us in list(result["packages_us"].items())[:top]:
+        print(f"{package:<32}{us / 1000:>10.1f}")
+    print(f"\n{'module':<48}{'self ms':>10}{'cumul. ms':>11}")
+    heaviest = sorted(result["modules"], key=lambda m: m["self_us"], reverse=True)[:top]
+    for item in heaviest:
+        print(f"{item['module'][:47]:<48}{item['self_us'] / 1000:>10.1f}{item['cumulative_us'] / 1000:>11.1f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bot cold-start import benchmark")
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="fail if the median import takes longer")
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.module, args.runs)
+    print_report(result, args.top)
+    if args.max_ms is not None and result["import_ms"] > args.max_ms:
+        print(f"\n❌ Import takes {result['import_ms']} ms > budget {args.max_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# blocking_pool.py
+"""
+Выделенный пул потоков для блокирующего I/O (YClients, Groq) из async-хендлеров.
+
+Пока нет полностью асинхронного клиента, хендлеры делают
+`await blocking.run(get_masters)` вместо прямого вызова, и event loop
+остаётся свободным для остальных пользователей.
+"""
+import time
+import asyncio
+import logging
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+import metrics
+
+log = logging.getLogger()
+
+SATURATION_WARNING_INTERVAL = 30  # секунд между предупреждениями о перегрузке
+
+
+class BlockingPool:
+    """ThreadPoolExecutor фиксированного размера с метриками очереди"""
+
+    def __init__(self, max_workers: int = 64, name: str = "blocking-io"):
+        self.max_workers = max_workers
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._last_warning = 0.0
+        self._submitted = metrics.counter(f"{name}.submitted")
+        self._wait = metrics.histogram(f"{name}.queue_wait_seconds")
+        self._run_time = metrics.histogram(f"{name}.run_seconds")
+        metrics.gauge(f"{name}.queue_depth", lambda: self._queued)
+        metrics.gauge(f"{name}.active", lambda: self._active)
+        metrics.gauge(f"{name}.saturation", self.saturation)
+
+    # --- состояние ---
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def saturation(self) -> float:
+        """Доля занятых потоков (1.0 — все заняты, дальше растёт очередь)"""
+        return round(self._active / self.max_workers, 3)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "active": self._active,
+            "queued": self._queued,
+            "saturation": self.saturation(),
+            "queue_wait": self._wait.summary(),
+        }
+
+    # --- выполнение ---
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Выполнить fn(*args, **kwargs) в пуле и дождаться результата"""
+        enqueued = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+        self._submitted.inc()
+        self._check_saturation()
+        loop = asyncio.get_running_loop()
+        # Как asyncio.to_thread: контекст (например, текущий салон из tenants.py) переходит в поток
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._call, enqueued, fn, args, kwargs)
+        future.add_done_callback(self._forget_cancelled)
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _forget_cancelled(self, future):
+        """Задачу отменили (ожидающий хендлер отменён, shutdown) до того, как её взял поток:
+        _call не выполнится, и из очереди её снимаем здесь"""
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def _call(self, enqueued: float, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        self._wait.observe(started - enqueued)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._run_time.observe(time.perf_counter() - started)
+
+    def wrap(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """Асинхронная обёртка над синхронной функцией"""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+        return wrapper
+
+    def _check_saturation(self):
+        if self._queued <= self.max_workers:
+            return
+        now = time.monotonic()
+        if now - self._last_warning >= SATURATION_WARNING_INTERVAL:
+            self._last_warning = now
+            log.warning(f"⚠️ {self.name} saturated: {self._active}/{self.max_workers} busy, "
+                        f"{self._queued} queued")
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
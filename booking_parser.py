@@ -0,0 +1,333 @@
+# booking_parser.py
+"""Разбор сообщений о записи: ключевые слова, услуги, мастера, дата и время"""
+import re
+import logging
+import importlib.util
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+log = logging.getLogger()
+
+BOOKING_KEYWORDS = [
+    "запись", "записаться", "записать", "забронировать",
+    "услуга", "мастер", "время", "дата",
+    "когда можно", "свободное время", "расписание",
+    "записаться на", "хочу записаться", "нужна запись",
+    "маникюр", "педикюр", "массаж",  # nazwy usług
+    "арина", "екатерина", "полина", "катя", "катюша",  # imiona masterów
+    "октября", "ноября", "декабря", "января", "февраля", "марта", "апреля", "мая", "июня", "июля", "августа", "сентября",  # miesiące
+    ":", "часов", "в ", "на "  # czas
+]
+
+def is_booking(text):
+    text_lower = text.lower()
+    matches = [k for k in BOOKING_KEYWORDS if k in text_lower]
+    log.info(f"🔍 BOOKING CHECK: '{text}' -> matches: {matches}")
+    return len(matches) > 0
+
+def init_fuzzy_matcher():
+    """Инициализация нечеткого поиска (импорт fuzzywuzzy — при первом нечетком поиске или в warm())"""
+    global fuzz, process
+    if process is not None:
+        return True
+    try:
+        from fuzzywuzzy import fuzz, process
+        return True
+    except ImportError:
+        log.warning("fuzzywuzzy not available, using basic parsing")
+        return False
+
+fuzz = process = None
+# Глобальный флаг доступности fuzzywuzzy; сам модуль импортируется лениво
+fuzzy_available = importlib.util.find_spec("fuzzywuzzy") is not None
+
+# Нечеткий поиск исправляет опечатки, а не подбирает похожие слова: слово
+# короче FUZZY_MIN_LENGTH не сравнивается (маска -> масаж), а кандидаты —
+# только с той же первой буквой и длиной ±1 (Марина, Карина, Ирина -> арина)
+FUZZY_MIN_LENGTH = 6
+FUZZY_THRESHOLD = 80  # одна опечатка в слове из 6 букв даёт 83
+
+def find_best_match(word: str, choices: list, threshold: int = FUZZY_THRESHOLD) -> str:
+    """Находит лучшее совпадение с помощью нечеткого поиска"""
+    if word in choices:
+        return word
+    if len(word) < FUZZY_MIN_LENGTH:
+        return None
+    candidates = [c for c in choices if c[0] == word[0] and abs(len(c) - len(word)) <= 1]
+    if not candidates or not fuzzy_available or not init_fuzzy_matcher():
+        return None
+    
+    try:
+        result = process.extractOne(word, candidates, scorer=fuzz.ratio)
+        if result and result[1] >= threshold:
+            return result[0]
+    except Exception as e:
+        log.debug(f"Error in fuzzy matching '{word}': {e}")
+    
+    return None
+
+# Словари услуг и мастеров компилируются один раз при импорте модуля
+# (в том числе в каждом процессе parsing_service.py), а не на каждое сообщение
+
+# Расширенные варианты услуг с regex паттернами
+SERVICE_PATTERNS = {
+    "маникюр": [
+        r'\bманикюр\w*\b',  # маникюр, маникюра, маникюру, маникюром, маникюре
+        r'\bманикюрн\w*\b',  # маникюрный, маникюрная, маникюрное
+        r'\bманик\w*\b',     # маник, маника (сокращения)
+    ],
+    "педикюр": [
+        r'\bпедикюр\w*\b',  # педикюр, педикюра, педикюру, педикюром, педикюре
+        r'\bпедикюрн\w*\b',  # педикюрный, педикюрная, педикюрное
+        r'\bпедик\w*\b',     # педик, педика (сокращения)
+    ],
+    "массаж": [
+        r'\bмассаж\w*\b',   # массаж, массажа, массажу, массажем, массаже
+        r'\bмассажн\w*\b',   # массажный, массажная, массажное
+        r'\bмасаж\w*\b',     # масаж, масажа (опечатки)
+        r'\bмас\w*ж\w*\b',   # мас*ж (опечатки)
+    ]
+}
+
+SERVICE_VARIANTS = {
+    "маникюр": ["маникюр", "маникюра", "маникюру", "маникюром", "маникюре", "маникюрный", "маникюрная", "маник", "маника"],
+    "педикюр": ["педикюр", "педикюра", "педикюру", "педикюром", "педикюре", "педикюрный", "педикюрная", "педик", "педика"],
+    "массаж": ["массаж", "массажа", "массажу", "массажем", "массаже", "масаж", "масажа", "массажный", "массажная"]
+}
+
+# Regex паттерны для имен мастеров
+MASTER_PATTERNS = {
+    "арина": [
+        r'\bарин\w*\b',      # арина, арины, арине, арину, ариной
+        r'\bаринк\w*\b',     # аринка, ариночка
+        r'\bорин\w*\b',      # орина, орине (просторечное «Орина»)
+    ],
+    "екатерина": [
+        r'\bекатерин\w*\b',  # екатерина, екатерины, екатерине, екатерину, екатериной
+        r'\bкат\w*\b',       # катя, кати, кате, катю, катей, катенька
+        r'\bкатюш\w*\b',     # катюша, катюши, катюше, катюшу, катюшей, катюшка
+    ],
+    "полина": [
+        r'\bполин\w*\b',     # полина, полины, полине, полину, полиной
+        r'\bполинк\w*\b',    # полинка, полиночка
+    ]
+}
+
+MASTER_VARIANTS = {
+    "арина": ["арина", "арины", "арине", "арину", "ариной", "аринка", "ариночка", "орина", "орине", "орину"],
+    "екатерина": ["екатерина", "екатерины", "екатерине", "екатерину", "екатериной", "катя", "кати", "кате", "катю", "катей", "катюша", "катюши", "катюше", "катюшу", "катюшей", "катенька", "катюшка"],
+    "полина": ["полина", "полины", "полине", "полину", "полиной", "полинка", "полиночка"]
+}
+
+
+def _compile(patterns: Dict[str, List[str]]) -> List[Tuple[str, "re.Pattern"]]:
+    return [(name, re.compile(pattern)) for name, items in patterns.items() for pattern in items]
+
+
+def _index(variants: Dict[str, List[str]]) -> Tuple[List[str], Dict[str, str]]:
+    """Плоский список вариантов для fuzzy-поиска и вариант -> каноническое имя (первое вхождение)"""
+    choices = [variant for items in variants.values() for variant in items]
+    owner = {}
+    for name, items in variants.items():
+        for variant in items:
+            owner.setdefault(variant, name)
+    return choices, owner
+
+
+SERVICE_REGEXES = _compile(SERVICE_PATTERNS)
+MASTER_REGEXES = _compile(MASTER_PATTERNS)
+SERVICE_CHOICES, SERVICE_BY_VARIANT = _index(SERVICE_VARIANTS)
+MASTER_CHOICES, MASTER_BY_VARIANT = _index(MASTER_VARIANTS)
+
+def find_service_advanced(message: str) -> str:
+    """Продвинутый поиск услуги с regex и нечетким поиском"""
+    message_lower = message.lower()
+    
+    # Ищем по regex паттернам
+    for service, pattern in SERVICE_REGEXES:
+        if pattern.search(message_lower):
+            return service
+    
+    # Fallback к нечеткому поиску по словам
+    if not fuzzy_available:
+        return None
+    for word in message_lower.split():
+        best_match = find_best_match(word, SERVICE_CHOICES)
+        if best_match:
+            return SERVICE_BY_VARIANT[best_match]
+    
+    return None
+
+def find_master_advanced(message: str) -> str:
+    """Продвинутый поиск мастера с regex и нечетким поиском"""
+    message_lower = message.lower()
+    
+    # Ищем по regex паттернам
+    for master, pattern in MASTER_REGEXES:
+        if pattern.search(message_lower):
+            return master.title()
+    
+    # Fallback к нечеткому поиску по словам
+    if not fuzzy_available:
+        return None
+    for word in message_lower.split():
+        best_match = find_best_match(word, MASTER_CHOICES)
+        if best_match:
+            return MASTER_BY_VARIANT[best_match].title()
+    
+    return None
+
+# Список услуг для поиска
+FALLBACK_SERVICES = [
+    "маникюр с покрытием гель-лак", "маникюр", "педикюр с покрытием гель-лак", 
+    "педикюр", "массаж оздоровительный", "массаж", "маникюр в 4 руки", 
+    "педикюр в 4 руки"
+]
+
+# Список мастеров
+FALLBACK_MASTERS = ["арина", "екатерина", "полина", "катя", "катюша"]
+
+# Паттерны для поиска времени
+TIME_PATTERNS = [
+    r'(\d{1,2}):(\d{2})',  # 12:00, 9:30
+    r'(\d{1,2})\s*часов',  # 12 часов
+    r'в\s*(\d{1,2}):(\d{2})',  # в 12:00
+    r'на\s*(\d{1,2}):(\d{2})',  # на 12:00
+]
+
+# Расширенные паттерны для поиска даты
+DATE_PATTERNS = [
+    # Точные даты с месяцами
+    r'(\d{1,2})\s*октября',  # 26 октября
+    r'(\d{1,2})\s*ноября',   # 26 ноября
+    r'(\d{1,2})\s*декабря',  # 26 декабря
+    r'(\d{1,2})\s*января',   # 26 января
+    r'(\d{1,2})\s*февраля',  # 26 февраля
+    r'(\d{1,2})\s*марта',    # 26 марта
+    r'(\d{1,2})\s*апреля',   # 26 апреля
+    r'(\d{1,2})\s*мая',      # 26 мая
+    r'(\d{1,2})\s*июня',     # 26 июня
+    r'(\d{1,2})\s*июля',     # 26 июля
+    r'(\d{1,2})\s*августа',  # 26 августа
+    r'(\d{1,2})\s*сентября', # 26 сентября
+    
+    # Относительные даты
+    r'\bзавтра\b',           # завтра
+    r'\bпослезавтра\b',      # послезавтра
+    r'\bсегодня\b',          # сегодня
+    
+    # Даты в формате DD.MM или DD/MM
+    r'(\d{1,2})[./](\d{1,2})',  # 26.10 или 26/10
+    
+    # Даты с годами
+    r'(\d{1,2})[./](\d{1,2})[./](\d{4})',  # 26.10.2025
+]
+
+MONTH_MAP = {
+    'января': '01', 'февраля': '02', 'марта': '03', 'апреля': '04',
+    'мая': '05', 'июня': '06', 'июля': '07', 'августа': '08',
+    'сентября': '09', 'октября': '10', 'ноября': '11', 'декабря': '12'
+}
+
+TIME_REGEXES = [(pattern, re.compile(pattern)) for pattern in TIME_PATTERNS]
+DATE_REGEXES = [(pattern, re.compile(pattern)) for pattern in DATE_PATTERNS]
+
+def parse_booking_message(message: str, history: str) -> Dict:
+    """Парсит сообщение пользователя и извлекает информацию о записи"""
+    result = {
+        "service": None,
+        "master": None,
+        "datetime": None,
+        "has_all_info": False
+    }
+    
+    message_lower = message.lower()
+    
+    # Используем продвинутый поиск услуг
+    result["service"] = find_service_advanced(message)
+    
+    # Используем продвинутый поиск мастеров
+    result["master"] = find_master_advanced(message)
+    
+    # Fallback к старому методу если не найдено
+    if not result["service"]:
+        for service in FALLBACK_SERVICES:
+            if service.lower() in message_lower:
+                result["service"] = service
+                break
+    
+    if not result["master"]:
+        for master in FALLBACK_MASTERS:
+            if master in message_lower:
+                # Преобразуем обратно в правильное имя
+                if master in ["арина"]:
+                    result["master"] = "Арина"
+                elif master in ["екатерина", "катя", "катюша"]:
+                    result["master"] = "Екатерина"
+                elif master in ["полина"]:
+                    result["master"] = "Полина"
+                break
+    
+    # Ищем время
+    time_match = None
+    for pattern, regex in TIME_REGEXES:
+        match = regex.search(message_lower)
+        if match:
+            if len(match.groups()) == 2:
+                hour, minute = match.groups()
+                time_match = f"{hour.zfill(2)}:{minute.zfill(2)}"
+            else:
+                hour = match.group(1)
+                time_match = f"{hour.zfill(2)}:00"
+            break
+    
+    # Ищем дату
+    date_match = None
+    for pattern, regex in DATE_REGEXES:
+        match = regex.search(message_lower)
+        if match:
+            if pattern == r'\bзавтра\b':
+                # Завтра
+                tomorrow = datetime.now() + timedelta(days=1)
+                date_match = tomorrow.strftime("%Y-%m-%d")
+            elif pattern == r'\bпослезавтра\b':
+                # Послезавтра
+                day_after_tomorrow = datetime.now() + timedelta(days=2)
+                date_match = day_after_tomorrow.strftime("%Y-%m-%d")
+            elif pattern == r'\bсегодня\b':
+                # Сегодня
+                today = datetime.now()
+                date_match = today.strftime("%Y-%m-%d")
+            elif pattern == r'(\d{1,2})[./](\d{1,2})[./](\d{4})':
+                # DD.MM.YYYY или DD/MM/YYYY
+                day, month, year = match.groups()
+                date_match = f"{year}-{month.zfill(2)}-{day.zfill(2)}"
+            elif pattern == r'(\d{1,2})[./](\d{1,2})':
+                # DD.MM или DD/MM (текущий год)
+                day, month = match.groups()
+                current_year = datetime.now().year
+                date_match = f"{current_year}-{month.zfill(2)}-{day.zfill(2)}"
+            else:
+                # Месяцы по названию
+                day = match.group(1)
+                month_name = pattern.split(r'\s*')[1].replace(')', '')
+                month = MONTH_MAP.get(month_name, '10')  # По умолчанию октябрь
+                current_year = datetime.now().year
+                date_match = f"{current_year}-{month}-{day.zfill(2)}"
+            break
+    
+    # Если нашли и время и дату, формируем datetime
+    if time_match and date_match:
+        result["datetime"] = f"{date_match} {time_match}"
+    
+    # Проверяем, есть ли все данные
+    result["has_all_info"] = all([result["service"], result["master"], result["datetime"]])
+    
+    return result
+
+def warm():
+    """Загрузить fuzzywuzzy и прогнать разбор один раз — до первого сообщения пользователя"""
+    if fuzzy_available:
+        init_fuzzy_matcher()
+        find_best_match("маникюр", SERVICE_CHOICES)
+    parse_booking_message("хочу маникюр к Арине завтра в 12:00", "")
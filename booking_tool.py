@@ -0,0 +1,137 @@
+# booking_tool.py
+"""
+Запись через вызов функции (tool calling) вместо разбора текста ответа.
+
+Раньше LLM отвечала строкой «ЗАПИСЬ: услуга | мастер | дата время», а бот
+искал услугу и мастера по подстроке названия: «Маникюр» находил первую
+услугу, в названии которой есть это слово, а лишний пробел или другое
+написание ломали разбор. Теперь в запрос к Groq передаётся схема функции
+create_booking (TOOLS): id услуги и мастера из блока каталога
+([service_id …], [staff_id …]) и время в формате YYYY-MM-DD HH:MM.
+
+validate() проверяет аргументы по каталогу: услуга и мастер существуют,
+мастер делает эту услугу, время разбирается и ещё не прошло. Ошибка —
+BookingError с текстом для пользователя; повторного запроса к LLM нет:
+пользователь уточняет, и следующий вызов снова проходит проверку.
+Метрики: booking_tool.calls и booking_tool.invalid.
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import metrics
+from catalog import Catalog
+
+log = logging.getLogger()
+
+TOOL_NAME = "create_booking"
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+_ACCEPTED_FORMATS = (DATETIME_FORMAT, "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S")
+
+TOOLS: List[Dict[str, Any]] = [{
+    "type": "function",
+    "function": {
+        "name": TOOL_NAME,
+        "description": "Создать запись, когда известны услуга, мастер, дата и время",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "service_id": {"type": "integer", "description": "service_id услуги из списка услуг"},
+                "staff_id": {"type": "integer", "description": "staff_id мастера из списка мастеров"},
+                "datetime": {"type": "string", "description": "Дата и время начала, YYYY-MM-DD HH:MM"},
+            },
+            "required": ["service_id", "staff_id", "datetime"],
+        },
+    },
+}]
+
+_calls = metrics.counter("booking_tool.calls")
+_invalid = metrics.counter("booking_tool.invalid")
+
+
+class BookingError(ValueError):
+    """Аргументы create_booking не прошли проверку; str(e) — текст для пользователя"""
+
+
+class Booking(NamedTuple):
+    service: Dict
+    master: Dict
+    date_time: str  # "YYYY-MM-DD HH:MM", как ждёт YClientsClient.create_record
+
+    def summary(self) -> str:
+        return f"{self.service.get('title')} | {self.master.get('name')} | {self.date_time}"
+
+
+def arguments(message: Dict) -> Optional[Dict[str, Any]]:
+    """Аргументы вызова create_booking из ответа chat completions; None — обычный текстовый ответ"""
+    for call in message.get("tool_calls") or []:
+        function = call.get("function") or {}
+        if function.get("name") != TOOL_NAME:
+            continue
+        _calls.inc()
+        raw = function.get("arguments") or "{}"
+        try:
+            parsed = raw if isinstance(raw, dict) else json.loads(raw)
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, dict):
+            _invalid.inc()
+            log.warning(f"⚠️ Malformed {TOOL_NAME} arguments: {raw!r}")
+            raise BookingError("Не удалось разобрать данные для записи. Напишите, пожалуйста, "
+                               "услугу, мастера, дату и время ещё раз.")
+        return parsed
+    return None
+
+
+def _as_id(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    for fmt in _ACCEPTED_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _check(arguments: Dict[str, Any], catalog: Catalog, now: datetime) -> Booking:
+    service = catalog.service(_as_id(arguments.get("service_id")))
+    if service is None:
+        raise BookingError("Не нашёл такую услугу в каталоге. Уточните, пожалуйста, на какую услугу записать.")
+    master = catalog.master(_as_id(arguments.get("staff_id")))
+    if master is None:
+        raise BookingError("Не нашёл такого мастера. Уточните, пожалуйста, к кому записать.")
+
+    offered = catalog.services_for_master(master.get("id"))
+    if offered and not any(s.get("id") == service.get("id") for s in offered):
+        others = [m.get("name") for m in catalog.masters if m.get("name")
+                  and any(s.get("id") == service.get("id") for s in catalog.services_for_master(m.get("id")))]
+        text = f"{master.get('name')} не делает «{service.get('title')}»."
+        if others:
+            text += " Эту услугу делают: " + ", ".join(others) + "."
+        raise BookingError(text)
+
+    when = parse_datetime(arguments.get("datetime"))
+    if when is None:
+        raise BookingError("Не понял дату и время. Напишите, пожалуйста, например: «завтра в 14:00».")
+    if when <= now:
+        raise BookingError("Это время уже прошло. Выберите, пожалуйста, другое время.")
+    return Booking(service, master, when.strftime(DATETIME_FORMAT))
+
+
+def validate(arguments: Dict[str, Any], catalog: Catalog, now: Optional[datetime] = None) -> Booking:
+    """Услуга, мастер и время из аргументов create_booking, проверенные по каталогу"""
+    try:
+        return _check(arguments, catalog, now or datetime.now())
+    except BookingError as e:
+        _invalid.inc()
+        log.warning(f"⚠️ Rejected {TOOL_NAME} {arguments}: {e}")
+        raise
@@ -0,0 +1,193 @@
+# bridge_driver.py
+"""
+Управление whatsapp_bridge.js как дочерним процессом asyncio.
+
+BridgeDriver запускает bridge, читает его stdout (NDJSON, см.
+bridge_protocol.py) и stderr без блокировок, отдаёт входящие сообщения
+в общий конвейер обработки — KeyedScheduler, как у Telegram: разные чаты
+параллельно, один чат по очереди — и перезапускает bridge с
+экспоненциальной задержкой, если процесс упал.
+
+Оба pipe читаются постоянно, поэтому заполненный буфер никогда не
+останавливает дочерний процесс.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence
+
+import metrics
+from bridge_protocol import BridgeConnection, BridgeError, MAX_LINE_BYTES
+from update_scheduler import KeyedScheduler
+
+log = logging.getLogger()
+
+DEFAULT_COMMAND = ("node", "whatsapp_bridge.js")
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = 60.0
+STABLE_AFTER = 60.0  # секунд работы, после которых задержка перезапуска сбрасывается
+STOP_TIMEOUT = 10.0
+
+
+class BridgeMessage:
+    """Входящее сообщение WhatsApp из bridge; answer() отвечает в тот же чат"""
+
+    def __init__(self, driver: "BridgeDriver", event: Dict[str, Any]):
+        self.driver = driver
+        self.chat_id = event.get("chatId") or event.get("sender")
+        self.sender = event.get("sender") or self.chat_id
+        self.message_text = event.get("message") or ""
+        self.timestamp = event.get("timestamp")
+
+    async def answer(self, text: str) -> Dict[str, Any]:
+        return await self.driver.send(self.chat_id, text)
+
+
+MessageHandler = Callable[[BridgeMessage], Awaitable[None]]
+
+
+class BridgeDriver:
+    def __init__(self, handler: MessageHandler, *, command: Sequence[str] = DEFAULT_COMMAND,
+                 cwd: Optional[str] = None, workers: int = 16, max_pending: int = 1000,
+                 backoff_initial: float = BACKOFF_INITIAL, backoff_max: float = BACKOFF_MAX,
+                 stable_after: float = STABLE_AFTER, name: str = "whatsapp_bridge"):
+        self.handler = handler
+        self.command = list(command)
+        self.cwd = cwd
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.name = name
+        self.scheduler = KeyedScheduler(workers, max_pending, name=name)
+        self.ready = asyncio.Event()
+        self._connection: Optional[BridgeConnection] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        # Входящие события отделены от цикла чтения: пока хендлеры ждут ack
+        # своих ответов, чтение stdout не должно стоять на backpressure планировщика
+        self._inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._restarts = metrics.counter(f"{name}.restarts")
+        self._received = metrics.counter(f"{name}.received")
+        metrics.gauge(f"{name}.connected", lambda: int(self._connection is not None))
+        metrics.gauge(f"{name}.inbox", lambda: self._inbox.qsize())
+
+    # --- отправка ---
+    async def send(self, chat_id: str, text: str) -> Dict[str, Any]:
+        connection = self._connection
+        if connection is None:
+            raise BridgeError("WhatsApp bridge is not running")
+        return await connection.send(chat_id, text)
+
+    # --- жизненный цикл ---
+    async def run(self, stop_event: Optional[asyncio.Event] = None):
+        """Держать bridge запущенным до stop_event, перезапуская после падений"""
+        stop_event = stop_event or asyncio.Event()
+        await self.scheduler.start()
+        dispatcher = asyncio.create_task(self._dispatch_loop(), name=f"{self.name}-dispatch")
+        delay = self.backoff_initial
+        try:
+            while not stop_event.is_set():
+                started = time.monotonic()
+                try:
+                    await self._run_once(stop_event)
+                except (OSError, ValueError) as e:
+                    log.error(f"❌ Failed to start WhatsApp bridge {self.command}: {e}")
+                if stop_event.is_set():
+                    break
+                if time.monotonic() - started >= self.stable_after:
+                    delay = self.backoff_initial
+                self._restarts.inc()
+                log.warning(f"🔁 WhatsApp bridge exited, restarting in {delay:.0f}s")
+                try:
+                    await asyncio.wait_for(stop_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, self.backoff_max)
+        finally:
+            dispatcher.cancel()
+            await asyncio.gather(dispatcher, return_exceptions=True)
+            await self.scheduler.stop()
+
+    async def _run_once(self, stop_event: asyncio.Event):
+        log.info(f"🚀 Starting WhatsApp bridge: {' '.join(self.command)}")
+        process = await asyncio.create_subprocess_exec(
+            *self.command, cwd=self.cwd, limit=MAX_LINE_BYTES,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        self._process = process
+        connection = BridgeConnection(process.stdout, process.stdin, on_event=self._on_event,
+                                      name=f"{self.name}.io")
+        connection.start()
+        self._connection = connection
+        stderr_task = asyncio.create_task(self._pump_stderr(process.stderr))
+        stop_task = asyncio.create_task(stop_event.wait())
+        closed_task = asyncio.create_task(connection.wait_closed())
+        try:
+            await asyncio.wait({stop_task, closed_task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._connection = None
+            self.ready.clear()
+            stop_task.cancel()
+            await self._terminate(process)
+            await connection.close()
+            await asyncio.gather(stderr_task, closed_task, stop_task, return_exceptions=True)
+            self._process = None
+        log.info(f"🛑 WhatsApp bridge stopped with exit code {process.returncode}")
+
+    async def _terminate(self, process: asyncio.subprocess.Process):
+        if process.returncode is not None:
+            return
+        # Закрытый stdin — сигнал bridge корректно завершить клиента WhatsApp
+        try:
+            process.stdin.close()
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+            return
+        except asyncio.TimeoutError:
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+    async def _pump_stderr(self, stream: asyncio.StreamReader):
+        """Логи и QR-код bridge — в наш лог; pipe не должен переполняться"""
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # Слишком длинная строка уже выброшена из буфера — читаем дальше
+                continue
+            if not line:
+                return
+            text = line.decode("utf-8", errors="replace").rstrip()
+            if text:
+                log.info(f"🟢 bridge: {text}")
+
+    # --- входящие события ---
+    async def _on_event(self, event: Dict[str, Any]):
+        kind = event.get("type")
+        if kind == "message":
+            self._received.inc()
+            self._inbox.put_nowait(event)
+        elif kind == "ready":
+            self.ready.set()
+            log.info("✅ WhatsApp bridge is ready")
+        elif kind == "qr":
+            log.info("📷 WhatsApp bridge is waiting for QR code scan (see bridge log)")
+        elif kind == "error":
+            log.error(f"❌ WhatsApp bridge error: {event.get('error')}")
+
+    async def _dispatch_loop(self):
+        while True:
+            event = await self._inbox.get()
+            message = BridgeMessage(self, event)
+            await self.scheduler.submit(message.chat_id, lambda message=message: self._handle(message))
+
+    async def _handle(self, message: BridgeMessage):
+        try:
+            await self.handler(message)
+        except Exception as e:
+            log.error(f"❌ Error handling WhatsApp message from {message.chat_id}: {e}")
@@ -0,0 +1,204 @@
+# bridge_protocol.py
+"""
+Протокол обмена с whatsapp_bridge.js: NDJSON (один JSON-объект на строку)
+поверх stdin/stdout процесса Node.
+
+Исходящие сообщения копятся в очереди и уходят пачками одной командой
+send_batch (одна запись в pipe на пачку). У каждого сообщения свой id;
+bridge отвечает {type: 'ack', id, ok, error?}, и BridgeConnection.send()
+возвращается только после подтверждения доставки.
+
+Остальные события (message, qr, ready, error) передаются в on_event;
+он вызывается из цикла чтения, поэтому должен быстро ставить работу в очередь,
+а не обрабатывать сообщение сам — иначе задержатся ack остальных отправок.
+"""
+import json
+import asyncio
+import logging
+import itertools
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+
+log = logging.getLogger()
+
+MAX_LINE_BYTES = 4 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 0.005  # секунд ждём, чтобы собрать пачку
+DEFAULT_ACK_TIMEOUT = 60
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class BridgeError(RuntimeError):
+    """Bridge не подтвердил доставку (ошибка WhatsApp, таймаут или разрыв соединения)"""
+
+
+def encode(command: Dict[str, Any]) -> bytes:
+    """Одна команда — одна строка NDJSON"""
+    return (json.dumps(command, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+async def read_events(reader: asyncio.StreamReader):
+    """Асинхронный итератор по событиям из потока NDJSON.
+
+    Не-JSON строки (например, случайный вывод библиотек в stdout) пропускаются.
+    """
+    while True:
+        try:
+            line = await reader.readline()
+        except ValueError:
+            # Строка длиннее лимита StreamReader — её не восстановить, пропускаем
+            log.error("❌ Bridge line exceeds buffer limit, skipping")
+            continue
+        if not line:
+            return
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            log.warning(f"⚠️ Non-JSON line from bridge: {line[:200]!r}")
+            continue
+        if isinstance(event, dict):
+            yield event
+
+
+class BridgeConnection:
+    """Читатель событий и пакетный писатель команд поверх пары asyncio-потоков"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer, *,
+                 on_event: Optional[EventHandler] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+                 name: str = "bridge"):
+        self.reader = reader
+        self.writer = writer
+        self.on_event = on_event
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ack_timeout = ack_timeout
+        self.name = name
+        self._ids = itertools.count(1)
+        self._outbox: "asyncio.Queue[Tuple[str, str, str]]" = asyncio.Queue()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._closed = False
+        self._sent = metrics.counter(f"{name}.sent")
+        self._failed = metrics.counter(f"{name}.failed")
+        self._batches = metrics.counter(f"{name}.batches")
+        self._ack_latency = metrics.histogram(f"{name}.ack_seconds")
+        metrics.gauge(f"{name}.awaiting_ack", lambda: len(self._pending))
+        metrics.gauge(f"{name}.outbox", lambda: self._outbox.qsize())
+
+    # --- жизненный цикл ---
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._read_loop(), name=f"{self.name}-reader"),
+            asyncio.create_task(self._write_loop(), name=f"{self.name}-writer"),
+        ]
+
+    async def wait_closed(self):
+        """Дождаться, пока bridge закроет stdout (процесс завершился)"""
+        if self._tasks:
+            await self._tasks[0]
+
+    async def close(self):
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._fail_pending("bridge connection closed")
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+    @property
+    def awaiting_ack(self) -> int:
+        return len(self._pending)
+
+    # --- отправка ---
+    async def send(self, chat_id: str, message: str) -> Dict[str, Any]:
+        """Отправить сообщение и дождаться ack; при ошибке доставки — BridgeError"""
+        if self._closed:
+            raise BridgeError("bridge connection closed")
+        message_id = f"m{next(self._ids)}"
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending[message_id] = future
+        started = loop.time()
+        self._outbox.put_nowait((message_id, chat_id, message))
+        try:
+            ack = await asyncio.wait_for(future, self.ack_timeout)
+        except asyncio.TimeoutError:
+            self._failed.inc()
+            raise BridgeError(f"no ack for {message_id} within {self.ack_timeout}s")
+        finally:
+            self._pending.pop(message_id, None)
+        self._ack_latency.observe(loop.time() - started)
+        if not ack.get("ok"):
+            self._failed.inc()
+            raise BridgeError(ack.get("error") or "send failed")
+        self._sent.inc()
+        return ack
+
+    async def send_many(self, items: Iterable[Tuple[str, str]]) -> List[Any]:
+        """Отправить несколько (chat_id, message); результат — ack или исключение на каждое"""
+        return await asyncio.gather(*(self.send(chat_id, message) for chat_id, message in items),
+                                    return_exceptions=True)
+
+    async def ping(self) -> None:
+        await self._write({"type": "ping", "id": f"p{next(self._ids)}"})
+
+    async def _write(self, command: Dict[str, Any]):
+        self.writer.write(encode(command))
+        await self.writer.drain()
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._outbox.get()]
+            # Немного ждём, чтобы одновременные send() ушли одной командой
+            if self.flush_interval and self._outbox.empty():
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_size and not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            messages = [{"id": message_id, "chatId": chat_id, "message": message}
+                        for message_id, chat_id, message in batch]
+            if len(messages) == 1:
+                command = dict(type="send", **messages[0])
+            else:
+                command = {"type": "send_batch", "messages": messages}
+            try:
+                await self._write(command)
+                self._batches.inc()
+            except (ConnectionError, BrokenPipeError) as e:
+                log.error(f"❌ Bridge write failed: {e}")
+                for message in messages:
+                    self._resolve(message["id"], {"type": "ack", "id": message["id"],
+                                                  "ok": False, "error": str(e)})
+
+    # --- чтение ---
+    async def _read_loop(self):
+        try:
+            async for event in read_events(self.reader):
+                if event.get("type") == "ack":
+                    self._resolve(event.get("id"), event)
+                elif self.on_event is not None:
+                    try:
+                        await self.on_event(event)
+                    except Exception as e:
+                        log.error(f"❌ Error handling bridge event {event.get('type')}: {e}")
+        finally:
+            self._fail_pending("bridge closed stdout")
+
+    def _resolve(self, message_id: Optional[str], ack: Dict[str, Any]):
+        future = self._pending.get(message_id)
+        if future is not None and not future.done():
+            future.set_result(ack)
+
+    def _fail_pending(self, reason: str):
+        for message_id in list(self._pending):
+            self._resolve(message_id, {"type": "ack", "id": message_id, "ok": False, "error": reason})
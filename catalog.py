@@ -0,0 +1,386 @@
+# catalog.py
+"""
+Кэш каталога салона из YClients: компания, услуги, услуги с ценами,
+мастера и услуги каждого мастера.
+
+Каталог меняется редко, а читается на каждое сообщение и каждый клик
+по меню, поэтому его загружаем целиком раз в CATALOG_TTL секунд.
+Каждый загруженный вариант получает version (хэш содержимого): по нему
+ключуются производные кэши (отрисованные страницы меню и т.п.), а
+подписчики add_listener() узнают о смене каталога.
+"""
+import time
+import json
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from yclients_client import YClientsError
+
+log = logging.getLogger()
+
+DEFAULT_TTL = 300
+RETRY_AFTER_ERROR = 30
+
+
+def format_price(service: Dict, currency: str, space: bool = True) -> str:
+    """Цена услуги из любого доступного поля: cost, price_min/price_max"""
+    cost = service.get("cost", 0) or 0
+    price_min = service.get("price_min", 0) or 0
+    price_max = service.get("price_max", 0) or 0
+    sep = " " if space else ""
+    if cost > 0:
+        return f"{cost}{sep}{currency}"
+    if price_min > 0 and price_max > 0:
+        if price_min == price_max:
+            return f"{price_min}{sep}{currency}"
+        return f"{price_min}-{price_max}{sep}{currency}"
+    if price_min > 0:
+        return f"от {price_min}{sep}{currency}"
+    return ""
+
+
+class Catalog:
+    """Неизменяемый снимок каталога"""
+
+    def __init__(self, company_id: Optional[int] = None, services: Optional[List[Dict]] = None,
+                 priced_services: Optional[List[Dict]] = None, masters: Optional[List[Dict]] = None,
+                 master_services: Optional[Dict[int, List[Dict]]] = None, fetched_at: float = 0.0):
+        self.company_id = company_id
+        self.services = services or []
+        self.priced_services = priced_services or []
+        self.masters = masters or []
+        self.master_services = master_services or {}
+        self.fetched_at = fetched_at
+        self.version = self._compute_version()
+        self._prompt_block: Optional[str] = None
+
+    def _compute_version(self) -> str:
+        content = json.dumps(
+            [self.company_id, self.services, self.priced_services, self.masters,
+             sorted(self.master_services.items())],
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()[:12]
+
+    def prompt_block(self) -> str:
+        """Услуги и мастера с ценами — текст для LLM-промптов (общий для Telegram и WhatsApp)"""
+        if self._prompt_block is None:
+            self._prompt_block = self._render_prompt_block()
+        return self._prompt_block
+
+    def _render_prompt_block(self) -> str:
+        return self.prompt_block_for(self.priced_services, self.masters)
+
+    def prompt_block_for(self, services: List[Dict], masters: List[Dict]) -> str:
+        """Тот же блок, но только с этими услугами и мастерами (prompt_builder.py)"""
+        data_text = "Доступные услуги (ТОЧНЫЕ ДАННЫЕ ИЗ API):\n"
+        for service in services:
+            name = service.get("title", "Без названия")
+            duration = service.get("length", 0)
+            data_text += f"- {name}"
+            price = format_price(service, "руб.")
+            if price:
+                data_text += f" ({price})"
+            if duration > 0:
+                data_text += f" ({duration} мин)"
+            if service.get("id") is not None:
+                data_text += f" [service_id {service['id']}]"
+            data_text += "\n"
+
+        data_text += "\nДоступные мастера (ТОЧНЫЕ ДАННЫЕ ИЗ API):\n"
+        for master in masters:
+            name = master.get("name", "Без имени")
+            specialization = master.get("specialization", "")
+            staff_id = master.get("id")
+
+            data_text += f"- {name}"
+            if specialization:
+                data_text += f" ({specialization})"
+            if staff_id is not None:
+                data_text += f" [staff_id {staff_id}]"
+
+            # Добавляем услуги мастера
+            master_services = self.services_for_master(staff_id) if staff_id else []
+            if master_services:
+                service_names = []
+                for service in master_services:
+                    service_name = service.get("title", "")
+                    if service_name:
+                        price = format_price(service, "₽", space=False)
+                        service_names.append(f"{service_name} ({price})" if price else service_name)
+                data_text += " - услуги: " + ", ".join(service_names)  # Показываем ВСЕ услуги мастера
+
+            data_text += "\n"
+        return data_text
+
+    def service(self, service_id: Any) -> Optional[Dict]:
+        """Услуга по id (booking_tool.py проверяет id из ответа LLM)"""
+        return next((s for s in self.priced_services or self.services if s.get("id") == service_id), None)
+
+    def master(self, staff_id: Any) -> Optional[Dict]:
+        return next((m for m in self.masters if m.get("id") == staff_id), None)
+
+    def services_for_master(self, staff_id: int) -> List[Dict]:
+        return self.master_services.get(staff_id, [])
+
+    def find_master(self, name: str) -> Optional[Dict]:
+        name = name.lower()
+        return next((m for m in self.masters if m.get("name", "").lower() == name), None)
+
+    def __bool__(self) -> bool:
+        return self.company_id is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "company_id": self.company_id,
+            "services": self.services,
+            "priced_services": self.priced_services,
+            "masters": self.masters,
+            "master_services": {str(staff_id): items for staff_id, items in self.master_services.items()},
+            "fetched_at": self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Catalog":
+        return cls(data.get("company_id"), data.get("services"), data.get("priced_services"),
+                   data.get("masters"),
+                   {int(staff_id): items for staff_id, items in (data.get("master_services") or {}).items()},
+                   fetched_at=data.get("fetched_at", 0.0))
+
+
+class CatalogCache:
+    """Потокобезопасный кэш каталога с TTL; одновременно идёт не больше одной загрузки.
+
+    С store (state_store.StateStore) загруженный каталог сохраняется в общее
+    хранилище, и другие реплики берут его оттуда, пока он не старше ttl,
+    вместо того чтобы каждая загружала его из API сама.
+
+    company_id — салон каталога (см. tenants.py); без него берётся первая
+    компания из my_companies.
+
+    С snapshot_path каталог переживает рестарт (catalog_snapshot.py): при
+    создании кэш берёт каталог из снимка, get() отдаёт его сразу и загружает
+    свежий в фоне, а каждая загрузка, изменившая каталог, обновляет снимок.
+    """
+
+    def __init__(self, client, ttl: int = DEFAULT_TTL, store=None, company_id: Optional[int] = None,
+                 snapshot_path: Optional[str] = None):
+        self.client = client
+        self.ttl = ttl
+        self.store = store
+        self.company_id = company_id
+        self.snapshot_path = snapshot_path
+        self._catalog = Catalog()
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Catalog], Any]] = []
+        self._from_snapshot = False
+        self._revalidating = False
+        self._snapshot_version: Optional[str] = None
+        if snapshot_path:
+            self._load_snapshot()
+
+    # --- чтение ---
+    @property
+    def current(self) -> Catalog:
+        """Последний загруженный каталог без обращения к API (может быть устаревшим)"""
+        return self._catalog
+
+    @property
+    def version(self) -> str:
+        return self._catalog.version
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self._expires_at
+
+    def get(self) -> Catalog:
+        """Каталог из кэша; при истёкшем TTL — загрузить заново
+
+        Пока в кэше каталог из снимка, get() не ждёт API: отдаёт снимок,
+        а загрузка идёт в фоне.
+        """
+        if self.is_fresh():
+            return self._catalog
+        if self._from_snapshot:
+            self._revalidate_in_background()
+            return self._catalog
+        return self.refresh()
+
+    # --- загрузка ---
+    def refresh(self, force: bool = False) -> Catalog:
+        with self._lock:
+            # Пока ждали блокировку, каталог мог обновить другой поток
+            if not force and self.is_fresh():
+                return self._catalog
+            shared = None if force else self._load_shared()
+            if shared is not None:
+                # Другая реплика уже загрузила свежий каталог — доживает свой ttl
+                changed = shared.version != self._catalog.version
+                self._catalog = shared
+                verified = True
+                self._expires_at = time.monotonic() + self.ttl - (time.time() - shared.fetched_at)
+            else:
+                catalog, complete = self._load()
+                verified = complete
+                if complete:
+                    self._save_shared(catalog)
+                if complete or not self._catalog:
+                    changed = catalog.version != self._catalog.version
+                    self._catalog = catalog
+                    self._expires_at = time.monotonic() + (self.ttl if complete else RETRY_AFTER_ERROR)
+                else:
+                    # Частичный ответ API — продолжаем отдавать прошлый каталог
+                    log.warning("⚠️ Catalog refresh incomplete, keeping previous catalog")
+                    changed = False
+                    self._expires_at = time.monotonic() + RETRY_AFTER_ERROR
+            if verified:
+                # Каталог подтверждён API или другой репликой — снимок больше не нужен как замена
+                self._from_snapshot = False
+                if self._catalog.version != self._snapshot_version:
+                    self._save_snapshot(self._catalog)
+            result = self._catalog
+        if changed:
+            log.info(f"📚 Catalog updated: version {result.version}, "
+                     f"{len(result.priced_services)} services, {len(result.masters)} masters")
+            self._notify(result)
+        return result
+
+    def _load_shared(self) -> Optional[Catalog]:
+        """Каталог из общего хранилища, если его недавно загрузила другая реплика"""
+        if self.store is None:
+            return None
+        try:
+            data = self.store.get("catalog", self._store_key)
+        except Exception as e:
+            log.error(f"❌ Error reading shared catalog: {e}")
+            return None
+        if not data or time.time() - data.get("fetched_at", 0) >= self.ttl:
+            return None
+        return Catalog.from_dict(data)
+
+    def _save_shared(self, catalog: Catalog):
+        if self.store is None:
+            return
+        try:
+            self.store.set("catalog", self._store_key, catalog.to_dict())
+        except Exception as e:
+            log.error(f"❌ Error saving shared catalog: {e}")
+
+    def _load_snapshot(self):
+        import catalog_snapshot
+
+        catalog = catalog_snapshot.load(self.snapshot_path)
+        if catalog is None or (self.company_id is not None and catalog.company_id != self.company_id):
+            return
+        self._catalog = catalog
+        self._from_snapshot = True
+        self._snapshot_version = catalog.version
+        age = max(0, time.time() - catalog.fetched_at)
+        log.info(f"💾 Catalog snapshot loaded: version {catalog.version}, {age:.0f}s old, "
+                 f"{len(catalog.priced_services)} services, {len(catalog.masters)} masters")
+
+    def _save_snapshot(self, catalog: Catalog):
+        if not self.snapshot_path:
+            return
+        import catalog_snapshot
+
+        try:
+            catalog_snapshot.save(self.snapshot_path, catalog)
+            self._snapshot_version = catalog.version
+        except Exception as e:
+            log.error(f"❌ Error saving catalog snapshot: {e}")
+
+    def _revalidate_in_background(self):
+        """Загрузить свежий каталог в фоновом потоке (не больше одной загрузки)"""
+        if self._revalidating:
+            return
+        self._revalidating = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                log.error(f"❌ Background catalog refresh failed: {e}")
+            finally:
+                self._revalidating = False
+
+        threading.Thread(target=run, name="catalog-revalidate", daemon=True).start()
+
+    @property
+    def _store_key(self) -> str:
+        return "current" if self.company_id is None else str(self.company_id)
+
+    def invalidate(self):
+        """Следующий get() загрузит каталог заново"""
+        self._expires_at = 0.0
+
+    def add_listener(self, fn: Callable[[Catalog], Any]):
+        """fn(catalog) вызывается после каждой загрузки, изменившей каталог
+
+        Если каталог уже есть (взят из снимка), fn вызывается с ним сразу.
+        """
+        self._listeners.append(fn)
+        if self._catalog:
+            self._call(fn, self._catalog)
+
+    def _notify(self, catalog: Catalog):
+        for fn in self._listeners:
+            self._call(fn, catalog)
+
+    @staticmethod
+    def _call(fn: Callable[[Catalog], Any], catalog: Catalog):
+        try:
+            fn(catalog)
+        except Exception as e:
+            log.error(f"❌ Catalog listener error: {e}")
+
+    def _load(self):
+        """Загрузить каталог из API; возвращает (catalog, complete)"""
+        complete = True
+
+        def fetch(what: str, call: Callable[[], Dict[str, Any]], require_success: bool = False) -> List[Dict]:
+            nonlocal complete
+            try:
+                response = call()
+                if require_success and not response.get("success"):
+                    log.error(f"❌ Failed to get {what}: {response}")
+                    complete = False
+                    return []
+                return response.get("data", []) or []
+            except YClientsError as e:
+                log.error(f"❌ YClients API Error getting {what}: {e}")
+            except Exception as e:
+                log.error(f"❌ General Error getting {what}: {e}")
+            complete = False
+            return []
+
+        log.info("📚 API CALL: Loading catalog from YClients...")
+        company_id = self.company_id
+        if company_id is None:
+            companies = fetch("companies", self.client.my_companies)
+            if not companies:
+                log.warning("⚠️ No companies found in response")
+                return Catalog(fetched_at=time.time()), False
+            company_id = companies[0]["id"]
+
+        services = fetch("services", lambda: self.client.company_services(company_id))
+        priced = fetch("services with prices",
+                       lambda: self.client.get_service_details(company_id), require_success=True)
+        masters = fetch("masters", lambda: self.client.company_masters(company_id))
+        master_services = {}
+        for master in masters:
+            staff_id = master.get("id")
+            if staff_id:
+                master_services[staff_id] = fetch(
+                    f"services for master {staff_id}",
+                    lambda staff_id=staff_id: self.client.get_service_details(company_id, staff_id=staff_id),
+                    require_success=True,
+                )
+
+        catalog = Catalog(company_id, services, priced, masters, master_services, fetched_at=time.time())
+        log.info(f"✅ Catalog loaded for company {company_id}: {len(services)} services, "
+                 f"{len(priced)} priced services, {len(masters)} masters")
+        return catalog, complete
+
@@ -0,0 +1,82 @@
+# catalog_snapshot.py
+"""
+Снимок каталога на диске — чтобы после рестарта не начинать с пустого кэша.
+
+После каждой загрузки, изменившей каталог, CatalogCache записывает снимок:
+компанию, услуги, услуги с ценами, мастеров, услуги каждого мастера и уже
+отрисованный блок для LLM-промптов. При старте снимок читается через mmap,
+бот сразу отвечает по нему, а свежий каталог загружается в фоне.
+
+Формат файла (всё little-endian):
+
+    заголовок  MAGIC, версия формата, версия каталога (12 ASCII),
+               fetched_at, длина и CRC32 данных
+    данные     JSON, сжатый zlib
+
+Снимок другой версии формата, битый или с несовпадающей версией каталога
+просто игнорируется — каталог загрузится из API, как без снимка.
+Запись атомарная: временный файл и os.replace().
+"""
+import os
+import mmap
+import json
+import zlib
+import struct
+import logging
+import tempfile
+from typing import Optional
+
+from catalog import Catalog
+
+log = logging.getLogger()
+
+MAGIC = b"YCCS"
+FORMAT_VERSION = 2  # 2 — в блоке для промпта есть service_id и staff_id
+_HEADER = struct.Struct("<4sH12sdII")
+
+
+def save(path: str, catalog: Catalog):
+    """Записать снимок каталога (атомарно)"""
+    payload = zlib.compress(json.dumps(
+        {"catalog": catalog.to_dict(), "prompt_block": catalog.prompt_block()},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8"))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, catalog.version.encode("ascii"), catalog.fetched_at,
+                          len(payload), zlib.crc32(payload))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load(path: str) -> Optional[Catalog]:
+    """Каталог из снимка; None, если файла нет или он непригоден"""
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if len(data) < _HEADER.size:
+                raise ValueError("truncated header")
+            magic, format_version, version, _, length, crc = _HEADER.unpack_from(data)
+            if magic != MAGIC or format_version != FORMAT_VERSION:
+                raise ValueError(f"unsupported format {magic!r} v{format_version}")
+            payload = data[_HEADER.size:_HEADER.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError("corrupted payload")
+        content = json.loads(zlib.decompress(payload))
+        catalog = Catalog.from_dict(content["catalog"])
+        if catalog.version != version.decode("ascii"):
+            raise ValueError("catalog version mismatch")
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning(f"⚠️ Ignoring catalog snapshot {path}: {e}")
+        return None
+    catalog._prompt_block = content.get("prompt_block")
+    return catalog
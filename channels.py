@@ -0,0 +1,149 @@
+# channels.py
+"""
+Каналы общения с клиентами за общим интерфейсом.
+
+Channel.run(stop_event) работает в общем event loop до stop_event,
+Channel.send(chat_id, text) отправляет сообщение из любого места процесса
+(напоминания, уведомления). run_bots.py запускает все настроенные каналы
+в одном event loop, а ресурсы (YClients, Groq, каталог, сессии) они
+берут из shared.py.
+
+Запущенный канал регистрирует свою отправку (Channel.ready: register_sender,
+затем on_ready — там боты запускают очередь outbox.py и напоминания
+reminders.py), и их код вне event loop пишет в чат через send_threadsafe().
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger()
+
+_senders: Dict[str, Tuple[Callable[[Any, str], Any], Optional[asyncio.AbstractEventLoop]]] = {}
+
+
+def register_sender(name: str, send: Callable[[Any, str], Any]):
+    """send(chat_id, text) канала name. Из корутины — send асинхронный и выполняется
+    в этом event loop; вне event loop — обычная функция"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    _senders[name] = (send, loop)
+
+
+def has_sender(name: str) -> bool:
+    return name in _senders
+
+
+def send_threadsafe(name: str, chat_id: Any, text: str, timeout: float = 30.0) -> Any:
+    """Отправить сообщение в канал name из любого потока (не из его event loop)"""
+    if name not in _senders:
+        raise LookupError(f"No sender registered for channel {name!r}")
+    send, loop = _senders[name]
+    if loop is None:
+        return send(chat_id, text)
+    return asyncio.run_coroutine_threadsafe(send(chat_id, text), loop).result(timeout)
+
+
+class Channel:
+    name = "channel"
+    # Вызывается, когда канал уже может отправлять сообщения (запуск outbox, напоминаний)
+    on_ready: Optional[Callable[[], Any]] = None
+
+    def ready(self):
+        register_sender(self.name, self.send)
+        if self.on_ready is not None:
+            self.on_ready()
+
+    async def run(self, stop_event: asyncio.Event):
+        raise NotImplementedError
+
+    async def send(self, chat_id: Any, text: str) -> Any:
+        raise NotImplementedError
+
+
+class TelegramChannel(Channel):
+    """python-telegram-bot Application: long polling или webhook-сервер"""
+
+    name = "telegram"
+
+    def __init__(self, application, *, webhook: Optional[dict] = None):
+        self.application = application
+        self.webhook = webhook  # аргументы serve_webhook(); None — long polling
+
+    async def run(self, stop_event: asyncio.Event):
+        if self.webhook is not None:
+            from webhook_server import serve_webhook
+            await serve_webhook(self.application, stop_event=stop_event, on_started=self.ready, **self.webhook)
+            return
+        async with self.application:
+            await self.application.start()
+            self.ready()
+            await self.application.updater.start_polling()
+            log.info("✅ Telegram channel is polling")
+            try:
+                await stop_event.wait()
+            finally:
+                await self.application.updater.stop()
+                await self.application.stop()
+
+    async def send(self, chat_id: Any, text: str) -> Any:
+        return await self.application.bot.send_message(chat_id=chat_id, text=text)
+
+
+class WhatsAppBridgeChannel(Channel):
+    """WhatsApp через whatsapp_bridge.js (см. bridge_driver.py)"""
+
+    name = "whatsapp"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def run(self, stop_event: asyncio.Event):
+        self.ready()
+        await self.driver.run(stop_event)
+
+    async def send(self, chat_id: Any, text: str) -> Any:
+        return await self.driver.send(chat_id, text)
+
+
+class GreenAPIChannel(Channel):
+    """WhatsApp через Green API.
+
+    У GreenAPIBot только блокирующий run_forever(), поэтому опрос идёт в
+    фоновом потоке, а сообщения обрабатывает ThreadedScheduler из whatsapp_bot.py.
+    """
+
+    name = "whatsapp"
+
+    def __init__(self, bot, scheduler, pool):
+        self.bot = bot
+        self.scheduler = scheduler
+        self.pool = pool
+
+    async def run(self, stop_event: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def poll():
+            try:
+                self.bot.run_forever()
+            except Exception as e:
+                log.error(f"❌ Green API polling stopped: {e}")
+            finally:
+                loop.call_soon_threadsafe(lambda: finished.done() or finished.set_result(None))
+
+        self.ready()
+        self.scheduler.start()
+        # Поток-демон: у run_forever нет штатной остановки, он завершится вместе с процессом
+        threading.Thread(target=poll, name="GreenAPIPolling", daemon=True).start()
+        stop_task = asyncio.ensure_future(stop_event.wait())
+        try:
+            await asyncio.wait({stop_task, finished}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop_task.cancel()
+            await asyncio.to_thread(self.scheduler.stop)
+
+    async def send(self, chat_id: Any, text: str) -> Any:
+        return await self.pool.run(self.bot.api.sending.sendMessage, chat_id, text)
@@ -0,0 +1,94 @@
+# client_records.py
+"""
+Записи клиента из YClients для «Мои записи».
+
+Раньше «Мои записи» показывали только то, что бот сам положил в
+сессию пользователя: после перезапуска список пропадал, а записи,
+сделанные по телефону или на сайте, не появлялись вовсе. ClientRecords
+берёт записи из YClients — только записи этого клиента (client_id по
+телефону пользователя) с сегодняшнего дня, — и держит их в кэше:
+
+    client_id(company_id, phone) — id клиента салона (кэш на CLIENT_ID_TTL;
+        «не найден» не кэшируется — клиент появится с первой записью)
+    records(company_id, client_id) — будущие записи клиента; повторное
+        открытие «Мои записи» — чтение из кэша, без запроса к YClients
+    on_write(entry) — слушатель outbox: выполненные создание, удаление и
+        изменение записи сбрасывают кэш её клиента
+
+Кэш — llm_cache.ResponseCache (ttl, LRU по capacity); со STATE_DB он общий
+у реплик, поэтому запись через одну реплику видна и в других.
+Метрики: client_records.hits, client_records.misses,
+client_records.fetch_seconds.
+"""
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import metrics
+import record_writes
+from llm_cache import ResponseCache
+from outbox import DONE, OutboxEntry
+
+log = logging.getLogger()
+
+DEFAULT_TTL = 300
+DEFAULT_CAPACITY = 1000
+CLIENT_ID_TTL = 86400
+NAMESPACE = "client_records"
+
+
+class ClientRecords:
+    def __init__(self, client, ttl: int = DEFAULT_TTL, capacity: int = DEFAULT_CAPACITY, store=None):
+        self.client = client  # YClientsClient салона текущего чата (tenants.client)
+        self._views = ResponseCache(ttl=ttl, capacity=capacity, store=store, name=NAMESPACE)
+        self._ids = ResponseCache(ttl=CLIENT_ID_TTL, capacity=capacity, store=store, name=f"{NAMESPACE}.ids")
+        self._hits = metrics.counter(f"{NAMESPACE}.hits")
+        self._misses = metrics.counter(f"{NAMESPACE}.misses")
+        self._fetch_time = metrics.histogram(f"{NAMESPACE}.fetch_seconds")
+
+    @staticmethod
+    def key(company_id: Any, client_id: Any) -> str:
+        return f"{company_id}:{client_id}"
+
+    def client_id(self, company_id: int, phone: str) -> Optional[int]:
+        key = self.key(company_id, phone)
+        cached = self._ids.get(key)
+        if cached is not None:
+            return cached
+        found = self.client.find_client_by_phone(company_id, phone).get("data") or []
+        if not found:
+            return None
+        self._ids.set(key, found[0]["id"])
+        return found[0]["id"]
+
+    def records(self, company_id: int, client_id: int, today: Optional[date] = None) -> List[Dict]:
+        """Записи клиента с сегодняшнего дня, по времени"""
+        key = self.key(company_id, client_id)
+        cached = self._views.get(key)
+        if cached is not None:
+            self._hits.inc()
+            return cached
+        self._misses.inc()
+        with self._fetch_time.time():
+            response = self.client.company_records(
+                company_id, client_id=client_id, start_date=(today or date.today()).isoformat())
+        # Фильтр YClients по client_id — на его стороне; чужие записи не показываем в любом случае
+        records = sorted((r for r in response.get("data") or []
+                          if (r.get("client") or {}).get("id", client_id) == client_id and not r.get("deleted")),
+                         key=lambda r: r.get("datetime") or "")
+        self._views.set(key, records)
+        return records
+
+    def invalidate(self, company_id: Any, client_id: Any):
+        self._views.delete(self.key(company_id, client_id))
+
+    def on_write(self, entry: OutboxEntry):
+        """Сбросить кэш клиента после выполненной записи в YClients"""
+        if entry.status != DONE or entry.kind not in (
+                record_writes.CREATE_RECORD, record_writes.DELETE_RECORD, record_writes.UPDATE_RECORD):
+            return
+        client_id = (entry.result or {}).get("client_id") or entry.payload.get("client_id")
+        if client_id is None:
+            log.warning(f"⚠️ No client_id for {entry.kind} {entry.key}, record views not invalidated")
+            return
+        self.invalidate(entry.payload["company_id"], client_id)
@@ -0,0 +1,253 @@
+# coordinator.py
+"""
+Координатор нескольких реплик Telegram-бота.
+
+Telegram умеет слать апдейты только на один webhook, поэтому его принимает
+координатор, а обрабатывают N воркеров — обычные app.py в BOT_MODE=webhook
+без WEBHOOK_URL (они не регистрируют webhook сами) с общим STATE_DB.
+Чаты распределяются по воркерам хэшем (partition), так что апдейты одного
+чата всегда попадают на одну реплику и обрабатываются там по порядку, а
+разные чаты — на разных репликах параллельно. Координатор ходит к воркерам
+по HTTP с keep-alive соединениями, но сами воркеры с общим STATE_DB должны
+работать на одном узле с файлом базы (см. state_store.py).
+
+Запуск:
+    WORKER_URLS=http://127.0.0.1:8001/telegram,http://127.0.0.1:8002/telegram \\
+    WEBHOOK_URL=https://bot.example.com WEBHOOK_SECRET=... python coordinator.py
+"""
+import os
+import sys
+import json
+import zlib
+import signal
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import metrics
+from update_scheduler import KeyedScheduler
+from webhook_server import SECRET_HEADER, WebhookServer
+
+log = logging.getLogger()
+
+FORWARD_ATTEMPTS = 5
+FORWARD_BACKOFF = 0.2  # секунд, удваивается с каждой попыткой
+CONNECT_TIMEOUT = 5
+RESPONSE_TIMEOUT = 30
+
+
+def payload_key(payload: Dict[str, Any]) -> Hashable:
+    """Ключ упорядочивания для сырого JSON апдейта — как update_key(): чат, затем пользователь"""
+    for field, value in payload.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return ("chat", chat["id"])
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return ("user", user["id"])
+    return ("update", payload.get("update_id"))
+
+
+def partition(key: Hashable, partitions: int) -> int:
+    """Стабильный между процессами и перезапусками номер реплики для ключа"""
+    return zlib.crc32(repr(key).encode("utf-8")) % partitions
+
+
+class WorkerLink:
+    """Пул keep-alive HTTP/1.1 соединений к одному воркеру"""
+
+    def __init__(self, url: str, secret_token: Optional[str] = None, connections: int = 8):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError(f"Worker URL must be http://host:port/path, got {url!r}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or "/"
+        self.secret_token = secret_token
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots = asyncio.Semaphore(connections)
+        self.inflight = 0
+
+    async def post(self, body: bytes) -> int:
+        """POST апдейта воркеру, возвращает HTTP-статус (ConnectionError при сбое сети)"""
+        async with self._slots:
+            self.inflight += 1
+            try:
+                reader, writer = self._idle.pop() if self._idle else await self._connect()
+                try:
+                    status, keep_alive = await asyncio.wait_for(self._exchange(reader, writer, body),
+                                                                RESPONSE_TIMEOUT)
+                except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+                    writer.close()
+                    raise ConnectionError(f"{self.url}: {e!r}") from e
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return status
+            finally:
+                self.inflight -= 1
+
+    async def _connect(self):
+        try:
+            return await asyncio.wait_for(asyncio.open_connection(self.host, self.port), CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ConnectionError(f"{self.url}: {e!r}") from e
+
+    async def _exchange(self, reader, writer, body: bytes) -> Tuple[int, bool]:
+        head = (f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n")
+        if self.secret_token:
+            head += f"{SECRET_HEADER}: {self.secret_token}\r\n"
+        writer.write((head + "Connection: keep-alive\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+        response = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(response[0].split(" ")[1])
+        headers = {}
+        for line in response[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0") or 0)
+        if length:
+            await reader.readexactly(length)
+        return status, headers.get("connection", "").lower() != "close"
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+class Coordinator(WebhookServer):
+    """Webhook-приёмник, который пересылает апдейт реплике-владельцу чата"""
+
+    def __init__(self, worker_urls: Sequence[str], *, host: str = "0.0.0.0", port: int = 8000,
+                 path: str = "/telegram", secret_token: Optional[str] = None,
+                 worker_secret: Optional[str] = None, max_pending: int = 10000,
+                 forward_concurrency: int = 256, connections_per_worker: int = 32):
+        if not worker_urls:
+            raise ValueError("At least one worker URL is required")
+        super().__init__(None, host=host, port=port, path=path, secret_token=secret_token,
+                         max_pending=max_pending)
+        worker_secret = worker_secret if worker_secret is not None else secret_token
+        self.workers = [WorkerLink(url, worker_secret, connections_per_worker) for url in worker_urls]
+        # Порядок внутри чата сохраняется и при пересылке: один чат — одна очередь
+        self.scheduler = KeyedScheduler(forward_concurrency, max_pending, name="coordinator")
+        self._forwarded = metrics.counter("coordinator.forwarded")
+        self._failed = metrics.counter("coordinator.failed")
+        self._retries = metrics.counter("coordinator.retries")
+        self._forward_time = metrics.histogram("coordinator.forward_seconds")
+        for index, worker in enumerate(self.workers):
+            metrics.gauge(f"coordinator.worker{index}.inflight", lambda worker=worker: worker.inflight)
+
+    async def start(self):
+        await self.scheduler.start()
+        await super().start()
+        log.info(f"🧭 Coordinator routing to {len(self.workers)} workers: "
+                 f"{', '.join(worker.url for worker in self.workers)}")
+
+    async def stop(self):
+        await super().stop()
+        await self.scheduler.stop()
+        for worker in self.workers:
+            worker.close()
+
+    def worker_for(self, payload: Dict[str, Any]) -> int:
+        return partition(payload_key(payload), len(self.workers))
+
+    async def dispatch(self, payload: Dict[str, Any]):
+        key = payload_key(payload)
+        worker = self.workers[partition(key, len(self.workers))]
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self.scheduler.run(key, lambda: self._forward(worker, payload, body))
+
+    async def _forward(self, worker: WorkerLink, payload: Dict[str, Any], body: bytes):
+        delay = FORWARD_BACKOFF
+        with self._forward_time.time():
+            for attempt in range(1, FORWARD_ATTEMPTS + 1):
+                try:
+                    status = await worker.post(body)
+                except ConnectionError as e:
+                    status, error = None, e
+                else:
+                    if status == 200:
+                        self._forwarded.inc()
+                        return
+                    error = f"HTTP {status}"
+                if attempt == FORWARD_ATTEMPTS:
+                    break
+                # 503 — у воркера полная очередь, сеть — воркер перезапускается: пробуем ещё раз
+                self._retries.inc()
+                await asyncio.sleep(delay)
+                delay *= 2
+        self._failed.inc()
+        log.error(f"❌ Update {payload.get('update_id')} not delivered to {worker.url}: {error}")
+
+
+def set_webhook(token: str, url: str, secret_token: Optional[str]) -> Dict[str, Any]:
+    """Зарегистрировать webhook координатора в Telegram Bot API"""
+    import urllib.request
+
+    data = json.dumps({"url": url, "secret_token": secret_token}).encode("utf-8")
+    request = urllib.request.Request(f"https://api.telegram.org/bot{token}/setWebhook", data=data,
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def run_coordinator():
+    worker_urls = [url.strip() for url in os.getenv("WORKER_URLS", "").split(",") if url.strip()]
+    path = os.getenv("WEBHOOK_PATH", "/telegram")
+    secret = os.getenv("WEBHOOK_SECRET")
+    coordinator = Coordinator(
+        worker_urls,
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        path=path,
+        secret_token=secret,
+        max_pending=int(os.getenv("UPDATE_MAX_PENDING", "10000")),
+    )
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+
+    await coordinator.start()
+    webhook_url = os.getenv("WEBHOOK_URL")
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+    if webhook_url and token:
+        result = await asyncio.to_thread(set_webhook, token, webhook_url.rstrip("/") + path, secret)
+        log.info(f"✅ Webhook registered: {result}")
+    else:
+        log.warning("⚠️ WEBHOOK_URL or TELEGRAM_BOT_TOKEN not set, webhook is not registered")
+    try:
+        await stop_event.wait()
+    finally:
+        await coordinator.stop()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    if not os.getenv("WORKER_URLS"):
+        log.error("❌ WORKER_URLS is required (comma-separated worker webhook URLs)")
+        return 1
+    if not os.getenv("WEBHOOK_SECRET"):
+        log.error("❌ WEBHOOK_SECRET is required")
+        return 1
+    asyncio.run(run_coordinator())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# deadlines.py
+"""
+Бюджет времени на обработку одного сообщения.
+
+Хвост задержек Groq доходит до 10–20 секунд, и всё это время чат
+пользователя молчит. Deadline задаётся в начале обработки апдейта
+(app.select_tenant, whatsapp_bot.build_reply, UPDATE_DEADLINE секунд) и
+виден всему, что вызывается дальше, через contextvar — BlockingPool
+переносит контекст в поток, так что синхронный код в пуле видит тот же
+дедлайн.
+
+model_router не ждёт LLM дольше remaining() и поднимает DeadlineExceeded;
+бот вместо ответа LLM отвечает детерминированно (degraded_answer: FAQ или
+DEGRADED_CHAT, для записи — DEGRADED_BOOKING). Метрика: updates.degraded.
+"""
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import metrics
+
+DEGRADED_CHAT = ("Извините, сейчас отвечаю медленнее обычного. Услуги, цены и мастеров можно "
+                 "посмотреть в меню, или напишите ещё раз через минуту.")
+DEGRADED_BOOKING = ("Не успел обработать запрос. Напишите, пожалуйста, услугу, мастера, дату и время "
+                    "одним сообщением, например: «маникюр у Арины завтра в 14:00».")
+
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("deadline", default=None)
+_degraded = metrics.counter("updates.degraded")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Бюджет времени апдейта исчерпан"""
+
+
+class Deadline:
+    def __init__(self, budget: float, clock: Callable[[], float] = time.monotonic):
+        self.budget = budget
+        self._clock = clock
+        self._expires = clock() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires - self._clock())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def set_current(budget: float) -> Optional[Deadline]:
+    """Новый дедлайн для текущего контекста (хендлеры Telegram одного апдейта); 0 — без дедлайна"""
+    deadline = Deadline(budget) if budget > 0 else None
+    _current.set(deadline)
+    return deadline
+
+
+@contextmanager
+def activate(budget: float) -> Iterator[Optional[Deadline]]:
+    deadline = Deadline(budget) if budget > 0 else None
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def degraded_answer(faq=None, text: str = "", booking: bool = False) -> str:
+    """Ответ без LLM: из FAQ салона, если вопрос там есть, иначе подсказка"""
+    _degraded.inc()
+    if booking:
+        return DEGRADED_BOOKING
+    return (faq.answer(text) if faq is not None else None) or DEGRADED_CHAT
@@ -0,0 +1,271 @@
+# faq_index.py
+"""
+Ответы на частые вопросы без LLM.
+
+Большая часть сообщений чата — несколько намерений: цены, мастера, как
+записаться. FaqIndex находит ближайший вопрос из набора и, если сходство
+достаточно высокое, отвечает готовым шаблоном — без запроса к Groq.
+
+Вопросы берутся из двух источников:
+    faq.json (FAQ_FILE) — курируемые вопросы и ответы; в ответах можно
+        использовать {price_list} и {masters} — они заполняются из каталога,
+        и {hours} — часы работы из SALON_HOURS. Вопрос, для ответа на
+        который поля пусты (часы не заданы), уходит в LLM
+    каталог — для каждой услуги «сколько стоит …», для каждого мастера
+        «какие услуги у …»; такой ответ выдаётся, только если Lexicon
+        находит в сообщении именно эту услугу или этого мастера
+
+Многие такие вопросы содержат ключевые слова записи («как записаться»,
+«сколько стоит маникюр», «что делает Полина») и по is_booking() попали
+бы в разбор записи; booking_question_answer() отвечает на них из FAQ,
+если в сообщении нет даты и времени — без них это вопрос, а не запись.
+Если же в нём названы услуга или мастер («хочу записаться на маникюр»),
+подходят только ответы про эту услугу или мастера, а не общие шаблоны.
+
+Поиск — TF-IDF по символьным n-граммам слов (устойчиво к склонениям и
+опечаткам) и косинусное сходство; сеть и GPU не нужны. Если установлен
+numpy, сходство считается умножением матрицы на вектор, иначе — по
+инвертированному индексу на чистом Python. Индекс строится один раз на
+версию каталога (Tenant.faq), поэтому цены в ответах всегда текущие.
+"""
+import os
+import json
+import math
+import string
+import logging
+import importlib.util
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+from booking_parser import parse_booking_message
+from catalog import Catalog, format_price
+from llm_cache import normalize
+
+log = logging.getLogger()
+
+FAQ_FILE = os.getenv("FAQ_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "faq.json")
+MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.55"))  # ниже — вопрос уходит в LLM
+SALON_HOURS = os.getenv("SALON_HOURS", "")  # «ежедневно с 10:00 до 21:00»
+NGRAM_SIZES = (3, 4)
+
+numpy_available = importlib.util.find_spec("numpy") is not None
+
+SERVICE_PRICE_QUESTIONS = [
+    "сколько стоит {title}",
+    "какая цена на {title}",
+    "стоимость {title}",
+    "{title} цена",
+]
+MASTER_SERVICES_QUESTIONS = [
+    "какие услуги у {name}",
+    "что делает {name}",
+    "{name} услуги",
+]
+
+
+class FaqEntry(NamedTuple):
+    intent: str
+    answer: str
+    service_id: Optional[int] = None  # ответ только если в сообщении эта услуга
+    master_id: Optional[int] = None   # ... или этот мастер
+
+
+class FaqMatch(NamedTuple):
+    entry: FaqEntry
+    score: float
+
+
+def ngrams(text: str) -> Counter:
+    """Символьные n-граммы слов с границами: «цена» -> « це», «цен», ..., «ена »"""
+    grams: Counter = Counter()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for i in range(len(padded) - size + 1):
+                grams[padded[i:i + size]] += 1
+    return grams
+
+
+_curated: Optional[List[Dict[str, Any]]] = None
+
+
+def _read_curated(path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        log.error(f"❌ Error loading FAQ file {path}: {e}")
+        return []
+
+
+def load_curated(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Курируемые вопросы: [{"intent", "questions": [...], "answer"}]; FAQ_FILE читается один раз"""
+    global _curated
+    if path is not None:
+        return _read_curated(path)
+    if _curated is None:
+        _curated = _read_curated(FAQ_FILE)
+    return _curated
+
+
+def price_list(catalog: Catalog) -> str:
+    lines = []
+    for service in catalog.priced_services:
+        price = format_price(service, "руб.")
+        if service.get("title") and price:
+            lines.append(f"- {service['title']}: {price}")
+    return "\n".join(lines)
+
+
+def masters_list(catalog: Catalog) -> str:
+    lines = []
+    for master in catalog.masters:
+        if master.get("name"):
+            specialization = master.get("specialization")
+            lines.append(f"- {master['name']}" + (f" ({specialization})" if specialization else ""))
+    return "\n".join(lines)
+
+
+def catalog_questions(catalog: Catalog) -> List[Tuple[str, FaqEntry]]:
+    """Вопросы о цене каждой услуги и об услугах каждого мастера"""
+    questions = []
+    for service in catalog.priced_services:
+        title, price = service.get("title"), format_price(service, "руб.")
+        if not title or not price:
+            continue
+        duration = service.get("length", 0)
+        answer = f"{title}: {price}" + (f" ({duration} мин)" if duration else "")
+        entry = FaqEntry("service_price", answer, service_id=service.get("id"))
+        questions.extend((template.format(title=title.lower()), entry) for template in SERVICE_PRICE_QUESTIONS)
+    for master in catalog.masters:
+        name, staff_id = master.get("name"), master.get("id")
+        services = [s for s in catalog.services_for_master(staff_id) if s.get("title")] if staff_id else []
+        if not name or not services:
+            continue
+        items = [f"{s['title']} ({format_price(s, '₽', space=False)})" if format_price(s, "₽")
+                 else s["title"] for s in services]
+        entry = FaqEntry("master_services", f"{name} — услуги: " + ", ".join(items), master_id=staff_id)
+        questions.extend((template.format(name=name.lower()), entry) for template in MASTER_SERVICES_QUESTIONS)
+    return questions
+
+
+class FaqIndex:
+    """TF-IDF индекс вопросов одной версии каталога"""
+
+    def __init__(self, questions: List[Tuple[str, FaqEntry]], lexicon=None,
+                 min_score: float = MIN_SCORE, use_numpy: bool = numpy_available):
+        self.entries = [entry for _, entry in questions]
+        self.lexicon = lexicon
+        self.min_score = min_score
+        documents = [ngrams(question) for question, _ in questions]
+        df: Counter = Counter(gram for document in documents for gram in document)
+        self.idf = {gram: math.log((1 + len(documents)) / (1 + count)) + 1 for gram, count in df.items()}
+        self._unseen_idf = math.log(1 + len(documents)) + 1
+        vectors = [self._vector(document) for document in documents]
+
+        self._matrix = None
+        self._vocabulary: Dict[str, int] = {}
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        if use_numpy and vectors:
+            import numpy
+
+            self._vocabulary = {gram: i for i, gram in enumerate(self.idf)}
+            self._matrix = numpy.zeros((len(vectors), len(self._vocabulary)), dtype=numpy.float32)
+            for row, vector in enumerate(vectors):
+                for gram, weight in vector.items():
+                    self._matrix[row, self._vocabulary[gram]] = weight
+        else:
+            for row, vector in enumerate(vectors):
+                for gram, weight in vector.items():
+                    self._postings.setdefault(gram, []).append((row, weight))
+        self._hits = metrics.counter("faq.hits")
+        self._misses = metrics.counter("faq.misses")
+
+    @classmethod
+    def from_catalog(cls, catalog: Catalog, lexicon=None, curated: Optional[List[Dict[str, Any]]] = None,
+                     hours: Optional[str] = None, **kwargs) -> "FaqIndex":
+        curated = load_curated() if curated is None else curated
+        fields = {"price_list": price_list(catalog), "masters": masters_list(catalog),
+                  "hours": SALON_HOURS if hours is None else hours}
+        questions = []
+        for item in curated:
+            try:
+                used = [name for _, name, _, _ in string.Formatter().parse(item["answer"]) if name]
+                if any(name in fields and not fields[name] for name in used):
+                    continue  # нечем ответить — вопрос уйдёт в LLM
+                entry = FaqEntry(item["intent"], item["answer"].format_map(fields))
+            except (KeyError, ValueError) as e:
+                log.error(f"❌ Bad FAQ entry {item.get('intent')!r}: {e}")
+                continue
+            questions.extend((question, entry) for question in item.get("questions", []))
+        questions.extend(catalog_questions(catalog))
+        return cls(questions, lexicon, **kwargs)
+
+    def _vector(self, grams: Counter) -> Dict[str, float]:
+        # Незнакомые индексу n-граммы не дают сходства, но учитываются в норме:
+        # «прайс пожалуйста» должен быть дальше от «прайс», чем сам «прайс»
+        weights = {gram: (1 + math.log(count)) * self.idf.get(gram, self._unseen_idf)
+                   for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {gram: weight / norm for gram, weight in weights.items() if gram in self.idf} if norm else {}
+
+    def _scores(self, text: str) -> List[float]:
+        query = self._vector(ngrams(text))
+        if self._matrix is not None:
+            import numpy
+
+            vector = numpy.zeros(len(self._vocabulary), dtype=numpy.float32)
+            for gram, weight in query.items():
+                vector[self._vocabulary[gram]] = weight
+            return (self._matrix @ vector).tolist()
+        scores = [0.0] * len(self.entries)
+        for gram, weight in query.items():
+            for row, doc_weight in self._postings.get(gram, ()):
+                scores[row] += weight * doc_weight
+        return scores
+
+    def _applies(self, entry: FaqEntry, text: str, generic: bool = True) -> bool:
+        """Ответ про конкретную услугу или мастера — только если они и правда упомянуты"""
+        if entry.service_id is None and entry.master_id is None:
+            return generic
+        if self.lexicon is None:
+            return False
+        if entry.service_id is not None:
+            service = self.lexicon.find_service(text)
+            return service is not None and service.get("id") == entry.service_id
+        master = self.lexicon.find_master(text)
+        return master is not None and master.get("id") == entry.master_id
+
+    def search(self, text: str, generic: bool = True) -> Optional[FaqMatch]:
+        """Лучший подходящий вопрос (без учёта порога); generic=False — только ответы
+        про конкретную услугу или мастера"""
+        best: Dict[FaqEntry, float] = {}
+        for row, score in enumerate(self._scores(text)):
+            entry = self.entries[row]
+            if score > best.get(entry, 0.0):
+                best[entry] = score
+        for entry, score in sorted(best.items(), key=lambda item: item[1], reverse=True):
+            if self._applies(entry, text, generic):
+                return FaqMatch(entry, score)
+        return None
+
+    def answer(self, text: str, generic: bool = True) -> Optional[str]:
+        """Готовый ответ, если вопрос достаточно похож на известный"""
+        match = self.search(text, generic)
+        if match is None or match.score < self.min_score:
+            self._misses.inc()
+            return None
+        self._hits.inc()
+        log.info(f"📖 FAQ answer: {match.entry.intent} (score {match.score:.2f})")
+        return match.entry.answer
+
+
+def booking_question_answer(index: FaqIndex, text: str) -> Optional[str]:
+    """Ответ FAQ на сообщение с ключевыми словами записи, если в нём нет даты и времени"""
+    parsed = parse_booking_message(text, "")
+    if parsed["datetime"]:
+        return None
+    return index.answer(text, generic=not (parsed["service"] or parsed["master"]))
@@ -0,0 +1,173 @@
+# llm_cache.py
+"""
+Кэш ответов LLM на повторяющиеся вопросы.
+
+Многие вопросы приходят от разных пользователей слово в слово ("сколько
+стоит маникюр", "где вы находитесь"), и каждый стоит полного запроса к
+Groq. ResponseCache хранит ответ под ключом из нормализованного сообщения,
+версии каталога (ответ устаревает вместе с ценами и мастерами, а версия
+у каждого салона своя) и шаблона промпта с моделью.
+
+Кэш применяется, только когда история диалога не влияет на ответ
+(context_free): у пользователя ещё нет предыдущих реплик или сообщение
+самодостаточно. Такой ответ запрашивается у LLM без истории, чтобы в кэш
+не попало ничего из чужого диалога.
+
+Записи живут ttl секунд; сверх capacity вытесняются давно не читанные
+(LRU). С store (state_store.StateStore, STATE_DB) кэш общий для всех
+реплик, иначе — в памяти процесса. Метрики: llm_cache.hits,
+llm_cache.misses и llm_cache.llm_seconds — время запросов к LLM на
+промахах; сэкономлено примерно hits × среднее llm_seconds.
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+
+log = logging.getLogger()
+
+DEFAULT_TTL = 3600
+DEFAULT_CAPACITY = 1000
+NAMESPACE = "llm_cache"
+
+_WORDS = re.compile(r"\w+")
+
+# Слова, которые отсылают к предыдущим репликам: без истории ответ на такое сообщение бессмыслен
+CONTEXT_WORDS = frozenset({
+    "он", "она", "оно", "они", "его", "ее", "их", "ему", "ей", "им", "него", "нее", "них",
+    "этот", "эта", "это", "эти", "этого", "этой", "этому", "тот", "та", "то", "те", "того", "той",
+    "там", "туда", "тогда", "так", "тоже", "еще", "также", "другой", "другое", "другую",
+    "да", "нет", "ок", "хорошо", "давай", "давайте", "а", "и", "выше", "предыдущий",
+})
+
+
+def normalize(text: str) -> str:
+    """"Сколько  стоит Маникюр?!" -> "сколько стоит маникюр" """
+    return " ".join(_WORDS.findall(text.lower().replace("ё", "е")))
+
+
+def standalone(message: str) -> bool:
+    """Сообщение понятно без истории: не короче двух слов и без отсылок к прошлым репликам"""
+    words = normalize(message).split()
+    return len(words) >= 2 and not CONTEXT_WORDS.intersection(words)
+
+
+def context_free(previous_turns: int, message: str) -> bool:
+    """Можно ли отвечать из кэша: истории нет или она не нужна для ответа"""
+    return previous_turns == 0 or standalone(message)
+
+
+class ResponseCache:
+    """Ответы LLM с TTL и LRU-вытеснением (в памяти или в общем StateStore)"""
+
+    def __init__(self, ttl: int = DEFAULT_TTL, capacity: int = DEFAULT_CAPACITY, store=None,
+                 name: str = NAMESPACE):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.store = store
+        self.name = name
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()  # key -> (ответ, время записи)
+        self._lock = threading.Lock()
+        self._hits = metrics.counter(f"{name}.hits")
+        self._misses = metrics.counter(f"{name}.misses")
+        self._llm_time = metrics.histogram(f"{name}.llm_seconds")
+        metrics.gauge(f"{name}.entries", self.size)
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0 and self.ttl > 0
+
+    @staticmethod
+    def key(message: str, catalog_version: str, *context: str) -> str:
+        """Ключ: нормализованное сообщение, версия каталога и всё, от чего ещё зависит ответ
+        (шаблон промпта, модель)"""
+        content = "\0".join([normalize(message), catalog_version, *context])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()[:24]
+
+    # --- хранение ---
+    def get(self, key: str) -> Optional[Any]:
+        if self.store is not None:
+            entry = self._store_get(key)
+        else:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+        if entry is None:
+            return None
+        response, created = entry
+        if time.time() - created >= self.ttl:
+            self.delete(key)
+            return None
+        return response
+
+    def set(self, key: str, response: Any):
+        created = time.time()
+        if self.store is not None:
+            self._store_set(key, response, created)
+            return
+        with self._lock:
+            self._entries[key] = (response, created)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        if self.store is not None:
+            self.store.delete(self.name, key)
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def size(self) -> int:
+        if self.store is not None:
+            try:
+                return self.store.count(self.name)
+            except Exception:  # хранилище уже закрыто — метрике это не повод падать
+                return 0
+        return len(self._entries)
+
+    def _store_get(self, key: str) -> Optional[Tuple[Any, float]]:
+        try:
+            entry = self.store.get(self.name, key)
+            if entry is None:
+                return None
+            # Перезапись обновляет updated_at — по нему trim() вытесняет давно не читанные
+            self.store.set(self.name, key, entry)
+            return entry["response"], entry["created"]
+        except Exception as e:
+            log.error(f"❌ Error reading LLM cache: {e}")
+            return None
+
+    def _store_set(self, key: str, response: Any, created: float):
+        try:
+            self.store.set(self.name, key, {"response": response, "created": created})
+            self.store.trim(self.name, self.capacity)
+        except Exception as e:
+            log.error(f"❌ Error saving LLM cache: {e}")
+
+    # --- использование ---
+    def cached(self, key: str, compute: Callable[[], Any],
+               cacheable: Callable[[Any], bool] = bool) -> Any:
+        """Ответ из кэша или compute(); в кэш попадают ответы, для которых cacheable() истинно.
+        Ответ — строка или JSON-совместимое значение (сообщение chat completions)"""
+        if not self.enabled:
+            return compute()
+        response = self.get(key)
+        if response is not None:
+            self._hits.inc()
+            return response
+        self._misses.inc()
+        with self._llm_time.time():
+            response = compute()
+        if cacheable(response):
+            self.set(key, response)
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": self.size(), "hits": self._hits.value, "misses": self._misses.value}
@@ -0,0 +1,155 @@
+# metrics.py
+"""
+Простые метрики процесса: счётчики, gauge и гистограммы задержек.
+
+Без внешних зависимостей; снимок отдаётся через snapshot()
+(webhook-сервер показывает его на GET /metrics с секретом webhook).
+"""
+import time
+import json
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        with _lock:
+            self.value += amount
+
+
+class Gauge:
+    """Текущее значение; можно задать функцией, которая читается при snapshot()"""
+
+    def __init__(self, name: str, fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value: float):
+        self.value = value
+
+    def read(self) -> float:
+        return self.fn() if self.fn else self.value
+
+
+class Histogram:
+    """Количество, сумма, максимум и перцентили по выборке последних значений"""
+
+    def __init__(self, name: str, reservoir: int = 1024):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._reservoir = reservoir
+        self._samples: List[float] = []
+
+    def observe(self, value: float):
+        with _lock:
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+            if len(self._samples) < self._reservoir:
+                self._samples.append(value)
+            else:
+                # Reservoir sampling: равномерная выборка по всему потоку
+                index = random.randrange(self.count)
+                if index < self._reservoir:
+                    self._samples[index] = value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """p-й перцентиль по выборке; None, пока значений нет"""
+        with _lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+
+    def summary(self) -> Dict[str, float]:
+        with _lock:
+            samples = sorted(self._samples)
+            count, total, maximum = self.count, self.total, self.max
+        if not samples:
+            return {"count": 0}
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(p / 100 * len(samples)))], 6)
+
+        return {
+            "count": count,
+            "mean": round(total / count, 6),
+            "p50": pct(50),
+            "p95": pct(95),
+            "p99": pct(99),
+            "max": round(maximum, 6),
+        }
+
+
+_counters: Dict[str, Counter] = {}
+_gauges: Dict[str, Gauge] = {}
+_histograms: Dict[str, Histogram] = {}
+
+
+def counter(name: str) -> Counter:
+    with _lock:
+        return _counters.setdefault(name, Counter(name))
+
+
+def gauge(name: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+    with _lock:
+        g = _gauges.setdefault(name, Gauge(name))
+    if fn is not None:
+        g.fn = fn
+    return g
+
+
+def histogram(name: str) -> Histogram:
+    with _lock:
+        return _histograms.setdefault(name, Histogram(name))
+
+
+def snapshot() -> Dict[str, Dict]:
+    """Все метрики одним словарём (для логов и /metrics)"""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = dict(_histograms)
+    return {
+        "counters": {name: c.value for name, c in sorted(counters.items())},
+        "gauges": {name: g.read() for name, g in sorted(gauges.items())},
+        "histograms": {name: h.summary() for name, h in sorted(histograms.items())},
+    }
+
+
+def start_reporter(interval: float = 60, prefix: str = "") -> threading.Thread:
+    """Раз в interval секунд писать метрики (с указанным префиксом) в лог"""
+    log = logging.getLogger()
+
+    def report():
+        while True:
+            time.sleep(interval)
+            data = snapshot()
+            if prefix:
+                data = {kind: {name: value for name, value in values.items() if name.startswith(prefix)}
+                        for kind, values in data.items()}
+            log.info(f"📈 METRICS: {json.dumps(data, ensure_ascii=False)}")
+
+    thread = threading.Thread(target=report, name="MetricsReporter", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,162 @@
+# model_router.py
+"""
+Выбор модели LLM по намерению сообщения.
+
+Раньше каждый запрос шёл в openai/gpt-oss-120b с max_tokens 1000, даже
+«спасибо» или «привет». ModelRouter делит запросы на два уровня:
+
+    small — короткие реплики чата (до short_chat_chars символов): быстрая
+            модель с небольшим max_tokens
+    large — извлечение записи (до LLM доходят только сообщения, которые не
+            разобрал booking_parser, — неоднозначные) и длинные вопросы
+
+Если модель уровня не ответила за его timeout, тот же запрос один раз
+отправляется модели другого уровня (fallback).
+
+Хвост задержек срезается хеджированием: если ответа нет дольше
+hedge_percentile-го перцентиля задержек уровня (пока замеров мало —
+hedge_delay секунд), отправляется второй такой же запрос, и берётся
+ответ, пришедший первым. Ни один запрос не ждёт дольше дедлайна апдейта
+(deadlines.py): по его истечении — DeadlineExceeded.
+
+Метрики: llm.route.small / llm.route.large — решения маршрутизатора,
+llm.small.seconds / llm.large.seconds — задержка успешных запросов уровня,
+llm.small.timeouts / llm.large.timeouts, llm.fallbacks, llm.hedges,
+llm.hedge_wins (первым ответил второй запрос) и llm.deadline_exceeded.
+"""
+import time
+import logging
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import requests
+
+import deadlines
+import metrics
+
+log = logging.getLogger()
+
+CHAT = "chat"
+BOOKING = "booking"
+DEFAULT_SHORT_CHAT_CHARS = 200
+DEFAULT_HEDGE_PERCENTILE = 95.0
+DEFAULT_HEDGE_DELAY = 3.0  # секунд, пока замеров меньше MIN_HEDGE_SAMPLES
+MIN_HEDGE_DELAY = 0.5
+MIN_HEDGE_SAMPLES = 20
+
+
+class Tier(NamedTuple):
+    name: str
+    model: str
+    max_tokens: int
+    timeout: float  # секунды на запрос, после них — fallback на другой уровень
+
+
+SMALL = Tier("small", "llama-3.1-8b-instant", 300, 10.0)
+LARGE = Tier("large", "openai/gpt-oss-120b", 1000, 30.0)
+
+
+class ModelRouter:
+    """Уровень модели для запроса, хеджирование и повтор на другом уровне по таймауту"""
+
+    def __init__(self, small: Tier = SMALL, large: Tier = LARGE,
+                 short_chat_chars: int = DEFAULT_SHORT_CHAT_CHARS,
+                 hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE, hedge_delay: float = DEFAULT_HEDGE_DELAY,
+                 workers: int = 16):
+        self.small = small
+        self.large = large
+        self.short_chat_chars = short_chat_chars
+        self.hedge_percentile = hedge_percentile  # 0 — без хеджирования
+        self.hedge_delay_default = hedge_delay
+        # Запросы к Groq идут в своём пуле: вызывающий поток ждёт первый ответ из нескольких
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+        self._fallbacks = metrics.counter("llm.fallbacks")
+        self._hedges = metrics.counter("llm.hedges")
+        self._hedge_wins = metrics.counter("llm.hedge_wins")
+        self._deadline_exceeded = metrics.counter("llm.deadline_exceeded")
+
+    def route(self, intent: str, text: str) -> Tier:
+        if intent == CHAT and len(text.strip()) <= self.short_chat_chars:
+            tier = self.small
+        else:
+            tier = self.large
+        metrics.counter(f"llm.route.{tier.name}").inc()
+        return tier
+
+    def other(self, tier: Tier) -> Tier:
+        return self.large if tier.name == self.small.name else self.small
+
+    def hedge_delay(self, tier: Tier) -> float:
+        """Через сколько секунд без ответа отправлять второй запрос"""
+        latency = metrics.histogram(f"llm.{tier.name}.seconds")
+        if latency.count < MIN_HEDGE_SAMPLES:
+            return self.hedge_delay_default
+        return max(MIN_HEDGE_DELAY, latency.percentile(self.hedge_percentile) or self.hedge_delay_default)
+
+    @staticmethod
+    def _attempt(tier: Tier, send: Callable[[Tier], Any]) -> Any:
+        started = time.perf_counter()
+        result = send(tier)
+        metrics.histogram(f"llm.{tier.name}.seconds").observe(time.perf_counter() - started)
+        return result
+
+    def _launch(self, tier: Tier, send: Callable[[Tier], Any], deadline: Optional[deadlines.Deadline]) -> Future:
+        # HTTP-таймаут запроса не дальше дедлайна апдейта
+        timeout = tier.timeout if deadline is None else min(tier.timeout, deadline.remaining())
+        if timeout <= 0:
+            self._deadline_exceeded.inc()
+            raise deadlines.DeadlineExceeded(f"no time left for {tier.model}")
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._attempt, tier._replace(timeout=timeout), send)
+
+    def complete(self, intent: str, text: str, send: Callable[[Tier], Any]) -> Tuple[Any, Tier]:
+        """send(tier) — запрос к модели уровня с его max_tokens и timeout;
+        (ответ, уровень, который ответил)"""
+        tier = self.route(intent, text)
+        deadline = deadlines.current()
+        started = time.monotonic()
+        pending: Dict[Future, Tuple[Tier, bool]] = {self._launch(tier, send, deadline): (tier, False)}
+        hedge_at = started + self.hedge_delay(tier) if self.hedge_percentile > 0 else None
+        fell_back = False
+        error: Optional[BaseException] = None
+
+        while pending:
+            waits = [deadline.remaining()] if deadline is not None else []
+            if hedge_at is not None:
+                waits.append(max(0.0, hedge_at - time.monotonic()))
+            done, _ = wait(list(pending), timeout=min(waits) if waits else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                attempt_tier, hedged = pending.pop(future)
+                try:
+                    result = future.result()
+                except requests.Timeout as e:
+                    error = e
+                    metrics.counter(f"llm.{attempt_tier.name}.timeouts").inc()
+                    if not fell_back:
+                        fell_back, hedge_at = True, None
+                        fallback = self.other(attempt_tier)
+                        self._fallbacks.inc()
+                        log.warning(f"⏱️ {attempt_tier.model} timed out after {time.monotonic() - started:.1f}s, "
+                                    f"retrying on {fallback.model}")
+                        pending[self._launch(fallback, send, deadline)] = (fallback, False)
+                    continue
+                except Exception as e:
+                    error = e
+                    continue
+                if hedged:
+                    self._hedge_wins.inc()
+                return result, attempt_tier
+
+            if deadline is not None and deadline.expired:
+                self._deadline_exceeded.inc()
+                log.warning(f"⏱️ LLM deadline exceeded after {time.monotonic() - started:.1f}s")
+                raise deadlines.DeadlineExceeded(f"{tier.model} did not answer within the update deadline")
+            if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                hedge_at = None
+                self._hedges.inc()
+                log.info(f"🔀 {tier.model}: no answer after {time.monotonic() - started:.1f}s, sending hedged request")
+                pending[self._launch(tier, send, deadline)] = (tier, True)
+
+        raise error
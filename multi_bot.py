@@ -21,18 +21,32 @@ log = logging.getLogger(__name__)
 
 class MultiPlatformBot:
     def __init__(self):
-        self.processes: List[subprocess.Popen] = []
+        self.processes: List[asyncio.subprocess.Process] = []
+        self.pumps: List[asyncio.Task] = []
         self.running = False
+    
+    async def spawn(self, name: str, *args: str) -> asyncio.subprocess.Process:
+        """Start a child process whose stdout/stderr are always drained into our log"""
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        self.processes.append(process)
+        self.pumps.append(asyncio.create_task(self.pump_output(name, process.stdout)))
+        return process
+    
+    async def pump_output(self, name: str, stream: asyncio.StreamReader):
+        """Forward child output line by line so a full pipe never blocks the child"""
+        while True:
+            line = await stream.readline()
+            if not line:
+                return
+            log.info(f"[{name}] {line.decode('utf-8', errors='replace').rstrip()}")
         
     async def start_telegram_bot(self):
         """Start Telegram bot"""
         try:
             log.info("🚀 Starting Telegram Bot...")
-            process = subprocess.Popen([
-                sys.executable, "app.py"
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            
-            self.processes.append(process)
+            process = await self.spawn("telegram", sys.executable, "app.py")
             log.info("✅ Telegram Bot started")
             return process
             
@@ -64,11 +78,7 @@ class MultiPlatformBot:
                 log.info("✅ WhatsApp dependencies installed")
             
             # Start WhatsApp bot
-            process = subprocess.Popen([
-                sys.executable, "whatsapp_bot.py"
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            
-            self.processes.append(process)
+            process = await self.spawn("whatsapp", sys.executable, "whatsapp_bot.py")
             log.info("✅ WhatsApp Bot started")
             return process
             
@@ -80,27 +90,32 @@ class MultiPlatformBot:
         """Monitor all bot processes"""
         while self.running:
             for i, process in enumerate(self.processes):
-                if process.poll() is not None:
+                if process.returncode is not None:
                     log.error(f"❌ Process {i} died with exit code {process.returncode}")
                     self.running = False
                     break
             
             await asyncio.sleep(1)
     
-    def stop_all(self):
+    async def stop_all(self):
         """Stop all bot processes"""
         log.info("🛑 Stopping all bots...")
         self.running = False
         
         for process in self.processes:
+            if process.returncode is not None:
+                continue
             try:
                 process.terminate()
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
                 process.kill()
+                await process.wait()
             except Exception as e:
                 log.error(f"❌ Error stopping process: {e}")
         
+        await asyncio.gather(*self.pumps, return_exceptions=True)
+        
         log.info("✅ All bots stopped")
     
     async def start_all(self):
@@ -128,27 +143,25 @@ class MultiPlatformBot:
         # Monitor processes
         await self.monitor_processes()
 
-def signal_handler(signum, frame):
-    """Handle shutdown signals"""
-    log.info(f"🛑 Received signal {signum}, shutting down...")
-    sys.exit(0)
-
 async def main():
     """Main function"""
-    # Setup signal handlers
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
     bot_system = MultiPlatformBot()
+    main_task = asyncio.current_task()
+    
+    # Setup signal handlers: cancel the main task so children are stopped in finally
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda sig=sig: (log.info(f"🛑 Received signal {sig}, shutting down..."),
+                                                     main_task.cancel()))
     
     try:
         await bot_system.start_all()
-    except KeyboardInterrupt:
-        log.info("🛑 Keyboard interrupt received")
+    except asyncio.CancelledError:
+        pass
     except Exception as e:
         log.error(f"❌ Unexpected error: {e}")
     finally:
-        bot_system.stop_all()
+        await bot_system.stop_all()
 
 if __name__ == "__main__":
     print("""
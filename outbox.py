@@ -0,0 +1,348 @@
+# outbox.py
+"""
+Очередь записей в YClients (outbox) в SQLite.
+
+Создание, удаление и изменение записи раньше были одиночными POST/DELETE/PUT
+прямо из хендлера: таймаут оставлял непонятным, создана ли запись, а
+повторное сообщение пользователя могло записать его дважды. Теперь хендлер
+только кладёт намерение в таблицу outbox под ключом идемпотентности и сразу
+отвечает, а выполняют записи фоновые воркеры:
+
+    enqueue(kind, payload, key) — строка со статусом pending; повтор с тем же
+        ключом возвращает уже существующую (не старше dedup_window для
+        выполненных; неудавшиеся ставятся в очередь заново)
+    воркер забирает строку (running, attempts + 1) и вызывает обработчик
+        её вида (register); результат — done, постоянная ошибка — failed,
+        временная — повтор с экспоненциальной паузой до max_attempts
+    неоднозначный исход (таймаут, обрыв соединения, 5xx YClients, воркер
+        умер посреди запроса — строка running дольше lease) помечает строку
+        ambiguous: перед повтором reconcile() ищет, не выполнена ли запись
+        в прошлый раз, и только если нет — выполняет её снова
+
+Слушатели (add_listener) получают строку после done или failed — из потока
+воркера; так боты подтверждают запись пользователю отдельным сообщением.
+Поэтому процесс забирает только строки своих каналов (serve) и строки без
+канала: запись из WhatsApp, выполненная процессом Telegram (multi_bot.py
+запускает их отдельно над одной базой), осталась бы без подтверждения.
+Таблица живёт в OUTBOX_DB (по умолчанию — в STATE_DB), поэтому очередь
+переживает перезапуск и общая у всех реплик. Метрики: outbox.pending,
+outbox.done, outbox.failed, outbox.retries, outbox.reconciled,
+outbox.write_seconds.
+"""
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+import requests
+
+import metrics
+from yclients_client import YClientsError
+
+log = logging.getLogger()
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 2.0  # секунд перед первым повтором, дальше вдвое больше
+MAX_RETRY_DELAY = 300.0
+DEFAULT_LEASE = 120.0  # секунд; running дольше — воркер, видимо, умер
+DEFAULT_DEDUP_WINDOW = 600.0
+BUSY_TIMEOUT_MS = 10000
+
+# Исход ошибки: повторить, повторить после сверки (reconcile) или сдаться
+RETRY = "retry"
+AMBIGUOUS = "ambiguous"
+PERMANENT = "permanent"
+
+_COLUMNS = ("id, key, kind, payload, channel, chat_id, status, attempts, ambiguous, result, error, "
+            "created_at, updated_at")
+
+
+class OutboxEntry(NamedTuple):
+    id: int
+    key: str
+    kind: str
+    payload: Dict[str, Any]
+    channel: Optional[str]
+    chat_id: Any
+    status: str
+    attempts: int
+    ambiguous: bool
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: float
+    updated_at: float
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "OutboxEntry":
+        (id_, key, kind, payload, channel, chat_id, status, attempts, ambiguous, result, error,
+         created_at, updated_at) = row
+        return cls(id_, key, kind, json.loads(payload), channel, json.loads(chat_id), status, attempts,
+                   bool(ambiguous), json.loads(result) if result else None, error, created_at, updated_at)
+
+
+def classify(error: BaseException) -> str:
+    """Таймаут и 5xx — запрос мог выполниться; 429 — просто подождать; остальное не исправится повтором"""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return AMBIGUOUS
+    if isinstance(error, YClientsError):
+        status = error.status
+    elif isinstance(error, requests.HTTPError) and error.response is not None:
+        # Ответ не JSON (YClientsClient._handle) — обычно 502/504 шлюза
+        status = error.response.status_code
+    else:
+        return PERMANENT
+    if status >= 500:
+        return AMBIGUOUS
+    if status == 429:
+        return RETRY
+    return PERMANENT
+
+
+Handler = Callable[[OutboxEntry], Dict[str, Any]]
+Reconciler = Callable[[OutboxEntry], Optional[Dict[str, Any]]]
+
+
+class Outbox:
+    def __init__(self, path: str, *, workers: int = 2, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 retry_delay: float = DEFAULT_RETRY_DELAY, lease: float = DEFAULT_LEASE,
+                 dedup_window: float = DEFAULT_DEDUP_WINDOW, poll_interval: float = 1.0,
+                 context: Optional[Callable[[OutboxEntry], ContextManager]] = None):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.dedup_window = dedup_window
+        self.poll_interval = poll_interval
+        # Контекст выполнения строки — например, салон чата (tenants.activate)
+        self.context = context or (lambda entry: nullcontext())
+        self._handlers: Dict[str, Tuple[Handler, Optional[Reconciler]]] = {}
+        self._listeners: List[Callable[[OutboxEntry], Any]] = []
+        self._channels: Set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE, kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL, channel TEXT, chat_id TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, ambiguous INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL, result TEXT, error TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+        self._done = metrics.counter("outbox.done")
+        self._failed = metrics.counter("outbox.failed")
+        self._retries = metrics.counter("outbox.retries")
+        self._reconciled = metrics.counter("outbox.reconciled")
+        self._write_time = metrics.histogram("outbox.write_seconds")
+        metrics.gauge("outbox.pending", self.pending)
+
+    # --- настройка ---
+    def register(self, kind: str, handler: Handler, reconcile: Optional[Reconciler] = None):
+        """handler(entry) выполняет запись и возвращает результат (JSON); reconcile(entry) —
+        результат прошлой попытки с неизвестным исходом или None, если её не было"""
+        self._handlers[kind] = (handler, reconcile)
+
+    def add_listener(self, fn: Callable[[OutboxEntry], Any]):
+        """fn(entry) после done или failed (в потоке воркера)"""
+        if fn not in self._listeners:
+            self._listeners.append(fn)
+
+    def serve(self, channel: str):
+        """Забирать строки канала channel: его подтверждения отправляет этот процесс"""
+        with self._lock:
+            self._channels.add(channel)
+
+    # --- очередь ---
+    def _select(self, where: str, args: Tuple) -> Optional[OutboxEntry]:
+        row = self._db.execute(f"SELECT {_COLUMNS} FROM outbox WHERE {where}", args).fetchone()
+        return OutboxEntry.from_row(row) if row else None
+
+    def get(self, key: str) -> Optional[OutboxEntry]:
+        with self._lock:
+            return self._select("key = ?", (key,))
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], key: str, channel: Optional[str] = None,
+                chat_id: Hashable = None) -> OutboxEntry:
+        """Поставить запись в очередь; с тем же ключом — вернуть уже поставленную"""
+        if kind not in self._handlers:
+            raise ValueError(f"No outbox handler for {kind!r}")
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._select("key = ?", (key,))
+                fresh = existing is not None and (
+                    existing.status in (PENDING, RUNNING)
+                    or (existing.status == DONE and now - existing.created_at < self.dedup_window))
+                if fresh:
+                    self._db.execute("COMMIT")
+                    log.info(f"📬 Outbox: {kind} {key} already {existing.status}")
+                    return existing
+                values = (kind, json.dumps(payload, ensure_ascii=False), channel,
+                          json.dumps(chat_id, ensure_ascii=False), PENDING, now, now, now)
+                if existing is None:
+                    self._db.execute(
+                        "INSERT INTO outbox (kind, payload, channel, chat_id, status, next_attempt_at,"
+                        " created_at, updated_at, key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values + (key,))
+                else:
+                    # Неудавшаяся или давно выполненная запись с тем же ключом — новое намерение.
+                    # Неудавшаяся могла выполниться (таймаут) — тогда сначала сверка, а не вторая запись
+                    ambiguous = int(existing.status == FAILED and existing.ambiguous)
+                    self._db.execute(
+                        "UPDATE outbox SET kind = ?, payload = ?, channel = ?, chat_id = ?, status = ?,"
+                        " next_attempt_at = ?, created_at = ?, updated_at = ?, attempts = 0, ambiguous = ?,"
+                        " result = NULL, error = NULL WHERE key = ?", values + (ambiguous, key))
+                entry = self._select("key = ?", (key,))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        log.info(f"📬 Outbox: queued {kind} {key}")
+        self._wakeup.set()
+        return entry
+
+    def pending(self) -> int:
+        try:
+            with self._lock:
+                return self._db.execute("SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)",
+                                        (PENDING, RUNNING)).fetchone()[0]
+        except sqlite3.Error:  # база уже закрыта — метрике это не повод падать
+            return 0
+
+    def claim(self) -> Optional[OutboxEntry]:
+        """Забрать одну готовую к выполнению строку (между процессами тоже)"""
+        now = time.time()
+        with self._lock:
+            channels = sorted(self._channels)
+            placeholders = ", ".join("?" * len(channels))
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM outbox WHERE ((status = ? AND next_attempt_at <= ?)"
+                    " OR (status = ? AND updated_at < ?))"
+                    f" AND (channel IS NULL OR channel IN ({placeholders}))"
+                    " ORDER BY next_attempt_at, id LIMIT 1",
+                    (PENDING, now, RUNNING, now - self.lease, *channels)).fetchone()
+                if row is None:
+                    self._db.execute("COMMIT")
+                    return None
+                entry = OutboxEntry.from_row(row)
+                # Строка, брошенная посреди запроса, могла выполниться — сначала сверка
+                ambiguous = entry.ambiguous or entry.status == RUNNING
+                self._db.execute(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, ambiguous = ?, updated_at = ?"
+                    " WHERE id = ?", (RUNNING, int(ambiguous), now, entry.id))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return entry._replace(status=RUNNING, attempts=entry.attempts + 1, ambiguous=ambiguous, updated_at=now)
+
+    def _update(self, entry: OutboxEntry, **fields: Any):
+        fields["updated_at"] = time.time()
+        if fields.get("result") is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        if "ambiguous" in fields:
+            fields["ambiguous"] = int(fields["ambiguous"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE outbox SET {assignments} WHERE id = ?", (*fields.values(), entry.id))
+
+    # --- выполнение ---
+    def process(self, entry: OutboxEntry) -> OutboxEntry:
+        """Выполнить забранную строку и записать исход"""
+        handler, reconcile = self._handlers[entry.kind]
+        started = time.perf_counter()
+        try:
+            with self.context(entry):
+                result = reconcile(entry) if entry.ambiguous and reconcile is not None else None
+                if result is not None:
+                    self._reconciled.inc()
+                    log.info(f"🔎 Outbox: {entry.kind} {entry.key} was already applied: {result}")
+                else:
+                    result = handler(entry)
+        except Exception as e:
+            outcome = classify(e)
+            ambiguous = entry.ambiguous or outcome == AMBIGUOUS
+            if outcome == PERMANENT or entry.attempts >= self.max_attempts:
+                log.error(f"❌ Outbox: {entry.kind} {entry.key} failed after {entry.attempts} attempt(s): {e}")
+                self._update(entry, status=FAILED, error=str(e), ambiguous=ambiguous)
+                self._failed.inc()
+                return self._finished(entry.key)
+            delay = min(MAX_RETRY_DELAY, self.retry_delay * 2 ** (entry.attempts - 1))
+            log.warning(f"⚠️ Outbox: {entry.kind} {entry.key} attempt {entry.attempts} failed ({outcome}): {e}; "
+                        f"retry in {delay:.0f}s")
+            self._update(entry, status=PENDING, error=str(e), ambiguous=ambiguous,
+                         next_attempt_at=time.time() + delay)
+            self._retries.inc()
+            return entry._replace(status=PENDING, error=str(e), ambiguous=ambiguous)
+        finally:
+            self._write_time.observe(time.perf_counter() - started)
+        self._update(entry, status=DONE, result=result, error=None)
+        self._done.inc()
+        log.info(f"✅ Outbox: {entry.kind} {entry.key} done")
+        return self._finished(entry.key)
+
+    def _finished(self, key: str) -> OutboxEntry:
+        entry = self.get(key)
+        for fn in self._listeners:
+            try:
+                fn(entry)
+            except Exception as e:
+                log.error(f"❌ Outbox listener failed for {entry.key}: {e}")
+        return entry
+
+    def run_once(self) -> bool:
+        """Выполнить одну готовую строку; False — очередь пуста"""
+        entry = self.claim()
+        if entry is None:
+            return False
+        self.process(entry)
+        return True
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                log.error(f"❌ Outbox worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._threads = [threading.Thread(target=self._work, name=f"Outbox-{i}", daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        log.info(f"📬 Outbox started: {self.workers} worker(s), {self.path}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,159 @@
+# parsing_service.py
+"""
+Разбор сообщений о записи (booking_parser) в пуле процессов.
+
+Регулярки и fuzzy-поиск парсера — чистый Python под GIL: в пиковые часы
+они отнимают время у event loop и потоков YClients/Groq. ParsingService
+уносит разбор в ProcessPoolExecutor, а event loop только ждёт результат.
+
+Процессы один раз при старте импортируют booking_parser (словари и
+регулярки компилируются при импорте) и прогревают его. parse() от разных
+чатов, пришедшие в одну итерацию event loop, склеиваются в пачки по
+batch_size сообщений — один обмен с процессом на пачку, а не на каждое
+сообщение. parse_many() отправляет готовую пачку.
+
+PARSER_WORKERS=0 (по умолчанию) — без процессов, разбор в вызывающем
+коде, как раньше; multiprocessing тогда даже не импортируется.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import metrics
+import booking_parser
+
+log = logging.getLogger()
+
+DEFAULT_BATCH_SIZE = 64
+
+Item = Tuple[str, str]  # (message, history)
+
+
+def _init_worker():
+    """Инициализатор процесса пула: парсер готов до первого сообщения"""
+    # is_booking пишет в лог каждый вызов — в процессах пула это только шум
+    logging.getLogger().setLevel(logging.WARNING)
+    booking_parser.warm()
+
+
+def parse_batch(items: Sequence[Item]) -> List[Dict[str, Any]]:
+    """Разобрать пачку сообщений (выполняется в процессе пула)"""
+    return [booking_parser.parse_booking_message(message, history) for message, history in items]
+
+
+def _mp_context():
+    import multiprocessing
+
+    # fork из процесса с потоками (пулы, планировщики) небезопасен
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class ParsingService:
+    """Асинхронный разбор сообщений в workers процессах (0 — в текущем процессе)"""
+
+    def __init__(self, workers: int = 0, batch_size: int = DEFAULT_BATCH_SIZE, name: str = "parser"):
+        if workers < 0 or batch_size < 1:
+            raise ValueError("workers must be >= 0 and batch_size >= 1")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.name = name
+        self._executor = None  # ProcessPoolExecutor, создаётся в start()
+        self._pending: List[Tuple[Item, asyncio.Future]] = []
+        self._flush_scheduled = False
+        self._inflight = 0
+        self._messages = metrics.counter(f"{name}.messages")
+        self._batches = metrics.counter(f"{name}.batches")
+        self._batch_time = metrics.histogram(f"{name}.batch_seconds")
+        metrics.gauge(f"{name}.inflight", lambda: self._inflight)
+
+    # --- жизненный цикл ---
+    def start(self):
+        if self.workers and self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=_mp_context(),
+                                                 initializer=_init_worker)
+            log.info(f"🧮 Parsing service started: {self.workers} processes, batches of {self.batch_size}")
+
+    def warm(self, timeout: Optional[float] = None):
+        """Запустить процессы пула и дождаться, пока каждый прогреет парсер"""
+        self.start()
+        if self._executor is None:
+            booking_parser.warm()
+            return
+        futures = [self._executor.submit(parse_batch, [("прогрев", "")]) for _ in range(self.workers)]
+        for future in futures:
+            future.result(timeout)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    # --- разбор ---
+    async def parse(self, message: str, history: str = "") -> Dict[str, Any]:
+        """Разобрать одно сообщение; одновременные вызовы уходят в процессы одной пачкой"""
+        if not self.workers:
+            self._messages.inc()
+            return booking_parser.parse_booking_message(message, history)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((message, history), future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    async def parse_many(self, items: Sequence[Item]) -> List[Dict[str, Any]]:
+        """Разобрать пачку (message, history); порядок результатов — как у items"""
+        items = list(items)
+        if not self.workers:
+            self._messages.inc(len(items))
+            return parse_batch(items)
+        chunks = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        results = await asyncio.gather(*(self._run_batch(chunk) for chunk in chunks))
+        return [parsed for chunk in results for parsed in chunk]
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), self.batch_size):
+            asyncio.ensure_future(self._resolve(pending[i:i + self.batch_size]))
+
+    async def _resolve(self, pending: List[Tuple[Item, asyncio.Future]]):
+        try:
+            results = await self._run_batch([item for item, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), parsed in zip(pending, results):
+            if not future.done():
+                future.set_result(parsed)
+
+    async def _run_batch(self, items: List[Item]) -> List[Dict[str, Any]]:
+        from concurrent.futures.process import BrokenProcessPool
+
+        self.start()
+        loop = asyncio.get_running_loop()
+        self._inflight += len(items)
+        try:
+            with self._batch_time.time():
+                try:
+                    results = await loop.run_in_executor(self._executor, parse_batch, items)
+                except BrokenProcessPool as e:
+                    # Процесс пула упал (OOM и т.п.): пересоздаём пул, эту пачку разбираем здесь
+                    log.error(f"❌ Parsing process pool broken, restarting: {e}")
+                    self.shutdown(wait=False)
+                    results = parse_batch(items)
+        finally:
+            self._inflight -= len(items)
+        self._batches.inc()
+        self._messages.inc(len(items))
+        return results
@@ -0,0 +1,237 @@
+# prompt_builder.py
+"""
+Сборка промптов для LLM в пределах бюджета токенов.
+
+Раньше BOOKING_PROMPT получал всю историю (до 50 реплик) и весь каталог
+целиком, поэтому промпт, а с ним задержка и стоимость запроса к Groq,
+росли с каждым мастером и услугой. PromptBuilder заполняет те же
+шаблоны ({{history}}, {{api_data}}, {{message}}), но:
+
+    каталог  — только услуги и мастера, о которых идёт речь (Lexicon находит
+               их в сообщении и недавних репликах): мастер со своими услугами,
+               услуга с мастерами, которые её делают. Если ничего не найдено,
+               весь каталог, обрезанный по бюджету
+    история  — последние recent_turns реплик дословно, более ранние сжаты
+               в одну строку с тем, что из них важно для записи: услуга,
+               мастер, дата и время
+
+build_messages() раскладывает промпт на два сообщения: system —
+неизменная часть (инструкции и весь каталог), user — история и сообщение.
+Groq кэширует совпадающее начало промпта у разных запросов, поэтому
+system-сообщение собирается один раз на версию каталога и у всех
+пользователей салона совпадает до байта. Каталог, который не помещается
+в prefix_budget, в префикс не идёт: в user-сообщение попадает только
+нужная его часть, как в build().
+
+Токены оцениваются по длине текста (estimate_tokens), без токенизатора.
+Оценка каждого промпта пишется в метрику llm.prompt_tokens_estimated,
+а из ответа Groq — llm.prompt_tokens, llm.cached_prompt_tokens (сколько
+взято из кэша префиксов) и llm.prompt_seconds (время обработки промпта).
+"""
+import math
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import metrics
+from booking_parser import DATE_REGEXES, TIME_REGEXES
+from catalog import Catalog
+
+log = logging.getLogger()
+
+DEFAULT_BUDGET = 1500
+DEFAULT_PREFIX_BUDGET = 4000
+MAX_PREFIXES = 64
+DEFAULT_RECENT_TURNS = 4
+CHARS_PER_TOKEN = 3  # русский текст в BPE-токенизаторах Llama/GPT — около 3 символов на токен
+MAX_TURN_CHARS = 600
+CATALOG_SHARE = 0.6  # доля свободного бюджета, которую может занять каталог
+TRUNCATED = "… (список сокращён — уточните услугу или мастера)\n"
+CATALOG_IN_MESSAGE = "(данные о нужных услугах и мастерах — в сообщении пользователя)"
+
+_estimated = metrics.histogram("llm.prompt_tokens_estimated")
+_actual = metrics.histogram("llm.prompt_tokens")
+_cached = metrics.histogram("llm.cached_prompt_tokens")
+_prompt_time = metrics.histogram("llm.prompt_seconds")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def record_usage(response: Dict) -> Optional[int]:
+    """Фактические prompt_tokens из ответа OpenAI-совместимого API (Groq)"""
+    usage = response.get("usage") or {}
+    tokens = usage.get("prompt_tokens")
+    if tokens is not None:
+        _actual.observe(tokens)
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if cached is not None:
+        _cached.observe(cached)
+    if usage.get("prompt_time") is not None:  # поле Groq
+        _prompt_time.observe(usage["prompt_time"])
+    return tokens
+
+
+def truncate(text: str, max_tokens: int, marker: str = TRUNCATED) -> str:
+    """Целые строки текста, пока они помещаются в max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens * CHARS_PER_TOKEN - len(marker)
+    lines, used = [], 0
+    for line in text.splitlines(keepends=True):
+        if used + len(line) > budget:
+            break
+        lines.append(line)
+        used += len(line)
+    return "".join(lines) + marker
+
+
+class BuiltPrompt(NamedTuple):
+    text: str
+    tokens: int
+    sections: Dict[str, int]  # оценка токенов по частям: catalog, history, summarized (реплик сжато)
+
+
+class BuiltMessages(NamedTuple):
+    messages: List[Dict[str, str]]  # [system, user] для chat completions
+    tokens: int
+    sections: Dict[str, int]  # то же, что у BuiltPrompt, и prefix — токены system-сообщения
+
+
+class PromptBuilder:
+    def __init__(self, budget: int = DEFAULT_BUDGET, recent_turns: int = DEFAULT_RECENT_TURNS,
+                 prefix_budget: int = DEFAULT_PREFIX_BUDGET):
+        self.budget = budget
+        self.recent_turns = recent_turns
+        self.prefix_budget = prefix_budget
+        self._prefixes: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- каталог ---
+    @staticmethod
+    def _mentioned(find, texts: Sequence[str]) -> Optional[Dict]:
+        return next((found for text in texts for found in [find(text)] if found), None)
+
+    def catalog_block(self, catalog: Catalog, lexicon, texts: Sequence[str], max_tokens: int) -> str:
+        """Блок каталога только с тем, о чём идёт речь (texts — от нового к старому), не длиннее max_tokens"""
+        if not catalog:
+            return "Данные недоступны"
+        service = self._mentioned(lexicon.find_service, texts) if lexicon is not None else None
+        master = self._mentioned(lexicon.find_master, texts) if lexicon is not None else None
+        if master is not None:
+            services = [service] if service else catalog.services_for_master(master.get("id"))
+            block = catalog.prompt_block_for(services, [master])
+        elif service is not None:
+            masters = [m for m in catalog.masters
+                       if any(s.get("id") == service.get("id") for s in catalog.services_for_master(m.get("id")))]
+            block = catalog.prompt_block_for([service], masters)
+        else:
+            block = catalog.prompt_block()
+        return truncate(block, max_tokens)
+
+    # --- история ---
+    @staticmethod
+    def summarize(turns: Sequence[Tuple[str, str]], lexicon=None) -> str:
+        """Одна строка о более ранних репликах: последние упомянутые услуга, мастер, дата и время"""
+        facts: Dict[str, str] = {}
+        for role, text in turns:
+            if role != "user":
+                continue
+            if lexicon is not None:
+                service, master = lexicon.find_service(text), lexicon.find_master(text)
+                if service:
+                    facts["услуга"] = service["title"]
+                if master:
+                    facts["мастер"] = master["name"]
+            lowered = text.lower()
+            for name, regexes in (("дата", DATE_REGEXES), ("время", TIME_REGEXES)):
+                match = next((m for _, regex in regexes for m in [regex.search(lowered)] if m), None)
+                if match:
+                    facts[name] = match.group(0)
+        summary = f"(ранее {len(turns)} сообщений"
+        if facts:
+            summary += ": " + "; ".join(f"{name} — {value}" for name, value in facts.items())
+        return summary + ")"
+
+    def history_block(self, turns: Sequence[Tuple[str, str]], lexicon, max_tokens: int) -> Tuple[str, int]:
+        """(история, сколько реплик сжато в сводку)"""
+        turns = list(turns)
+        lines = [f"{role}: {text[:MAX_TURN_CHARS]}" for role, text in turns]
+        keep = min(len(turns), self.recent_turns)
+        # Старые реплики уходят в сводку, пока история не поместится в бюджет
+        while True:
+            older = turns[:len(turns) - keep]
+            summary = [self.summarize(older, lexicon)] if older else []
+            history = "\n".join(summary + lines[len(turns) - keep:])
+            if keep == 0 or estimate_tokens(history) <= max_tokens:
+                return history, len(older)
+            keep -= 1
+
+    # --- промпт ---
+    def build(self, template: str, message: str, turns: Sequence[Tuple[str, str]] = (),
+              catalog: Optional[Catalog] = None, lexicon=None) -> BuiltPrompt:
+        """Шаблон с {{message}}, {{history}} и {{api_data}}; turns — реплики до message"""
+        prompt = self._fill(template, message, turns, catalog, lexicon)
+        _estimated.observe(prompt.tokens)
+        return prompt
+
+    def _fill(self, template: str, message: str, turns: Sequence[Tuple[str, str]],
+              catalog: Optional[Catalog], lexicon) -> BuiltPrompt:
+        message = message[:MAX_TURN_CHARS * 2]
+        fixed = (template.replace("{{history}}", "").replace("{{api_data}}", "")
+                 .replace("{{message}}", message))
+        free = max(0, self.budget - estimate_tokens(fixed))
+        sections = {"catalog": 0, "history": 0, "summarized": 0}
+
+        api_data = ""
+        if "{{api_data}}" in template:
+            texts = [message] + [text for role, text in reversed(list(turns)[-self.recent_turns:]) if role == "user"]
+            api_data = self.catalog_block(catalog or Catalog(), lexicon, texts, int(free * CATALOG_SHARE))
+            sections["catalog"] = estimate_tokens(api_data)
+        history = ""
+        if "{{history}}" in template and turns:
+            history, sections["summarized"] = self.history_block(turns, lexicon, free - sections["catalog"])
+            sections["history"] = estimate_tokens(history)
+
+        text = (template.replace("{{history}}", history).replace("{{api_data}}", api_data)
+                .replace("{{message}}", message))
+        return BuiltPrompt(text, estimate_tokens(text), sections)
+
+    # --- префикс для кэша провайдера ---
+    def static_prefix(self, template: str, catalog: Optional[Catalog]) -> Optional[str]:
+        """System-сообщение со всем каталогом: одна и та же строка на версию каталога;
+        None, если каталог не помещается в prefix_budget"""
+        if "{{api_data}}" not in template:
+            return template
+        catalog = catalog or Catalog()
+        key = (template, catalog.version)
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                return prefix or None
+        block = catalog.prompt_block() if catalog else "Данные недоступны"
+        prefix = template.replace("{{api_data}}", block) if estimate_tokens(block) <= self.prefix_budget else ""
+        with self._lock:
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > MAX_PREFIXES:
+                self._prefixes.popitem(last=False)
+        return prefix or None
+
+    def build_messages(self, system: str, user: str, message: str, turns: Sequence[Tuple[str, str]] = (),
+                       catalog: Optional[Catalog] = None, lexicon=None) -> BuiltMessages:
+        """system — неизменные инструкции и {{api_data}}, user — {{history}}, {{message}} и
+        {{api_data}} для каталога, который не поместился в префикс"""
+        prefix = self.static_prefix(system, catalog)
+        if prefix is None:
+            prefix = system.replace("{{api_data}}", CATALOG_IN_MESSAGE)
+            suffix = self._fill(user, message, turns, catalog, lexicon)
+        else:
+            suffix = self._fill(user.replace("{{api_data}}", ""), message, turns, None, lexicon)
+        sections = dict(suffix.sections, prefix=estimate_tokens(prefix))
+        tokens = sections["prefix"] + suffix.tokens
+        _estimated.observe(tokens)
+        messages = [{"role": "system", "content": prefix}, {"role": "user", "content": suffix.text}]
+        return BuiltMessages(messages, tokens, sections)
@@ -0,0 +1,142 @@
+# record_writes.py
+"""
+Записи в YClients, которые выполняет outbox (outbox.py).
+
+    create_record — найти или создать клиента по телефону и создать запись;
+        в комментарий записи добавляется метка ключа идемпотентности, по ней
+        find_created_record() после таймаута находит запись, созданную
+        прошлой попыткой, вместо того чтобы создать вторую
+    delete_record — удалить запись; 404 значит, что её уже нет
+    update_record — изменить запись (PUT с тем же телом можно повторять)
+
+Результат каждой записи — record_id и client_id: по client_id
+client_records.py сбрасывает кэш «Мои записи» клиента.
+
+payload — всё, что нужно для записи, плюс поля для подтверждения
+пользователю (service_title, master_name). Ключ записи — booking_key():
+один и тот же чат, услуга, мастер и время дают один ключ, поэтому
+повторное «записаться» не создаёт вторую запись.
+"""
+import hashlib
+import logging
+from typing import Any, Dict, Hashable, Optional
+
+from outbox import Outbox, OutboxEntry
+from yclients_client import YClientsError
+
+log = logging.getLogger()
+
+CREATE_RECORD = "create_record"
+DELETE_RECORD = "delete_record"
+UPDATE_RECORD = "update_record"
+
+
+def booking_key(channel: str, chat_id: Hashable, service_id: Any, staff_id: Any, date_time: str) -> str:
+    content = "\0".join(str(part) for part in (CREATE_RECORD, channel, chat_id, service_id, staff_id, date_time))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:24]
+
+
+def write_key(kind: str, company_id: Any, record_id: Any, *extra: Any) -> str:
+    content = "\0".join(str(part) for part in (kind, company_id, record_id, *extra))
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()[:24]
+
+
+def marker(key: str) -> str:
+    """Метка в комментарии записи: по ней запись находится после неоднозначного исхода"""
+    return f"[bot:{key[:12]}]"
+
+
+def booking_payload(company_id: int, service: Dict, master: Dict, date_time: str, *,
+                    client_name: str = "", client_phone: str = "", comment: str = "",
+                    seance_length: Optional[int] = None, **extra: Any) -> Dict[str, Any]:
+    return dict(
+        extra,
+        company_id=company_id,
+        service_id=service["id"],
+        service_title=service.get("title", ""),
+        service_cost=service.get("price_min", 0),
+        service_length=service.get("length", 60),
+        staff_id=master["id"],
+        master_name=master.get("name", ""),
+        master_specialization=master.get("specialization", ""),
+        datetime=date_time,
+        client_name=client_name,
+        client_phone=client_phone,
+        comment=comment,
+        seance_length=seance_length,
+    )
+
+
+def _client_id(client, company_id: int, name: str, phone: str) -> Optional[int]:
+    """Клиент YClients по телефону; если его нет — создать"""
+    try:
+        found = client.find_client_by_phone(company_id, phone)
+        if found.get("data"):
+            client_id = found["data"][0]["id"]
+            log.info(f"✅ Found existing client ID: {client_id}")
+            return client_id
+    except Exception as e:
+        log.error(f"❌ Error searching for client: {e}")
+    try:
+        created = client.create_client(company_id, name=name or "Клиент", phone=phone, email="",
+                                       comment="Создан через бота")
+        log.info(f"✅ Created new client ID: {created['data']['id']}")
+        return created["data"]["id"]
+    except Exception as e:
+        log.error(f"❌ Error creating client: {e}")
+        return None
+
+
+def create_record(client, entry: OutboxEntry) -> Dict[str, Any]:
+    p = entry.payload
+    client_id = _client_id(client, p["company_id"], p["client_name"], p["client_phone"]) if p["client_phone"] else None
+    record = client.create_record(
+        p["company_id"],
+        service_id=p["service_id"],
+        staff_id=p["staff_id"],
+        date_time=p["datetime"],
+        client_id=client_id,
+        client=None if client_id else {"name": p["client_name"] or "Клиент", "phone": p["client_phone"]},
+        comment=f"{p['comment']} {marker(entry.key)}".strip(),
+        seance_length=p.get("seance_length"),
+    )
+    log.info(f"✅ Record created: {record}")
+    data = record["data"]
+    return {"record_id": data["id"], "client_id": client_id or (data.get("client") or {}).get("id")}
+
+
+def find_created_record(client, entry: OutboxEntry) -> Optional[Dict[str, Any]]:
+    """Запись, созданная прошлой попыткой (по метке в комментарии), или None"""
+    p = entry.payload
+    day = p["datetime"].split()[0]
+    records = client.company_records(p["company_id"], staff_id=p["staff_id"], start_date=day, end_date=day)
+    tag = marker(entry.key)
+    for record in records.get("data") or []:
+        if tag in (record.get("comment") or ""):
+            return {"record_id": record["id"], "client_id": (record.get("client") or {}).get("id")}
+    return None
+
+
+def delete_record(client, entry: OutboxEntry) -> Dict[str, Any]:
+    p = entry.payload
+    try:
+        client.delete_record(p["company_id"], p["record_id"])
+    except YClientsError as e:
+        if e.status != 404:
+            raise
+        log.info(f"ℹ️ Record {p['record_id']} is already gone")
+    return {"record_id": p["record_id"], "client_id": p.get("client_id")}
+
+
+def update_record(client, entry: OutboxEntry) -> Dict[str, Any]:
+    p = entry.payload
+    client.update_record(p["company_id"], p["record_id"], **p["changes"])
+    return {"record_id": p["record_id"], "client_id": p.get("client_id")}
+
+
+def register(outbox: Outbox, client):
+    """Обработчики записей YClients; client — клиент салона текущей строки (tenants.client)"""
+    outbox.register(CREATE_RECORD, lambda entry: create_record(client, entry),
+                    lambda entry: find_created_record(client, entry))
+    outbox.register(DELETE_RECORD, lambda entry: delete_record(client, entry))
+    outbox.register(UPDATE_RECORD, lambda entry: update_record(client, entry))
@@ -0,0 +1,324 @@
+# reminders.py
+"""
+Напоминания клиентам о записях (за REMINDER_OFFSETS до визита, по
+умолчанию за 24 и за 2 часа).
+
+Напоминания хранятся в SQLite-таблице reminders (переживают перезапуск, в
+общей базе — у всех реплик), а в памяти — куча (heapq) по времени
+отправки: поток планировщика спит до ближайшего напоминания, а не
+перебирает все записи по расписанию.
+
+Откуда берутся напоминания:
+    on_write(entry) — слушатель outbox: созданная ботом запись ставит
+        напоминания в чат, откуда записались; отмена их снимает, перенос
+        (update_record с datetime) — переставляет
+    schedule_records() — записи клиента из YClients (client_records.py),
+        например сделанные по телефону: «Мои записи» ставят и их
+
+Отправка — через channels.send_threadsafe() канала записи, не быстрее
+rate в секунду (RateBudget из tenants.py) и не больше batch_size за один
+проход. Перед отправкой строка переводится в sent условным UPDATE —
+одно напоминание отправит только одна реплика. Процесс забирает только
+напоминания каналов, которые в нём запущены (served, по умолчанию
+channels.has_sender): при раздельных процессах ботов (multi_bot.py) над
+общей базой напоминание в WhatsApp отправит процесс WhatsApp. Пропущенное больше чем на
+grace секунд (бот был выключен) не отправляется: за ним придёт следующее.
+Время записи без часового пояса (так его пишут бот и YClients) считается
+в часовом поясе салона tz (SALON_TZ), а не процесса: в Docker и на
+Railway процесс живёт в UTC.
+
+Метрики: reminders.sent, reminders.failed, reminders.expired,
+reminders.scheduled (gauge), reminders.lag_seconds — опоздание отправки.
+"""
+import json
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+from datetime import datetime, tzinfo
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import channels
+import metrics
+import record_writes
+from outbox import DONE, OutboxEntry
+from tenants import RateBudget
+
+log = logging.getLogger()
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+EXPIRED = "expired"
+
+DEFAULT_OFFSETS = (24 * 3600, 2 * 3600)
+DEFAULT_GRACE = 3600.0
+DEFAULT_RATE = 1.0  # сообщений в секунду
+DEFAULT_BURST = 10
+DEFAULT_BATCH_SIZE = 50
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60.0
+RELOAD_INTERVAL = 60.0  # секунд; напоминания, поставленные другими репликами
+BUSY_TIMEOUT_MS = 10000
+
+
+def parse_offsets(spec: str) -> Tuple[int, ...]:
+    """"24h,2h,30m" -> (86400, 7200, 1800)"""
+    units = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+    offsets = []
+    for part in spec.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        unit = units.get(part[-1])
+        offsets.append(int(float(part[:-1]) * unit) if unit else int(part))
+    return tuple(sorted(set(offsets), reverse=True))
+
+
+def timestamp(value: Any, tz: tzinfo) -> Optional[float]:
+    """"2030-01-02 14:00" (время салона tz) или ISO-время YClients ("2030-01-02T14:00:00+03:00") -> unix time"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        when = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=tz)
+    return when.timestamp()
+
+
+def reminder_text(details: Dict[str, Any], tz: tzinfo) -> str:
+    when = datetime.fromtimestamp(details["at"], tz)
+    text = f"⏰ Напоминаем о записи {when:%d.%m} в {when:%H:%M}"
+    if details.get("service"):
+        text += f": {details['service']}"
+    if details.get("master"):
+        text += f", мастер {details['master']}"
+    return text + ".\nЖдём вас! Если планы изменились, запись можно отменить в меню «Мои записи»."
+
+
+class ReminderScheduler:
+    def __init__(self, path: str, *, tz: tzinfo, offsets: Iterable[int] = DEFAULT_OFFSETS, grace: float = DEFAULT_GRACE,
+                 rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, batch_size: int = DEFAULT_BATCH_SIZE,
+                 send: Callable[[str, Any, str], Any] = channels.send_threadsafe,
+                 served: Callable[[str], bool] = channels.has_sender,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.tz = tz
+        self.offsets = tuple(offsets)
+        self.grace = grace
+        self.batch_size = batch_size
+        self.send = send
+        self.served = served
+        self.clock = clock
+        self.budget = RateBudget(rate, burst, name="reminders")
+        self._heap: List[Tuple[float, int]] = []  # (fire_at, id); устаревшие пары отсеивает _claim
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS reminders ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, record_id TEXT NOT NULL, lead_time INTEGER NOT NULL,"
+            " fire_at REAL NOT NULL, channel TEXT NOT NULL, chat_id TEXT NOT NULL, details TEXT NOT NULL,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL,"
+            " UNIQUE (record_id, lead_time))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS reminders_due ON reminders (status, fire_at)")
+        self._sent = metrics.counter("reminders.sent")
+        self._failed = metrics.counter("reminders.failed")
+        self._expired = metrics.counter("reminders.expired")
+        self._lag = metrics.histogram("reminders.lag_seconds")
+        metrics.gauge("reminders.scheduled", self.scheduled)
+        self.reload()
+
+    # --- расписание ---
+    def reload(self):
+        """Куча из несделанных напоминаний базы (при запуске и для напоминаний других реплик)"""
+        with self._lock:
+            rows = self._db.execute("SELECT fire_at, id FROM reminders WHERE status = ?", (PENDING,)).fetchall()
+            self._heap = [(fire_at, id_) for fire_at, id_ in rows]
+            heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def schedule(self, record_id: Any, channel: str, chat_id: Hashable, at: float,
+                 service: str = "", master: str = "") -> int:
+        """Напоминания о записи record_id в момент at (unix time); сколько поставлено.
+        Повтор с тем же временем ничего не меняет, отправленные не ставятся заново"""
+        now = self.clock()
+        details = json.dumps({"at": at, "service": service, "master": master}, ensure_ascii=False)
+        chat = json.dumps(chat_id, ensure_ascii=False)
+        scheduled = 0
+        with self._lock:
+            for offset in self.offsets:
+                fire_at = at - offset
+                if fire_at + self.grace <= now:
+                    continue
+                cursor = self._db.execute(
+                    "INSERT INTO reminders (record_id, lead_time, fire_at, channel, chat_id, details, status, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (record_id, lead_time) DO UPDATE SET fire_at = excluded.fire_at,"
+                    " channel = excluded.channel, chat_id = excluded.chat_id, details = excluded.details,"
+                    " updated_at = excluded.updated_at"
+                    " WHERE reminders.status = ? AND reminders.details != excluded.details",
+                    (str(record_id), offset, fire_at, channel, chat, details, PENDING, now, PENDING))
+                if cursor.rowcount:
+                    row = self._db.execute("SELECT id FROM reminders WHERE record_id = ? AND lead_time = ?",
+                                           (str(record_id), offset)).fetchone()
+                    heapq.heappush(self._heap, (fire_at, row[0]))
+                    scheduled += 1
+        if scheduled:
+            log.info(f"⏰ Scheduled {scheduled} reminder(s) for record {record_id}")
+            self._wakeup.set()
+        return scheduled
+
+    def cancel(self, record_id: Any) -> int:
+        """Снять напоминания о записи (и забыть отправленные — после переноса они понадобятся снова)"""
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM reminders WHERE record_id = ?", (str(record_id),))
+        return cursor.rowcount
+
+    def scheduled(self) -> int:
+        try:
+            with self._lock:
+                return self._db.execute("SELECT COUNT(*) FROM reminders WHERE status = ?",
+                                        (PENDING,)).fetchone()[0]
+        except sqlite3.Error:  # база уже закрыта — метрике это не повод падать
+            return 0
+
+    def schedule_records(self, channel: str, chat_id: Hashable, records: Iterable[Dict[str, Any]]) -> int:
+        """Напоминания о записях клиента в формате YClients (client_records.py)"""
+        scheduled = 0
+        for record in records:
+            at = timestamp(record.get("datetime"), self.tz)
+            if at is None or record.get("id") is None:
+                continue
+            services = record.get("services") or [{}]
+            scheduled += self.schedule(record["id"], channel, chat_id, at, services[0].get("title", ""),
+                                       (record.get("staff") or {}).get("name", ""))
+        return scheduled
+
+    def on_write(self, entry: OutboxEntry):
+        """Слушатель outbox: запись создана, отменена или перенесена"""
+        if entry.status != DONE or entry.channel is None:
+            return
+        p = entry.payload
+        if entry.kind == record_writes.CREATE_RECORD:
+            at = timestamp(p["datetime"], self.tz)
+            if at is not None:
+                self.schedule(entry.result["record_id"], entry.channel, entry.chat_id, at,
+                              p.get("service_title", ""), p.get("master_name", ""))
+        elif entry.kind == record_writes.DELETE_RECORD:
+            self.cancel(p["record_id"])
+        elif entry.kind == record_writes.UPDATE_RECORD:
+            at = timestamp(p["changes"].get("datetime"), self.tz)
+            if at is not None:
+                self.cancel(p["record_id"])
+                self.schedule(p["record_id"], entry.channel, entry.chat_id, at,
+                              p.get("service_title", ""), p.get("master_name", ""))
+
+    # --- отправка ---
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _claim(self, id_: int, fire_at: float, now: float) -> Optional[Tuple]:
+        """Забрать напоминание, если оно всё ещё ждёт отправки в это время"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT channel, chat_id, details, attempts FROM reminders"
+                " WHERE id = ? AND status = ? AND fire_at = ?", (id_, PENDING, fire_at)).fetchone()
+            if row is None:  # отменено, перенесено или уже отправлено другой репликой
+                return None
+            if not self.served(row[0]):  # канал другого процесса: строку заберёт он
+                return None
+            status = EXPIRED if now - fire_at > self.grace else SENT
+            cursor = self._db.execute(
+                "UPDATE reminders SET status = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE id = ? AND status = ? AND fire_at = ?", (status, now, id_, PENDING, fire_at))
+            if not cursor.rowcount:
+                return None
+        if status == EXPIRED:
+            self._expired.inc()
+            log.info(f"⏰ Reminder {id_} is {now - fire_at:.0f}s late, skipped")
+            return None
+        return row
+
+    def _retry_or_fail(self, id_: int, attempts: int, error: Exception):
+        now = self.clock()
+        with self._lock:
+            if attempts + 1 >= MAX_ATTEMPTS:
+                self._db.execute("UPDATE reminders SET status = ?, updated_at = ? WHERE id = ?", (FAILED, now, id_))
+                self._failed.inc()
+                log.error(f"❌ Reminder {id_} failed: {error}")
+                return
+            fire_at = now + RETRY_DELAY
+            self._db.execute("UPDATE reminders SET status = ?, fire_at = ?, updated_at = ? WHERE id = ?",
+                             (PENDING, fire_at, now, id_))
+            heapq.heappush(self._heap, (fire_at, id_))
+        log.warning(f"⚠️ Reminder {id_} not sent ({error}), retry in {RETRY_DELAY:.0f}s")
+
+    def run_once(self) -> int:
+        """Отправить наступившие напоминания (не больше batch_size); сколько отправлено"""
+        now = self.clock()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap))
+        sent = 0
+        for fire_at, id_ in due:
+            claimed = self._claim(id_, fire_at, now)
+            if claimed is None:
+                continue
+            channel, chat_id, details, attempts = claimed
+            self.budget.acquire()
+            try:
+                self.send(channel, json.loads(chat_id), reminder_text(json.loads(details), self.tz))
+            except Exception as e:
+                self._retry_or_fail(id_, attempts, e)
+                continue
+            self._sent.inc()
+            self._lag.observe(max(0.0, self.clock() - fire_at))
+            sent += 1
+        return sent
+
+    def _work(self):
+        reload_at = time.monotonic() + RELOAD_INTERVAL
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() >= reload_at:
+                    reload_at = time.monotonic() + RELOAD_INTERVAL
+                    self.reload()
+                self.run_once()
+            except Exception as e:
+                log.error(f"❌ Reminder scheduler error: {e}")
+            next_due = self.next_due()
+            timeout = RELOAD_INTERVAL if next_due is None else min(RELOAD_INTERVAL, max(0.0, next_due - self.clock()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._work, name="Reminders", daemon=True)
+        self._thread.start()
+        log.info(f"⏰ Reminders started: offsets {self.offsets}, {self.path}")
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,101 @@
+# render_cache.py
+"""
+Кэш готовых к отправке страниц меню (текст + клавиатура).
+
+Ключ — (catalog_version, view, page_offset): при смене каталога старые
+страницы просто перестают совпадать по версии и удаляются, а после каждой
+загрузки каталога все страницы отрисовываются заранее (prewarm), так что
+клики «Вперед ➡️» / «⬅️ Назад» обслуживаются из памяти. Каталоги разных
+салонов (tenants.py) живут в кэше одновременно: новая версия вытесняет
+только страницы прошлой версии того же салона.
+
+page_offset приходит из callback_data клиента, поэтому приводится к
+ближайшей существующей странице представления, а сверх capacity страниц
+вытесняются давно не читанные (LRU) — в том числе страницы старой версии,
+дорисованные запоздавшим запросом уже после drop_version.
+"""
+import bisect
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+import metrics
+
+log = logging.getLogger()
+
+# renderer(catalog, page_offset) -> (text, reply_markup)
+Renderer = Callable[[Any, int], Tuple[str, Any]]
+# pages(catalog) -> смещения страниц, которые стоит отрисовать заранее
+Pages = Callable[[Any], Iterable[int]]
+
+DEFAULT_CAPACITY = 1000
+
+
+class RenderCache:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._views: Dict[str, Tuple[Renderer, Pages]] = {}
+        self._pages: "OrderedDict[Tuple[str, str, int], Tuple[str, Any]]" = OrderedDict()
+        self._versions: Dict[Any, str] = {}  # company_id -> последняя версия каталога
+        self._lock = threading.Lock()
+        self._hits = metrics.counter("render_cache.hits")
+        self._misses = metrics.counter("render_cache.misses")
+        metrics.gauge("render_cache.pages", lambda: len(self._pages))
+
+    def register(self, view: str, renderer: Renderer, pages: Pages = lambda catalog: (0,)):
+        self._views[view] = (renderer, pages)
+
+    def page_offset(self, catalog, view: str, page_offset: int) -> int:
+        """Существующая страница представления: ближайшая не дальше page_offset, иначе первая"""
+        offsets = sorted(self._views[view][1](catalog)) or [0]
+        index = bisect.bisect_right(offsets, page_offset)
+        return offsets[index - 1] if index else offsets[0]
+
+    def get(self, catalog, view: str, page_offset: int = 0) -> Tuple[str, Any]:
+        key = (catalog.version, view, self.page_offset(catalog, view, page_offset))
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+        if page is not None:
+            self._hits.inc()
+            return page
+        self._misses.inc()
+        renderer, _ = self._views[view]
+        page = renderer(catalog, key[2])
+        with self._lock:
+            self._pages[key] = page
+            while len(self._pages) > self.capacity:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate(self, keep_version: str = None):
+        """Удалить страницы всех версий каталога, кроме keep_version"""
+        with self._lock:
+            self._pages = OrderedDict((key, page) for key, page in self._pages.items() if key[0] == keep_version)
+
+    def drop_version(self, version: str):
+        """Удалить страницы одной версии каталога"""
+        with self._lock:
+            self._pages = OrderedDict((key, page) for key, page in self._pages.items() if key[0] != version)
+
+    def prewarm(self, catalog):
+        """Отрисовать все страницы всех представлений для нового каталога"""
+        with self._lock:
+            previous = self._versions.get(catalog.company_id)
+            self._versions[catalog.company_id] = catalog.version
+        if previous and previous != catalog.version:
+            self.drop_version(previous)
+        count = 0
+        for view, (renderer, pages) in self._views.items():
+            for page_offset in pages(catalog):
+                try:
+                    self.get(catalog, view, page_offset)
+                    count += 1
+                except Exception as e:
+                    log.error(f"❌ Error prerendering {view}[{page_offset}]: {e}")
+        log.info(f"🖼 Prerendered {count} menu pages for catalog {catalog.version}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"pages": len(self._pages), "hits": self._hits.value, "misses": self._misses.value}
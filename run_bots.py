@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 """
-Skrypt do uruchamiania botów Telegram i WhatsApp równolegle
+Skrypt do uruchamiania botów Telegram i WhatsApp w jednym procesie
+
+Wszystkie kanały (channels.py) działają w jednej pętli asyncio i dzielą
+jeden pool wątków, jednego klienta YClients, sesję HTTP do Groq, cache
+katalogu i magazyn sesji użytkowników (shared.py).
 """
 import os
 import sys
-import time
-import threading
+import signal
 import logging
 import asyncio
+from typing import List
 from dotenv import load_dotenv
 
+import metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -20,84 +26,87 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
-def run_telegram_bot():
-    """Run Telegram bot in separate thread"""
-    try:
-        log.info("🚀 Starting Telegram Bot...")
-        from app import main as telegram_main
-        telegram_main()
-    except Exception as e:
-        log.error(f"❌ Telegram Bot error: {e}")
+def whatsapp_enabled() -> bool:
+    """WhatsApp needs Green API credentials unless it runs through the local bridge"""
+    if os.getenv("WHATSAPP_TRANSPORT", "green_api").lower() == "bridge":
+        return True
+    return bool(os.getenv("GREEN_API_ID") and os.getenv("GREEN_API_TOKEN"))
+
+def build_channels() -> List:
+    """Import the bots and collect their channels"""
+    from app import build_channel as telegram_channel
+    channels = [telegram_channel()]
+    if whatsapp_enabled():
+        from whatsapp_bot import build_channel as whatsapp_channel
+        channels.append(whatsapp_channel())
+    else:
+        log.info("ℹ️ WhatsApp bot skipped due to missing credentials")
+    return channels
+
+async def run_channels(channels: List, stop_event: asyncio.Event) -> bool:
+    """Run all channels until stop_event; returns False if a channel stopped on its own"""
+    tasks = {asyncio.create_task(channel.run(stop_event), name=channel.name): channel for channel in channels}
+    log.info(f"✅ Channels started: {', '.join(channel.name for channel in channels)}")
+    stop_task = asyncio.create_task(stop_event.wait())
+    done, _ = await asyncio.wait([stop_task, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    clean = stop_task in done
+    for task in done:
+        if task is not stop_task:
+            error = task.exception()
+            log.error(f"❌ {tasks[task].name} channel stopped: {error or 'exited'}")
+    # Один канал упал — останавливаем остальные, чтобы процесс перезапустили целиком
+    stop_event.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for task, result in zip(tasks, results):
+        if isinstance(result, Exception) and task not in done:
+            log.error(f"❌ {tasks[task].name} channel failed while stopping: {result}")
+    return clean
 
-def run_whatsapp_bot():
-    """Run WhatsApp bot in separate thread"""
-    try:
-        log.info("🚀 Starting WhatsApp Bot...")
-        from whatsapp_bot import main as whatsapp_main
-        whatsapp_main()
-    except Exception as e:
-        log.error(f"❌ WhatsApp Bot error: {e}")
+async def run_all() -> bool:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+    channels = build_channels()
+    # Prewarm (catalog, parser, HTTP pools) before any channel takes updates
+    import startup
+    if startup.enabled():
+        await asyncio.to_thread(startup.prewarm)
+    return await run_channels(channels, stop_event)
 
 def main():
     """Start both bots"""
     log.info("🎯 Starting Multi-Platform Bot System...")
-    
+
     # Check environment variables
     required_vars = [
         "TELEGRAM_BOT_TOKEN",
-        "YCLIENTS_PARTNER_TOKEN", 
+        "YCLIENTS_PARTNER_TOKEN",
         "YCLIENTS_USER_TOKEN",
         "GROQ_API_KEY"
     ]
-    
-    optional_vars = [
-        "GREEN_API_ID",
-        "GREEN_API_TOKEN"
-    ]
-    
+
     missing_required = [var for var in required_vars if not os.getenv(var)]
     if missing_required:
         log.error(f"❌ Missing required environment variables: {missing_required}")
         sys.exit(1)
-    
-    missing_optional = [var for var in optional_vars if not os.getenv(var)]
-    if missing_optional:
-        log.warning(f"⚠️ Missing optional environment variables: {missing_optional}")
+
+    if not whatsapp_enabled():
+        log.warning("⚠️ Missing optional environment variables: ['GREEN_API_ID', 'GREEN_API_TOKEN']")
         log.warning("⚠️ WhatsApp bot will not start")
-    
-    # Start Telegram bot
-    telegram_thread = threading.Thread(target=run_telegram_bot, name="TelegramBot")
-    telegram_thread.daemon = True
-    telegram_thread.start()
-    
-    # Start WhatsApp bot if credentials are available
-    whatsapp_thread = None
-    if not missing_optional:
-        whatsapp_thread = threading.Thread(target=run_whatsapp_bot, name="WhatsAppBot")
-        whatsapp_thread.daemon = True
-        whatsapp_thread.start()
-        log.info("✅ Both bots started successfully!")
-    else:
-        log.info("✅ Telegram bot started successfully!")
-        log.info("ℹ️ WhatsApp bot skipped due to missing credentials")
-    
-    try:
-        # Keep main thread alive
-        while True:
-            time.sleep(1)
-            
-            # Check if threads are still alive
-            if not telegram_thread.is_alive():
-                log.error("❌ Telegram bot thread died!")
-                break
-                
-            if whatsapp_thread and not whatsapp_thread.is_alive():
-                log.error("❌ WhatsApp bot thread died!")
-                break
-                
-    except KeyboardInterrupt:
-        log.info("🛑 Shutting down bots...")
+
+    interval = int(os.getenv("METRICS_LOG_INTERVAL", "60"))
+    if interval > 0:
+        metrics.start_reporter(interval)
+
+    clean = asyncio.run(run_all())
+    if clean:
         log.info("✅ Bots stopped successfully!")
+    else:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+# sessions.py
+"""
+Хранилище состояния пользователей всех каналов: история диалога для LLM,
+телефон, записи и данные авторизации.
+
+Ключ — идентификатор пользователя в канале: у Telegram это int (user.id),
+у WhatsApp строка вида "79001234567@c.us", поэтому каналы не пересекаются
+и могут жить в одном хранилище.
+
+Обращаться к состоянию лучше через методы (add_memory, add_record, ...):
+у общего для нескольких реплик SqliteSessionStore (state_store.py) тот же
+интерфейс, но изменения вложенных списков на месте там не сохраняются.
+"""
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Hashable, List, Tuple
+
+DEFAULT_MEMORY_TURNS = 6
+
+
+class SessionStore:
+    def __init__(self, memory_turns: int = DEFAULT_MEMORY_TURNS):
+        self.memory_turns = memory_turns
+        self.memory: Dict[Hashable, Deque[Tuple[str, str]]] = defaultdict(
+            lambda: deque(maxlen=memory_turns * 2))
+        self.records: Dict[Hashable, List[Dict[str, Any]]] = defaultdict(list)
+        self.auth: Dict[Hashable, Dict[str, Any]] = defaultdict(dict)
+        self.phones: Dict[Hashable, str] = {}
+
+    def add_memory(self, user_id: Hashable, role: str, text: str):
+        self.memory[user_id].append((role, text))
+
+    def messages(self, user_id: Hashable) -> List[Tuple[str, str]]:
+        return list(self.memory.get(user_id, ()))
+
+    def history(self, user_id: Hashable) -> str:
+        return "\n".join(f"{role}: {text}" for role, text in self.messages(user_id))
+
+    def get_records(self, user_id: Hashable) -> List[Dict[str, Any]]:
+        return self.records.get(user_id, [])
+
+    def add_record(self, user_id: Hashable, record: Dict[str, Any]):
+        self.records[user_id].append(record)
+
+    def remove_record(self, user_id: Hashable, record_id: Any):
+        self.records[user_id] = [r for r in self.records[user_id] if r.get("id") != record_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": len(self.memory), "with_records": len(self.records), "phones": len(self.phones)}
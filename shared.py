@@ -0,0 +1,214 @@
+# shared.py
+"""
+Общие ресурсы процесса.
+
+Когда Telegram и WhatsApp работают в одном процессе (run_bots.py), оба
+получают отсюда одни и те же экземпляры: пул потоков для блокирующего I/O,
+клиент YClients с его пулом соединений, HTTP-сессию для Groq, салоны с их
+кэшами каталога (tenants.py) и хранилище сессий пользователей. Ресурс
+создаётся при первом обращении из переменных окружения.
+
+STATE_DB — путь к SQLite-базе общего состояния. Если задан, сессии
+пользователей и каталог хранятся в ней и видны всем репликам
+(см. coordinator.py); иначе всё живёт в памяти процесса.
+
+OUTBOX_DB — база очереди записей в YClients (outbox.py); по умолчанию та же,
+что STATE_DB, без него — outbox.db рядом с процессом.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from blocking_pool import BlockingPool
+from llm_cache import ResponseCache
+from model_router import LARGE, SMALL, ModelRouter, Tier
+from parsing_service import ParsingService
+from prompt_builder import PromptBuilder
+from sessions import SessionStore
+from tenants import CurrentCatalog, TenantRegistry, parse_routes
+from yclients_client import YClientsClient
+
+if TYPE_CHECKING:
+    from client_records import ClientRecords
+    from outbox import Outbox
+    from reminders import ReminderScheduler
+    from state_store import SqliteSessionStore, StateStore
+
+_instances: Dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def _once(name: str, factory: Callable[[], Any]) -> Any:
+    with _lock:
+        if name not in _instances:
+            _instances[name] = factory()
+        return _instances[name]
+
+
+def pool_size() -> int:
+    return int(os.getenv("BLOCKING_POOL_WORKERS", "64"))
+
+
+def blocking_pool() -> BlockingPool:
+    """Один пул потоков для YClients/Groq на все каналы"""
+    return _once("blocking_pool", lambda: BlockingPool(pool_size()))
+
+
+def yclients() -> YClientsClient:
+    return _once("yclients", lambda: YClientsClient(
+        os.getenv("YCLIENTS_PARTNER_TOKEN"), os.getenv("YCLIENTS_USER_TOKEN"), pool_maxsize=pool_size()))
+
+
+def groq_session() -> requests.Session:
+    """HTTP-сессия с пулом keep-alive соединений к Groq"""
+    def create():
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size()))
+        return session
+    return _once("groq_session", create)
+
+
+def parsing_service() -> ParsingService:
+    """Разбор сообщений о записи: PARSER_WORKERS процессов (0 — в текущем процессе)"""
+    return _once("parsing_service", lambda: ParsingService(
+        int(os.getenv("PARSER_WORKERS", "0")), int(os.getenv("PARSER_BATCH_SIZE", "64"))))
+
+
+def state_store() -> Optional["StateStore"]:
+    """Общее для реплик хранилище (None, если STATE_DB не задан)"""
+    path = os.getenv("STATE_DB")
+    if not path:
+        return None
+    # sqlite3 импортируется, только если общее хранилище действительно нужно
+    from state_store import StateStore
+    return _once("state_store", lambda: StateStore(path))
+
+
+def tenants() -> TenantRegistry:
+    """Салоны процесса: COMPANY_ID — салон по умолчанию, TENANT_ROUTES — привязки каналов и чатов"""
+    def create():
+        default_company_id = os.getenv("COMPANY_ID")
+        return TenantRegistry(
+            yclients(),
+            ttl=int(os.getenv("CATALOG_TTL", "300")),
+            store=state_store(),
+            rate=float(os.getenv("TENANT_RATE_LIMIT", "5")),
+            burst=int(os.getenv("TENANT_RATE_BURST", "20")),
+            default_company_id=int(default_company_id) if default_company_id else None,
+            routes=parse_routes(os.getenv("TENANT_ROUTES", "")),
+            snapshot_dir=os.getenv("CATALOG_SNAPSHOT_DIR", "snapshots") or None,
+            routes_ttl=int(os.getenv("TENANT_ROUTES_TTL", "60")),
+        )
+    return _once("tenants", create)
+
+
+def response_cache() -> ResponseCache:
+    """Кэш ответов LLM: LLM_CACHE_TTL секунд, до LLM_CACHE_SIZE записей (0 — выключен)"""
+    return _once("response_cache", lambda: ResponseCache(
+        ttl=int(os.getenv("LLM_CACHE_TTL", "3600")),
+        capacity=int(os.getenv("LLM_CACHE_SIZE", "1000")),
+        store=state_store(),
+    ))
+
+
+def prompt_builder() -> PromptBuilder:
+    """Сборка промптов LLM: PROMPT_TOKEN_BUDGET токенов, PROMPT_RECENT_TURNS реплик дословно,
+    каталог до PROMPT_PREFIX_BUDGET токенов — в неизменном префиксе"""
+    return _once("prompt_builder", lambda: PromptBuilder(
+        int(os.getenv("PROMPT_TOKEN_BUDGET", "1500")), int(os.getenv("PROMPT_RECENT_TURNS", "4")),
+        int(os.getenv("PROMPT_PREFIX_BUDGET", "4000"))))
+
+
+def model_router() -> ModelRouter:
+    """Модели LLM по уровням: LLM_SMALL_* — короткие реплики чата, LLM_LARGE_* — запись
+    и длинные вопросы; LLM_SHORT_CHAT_CHARS — граница короткой реплики.
+    Второй запрос — после LLM_HEDGE_PERCENTILE-го перцентиля задержек (0 — без него)"""
+    def tier(default: Tier) -> Tier:
+        prefix = f"LLM_{default.name.upper()}_"
+        return Tier(default.name, os.getenv(prefix + "MODEL", default.model),
+                    int(os.getenv(prefix + "MAX_TOKENS", str(default.max_tokens))),
+                    float(os.getenv(prefix + "TIMEOUT", str(default.timeout))))
+    return _once("model_router", lambda: ModelRouter(
+        tier(SMALL), tier(LARGE), int(os.getenv("LLM_SHORT_CHAT_CHARS", "200")),
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "3")),
+        workers=pool_size()))
+
+
+def outbox() -> "Outbox":
+    """Очередь записей в YClients: OUTBOX_WORKERS воркеров, до OUTBOX_MAX_ATTEMPTS попыток.
+    Каждая строка выполняется в салоне своего чата. Воркеры запускает бот (start_writes),
+    когда его канал уже может отправлять подтверждения"""
+    def create():
+        from outbox import Outbox
+        import record_writes
+        box = Outbox(
+            os.getenv("OUTBOX_DB") or os.getenv("STATE_DB") or "outbox.db",
+            workers=int(os.getenv("OUTBOX_WORKERS", "2")),
+            max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5")),
+            context=lambda entry: tenants().activate(entry.channel, entry.chat_id),
+        )
+        record_writes.register(box, tenants().client)
+        box.add_listener(client_records().on_write)
+        if reminders() is not None:
+            box.add_listener(reminders().on_write)
+        return box
+    return _once("outbox", create)
+
+
+def client_records() -> "ClientRecords":
+    """Записи клиентов из YClients для «Мои записи», кэш на CLIENT_RECORDS_TTL секунд"""
+    def create():
+        from client_records import ClientRecords
+        return ClientRecords(tenants().client, ttl=int(os.getenv("CLIENT_RECORDS_TTL", "300")),
+                             capacity=int(os.getenv("CLIENT_RECORDS_SIZE", "1000")), store=state_store())
+    return _once("client_records", create)
+
+
+def reminders() -> Optional["ReminderScheduler"]:
+    """Напоминания о записях за REMINDER_OFFSETS ("24h,2h"; пусто — без напоминаний),
+    не быстрее REMINDER_RATE сообщений в секунду. Время записей — в часовом поясе
+    SALON_TZ ("Europe/Moscow"), без него напоминания не запускаются.
+    Поток отправки запускает бот (start_writes)"""
+    from reminders import parse_offsets
+    offsets = parse_offsets(os.getenv("REMINDER_OFFSETS", "24h,2h"))
+    if not offsets:
+        return None
+    if not os.getenv("SALON_TZ"):
+        raise ValueError("Error: Missing SALON_TZ in .env (e.g. Europe/Moscow; required for reminders, "
+                         "set REMINDER_OFFSETS= to disable them)")
+
+    def create():
+        from reminders import ReminderScheduler
+        from zoneinfo import ZoneInfo
+        return ReminderScheduler(
+            os.getenv("REMINDERS_DB") or os.getenv("OUTBOX_DB") or os.getenv("STATE_DB") or "outbox.db",
+            tz=ZoneInfo(os.environ["SALON_TZ"]),
+            offsets=offsets,
+            rate=float(os.getenv("REMINDER_RATE", "1")),
+            burst=int(os.getenv("REMINDER_BURST", "10")),
+        )
+    return _once("reminders", create)
+
+
+def update_deadline() -> float:
+    """Бюджет времени на ответ на одно сообщение, секунд (deadlines.py); 0 — без дедлайна"""
+    return float(os.getenv("UPDATE_DEADLINE", "15"))
+
+
+def catalog_cache() -> CurrentCatalog:
+    """Каталог салона, чьё сообщение сейчас обрабатывается"""
+    return tenants().catalog
+
+
+def session_store() -> Union[SessionStore, "SqliteSessionStore"]:
+    def create():
+        store = state_store()
+        if store is None:
+            return SessionStore()
+        from state_store import SqliteSessionStore
+        return SqliteSessionStore(store)
+    return _once("session_store", create)
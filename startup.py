@@ -0,0 +1,91 @@
+# startup.py
+"""
+Прогрев процесса до приёма первого апдейта.
+
+Без прогрева первый пользователь после рестарта (supervisord, Railway с
+restartPolicyMaxRetries) платит за всё сразу: загрузку каталога из
+YClients, импорт fuzzywuzzy, TLS-рукопожатия с YClients и Groq, запуск
+процессов парсера. prewarm() делает это параллельно и до polling/webhook:
+
+    catalog  — каталог каждого настроенного салона (tenants.py), лексикон и FAQ;
+               слушатели каталога заодно отрисовывают страницы меню. Если есть
+               снимок каталога (catalog_snapshot.py), шаг берёт его с диска,
+               а свежий каталог догружается в фоне
+    parser   — fuzzy-индекс booking_parser и процессы parsing_service.py
+    groq     — keep-alive соединение в пуле HTTP-сессии Groq
+
+Ошибка шага не мешает старту: бот поднимется, а недостающее догрузит
+по первому запросу, как раньше. PREWARM=0 отключает прогрев,
+PREWARM_TIMEOUT ограничивает его длительность. Время импорта модулей
+меряет bench_startup.py.
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import shared
+
+log = logging.getLogger()
+
+GROQ_WARM_URL = "https://api.groq.com/openai/v1/models"
+
+
+def warm_catalogs():
+    for tenant in shared.tenants().configured():
+        tenant.catalog.get()
+        tenant.lexicon
+        tenant.faq
+
+
+def warm_parser():
+    shared.parsing_service().warm()
+
+
+def warm_groq():
+    api_key = os.getenv("GROQ_API_KEY")
+    if api_key:
+        shared.groq_session().get(GROQ_WARM_URL, headers={"Authorization": f"Bearer {api_key}"},
+                                  timeout=10).close()
+
+
+STEPS: Dict[str, Callable[[], None]] = {
+    "catalog": warm_catalogs,
+    "parser": warm_parser,
+    "groq": warm_groq,
+}
+
+
+def enabled() -> bool:
+    return os.getenv("PREWARM", "1") != "0"
+
+
+def prewarm(steps: Optional[Dict[str, Callable[[], None]]] = None,
+            timeout: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """Выполнить шаги параллельно; возвращает секунды на шаг (None — ошибка или не успел)"""
+    steps = STEPS if steps is None else steps
+    timeout = float(os.getenv("PREWARM_TIMEOUT", "30")) if timeout is None else timeout
+    timings: Dict[str, Optional[float]] = dict.fromkeys(steps)
+    started = time.perf_counter()
+
+    def run(name: str, fn: Callable[[], None]):
+        step_started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            log.error(f"❌ Prewarm step {name} failed: {e}")
+            return
+        timings[name] = round(time.perf_counter() - step_started, 3)
+
+    executor = ThreadPoolExecutor(max_workers=len(steps) or 1, thread_name_prefix="prewarm")
+    futures = {executor.submit(run, name, fn): name for name, fn in steps.items()}
+    _, not_done = wait(futures, timeout=timeout)
+    # Не дождавшиеся шаги доработают в фоне, старт их не ждёт
+    executor.shutdown(wait=False)
+    for future in not_done:
+        log.warning(f"⚠️ Prewarm step {futures[future]} still running after {timeout}s, continuing startup")
+
+    summary = ", ".join(f"{name} {'-' if seconds is None else f'{seconds}s'}" for name, seconds in timings.items())
+    log.info(f"🔥 Prewarm finished in {time.perf_counter() - started:.2f}s: {summary}")
+    return timings
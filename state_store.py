@@ -0,0 +1,170 @@
+# state_store.py
+"""
+Общее состояние нескольких реплик бота в SQLite.
+
+StateStore — key-value таблица (namespace, key) -> JSON. База в режиме WAL,
+поэтому читать и писать её могут несколько процессов сразу — но только на
+одном узле: WAL держит индекс в разделяемой памяти и не работает на
+сетевых файловых системах (NFS, SMB). SqliteSessionStore — тот же интерфейс, что
+у sessions.SessionStore, но состояние пользователей лежит в StateStore и
+видно всем репликам.
+"""
+import json
+import time
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from sessions import DEFAULT_MEMORY_TURNS
+
+BUSY_TIMEOUT_MS = 10000
+
+
+class StateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                   timeout=BUSY_TIMEOUT_MS / 1000)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (ns, key))"
+        )
+
+    def get(self, ns: str, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, str(key))).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_with_time(self, ns: str, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, updated_at) или None"""
+        with self._lock:
+            row = self._db.execute("SELECT value, updated_at FROM kv WHERE ns = ? AND key = ?",
+                                   (ns, str(key))).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def set(self, ns: str, key: Hashable, value: Any):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (ns, str(key), json.dumps(value, ensure_ascii=False), time.time()),
+            )
+
+    def delete(self, ns: str, key: Hashable):
+        with self._lock:
+            self._db.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, str(key)))
+
+    def update(self, ns: str, key: Hashable, fn: Callable[[Any], Any], default: Any = None) -> Any:
+        """Атомарно прочитать, изменить fn(value) и записать значение (между процессами тоже)"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT value FROM kv WHERE ns = ? AND key = ?",
+                                       (ns, str(key))).fetchone()
+                value = fn(json.loads(row[0]) if row else default)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO kv (ns, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                    (ns, str(key), json.dumps(value, ensure_ascii=False), time.time()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return value
+
+    def keys(self, ns: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT key FROM kv WHERE ns = ?", (ns,))]
+
+    def count(self, ns: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM kv WHERE ns = ?", (ns,)).fetchone()[0]
+
+    def trim(self, ns: str, keep: int):
+        """Оставить в ns только keep записей, изменённых последними"""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM kv WHERE ns = ? AND key NOT IN"
+                " (SELECT key FROM kv WHERE ns = ? ORDER BY updated_at DESC LIMIT ?)",
+                (ns, ns, keep),
+            )
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_MISSING = object()
+
+
+class StoreMapping(MutableMapping):
+    """dict-подобный вид на один namespace (значения пишутся сразу в базу)"""
+
+    def __init__(self, store: StateStore, ns: str, factory: Optional[Callable[[], Any]] = None):
+        self.store = store
+        self.ns = ns
+        self.factory = factory
+
+    def __getitem__(self, key):
+        value = self.store.get(self.ns, key, _MISSING)
+        if value is _MISSING:
+            if self.factory is None:
+                raise KeyError(key)
+            return self.factory()
+        return value
+
+    def __setitem__(self, key, value):
+        self.store.set(self.ns, key, value)
+
+    def __delitem__(self, key):
+        self.store.delete(self.ns, key)
+
+    def __contains__(self, key) -> bool:
+        return self.store.get(self.ns, key, _MISSING) is not _MISSING
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.keys(self.ns))
+
+    def __len__(self) -> int:
+        return self.store.count(self.ns)
+
+
+class SqliteSessionStore:
+    """SessionStore, общий для всех реплик"""
+
+    def __init__(self, store: StateStore, memory_turns: int = DEFAULT_MEMORY_TURNS):
+        self.store = store
+        self.memory_turns = memory_turns
+        self.memory = StoreMapping(store, "memory", factory=list)
+        self.records = StoreMapping(store, "records", factory=list)
+        self.auth = StoreMapping(store, "auth", factory=dict)
+        self.phones = StoreMapping(store, "phones")
+
+    def add_memory(self, user_id: Hashable, role: str, text: str):
+        limit = self.memory_turns * 2
+        self.store.update("memory", user_id, lambda items: (items + [[role, text]])[-limit:], default=[])
+
+    def messages(self, user_id: Hashable) -> List[Tuple[str, str]]:
+        return [tuple(item) for item in self.store.get("memory", user_id, [])]
+
+    def history(self, user_id: Hashable) -> str:
+        return "\n".join(f"{role}: {text}" for role, text in self.messages(user_id))
+
+    def get_records(self, user_id: Hashable) -> List[Dict[str, Any]]:
+        return self.store.get("records", user_id, [])
+
+    def add_record(self, user_id: Hashable, record: Dict[str, Any]):
+        self.store.update("records", user_id, lambda items: items + [record], default=[])
+
+    def remove_record(self, user_id: Hashable, record_id: Any):
+        self.store.update("records", user_id,
+                          lambda items: [r for r in items if r.get("id") != record_id], default=[])
+
+    def stats(self) -> Dict[str, int]:
+        return {"users": self.store.count("memory"), "with_records": self.store.count("records"),
+                "phones": self.store.count("phones")}
@@ -0,0 +1,346 @@
+# tenants.py
+"""
+Несколько салонов (компаний YClients) в одном процессе.
+
+Салон — Tenant: свой company_id, свой кэш каталога (catalog.CatalogCache)
+и производные от каталога индексы (Lexicon и т.п.), свой бюджет запросов
+к YClients. Клиент YClients с его пулом соединений у всех салонов общий:
+Tenant.client лишь списывает запрос из бюджета салона и передаёт вызов
+общему клиенту, поэтому один шумный салон не выбирает чужой лимит.
+
+Салон выбирается по каналу и чату (TenantRegistry.resolve): привязка чата,
+затем канала ("telegram", "whatsapp"), затем салон по умолчанию. Выбранный
+салон кладётся в contextvar на время обработки сообщения, и код хендлеров
+читает каталог и ходит в API через registry.catalog / registry.client, не
+передавая company_id по цепочке вызовов. BlockingPool переносит contextvar
+в поток пула.
+
+Настройка из окружения (см. shared.tenants()):
+    COMPANY_ID=123                          # салон по умолчанию (иначе первый из my_companies)
+    TENANT_ROUTES=telegram=123,whatsapp=456,whatsapp:79001234567@c.us=789
+    TENANT_RATE_LIMIT=5 TENANT_RATE_BURST=20   # запросов в секунду на салон и запас подряд
+    TENANT_ROUTES_TTL=60                    # секунд: привязки чатов из STATE_DB кэшируются в памяти
+    CATALOG_SNAPSHOT_DIR=snapshots          # снимки каталогов салонов (catalog_snapshot.py)
+"""
+import os
+import re
+import time
+import logging
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import metrics
+from catalog import DEFAULT_TTL, Catalog, CatalogCache
+from faq_index import FaqIndex
+from llm_cache import ResponseCache
+
+log = logging.getLogger()
+
+DEFAULT_RATE = 5.0  # запросов в секунду на салон
+DEFAULT_BURST = 20
+THROTTLE_WARNING_INTERVAL = 30  # секунд между предупреждениями о лимите
+DEFAULT_ROUTES_TTL = 60  # секунд; привязку, сделанную другой репликой, процесс увидит не позже
+ROUTES_CACHE_SIZE = 10000
+
+_current: contextvars.ContextVar[Optional["Tenant"]] = contextvars.ContextVar("tenant", default=None)
+
+
+class RateBudget:
+    """Token bucket: rate запросов в секунду, до burst подряд. acquire() ждёт токен"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, name: str = "tenant"):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate and burst must be positive")
+        self.rate = rate
+        self.burst = burst
+        self.name = name
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._last_warning = 0.0
+        self._throttled = metrics.counter(f"{name}.throttled")
+        self._wait = metrics.histogram(f"{name}.throttle_seconds")
+
+    def _reserve(self) -> float:
+        """Занять токен; возвращает, сколько секунд ждать, пока он станет доступен"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay <= 0:
+            return
+        self._throttled.inc()
+        self._wait.observe(delay)
+        now = time.monotonic()
+        if now - self._last_warning >= THROTTLE_WARNING_INTERVAL:
+            self._last_warning = now
+            log.warning(f"⚠️ {self.name} over its YClients budget ({self.rate}/s), waiting {delay:.2f}s")
+        time.sleep(delay)
+
+
+class BudgetedClient:
+    """Вызовы общего YClientsClient, списываемые из бюджета одного салона"""
+
+    def __init__(self, client, budget: RateBudget):
+        self.client = client
+        self.budget = budget
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            self.budget.acquire()
+            return attr(*args, **kwargs)
+        return call
+
+
+def _stem(word: str) -> str:
+    """Основа для русских склонений: «арина» -> «арин», «маникюр» -> «маникюр»"""
+    return word[:-1] if len(word) > 4 and word[-1] in "аяоеьйиыу" else word
+
+
+class Lexicon:
+    """Имена мастеров и названия услуг одного каталога с учётом склонений"""
+
+    def __init__(self, catalog: Catalog):
+        self.masters: List[Tuple[re.Pattern, Dict]] = []
+        for master in catalog.masters:
+            words = master.get("name", "").lower().split()
+            # Слишком короткая основа совпадёт с чем угодно («ян» — «января»)
+            if words and len(_stem(words[0])) >= 3:
+                self.masters.append((re.compile(rf"\b{re.escape(_stem(words[0]))}\w*"), master))
+        self.services = sorted((s for s in catalog.priced_services or catalog.services if s.get("title")),
+                               key=lambda s: len(s["title"]))
+        self._service_stems = [
+            (re.compile(rf"\b{re.escape(_stem(s['title'].lower().split()[0]))}\w*"), s) for s in self.services
+        ]
+
+    def find_master(self, text: str) -> Optional[Dict]:
+        text = text.lower()
+        return next((master for pattern, master in self.masters if pattern.search(text)), None)
+
+    def find_service(self, text: str) -> Optional[Dict]:
+        """Самое длинное название услуги в тексте, иначе самая общая услуга по основе слова"""
+        text = text.lower()
+        exact = [s for s in self.services if s["title"].lower() in text]
+        if exact:
+            return exact[-1]
+        return next((service for pattern, service in self._service_stems if pattern.search(text)), None)
+
+    def refine(self, parsed: Dict[str, Any], text: str) -> Dict[str, Any]:
+        """Дополнить результат booking_parser мастером и услугой из каталога салона"""
+        master = self.find_master(text)
+        if master:
+            parsed["master"] = master["name"]
+        service = self.find_service(text)
+        if service:
+            parsed["service"] = service["title"]
+        if "has_all_info" in parsed:
+            parsed["has_all_info"] = all([parsed.get("service"), parsed.get("master"), parsed.get("datetime")])
+        return parsed
+
+
+class Tenant:
+    """Один салон: каталог, производные индексы и бюджет запросов к YClients"""
+
+    def __init__(self, company_id: Optional[int], client, *, ttl: int = DEFAULT_TTL, store=None,
+                 rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, snapshot_dir: Optional[str] = None):
+        self.configured_id = company_id
+        key = company_id if company_id is not None else "default"
+        self.name = f"tenant.{key}"
+        self.budget = RateBudget(rate, burst, name=self.name)
+        self.client = BudgetedClient(client, self.budget)
+        snapshot_path = os.path.join(snapshot_dir, f"catalog-{key}.snap") if snapshot_dir else None
+        self.catalog = CatalogCache(self.client, ttl=ttl, store=store, company_id=company_id,
+                                    snapshot_path=snapshot_path)
+        self._derived: Dict[str, Tuple[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def company_id(self) -> Optional[int]:
+        if self.configured_id is not None:
+            return self.configured_id
+        return self.catalog.get().company_id
+
+    def derived(self, name: str, build: Callable[[Catalog], Any]) -> Any:
+        """Индекс, построенный build(catalog) один раз на версию каталога"""
+        catalog = self.catalog.get()
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == catalog.version:
+            return cached[1]
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is None or cached[0] != catalog.version:
+                cached = (catalog.version, build(catalog))
+                self._derived[name] = cached
+        return cached[1]
+
+    @property
+    def lexicon(self) -> Lexicon:
+        return self.derived("lexicon", Lexicon)
+
+    @property
+    def faq(self) -> FaqIndex:
+        return self.derived("faq", lambda catalog: FaqIndex.from_catalog(catalog, Lexicon(catalog)))
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.configured_id!r})"
+
+
+def parse_routes(spec: str) -> Dict[str, int]:
+    """"telegram=1,whatsapp:7900@c.us=2" -> {"telegram": 1, "whatsapp:7900@c.us": 2}"""
+    routes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        key, _, company_id = item.rpartition("=")
+        if not key.strip():
+            raise ValueError(f"Bad tenant route {item!r}, expected <channel>[:<chat_id>]=<company_id>")
+        routes[key.strip()] = int(company_id)
+    return routes
+
+
+class TenantRegistry:
+    """Салоны процесса, создаются при первом обращении"""
+
+    def __init__(self, client, *, ttl: int = DEFAULT_TTL, store=None, rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, default_company_id: Optional[int] = None,
+                 routes: Optional[Dict[str, int]] = None, snapshot_dir: Optional[str] = None,
+                 routes_ttl: int = DEFAULT_ROUTES_TTL):
+        self.client_factory = client
+        self.ttl = ttl
+        self.store = store
+        self.snapshot_dir = snapshot_dir
+        self.rate = rate
+        self.burst = burst
+        self.default_company_id = default_company_id
+        self.routes: Dict[str, int] = dict(routes or {})
+        # Привязки чатов из store (и их отсутствие): company_for() вызывается на каждый апдейт
+        # в event loop, поэтому в SQLite он ходит не чаще раза в routes_ttl на чат
+        self._bound = ResponseCache(ttl=routes_ttl, capacity=ROUTES_CACHE_SIZE, name="tenants.routes")
+        self._tenants: Dict[Optional[int], Tenant] = {}
+        self._listeners: List[Callable[[Catalog], Any]] = []
+        self._lock = threading.Lock()
+        # Вид на каталог и клиент салона текущего сообщения — для кода хендлеров
+        self.catalog = CurrentCatalog(self)
+        self.client = CurrentClient(self)
+        metrics.gauge("tenants.count", lambda: len(self._tenants))
+
+    # --- салоны ---
+    def get(self, company_id: Optional[int] = None) -> Tenant:
+        company_id = self.default_company_id if company_id is None else company_id
+        tenant = self._tenants.get(company_id)
+        if tenant is not None:
+            return tenant
+        with self._lock:
+            tenant = self._tenants.get(company_id)
+            if tenant is None:
+                tenant = Tenant(company_id, self.client_factory, ttl=self.ttl, store=self.store,
+                                rate=self.rate, burst=self.burst, snapshot_dir=self.snapshot_dir)
+                for fn in self._listeners:
+                    tenant.catalog.add_listener(fn)
+                self._tenants[company_id] = tenant
+                log.info(f"🏢 Tenant registered: company {company_id if company_id is not None else 'default'}")
+        return tenant
+
+    def tenants(self) -> List[Tenant]:
+        return list(self._tenants.values())
+
+    def configured(self) -> List[Tenant]:
+        """Салон по умолчанию и все салоны из маршрутов — их стоит прогреть при старте"""
+        company_ids = [self.default_company_id, *self.routes.values()]
+        return [self.get(company_id) for company_id in dict.fromkeys(company_ids)]
+
+    def add_listener(self, fn: Callable[[Catalog], Any]):
+        """fn(catalog) после смены каталога любого салона, в том числе созданного позже"""
+        with self._lock:
+            self._listeners.append(fn)
+            for tenant in self._tenants.values():
+                tenant.catalog.add_listener(fn)
+
+    # --- маршрутизация ---
+    @staticmethod
+    def _route_key(channel: str, chat_id: Hashable = None) -> str:
+        return channel if chat_id is None else f"{channel}:{chat_id}"
+
+    def bind(self, channel: str, chat_id: Hashable, company_id: int):
+        """Закрепить чат канала за салоном (в STATE_DB — для всех реплик)"""
+        key = self._route_key(channel, chat_id)
+        self.routes[key] = company_id
+        if self.store is not None:
+            self.store.set("tenant_routes", key, company_id)
+
+    def company_for(self, channel: str, chat_id: Hashable = None) -> Optional[int]:
+        if chat_id is not None:
+            key = self._route_key(channel, chat_id)
+            if key in self.routes:
+                return self.routes[key]
+            if self.store is not None:
+                company_id = self._stored_route(key)
+                if company_id is not None:
+                    return company_id
+        return self.routes.get(channel, self.default_company_id)
+
+    def _stored_route(self, key: str) -> Optional[int]:
+        if not self._bound.enabled:
+            return self.store.get("tenant_routes", key)
+        cached = self._bound.get(key)
+        if cached is None:
+            cached = [self.store.get("tenant_routes", key)]
+            self._bound.set(key, cached)
+        return cached[0]
+
+    def resolve(self, channel: str, chat_id: Hashable = None) -> Tenant:
+        return self.get(self.company_for(channel, chat_id))
+
+    # --- текущий салон ---
+    def current(self) -> Tenant:
+        """Салон обрабатываемого сообщения; вне сообщения — салон по умолчанию"""
+        return _current.get() or self.get()
+
+    @staticmethod
+    def set_current(tenant: Tenant):
+        _current.set(tenant)
+
+    @contextmanager
+    def activate(self, channel: str, chat_id: Hashable = None) -> Iterator[Tenant]:
+        tenant = self.resolve(channel, chat_id)
+        token = _current.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current.reset(token)
+
+
+class CurrentCatalog:
+    """Интерфейс CatalogCache, обращающийся к каталогу текущего салона"""
+
+    def __init__(self, registry: TenantRegistry):
+        self.registry = registry
+
+    def __getattr__(self, name: str):
+        return getattr(self.registry.current().catalog, name)
+
+    def add_listener(self, fn: Callable[[Catalog], Any]):
+        self.registry.add_listener(fn)
+
+
+class CurrentClient:
+    """YClientsClient текущего салона (общий пул соединений, бюджет салона)"""
+
+    def __init__(self, registry: TenantRegistry):
+        self.registry = registry
+
+    def __getattr__(self, name: str):
+        return getattr(self.registry.current().client, name)
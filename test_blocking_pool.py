@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Тест пула блокирующих вызовов: event loop отзывчив при 50+ одновременных пользователях,
+отменённые в очереди вызовы не оставляют след в метриках
+"""
+import time
+import asyncio
+import threading
+
+from blocking_pool import BlockingPool
+
+
+def slow_api_call(delay: float) -> str:
+    time.sleep(delay)  # имитация requests к YClients/Groq
+    return "ok"
+
+
+def test_event_loop_stays_responsive():
+    async def scenario():
+        pool = BlockingPool(max_workers=64, name="test-pool")
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                ticks.append(time.perf_counter() - started)
+
+        beat = asyncio.create_task(heartbeat())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pool.run(slow_api_call, 0.1) for _ in range(60)))
+        elapsed = time.perf_counter() - started
+        beat.cancel()
+        pool.shutdown()
+        return results, elapsed, max(ticks)
+
+    results, elapsed, worst_tick = asyncio.run(scenario())
+    assert results == ["ok"] * 60
+    assert elapsed < 0.5          # 60 вызовов по 100 мс шли параллельно
+    assert worst_tick < 0.05      # loop не блокировался
+
+
+def test_saturation_metrics():
+    async def scenario():
+        pool = BlockingPool(max_workers=2, name="test-small-pool")
+        tasks = [asyncio.create_task(pool.run(slow_api_call, 0.05)) for _ in range(6)]
+        await asyncio.sleep(0.02)
+        during = pool.stats()
+        await asyncio.gather(*tasks)
+        after = pool.stats()
+        pool.shutdown()
+        return during, after
+
+    during, after = asyncio.run(scenario())
+    assert during["active"] == 2 and during["saturation"] == 1.0
+    assert during["queued"] == 4
+    assert after["active"] == 0 and after["queued"] == 0
+    assert after["queue_wait"]["count"] == 6
+
+
+def test_cancelled_while_queued_leaves_queue():
+    async def scenario():
+        pool = BlockingPool(max_workers=1, name="test-cancel-pool")
+        release = threading.Event()
+        busy = asyncio.create_task(pool.run(release.wait))
+        waiting = [asyncio.create_task(pool.run(slow_api_call, 0)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        during = pool.stats()
+        for task in waiting:
+            task.cancel()  # хендлер отменён (дедлайн), поток задачу ещё не взял
+        await asyncio.gather(*waiting, return_exceptions=True)
+        release.set()
+        await busy
+        after = pool.stats()
+        pool.shutdown()
+        return during, after
+
+    during, after = asyncio.run(scenario())
+    assert during["active"] == 1 and during["queued"] == 3
+    assert after["active"] == 0 and after["queued"] == 0
+
+
+if __name__ == "__main__":
+    test_event_loop_stays_responsive()
+    print("✅ test_event_loop_stays_responsive")
+    test_saturation_metrics()
+    print("✅ test_saturation_metrics")
+    test_cancelled_while_queued_leaves_queue()
+    print("✅ test_cancelled_while_queued_leaves_queue")
+    print("🎉 Blocking pool tests passed!")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Тест парсера записей и гейта бенчмарка (без обращения к API)
+"""
+from datetime import datetime, timedelta
+
+import booking_parser
+from booking_parser import find_master_advanced, find_service_advanced, is_booking, parse_booking_message
+from bench_parser import generate_corpus, accuracy, compare
+
+
+def test_parse_full_booking():
+    """Услуга, мастер, дата и время извлекаются из одного сообщения"""
+    parsed = parse_booking_message("Хочу записаться на маникюр к Арине 26 октября в 12:00", "")
+    year = datetime.now().year
+    assert parsed["service"] == "маникюр"
+    assert parsed["master"] == "Арина"
+    assert parsed["datetime"] == f"{year}-10-26 12:00"
+    assert parsed["has_all_info"]
+
+
+def test_parse_relative_date():
+    """Относительные даты и уменьшительные имена мастеров"""
+    parsed = parse_booking_message("педикюр к Катюше завтра 15:30", "")
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    assert parsed["master"] == "Екатерина"
+    assert parsed["datetime"] == f"{tomorrow} 15:30"
+
+
+def test_fuzzy_fixes_typos_but_not_other_words():
+    """Другие имена и короткие похожие слова не становятся мастером или услугой"""
+    for text in ("Запишите к Марине", "к Карине на завтра", "Ирина свободна?"):
+        assert find_master_advanced(text) is None, text
+    assert find_service_advanced("нужна маска для лица") is None
+    if booking_parser.fuzzy_available:
+        assert find_service_advanced("хочу массаш") == "массаж"
+        assert find_master_advanced("к Екатерне в 12:00") == "Екатерина"
+
+
+def test_is_booking_chitchat():
+    assert is_booking("хочу записаться")
+    assert not is_booking("привет")
+
+
+def test_corpus_is_deterministic():
+    first = generate_corpus(200, seed=7)
+    second = generate_corpus(200, seed=7)
+    assert first == second
+    assert len(first) == 200
+
+
+def test_gate_detects_regression():
+    corpus = generate_corpus(300)
+    measured = accuracy(corpus)
+    result = {"accuracy": {field: value - 0.1 for field, value in measured.items()},
+              "latency": {"parse_booking_message": {"p50_us": 10.0}}}
+    baseline = {
+        "accuracy": measured,
+        "latency": {"parse_booking_message": {"p50_us": 5.0}},
+    }
+    problems = compare(result, baseline, accuracy_tolerance=0.005, speed_tolerance=0.5)
+    assert any(p.startswith("accuracy[service]") for p in problems)
+    assert any(p.startswith("latency[parse_booking_message]") for p in problems)
+    assert compare(result, result, 0.005, 0.5) == []
+
+
+def test_gate_scales_latency_by_machine_speed():
+    baseline = {"calibration_us": 5.0, "accuracy": {}, "latency": {"parse_booking_message": {"p50_us": 40.0}}}
+    # Та же версия парсера на машине вдвое медленнее — не регрессия
+    slower_machine = dict(baseline, calibration_us=10.0, latency={"parse_booking_message": {"p50_us": 80.0}})
+    assert compare(slower_machine, baseline, 0.005, 0.5) == []
+    # Парсер вдвое медленнее на той же машине — регрессия
+    slower_parser = dict(baseline, latency={"parse_booking_message": {"p50_us": 80.0}})
+    assert compare(slower_parser, baseline, 0.005, 0.5)
+
+
+def test_gate_rejects_baseline_with_other_fuzzy_mode():
+    result = {"fuzzy_available": False, "accuracy": {"service": 0.95}, "latency": {}}
+    baseline = dict(result, fuzzy_available=True)
+    assert any(p.startswith("fuzzy_available") for p in compare(result, baseline, 0.005, 0.5))
+    assert compare(result, dict(result), 0.005, 0.5) == []
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 All parser tests passed!")
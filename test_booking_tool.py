@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Тест записи через вызов create_booking: аргументы из ответа LLM
+проверяются по каталогу (без обращения к Groq и YClients)
+"""
+import json
+from datetime import datetime
+
+from booking_tool import TOOLS, Booking, BookingError, arguments, validate
+from catalog import Catalog
+
+SERVICES = [
+    {"id": 10, "title": "Маникюр", "cost": 1500, "length": 60},
+    {"id": 11, "title": "Маникюр с покрытием гель-лак", "cost": 2500, "length": 90},
+    {"id": 12, "title": "Педикюр", "cost": 2000},
+]
+MASTERS = [{"id": 100, "name": "Арина"}, {"id": 101, "name": "Полина"}]
+CATALOG = Catalog(1, SERVICES, SERVICES, MASTERS, {100: SERVICES[:2], 101: SERVICES[2:]})
+NOW = datetime(2025, 10, 20, 12, 0)
+
+
+def tool_message(args):
+    raw = args if isinstance(args, str) else json.dumps(args)
+    return {"content": None, "tool_calls": [
+        {"id": "call_1", "type": "function", "function": {"name": "create_booking", "arguments": raw}}]}
+
+
+def rejected(args) -> str:
+    try:
+        validate(args, CATALOG, now=NOW)
+    except BookingError as e:
+        return str(e)
+    raise AssertionError(f"{args} accepted")
+
+
+def test_tool_call_resolves_ids_not_names():
+    assert TOOLS[0]["function"]["parameters"]["required"] == ["service_id", "staff_id", "datetime"]
+    args = arguments(tool_message({"service_id": 11, "staff_id": 100, "datetime": "2025-10-26T12:00"}))
+    booking = validate(args, CATALOG, now=NOW)
+    assert booking == Booking(SERVICES[1], MASTERS[0], "2025-10-26 12:00")
+    assert booking.summary() == "Маникюр с покрытием гель-лак | Арина | 2025-10-26 12:00"
+    assert "[service_id 11]" in CATALOG.prompt_block() and "Арина [staff_id 100]" in CATALOG.prompt_block()
+
+
+def test_text_reply_is_not_a_booking():
+    assert arguments({"content": "На какое время вас записать?"}) is None
+    assert arguments({"content": "", "tool_calls": [{"function": {"name": "other", "arguments": "{}"}}]}) is None
+
+
+def test_invalid_arguments_get_a_user_message():
+    assert "услугу" in rejected({"service_id": 99, "staff_id": 100, "datetime": "2025-10-26 12:00"})
+    assert "мастера" in rejected({"service_id": 10, "staff_id": "Арина", "datetime": "2025-10-26 12:00"})
+    assert rejected({"service_id": 12, "staff_id": 100, "datetime": "2025-10-26 12:00"}) == \
+        "Арина не делает «Педикюр». Эту услугу делают: Полина."
+    assert "дату" in rejected({"service_id": 10, "staff_id": 100, "datetime": "завтра в 12"})
+    assert "прошло" in rejected({"service_id": 10, "staff_id": 100, "datetime": "2025-10-19 12:00"})
+    try:
+        arguments(tool_message("{service_id: 10"))
+        raise AssertionError("malformed arguments accepted")
+    except BookingError:
+        pass
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Booking tool tests passed!")
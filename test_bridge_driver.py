@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Тест драйвера whatsapp_bridge.js: входящие сообщения доходят до хендлера,
+ответы подтверждаются bridge, упавший bridge перезапускается, шумный stderr
+не блокирует дочерний процесс
+"""
+import sys
+import json
+import asyncio
+import tempfile
+import textwrap
+from pathlib import Path
+
+from bridge_driver import BridgeDriver
+
+# Поддельный bridge: пишет много в stderr, присылает сообщение, подтверждает ответ
+# и завершается (первый запуск — "падение", чтобы проверить перезапуск)
+FAKE_BRIDGE = textwrap.dedent("""
+    import sys, json
+    from pathlib import Path
+    runs = Path(sys.argv[1])
+    run = int(runs.read_text()) + 1 if runs.exists() else 1
+    runs.write_text(str(run))
+    sys.stderr.write("x" * 200000 + "\\n")
+    sys.stderr.flush()
+    print(json.dumps({"type": "ready"}), flush=True)
+    print(json.dumps({"type": "message", "chatId": "7@c.us", "sender": "7@c.us",
+                      "message": f"привет {run}"}), flush=True)
+    for line in sys.stdin:
+        command = json.loads(line)
+        items = command["messages"] if command["type"] == "send_batch" else [command]
+        for item in items:
+            print(json.dumps({"type": "ack", "id": item["id"], "ok": True}), flush=True)
+        if run == 1:
+            sys.exit(1)
+""")
+
+
+def test_driver_routes_messages_and_restarts_bridge():
+    async def scenario(workdir: Path):
+        script = workdir / "fake_bridge.py"
+        script.write_text(FAKE_BRIDGE)
+        replies = []
+        stop_event = asyncio.Event()
+
+        async def handler(message):
+            ack = await message.answer(f"ответ на «{message.message_text}»")
+            replies.append((message.chat_id, message.message_text, ack["ok"]))
+            if len(replies) == 2:
+                stop_event.set()
+
+        driver = BridgeDriver(handler, command=[sys.executable, str(script), str(workdir / "runs")],
+                              backoff_initial=0.05, name="bridge_driver_test")
+        await asyncio.wait_for(driver.run(stop_event), 20)
+        return replies, int((workdir / "runs").read_text()), driver
+
+    with tempfile.TemporaryDirectory() as tmp:
+        replies, runs, driver = asyncio.run(scenario(Path(tmp)))
+
+    assert replies == [("7@c.us", "привет 1", True), ("7@c.us", "привет 2", True)]
+    assert runs == 2
+    assert driver._restarts.value == 1
+    assert driver._process is None
+
+
+if __name__ == "__main__":
+    test_driver_routes_messages_and_restarts_bridge()
+    print("✅ Bridge driver tests passed")
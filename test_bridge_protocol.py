@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Тест NDJSON-протокола с whatsapp_bridge.js: разбор склеенных и разорванных строк,
+пакетная отправка и подтверждения по id
+"""
+import json
+import asyncio
+
+from bridge_protocol import BridgeConnection, BridgeError, read_events
+
+
+def test_read_events_handles_coalesced_and_split_chunks():
+    async def scenario():
+        reader = asyncio.StreamReader()
+        first = json.dumps({"type": "message", "message": "привет", "chatId": "1@c.us"})
+        second = json.dumps({"type": "message", "message": "запись", "chatId": "2@c.us"})
+        data = (first + "\n" + second + "\nnot json\n" + '{"type": "ready"}\n').encode("utf-8")
+        # Два события в одном чанке, третье разрезано посередине UTF-8 символа
+        cut = len((first + "\n").encode("utf-8")) + 25
+        reader.feed_data(data[:cut])
+        reader.feed_data(data[cut:])
+        reader.feed_eof()
+        return [event async for event in read_events(reader)]
+
+    events = asyncio.run(scenario())
+    assert [e["type"] for e in events] == ["message", "message", "ready"]
+    assert events[1]["message"] == "запись"
+
+
+class FakeBridge:
+    """Bridge на TCP-сокете: читает NDJSON-команды и подтверждает каждое сообщение"""
+
+    def __init__(self):
+        self.commands = []
+
+    async def handle(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = json.loads(line)
+            self.commands.append(command)
+            items = command["messages"] if command["type"] == "send_batch" else [command]
+            # Все ack одной записью — клиент должен разобрать склеенные строки
+            acks = [{"type": "ack", "id": item["id"], "ok": item["chatId"] != "bad@c.us",
+                     "error": None if item["chatId"] != "bad@c.us" else "chat not found"}
+                    for item in items]
+            writer.write("".join(json.dumps(ack) + "\n" for ack in acks).encode())
+            writer.write(b'{"type": "message", "message": "hi", "chatId": "7@c.us"}\n')
+            await writer.drain()
+        writer.close()
+
+
+def test_batched_sends_are_acknowledged_by_id():
+    async def scenario():
+        bridge = FakeBridge()
+        server = await asyncio.start_server(bridge.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        events = []
+
+        async def on_event(event):
+            events.append(event)
+
+        connection = BridgeConnection(reader, writer, on_event=on_event, batch_size=50,
+                                      name="bridge_test")
+        connection.start()
+        results = await connection.send_many(
+            [(f"{n}@c.us", f"сообщение {n}") for n in range(120)] + [("bad@c.us", "x")])
+        single = await connection.send("1@c.us", "ещё одно")
+        await connection.close()
+        server.close()
+        await server.wait_closed()
+        return bridge.commands, results, single, events, connection
+
+    commands, results, single, events, connection = asyncio.run(scenario())
+    # 121 сообщение ушло пачками, а не 121 отдельной записью
+    batch_commands = [c for c in commands if c["type"] == "send_batch"]
+    assert len(batch_commands) >= 3
+    assert max(len(c["messages"]) for c in batch_commands) == 50
+    sent = [m for c in batch_commands for m in c["messages"]]
+    assert [m["message"] for m in sent[:3]] == ["сообщение 0", "сообщение 1", "сообщение 2"]
+
+    assert all(r["ok"] for r in results[:120])
+    assert isinstance(results[120], BridgeError)
+    assert "chat not found" in str(results[120])
+    assert single["ok"] and commands[-1]["type"] == "send"
+    assert events and all(e["type"] == "message" for e in events)
+    assert connection.awaiting_ack == 0
+
+
+def test_pending_sends_fail_when_bridge_disconnects():
+    async def scenario():
+        async def silent_bridge(reader, writer):
+            await reader.readline()
+            writer.close()
+
+        server = await asyncio.start_server(silent_bridge, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        connection = BridgeConnection(reader, writer, ack_timeout=5, name="bridge_test_closed")
+        connection.start()
+        try:
+            await connection.send("1@c.us", "не дойдёт")
+        except BridgeError as e:
+            error = e
+        else:
+            error = None
+        await connection.close()
+        server.close()
+        await server.wait_closed()
+        return error
+
+    error = asyncio.run(scenario())
+    assert error is not None and "closed" in str(error)
+
+
+if __name__ == "__main__":
+    test_read_events_handles_coalesced_and_split_chunks()
+    test_batched_sends_are_acknowledged_by_id()
+    test_pending_sends_fail_when_bridge_disconnects()
+    print("✅ Bridge protocol tests passed")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Тест кэша каталога и кэша отрисованных страниц меню (фейковый клиент YClients)
+"""
+import os
+import time
+import tempfile
+import threading
+
+import catalog_snapshot
+from catalog import CatalogCache
+from render_cache import RenderCache
+
+
+class FakeYClients:
+    """Отвечает как YClients API и считает обращения"""
+
+    def __init__(self):
+        self.calls = 0
+        self.price = 1500
+        self.fail = False
+
+    def _ok(self, data):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("API down")
+        return {"success": True, "data": data}
+
+    def my_companies(self):
+        return self._ok([{"id": 1}])
+
+    def company_services(self, company_id):
+        return self._ok([{"id": 10, "title": "Маникюр"}])
+
+    def get_service_details(self, company_id, staff_id=None):
+        return self._ok([{"id": 10, "title": "Маникюр", "price_min": self.price, "price_max": self.price}])
+
+    def company_masters(self, company_id):
+        return self._ok([{"id": 100, "name": "Арина"}, {"id": 101, "name": "Полина"}])
+
+
+def test_catalog_is_cached_until_ttl():
+    client = FakeYClients()
+    cache = CatalogCache(client, ttl=300)
+    catalog = cache.get()
+    calls = client.calls
+    assert catalog.company_id == 1
+    assert catalog.services_for_master(100)[0]["title"] == "Маникюр"
+    assert cache.get() is catalog
+    assert client.calls == calls
+
+
+def test_version_changes_with_content_and_notifies():
+    client = FakeYClients()
+    cache = CatalogCache(client)
+    seen = []
+    cache.add_listener(lambda catalog: seen.append(catalog.version))
+    first = cache.refresh(force=True).version
+    assert cache.refresh(force=True).version == first
+    client.price = 1700
+    second = cache.refresh(force=True).version
+    assert second != first
+    assert seen == [first, second]
+
+
+def test_failed_refresh_keeps_previous_catalog():
+    client = FakeYClients()
+    cache = CatalogCache(client)
+    catalog = cache.refresh(force=True)
+    client.fail = True
+    assert cache.refresh(force=True) is catalog
+
+
+def test_warm_catalog_costs_no_round_trips():
+    """Сообщение WhatsApp при тёплом кэше: промпт без обращений к API"""
+    client = FakeYClients()
+    cache = CatalogCache(client)
+    cache.get()
+    calls = client.calls
+    catalog = cache.get()
+    assert "Маникюр (1500 руб.)" in catalog.prompt_block()
+    assert catalog.prompt_block() is catalog.prompt_block()
+    assert client.calls == calls
+
+
+def test_render_cache_keyed_by_version_and_prewarmed():
+    client = FakeYClients()
+    cache = CatalogCache(client)
+    renders = []
+
+    def render(catalog, offset):
+        renders.append(offset)
+        return f"{catalog.priced_services[0]['price_min']}:{offset}", None
+
+    pages = RenderCache()
+    pages.register("services_page", render, lambda catalog: (0, 6))
+    cache.add_listener(pages.prewarm)
+
+    catalog = cache.refresh(force=True)
+    assert renders == [0, 6]
+    assert pages.get(catalog, "services_page", 6) == ("1500:6", None)
+    assert renders == [0, 6]  # клик по навигации — без перерисовки
+
+    client.price = 1700
+    catalog = cache.refresh(force=True)
+    assert pages.get(catalog, "services_page", 0) == ("1700:0", None)
+    assert pages.stats()["pages"] == 2  # страницы старой версии удалены
+
+
+def test_render_cache_clamps_client_offsets_and_is_bounded():
+    client = FakeYClients()
+    catalog = CatalogCache(client).get()
+    renders = []
+
+    def render(catalog, offset):
+        renders.append(offset)
+        return str(offset), None
+
+    pages = RenderCache(capacity=2)
+    pages.register("services_page", render, lambda catalog: (0, 6, 12))
+    # services_page_N из callback_data: чужие смещения не плодят страницы
+    assert pages.get(catalog, "services_page", 7) == ("6", None)
+    assert pages.get(catalog, "services_page", 10 ** 9) == ("12", None)
+    assert pages.get(catalog, "services_page", -6) == ("0", None)
+    assert renders == [6, 12, 0] and pages.stats()["pages"] == 2
+    assert pages.get(catalog, "services_page", 0) == ("0", None)
+    assert renders == [6, 12, 0]
+
+
+class SlowYClients(FakeYClients):
+    """YClients, который не отвечает, пока не выставлен release"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def _ok(self, data):
+        self.release.wait(5)
+        return super()._ok(data)
+
+
+def test_snapshot_served_at_once_and_revalidated_in_background():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog-1.snap")
+        client = FakeYClients()
+        saved = CatalogCache(client, company_id=1, snapshot_path=path).get()
+        loaded = catalog_snapshot.load(path)
+        assert loaded.version == saved.version
+        assert loaded.prompt_block() == saved.prompt_block()
+
+        # Рестарт: каталог из снимка без обращения к API, свежий — в фоне
+        client = SlowYClients()
+        client.price = 1700
+        cache = CatalogCache(client, company_id=1, snapshot_path=path)
+        seen = []
+        cache.add_listener(lambda catalog: seen.append(catalog.version))
+        assert seen == [saved.version]
+        assert cache.get().version == saved.version
+        assert cache.get().version == saved.version  # вторая фоновая загрузка не запускается
+        assert client.calls == 0
+        client.release.set()
+        deadline = time.monotonic() + 5
+        while len(seen) < 2 and time.monotonic() < deadline:  # слушатели — после записи снимка
+            time.sleep(0.01)
+        assert cache.get().priced_services[0]["price_min"] == 1700
+        assert seen == [saved.version, cache.version]
+        assert catalog_snapshot.load(path).version == cache.version
+
+
+def test_corrupted_snapshot_is_ignored():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snap")
+        CatalogCache(FakeYClients(), snapshot_path=path).get()
+        with open(path, "r+b") as f:
+            f.seek(-4, os.SEEK_END)
+            f.write(b"\0\0\0\0")
+        assert catalog_snapshot.load(path) is None
+        client = FakeYClients()
+        assert CatalogCache(client, snapshot_path=path).get().company_id == 1
+        assert client.calls > 0
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Catalog tests passed!")
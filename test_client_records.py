@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Тест «Мои записи» из YClients: записи клиента кэшируются, чужие не видны,
+выполненные записи outbox сбрасывают кэш клиента (без обращения к YClients)
+"""
+import os
+import tempfile
+from datetime import date
+
+import record_writes
+from client_records import ClientRecords
+from outbox import Outbox
+from state_store import StateStore
+
+
+class FakeYClients:
+    def __init__(self):
+        self.clients = {"+79990000000": 7}
+        self.records = [
+            {"id": 2, "datetime": "2030-01-03 10:00", "client": {"id": 7}},
+            {"id": 1, "datetime": "2030-01-02 10:00", "client": {"id": 7}},
+            {"id": 3, "datetime": "2030-01-02 11:00", "client": {"id": 8}},
+        ]
+        self.fetches = []
+        self.lookups = 0
+
+    def find_client_by_phone(self, company_id, phone):
+        self.lookups += 1
+        return {"data": [{"id": self.clients[phone]}] if phone in self.clients else []}
+
+    def company_records(self, company_id, **params):
+        self.fetches.append(params)
+        return {"data": list(self.records)}
+
+    def delete_record(self, company_id, record_id):
+        self.records = [r for r in self.records if r["id"] != record_id]
+        return {}
+
+
+def test_records_of_client_are_fetched_once_and_sorted():
+    client = FakeYClients()
+    view = ClientRecords(client)
+    assert view.client_id(5, "+79990000000") == 7
+    records = view.records(5, 7, today=date(2030, 1, 1))
+    assert [r["id"] for r in records] == [1, 2]
+    assert view.records(5, 7) == records
+    assert client.fetches == [{"client_id": 7, "start_date": "2030-01-01"}]
+    assert view.client_id(5, "+79990000000") == 7 and client.lookups == 1
+
+
+def test_unknown_client_is_looked_up_again():
+    client = FakeYClients()
+    view = ClientRecords(client)
+    assert view.client_id(5, "+70000000000") is None
+    client.clients["+70000000000"] = 9
+    assert view.client_id(5, "+70000000000") == 9
+
+
+def test_outbox_delete_invalidates_the_client_view():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients()
+        store = StateStore(os.path.join(tmp, "state.db"))
+        view = ClientRecords(client, store=store)
+        box = Outbox(os.path.join(tmp, "state.db"))
+        record_writes.register(box, client)
+        box.add_listener(view.on_write)
+        assert [r["id"] for r in view.records(5, 7)] == [1, 2]
+
+        key = record_writes.write_key(record_writes.DELETE_RECORD, 5, 1)
+        box.enqueue(record_writes.DELETE_RECORD, {"company_id": 5, "record_id": 1, "client_id": 7}, key)
+        while box.run_once():
+            pass
+        assert [r["id"] for r in view.records(5, 7)] == [2]
+        assert len(client.fetches) == 2
+        box.close()
+        store.close()
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Client records tests passed!")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Тест режима нескольких реплик: разбиение чатов по воркерам, порядок внутри чата,
+рост пропускной способности с числом реплик и общее состояние в SQLite
+"""
+import os
+import time
+import asyncio
+import tempfile
+
+from coordinator import Coordinator, partition, payload_key
+from state_store import SqliteSessionStore, StateStore
+from webhook_server import WebhookServer, post_update
+
+SECRET = "test-secret"
+WORK_SECONDS = 0.02  # "обработка" одного апдейта воркером
+WORKER_CAPACITY = 2  # апдейтов одновременно на одном воркере
+
+
+class SlowWorker(WebhookServer):
+    """Реплика бота: ограниченная параллельность и фиксированное время обработки"""
+
+    def __init__(self):
+        super().__init__(application=None, host="127.0.0.1", port=0, secret_token=SECRET)
+        self.received = []
+        self.capacity = asyncio.Semaphore(WORKER_CAPACITY)
+
+    async def dispatch(self, payload):
+        self.received.append((payload["message"]["chat"]["id"], payload["update_id"]))
+        async with self.capacity:
+            await asyncio.sleep(WORK_SECONDS)
+
+
+def make_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 1760000000, "text": "привет",
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": "Тест"}},
+    }
+
+
+async def run_cluster(replicas, updates):
+    workers = [SlowWorker() for _ in range(replicas)]
+    for worker in workers:
+        await worker.start()
+    coordinator = Coordinator([f"http://127.0.0.1:{w.port}/telegram" for w in workers],
+                              host="127.0.0.1", port=0, secret_token=SECRET)
+    await coordinator.start()
+    url = f"http://127.0.0.1:{coordinator.port}/telegram"
+
+    started = time.perf_counter()
+    for payload in updates:
+        assert await asyncio.to_thread(post_update, url, payload, SECRET) == 200
+    while sum(len(w.received) for w in workers) < len(updates) or any(w.pending for w in workers):
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+
+    await coordinator.stop()
+    for worker in workers:
+        await worker.stop()
+    return workers, elapsed
+
+
+def test_chats_are_partitioned_and_ordered():
+    updates = [make_update(n, 100 + n % 10) for n in range(60)]
+    workers, _ = asyncio.run(run_cluster(3, updates))
+
+    owners = {}
+    for index, worker in enumerate(workers):
+        for chat_id, _ in worker.received:
+            owners.setdefault(chat_id, set()).add(index)
+    # Каждый чат обслуживает ровно одна реплика — та, что выбрана хэшем
+    assert all(len(indexes) == 1 for indexes in owners.values())
+    for chat_id, indexes in owners.items():
+        assert indexes == {partition(("chat", chat_id), 3)}
+    # Внутри чата апдейты приходят в исходном порядке
+    for worker in workers:
+        for chat_id in {c for c, _ in worker.received}:
+            ids = [u for c, u in worker.received if c == chat_id]
+            assert ids == sorted(ids)
+
+
+def test_throughput_scales_with_replicas():
+    updates = [make_update(n, 1000 + n) for n in range(160)]
+    _, single = asyncio.run(run_cluster(1, updates))
+    _, four = asyncio.run(run_cluster(4, updates))
+    # 160 × 20 мс / 2 ≈ 1.6 с на одной реплике, ≈ 0.4 с на четырёх (+ общие накладные расходы)
+    assert single / four >= 2.5, (single, four)
+
+
+def test_payload_key_matches_chat_then_user():
+    assert payload_key(make_update(1, 5)) == ("chat", 5)
+    callback = {"update_id": 2, "callback_query": {"id": "x", "from": {"id": 7},
+                                                   "message": {"chat": {"id": 9}}}}
+    assert payload_key(callback) == ("chat", 9)
+    inline = {"update_id": 3, "inline_query": {"id": "y", "from": {"id": 11}, "query": ""}}
+    assert payload_key(inline) == ("user", 11)
+
+
+def test_sessions_are_shared_between_replicas():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        first = SqliteSessionStore(StateStore(path))
+        second = SqliteSessionStore(StateStore(path))
+
+        for n in range(20):
+            first.add_memory(42, "user", f"сообщение {n}")
+        first.phones[42] = "+79001234567"
+        first.add_record(42, {"id": 1, "service": "Маникюр"})
+        second.add_record(42, {"id": 2, "service": "Педикюр"})
+        second.remove_record(42, 1)
+
+        assert len(second.messages(42)) == second.memory_turns * 2
+        assert second.history(42).endswith("user: сообщение 19")
+        assert second.phones.get(42) == "+79001234567" and 42 in second.phones
+        assert [r["id"] for r in first.get_records(42)] == [2]
+
+
+if __name__ == "__main__":
+    test_chats_are_partitioned_and_ordered()
+    test_throughput_scales_with_replicas()
+    test_payload_key_matches_chat_then_user()
+    test_sessions_are_shared_between_replicas()
+    print("✅ Coordinator tests passed")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Тест FAQ-индекса: частые вопросы отвечаются шаблоном с ценами из каталога,
+остальное уходит в LLM (без обращения к API)
+"""
+from catalog import Catalog
+from faq_index import FaqIndex, booking_question_answer, load_curated, numpy_available
+from tenants import Lexicon
+
+SERVICES = [
+    {"id": 10, "title": "Маникюр", "price_min": 1500, "price_max": 1500, "length": 60},
+    {"id": 11, "title": "Педикюр", "cost": 2000},
+]
+MASTERS = [{"id": 100, "name": "Арина", "specialization": "маникюр"}, {"id": 101, "name": "Полина"}]
+
+
+def make_index(price=1500, **kwargs):
+    services = [dict(SERVICES[0], price_min=price, price_max=price), SERVICES[1]]
+    catalog = Catalog(1, services, services, MASTERS, {100: services, 101: services[1:]})
+    return FaqIndex.from_catalog(catalog, Lexicon(catalog), **kwargs)
+
+
+def test_curated_questions_use_catalog_fields():
+    assert {item["intent"] for item in load_curated()} >= {"price_list", "masters", "how_to_book", "hours"}
+    index = make_index()
+    assert index.answer("Какие у вас цены?") == "Цены на услуги:\n- Маникюр: 1500 руб.\n- Педикюр: 2000 руб."
+    assert index.answer("кто у вас работает") == "Наши мастера:\n- Арина (маникюр)\n- Полина"
+    assert "+7XXXXXXXXXX" in index.answer("как к вам записаться?")
+
+
+def test_service_and_master_answers_follow_catalog():
+    assert make_index().answer("сколько стоит маникюр?") == "Маникюр: 1500 руб. (60 мин)"
+    assert make_index(price=1700).answer("сколько стоит маникюр?") == "Маникюр: 1700 руб. (60 мин)"
+    assert make_index().answer("что делает Полина") == "Полина — услуги: Педикюр (2000₽)"
+
+
+def test_unknown_questions_go_to_llm():
+    index = make_index()
+    for text in ["сколько стоит наращивание ресниц", "где вы находитесь", "привет", "во сколько вы открываетесь"]:
+        assert index.answer(text) is None, text
+
+
+def test_hours_answered_only_when_configured():
+    assert make_index(hours="ежедневно с 10:00 до 21:00").answer("до скольки вы работаете?") == \
+        "Мы работаем ежедневно с 10:00 до 21:00."
+    assert make_index(hours="").answer("до скольки вы работаете?") is None
+
+
+def test_booking_messages_get_faq_only_without_date_and_time():
+    index = make_index()
+    assert "+7XXXXXXXXXX" in booking_question_answer(index, "как записаться")
+    assert booking_question_answer(index, "сколько стоит маникюр") == "Маникюр: 1500 руб. (60 мин)"
+    # Названа услуга — общий шаблон «как записаться» не подходит, это запись
+    assert booking_question_answer(index, "хочу записаться на маникюр") is None
+    assert booking_question_answer(index, "сколько стоит маникюр завтра в 14:00") is None
+
+
+def test_numpy_scores_match_pure_python():
+    pure = make_index(use_numpy=False)
+    assert pure._matrix is None
+    if not numpy_available:
+        return
+    dense = make_index(use_numpy=True)
+    for text in ["сколько стоит маникюр", "какие мастера", "привет"]:
+        assert [round(s, 5) for s in dense._scores(text)] == [round(s, 5) for s in pure._scores(text)]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 FAQ index tests passed!")
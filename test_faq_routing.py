@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Тест маршрутизации сообщений в ботах: частые вопросы с ключевыми словами
+записи («как записаться», «сколько стоит маникюр») отвечаются из FAQ, а
+сообщение с датой и временем идёт в разбор записи (без обращения к API)
+"""
+import os
+import asyncio
+from types import SimpleNamespace
+
+os.environ.setdefault("WHATSAPP_TRANSPORT", "bridge")
+for name in ("TELEGRAM_BOT_TOKEN", "GROQ_API_KEY", "YCLIENTS_PARTNER_TOKEN", "YCLIENTS_USER_TOKEN"):
+    os.environ.setdefault(name, "test")
+os.environ["CATALOG_SNAPSHOT_DIR"] = ""
+
+import app
+import whatsapp_bot
+from tenants import TenantRegistry
+
+SERVICES = [{"id": 10, "title": "Маникюр", "price_min": 1500, "price_max": 1500, "length": 60}]
+MASTERS = [{"id": 100, "name": "Арина"}, {"id": 101, "name": "Полина"}]
+QUESTIONS = {
+    "Как записаться?": "+7XXXXXXXXXX",
+    "к какому мастеру можно записаться": "Наши мастера",
+    "цены на услуги": "Цены на услуги",
+    "сколько стоит маникюр": "Маникюр: 1500 руб.",
+    "что делает Полина": "Полина — услуги",
+}
+
+
+class FakeYClients:
+    def my_companies(self):
+        return {"success": True, "data": [{"id": 1}]}
+
+    def company_services(self, company_id):
+        return {"success": True, "data": SERVICES}
+
+    def get_service_details(self, company_id, staff_id=None):
+        return {"success": True, "data": SERVICES}
+
+    def company_masters(self, company_id):
+        return {"success": True, "data": MASTERS}
+
+
+class NoLLM:
+    """Вместо Groq и разбора записи: запоминает, что до них дошло"""
+
+    def __init__(self, answer):
+        self.calls = []
+        self.answer = answer
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append(args)
+        return self.answer
+
+
+def use_fake_salon(module):
+    module.tenants = TenantRegistry(FakeYClients())
+
+
+def test_whatsapp_faq_questions_skip_booking():
+    use_fake_salon(whatsapp_bot)
+    booking = whatsapp_bot.booking_reply = NoLLM("booking")
+    whatsapp_bot.call_groq_api = NoLLM("llm")
+    for number, (text, expected) in enumerate(QUESTIONS.items()):
+        assert expected in whatsapp_bot.answer_message(f"7900{number}@c.us", text), text
+    assert booking.calls == []
+    assert whatsapp_bot.answer_message("79009@c.us", "маникюр к Арине завтра в 14:00") == "booking"
+
+
+def test_telegram_faq_questions_skip_booking():
+    use_fake_salon(app)
+    app.booking_answer = NoLLM({"content": "booking"})
+    app.parsing = SimpleNamespace(parse=NoLLM(None))
+
+    async def reply(user_id, text):
+        sent = []
+
+        async def reply_text(answer, **kwargs):
+            sent.append(answer)
+
+        message = SimpleNamespace(text=text, from_user=SimpleNamespace(id=user_id, first_name="Тест"),
+                                  reply_text=reply_text)
+        await app.reply(SimpleNamespace(message=message), None)
+        return sent
+
+    for number, (text, expected) in enumerate(QUESTIONS.items()):
+        sent = asyncio.run(reply(5000 + number, text))
+        assert len(sent) == 1 and expected in sent[0], (text, sent)
+    assert app.parsing.parse.calls == [] and app.booking_answer.calls == []
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 FAQ routing tests passed!")
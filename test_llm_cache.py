@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Тест кэша ответов LLM: нормализация ключа, когда история не нужна,
+TTL и LRU в памяти и в общем StateStore (без обращения к Groq)
+"""
+import os
+import time
+import tempfile
+
+from llm_cache import ResponseCache, context_free, normalize, standalone
+from state_store import StateStore
+
+
+def test_key_ignores_case_and_punctuation_but_not_catalog_version():
+    assert normalize("Сколько  стоит Маникюр?!") == "сколько стоит маникюр"
+    key = ResponseCache.key("Сколько стоит маникюр?", "v1", "prompt")
+    assert ResponseCache.key("сколько стоит маникюр", "v1", "prompt") == key
+    assert ResponseCache.key("сколько стоит маникюр", "v2", "prompt") != key
+    assert ResponseCache.key("сколько стоит маникюр", "v1", "other prompt") != key
+
+
+def test_cache_applies_only_without_conversation_context():
+    assert standalone("где вы находитесь")
+    assert not standalone("а сколько это стоит")
+    assert not standalone("да")
+    assert context_free(0, "да")
+    assert not context_free(3, "а у неё?")
+    assert context_free(3, "сколько стоит маникюр")
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = ResponseCache(ttl=1, capacity=2, name="llm_cache_memory")
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"  # "a" теперь недавно читан
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    cache._entries["a"] = ("A", time.time() - 2)
+    assert cache.get("a") is None
+
+
+def test_cached_counts_hits_and_skips_uncacheable_answers():
+    cache = ResponseCache(name="llm_cache_calls")
+    calls = []
+
+    def ask():
+        calls.append(1)
+        return "Маникюр стоит 1500 руб."
+
+    key = cache.key("сколько стоит маникюр", "v1")
+    assert cache.cached(key, ask) == cache.cached(key, ask)
+    assert len(calls) == 1
+    booking = cache.key("запишите на маникюр", "v1")
+    for _ in range(2):
+        cache.cached(booking, lambda: "ЗАПИСЬ: Маникюр | Арина | завтра 12:00",
+                     cacheable=lambda answer: "ЗАПИСЬ:" not in answer)
+    assert cache.stats() == {"entries": 1, "hits": 1, "misses": 3}
+
+
+def test_store_backed_cache_is_shared_and_trimmed():
+    with tempfile.TemporaryDirectory() as directory:
+        store = StateStore(os.path.join(directory, "state.db"))
+        first = ResponseCache(capacity=2, store=store, name="llm_cache_store")
+        second = ResponseCache(capacity=2, store=store, name="llm_cache_store")
+        first.set("a", "A")
+        assert second.get("a") == "A"  # другая реплика видит ответ
+        time.sleep(0.01)
+        first.set("b", "B")
+        time.sleep(0.01)
+        assert second.get("a") == "A"
+        time.sleep(0.01)
+        first.set("c", "C")
+        assert sorted(store.keys("llm_cache_store")) == ["a", "c"]
+        store.close()
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 LLM cache tests passed!")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Тест маршрутизации по моделям: короткий чат — малая модель, запись —
+большая, по таймауту — другой уровень; хеджирование и дедлайн апдейта
+(без обращения к Groq)
+"""
+import time
+import threading
+
+import requests
+
+import deadlines
+import metrics
+from model_router import BOOKING, CHAT, ModelRouter, Tier
+
+SMALL = Tier("small", "small-model", 100, 1.0)
+LARGE = Tier("large", "large-model", 1000, 5.0)
+
+
+def count(name: str) -> int:
+    return metrics.counter(name).value
+
+
+def test_intent_and_length_pick_the_tier():
+    router = ModelRouter(SMALL, LARGE, short_chat_chars=50)
+    small_before, large_before = count("llm.route.small"), count("llm.route.large")
+    assert router.route(CHAT, "привет, как дела?") is SMALL
+    assert router.route(CHAT, "расскажите подробно " * 5) is LARGE
+    assert router.route(BOOKING, "к Арине") is LARGE
+    assert count("llm.route.small") == small_before + 1
+    assert count("llm.route.large") == large_before + 2
+
+
+def test_answer_comes_from_the_routed_model():
+    calls = []
+    answer, tier = ModelRouter(SMALL, LARGE).complete(CHAT, "спасибо", lambda t: calls.append(t) or t.model)
+    assert (answer, tier, calls) == ("small-model", SMALL, [SMALL])
+    assert metrics.histogram("llm.small.seconds").summary()["count"] >= 1
+
+
+def test_timeout_falls_back_to_the_other_tier():
+    def send(tier):
+        if tier.name == "large":
+            raise requests.Timeout("slow")
+        return {"content": f"from {tier.model}"}
+
+    fallbacks, timeouts = count("llm.fallbacks"), count("llm.large.timeouts")
+    answer, tier = ModelRouter(SMALL, LARGE).complete(BOOKING, "хочу записаться", send)
+    assert answer == {"content": "from small-model"} and tier is SMALL
+    assert count("llm.fallbacks") == fallbacks + 1
+    assert count("llm.large.timeouts") == timeouts + 1
+
+
+def test_other_errors_and_second_timeout_are_raised():
+    def fail(tier):
+        raise ValueError("bad response")
+
+    def slow(tier):
+        raise requests.Timeout("slow")
+
+    for send, error in ((fail, ValueError), (slow, requests.Timeout)):
+        try:
+            ModelRouter(SMALL, LARGE).complete(CHAT, "привет", send)
+        except error:
+            continue
+        raise AssertionError(f"{error.__name__} was swallowed")
+
+
+
+def test_slow_request_is_hedged_and_first_answer_wins():
+    release, calls, lock = threading.Event(), [], threading.Lock()
+
+    def send(tier):
+        with lock:
+            calls.append(tier)
+            first = len(calls) == 1
+        if first:
+            release.wait(5)
+            return "slow"
+        return "fast"
+
+    hedges, wins = count("llm.hedges"), count("llm.hedge_wins")
+    try:
+        answer, tier = ModelRouter(SMALL, LARGE, hedge_delay=0.05).complete(CHAT, "привет", send)
+    finally:
+        release.set()
+    assert (answer, tier) == ("fast", SMALL) and len(calls) == 2
+    assert count("llm.hedges") == hedges + 1 and count("llm.hedge_wins") == wins + 1
+
+
+def test_deadline_bounds_the_wait():
+    release, timeouts = threading.Event(), []
+
+    def send(tier):
+        timeouts.append(tier.timeout)
+        release.wait(5)
+        return "late"
+
+    router = ModelRouter(SMALL, LARGE, hedge_percentile=0)
+    started = time.monotonic()
+    try:
+        with deadlines.activate(0.2):
+            router.complete(BOOKING, "хочу записаться", send)
+        raise AssertionError("deadline was not enforced")
+    except deadlines.DeadlineExceeded:
+        assert time.monotonic() - started < 1
+    finally:
+        release.set()
+    assert timeouts and max(timeouts) <= 0.2  # HTTP-таймаут не дальше дедлайна
+
+
+def test_degraded_answer_is_deterministic():
+    class Faq:
+        def answer(self, text):
+            return "Цены на услуги: ..." if "цен" in text else None
+
+    assert deadlines.degraded_answer(booking=True) == deadlines.DEGRADED_BOOKING
+    assert deadlines.degraded_answer(Faq(), "какие цены") == "Цены на услуги: ..."
+    assert deadlines.degraded_answer(Faq(), "привет") == deadlines.DEGRADED_CHAT
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Model router tests passed!")
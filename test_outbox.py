@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Тест очереди записей в YClients: ключ идемпотентности, повторы, сверка после
+таймаута без двойной записи и подтверждение слушателям (без обращения к YClients)
+"""
+import os
+import tempfile
+
+import requests
+
+import record_writes
+from outbox import AMBIGUOUS, DONE, FAILED, PENDING, PERMANENT, RETRY, Outbox, classify
+from yclients_client import YClientsError
+
+
+class FakeYClients:
+    """create_record, который может «потерять» ответ после создания записи"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.records = []
+        self.deleted = []
+
+    def find_client_by_phone(self, company_id, phone):
+        return {"data": [{"id": 7}]}
+
+    def create_record(self, company_id, **fields):
+        error = self.errors.pop(0) if self.errors else None
+        if isinstance(error, YClientsError):
+            raise error
+        self.records.append(dict(fields, id=100 + len(self.records)))
+        if error is not None:  # запись создана, но ответ не дошёл
+            raise error
+        return {"data": {"id": self.records[-1]["id"]}}
+
+    def company_records(self, company_id, **params):
+        return {"data": [r for r in self.records if r["date_time"].startswith(params["start_date"])]}
+
+    def delete_record(self, company_id, record_id):
+        if record_id in self.deleted:
+            raise YClientsError(404, {"message": "not found"})
+        self.deleted.append(record_id)
+        return {}
+
+
+def make_outbox(path, client, channel="telegram", **kwargs):
+    box = Outbox(path, retry_delay=0, **kwargs)
+    record_writes.register(box, client)
+    box.serve(channel)
+    return box
+
+
+def booking(box, chat_id=1, date_time="2030-01-02 14:00"):
+    payload = record_writes.booking_payload(
+        5, {"id": 11, "title": "Маникюр"}, {"id": 22, "name": "Арина"}, date_time,
+        client_name="Анна", client_phone="+79990000000", comment="Запись через бота")
+    key = record_writes.booking_key("telegram", chat_id, 11, 22, date_time)
+    return box.enqueue(record_writes.CREATE_RECORD, payload, key, channel="telegram", chat_id=chat_id)
+
+
+def drain(box):
+    while box.run_once():
+        pass
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} Bad Gateway", response=response)
+
+
+def test_errors_are_classified_by_status():
+    assert classify(requests.Timeout()) == AMBIGUOUS
+    assert classify(YClientsError(503, None)) == AMBIGUOUS
+    assert classify(http_error(502)) == AMBIGUOUS
+    assert classify(http_error(429)) == RETRY
+    assert classify(YClientsError(429, None)) == RETRY
+    assert classify(http_error(404)) == PERMANENT
+    assert classify(YClientsError(422, None)) == PERMANENT
+    assert classify(ValueError("bad payload")) == PERMANENT
+
+
+def test_same_booking_is_queued_and_created_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients()
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client)
+        first = booking(box)
+        assert booking(box).id == first.id
+        assert box.pending() == 1
+        drain(box)
+        again = booking(box)
+        assert again.status == DONE and again.result == {"record_id": 100, "client_id": 7}
+        drain(box)
+        assert len(client.records) == 1
+        assert record_writes.marker(first.key) in client.records[0]["comment"]
+        box.close()
+
+
+def test_rate_limit_is_retried_until_done():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients([YClientsError(429, "slow down")])
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client)
+        finished = []
+        box.add_listener(finished.append)
+        entry = booking(box)
+        assert box.run_once()
+        assert box.get(entry.key).status == PENDING and not finished
+        drain(box)
+        assert [e.status for e in finished] == [DONE]
+        assert finished[0].attempts == 2 and len(client.records) == 1
+        box.close()
+
+
+def test_timeout_after_create_is_reconciled_without_second_record():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients([requests.Timeout("read timed out")])
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client)
+        entry = booking(box)
+        drain(box)
+        done = box.get(entry.key)
+        assert done.status == DONE and done.ambiguous
+        assert done.result["record_id"] == 100
+        assert len(client.records) == 1
+        box.close()
+
+
+def test_permanent_error_fails_and_notifies_listener():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients([YClientsError(422, "Время недоступно")])
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client)
+        finished = []
+        box.add_listener(finished.append)
+        booking(box)
+        drain(box)
+        assert [e.status for e in finished] == [FAILED]
+        assert "недоступно" in finished[0].error and finished[0].attempts == 1
+        # Неудавшуюся запись можно повторить тем же ключом
+        assert booking(box).status == PENDING
+        box.close()
+
+
+def test_retry_of_failed_timeout_reconciles_before_creating():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients([requests.Timeout("read timed out")])
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client, max_attempts=1)
+        entry = booking(box)
+        drain(box)
+        failed = box.get(entry.key)
+        assert failed.status == FAILED and failed.ambiguous and len(client.records) == 1
+        # Пользователь повторяет ту же запись: запись уже есть в YClients, вторую не создаём
+        again = booking(box)
+        assert again.status == PENDING and again.ambiguous
+        drain(box)
+        done = box.get(entry.key)
+        assert done.status == DONE and done.result["record_id"] == 100
+        assert len(client.records) == 1
+        box.close()
+
+
+def test_abandoned_entry_is_reclaimed_and_reconciled():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "outbox.db")
+        client = FakeYClients()
+        crashed = make_outbox(path, client, lease=0)
+        entry = booking(crashed)
+        claimed = crashed.claim()
+        # «Воркер умер» после того, как запись создана в YClients
+        record_writes.create_record(client, claimed)
+        crashed.close()
+
+        box = make_outbox(path, client, lease=0)
+        drain(box)
+        done = box.get(entry.key)
+        assert done.status == DONE and done.ambiguous and done.attempts == 2
+        assert len(client.records) == 1
+        box.close()
+
+
+def test_process_claims_only_its_channels():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "outbox.db")
+        client = FakeYClients()
+        whatsapp = make_outbox(path, client, channel="whatsapp")
+        entry = booking(whatsapp)
+        assert whatsapp.claim() is None
+        telegram = make_outbox(path, client)
+        assert telegram.claim().key == entry.key
+        whatsapp.close()
+        telegram.close()
+
+
+def test_delete_of_missing_record_is_done():
+    with tempfile.TemporaryDirectory() as tmp:
+        client = FakeYClients()
+        box = make_outbox(os.path.join(tmp, "outbox.db"), client)
+        for attempt in range(2):
+            key = record_writes.write_key(record_writes.DELETE_RECORD, 5, 100, attempt)
+            box.enqueue(record_writes.DELETE_RECORD, {"company_id": 5, "record_id": 100}, key)
+            drain(box)
+            assert box.get(key).status == DONE
+        assert client.deleted == [100]
+        box.close()
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Outbox tests passed!")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Тест разбора сообщений в пуле процессов: те же результаты, что и в
+текущем процессе, порядок пачек и склейка одновременных parse() в пачки
+"""
+import asyncio
+
+import metrics
+from bench_parser import generate_corpus
+from booking_parser import parse_booking_message
+from parsing_service import ParsingService
+
+
+def items(size=200):
+    return [(item["text"], "") for item in generate_corpus(size, seed=11)]
+
+
+def expected(batch):
+    return [parse_booking_message(message, history) for message, history in batch]
+
+
+def test_inline_mode_without_processes():
+    service = ParsingService(0, name="parser_inline")
+    batch = items(50)
+    assert asyncio.run(service.parse_many(batch)) == expected(batch)
+    assert asyncio.run(service.parse(*batch[0])) == expected(batch[:1])[0]
+
+
+def test_process_pool_matches_inline_and_batches_concurrent_calls():
+    service = ParsingService(2, batch_size=16, name="parser_pool")
+    batch = items(200)
+
+    async def scenario():
+        many = await service.parse_many(batch)
+        single = await asyncio.gather(*(service.parse(message, history) for message, history in batch))
+        return many, list(single)
+
+    try:
+        many, single = asyncio.run(scenario())
+    finally:
+        service.shutdown()
+    assert many == expected(batch)
+    assert single == expected(batch)
+    # 400 сообщений ушли в процессы пачками по 16, а не по одному
+    assert metrics.counter("parser_pool.messages").value == 400
+    assert metrics.counter("parser_pool.batches").value == 2 * ((200 + 15) // 16)
+    assert service.inflight == 0
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Parsing service tests passed!")
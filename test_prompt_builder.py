@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Тест сборки промптов: бюджет токенов на большом каталоге, только нужные
+услуги и мастера, сжатие старых реплик (без обращения к Groq)
+"""
+from catalog import Catalog
+import metrics
+from prompt_builder import CATALOG_IN_MESSAGE, PromptBuilder, estimate_tokens, record_usage
+from tenants import Lexicon
+
+# Шаблоны с теми же полями, что в app.py (импорт app требует токенов из .env)
+BOOKING_PROMPT = "Инструкции по записи.\nИстория:\n{{history}}\nДанные:\n{{api_data}}\nСообщение: {{message}}\n"
+CHAT_PROMPT = "Ты помощник.\nИстория чата:\n{{history}}\nСообщение:\n{{message}}\n"
+SYSTEM_PROMPT = "Инструкции по записи.\nДоступные данные:\n{{api_data}}\n"
+USER_PROMPT = "{{api_data}}История:\n{{history}}\nСообщение: {{message}}\n"
+
+
+def big_catalog(services=200, masters=30):
+    items = [{"id": i, "title": f"Услуга номер {i}", "cost": 1000 + i, "length": 60} for i in range(services)]
+    items[7] = {"id": 7, "title": "Маникюр", "cost": 1500, "length": 60}
+    staff = [{"id": 1000 + i, "name": f"Мастер{i}"} for i in range(masters)]
+    staff[3] = {"id": 1003, "name": "Арина", "specialization": "маникюр"}
+    matrix = {m["id"]: items[i::masters] for i, m in enumerate(staff)}
+    matrix[1003] = [items[7]]
+    return Catalog(1, items, items, staff, matrix)
+
+
+def test_booking_prompt_stays_within_budget_for_large_catalog():
+    catalog = big_catalog()
+    builder = PromptBuilder(budget=1500)
+    assert estimate_tokens(catalog.prompt_block()) > 4000
+    prompt = builder.build(BOOKING_PROMPT, "хочу записаться завтра", catalog=catalog, lexicon=Lexicon(catalog))
+    assert prompt.tokens <= 1500
+    assert "список сокращён" in prompt.text
+
+
+def test_only_mentioned_master_and_service_are_included():
+    catalog = big_catalog()
+    builder = PromptBuilder()
+    prompt = builder.build(BOOKING_PROMPT, "можно к Арине?", [("user", "хочу на маникюр")],
+                           catalog, Lexicon(catalog))
+    assert "- Арина (маникюр) [staff_id 1003] - услуги: Маникюр (1500₽)" in prompt.text
+    assert "Мастер0" not in prompt.text and "Услуга номер" not in prompt.text
+
+    prompt = builder.build(BOOKING_PROMPT, "сколько стоит маникюр", catalog=catalog, lexicon=Lexicon(catalog))
+    assert "- Маникюр (1500 руб.) (60 мин) [service_id 7]" in prompt.text
+    assert "- Арина" in prompt.text and "Мастер0" not in prompt.text
+
+
+def test_older_turns_are_summarized():
+    catalog = big_catalog()
+    turns = [("user", "хочу на маникюр к Арине"), ("assistant", "На какое время?"),
+             ("user", "завтра в 14:00"), ("assistant", "Уточните телефон"),
+             ("user", "+79990000000"), ("assistant", "Спасибо")]
+    prompt = PromptBuilder(recent_turns=2).build(CHAT_PROMPT, "подтверждаю", turns, catalog, Lexicon(catalog))
+    assert "(ранее 4 сообщений: услуга — Маникюр; мастер — Арина; дата — завтра; время — 14:00)" in prompt.text
+    assert "user: +79990000000\nassistant: Спасибо" in prompt.text
+    assert "хочу на маникюр к Арине" not in prompt.text
+    assert prompt.sections["summarized"] == 4
+
+
+def test_system_prefix_is_identical_for_every_user_of_a_catalog_version():
+    catalog = big_catalog(services=20, masters=4)
+    builder = PromptBuilder()
+    first = builder.build_messages(SYSTEM_PROMPT, USER_PROMPT, "хочу на маникюр", catalog=catalog,
+                                   lexicon=Lexicon(catalog))
+    second = builder.build_messages(SYSTEM_PROMPT, USER_PROMPT, "а к Арине можно?", [("user", "привет")],
+                                    catalog, Lexicon(catalog))
+    assert first.messages[0]["content"] is second.messages[0]["content"]
+    assert first.messages[0]["content"].endswith(catalog.prompt_block() + "\n")
+    assert "Доступные услуги" not in second.messages[1]["content"]
+    assert second.messages[1]["content"].startswith("История:\nuser: привет")
+    assert first.sections["prefix"] == estimate_tokens(first.messages[0]["content"])
+
+    updated = big_catalog(services=21, masters=4)
+    third = builder.build_messages(SYSTEM_PROMPT, USER_PROMPT, "хочу на маникюр", catalog=updated)
+    assert third.messages[0]["content"] != first.messages[0]["content"]
+
+
+def test_catalog_over_prefix_budget_goes_to_user_message():
+    catalog = big_catalog()
+    prompt = PromptBuilder(prefix_budget=1000).build_messages(
+        SYSTEM_PROMPT, USER_PROMPT, "можно к Арине?", catalog=catalog, lexicon=Lexicon(catalog))
+    assert CATALOG_IN_MESSAGE in prompt.messages[0]["content"]
+    assert "- Арина (маникюр)" in prompt.messages[1]["content"]
+
+
+def test_record_usage_reads_cached_prompt_tokens():
+    before = metrics.histogram("llm.cached_prompt_tokens").summary()["count"]
+    usage = {"prompt_tokens": 1200, "prompt_tokens_details": {"cached_tokens": 1024}, "prompt_time": 0.01}
+    assert record_usage({"usage": usage}) == 1200
+    assert metrics.histogram("llm.cached_prompt_tokens").summary()["count"] == before + 1
+    assert record_usage({}) is None
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Prompt builder tests passed!")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Тест напоминаний о записях: время отправки за 24 и 2 часа, перезапуск,
+отмена через outbox, пропуск опоздавших, повтор при ошибке отправки,
+напоминания каналов другого процесса и часовой пояс салона
+"""
+import os
+import tempfile
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from outbox import DONE, OutboxEntry
+import record_writes
+import shared
+from reminders import ReminderScheduler, parse_offsets
+
+HOUR = 3600
+VISIT = 1_900_000_000.0
+SALON_TZ = ZoneInfo("Europe/Moscow")
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Sent(list):
+    def __call__(self, channel, chat_id, text):
+        self.append((channel, chat_id, text))
+
+
+def make(path, clock, sent, **kwargs):
+    kwargs.setdefault("served", lambda channel: True)
+    kwargs.setdefault("tz", SALON_TZ)
+    return ReminderScheduler(path, send=sent, clock=clock, rate=1000, burst=1000, **kwargs)
+
+
+def test_offsets_from_env_spec():
+    assert parse_offsets("24h, 2h") == (24 * HOUR, 2 * HOUR)
+    assert parse_offsets("30m,1d,30m") == (86400, 1800)
+    assert parse_offsets("") == ()
+
+
+def test_reminders_fire_at_offsets_and_survive_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        clock, sent = Clock(VISIT - 48 * HOUR), Sent()
+        scheduler = make(path, clock, sent)
+        assert scheduler.schedule(100, "telegram", 42, VISIT, "Маникюр", "Арина") == 2
+        assert scheduler.schedule(100, "telegram", 42, VISIT, "Маникюр", "Арина") == 0
+        assert scheduler.next_due() == VISIT - 24 * HOUR
+        clock.now = VISIT - 25 * HOUR
+        assert scheduler.run_once() == 0
+        clock.now = VISIT - 24 * HOUR
+        assert scheduler.run_once() == 1
+        assert sent[0][:2] == ("telegram", 42) and "Маникюр" in sent[0][2] and "Арина" in sent[0][2]
+        scheduler.close()
+
+        # После перезапуска — только оставшееся напоминание
+        restarted = make(path, clock, sent)
+        assert restarted.scheduled() == 1
+        clock.now = VISIT - 2 * HOUR
+        assert restarted.run_once() == 1 and len(sent) == 2
+        assert restarted.schedule(100, "telegram", 42, VISIT, "Маникюр", "Арина") == 0
+        restarted.close()
+
+
+def test_outbox_writes_schedule_and_cancel():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock, sent = Clock(VISIT - 48 * HOUR), Sent()
+        scheduler = make(os.path.join(tmp, "state.db"), clock, sent)
+        payload = {"datetime": "2030-03-17 20:00", "service_title": "Стрижка", "master_name": "Полина"}
+        created = OutboxEntry(1, "k1", record_writes.CREATE_RECORD, payload, "whatsapp", "7999@c.us", DONE, 1,
+                              False, {"record_id": 7}, None, 0, 0)
+        scheduler.on_write(created)
+        assert scheduler.scheduled() == 2
+        deleted = created._replace(kind=record_writes.DELETE_RECORD, payload={"company_id": 5, "record_id": 7})
+        scheduler.on_write(deleted)
+        assert scheduler.scheduled() == 0
+        clock.now = 1_950_000_000.0
+        assert scheduler.run_once() == 0 and not sent
+        scheduler.close()
+
+
+def test_late_reminder_is_skipped_and_failed_send_retried():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock = Clock(VISIT - 48 * HOUR)
+        attempts = []
+
+        def flaky(channel, chat_id, text):
+            attempts.append(text)
+            if len(attempts) == 1:
+                raise LookupError("channel is not running yet")
+
+        scheduler = ReminderScheduler(os.path.join(tmp, "state.db"), tz=SALON_TZ, send=flaky, clock=clock,
+                                      rate=1000, burst=1000, served=lambda channel: True)
+        scheduler.schedule(100, "telegram", 42, VISIT)
+        # Бот был выключен: напоминание за 24 часа опоздало больше чем на grace
+        clock.now = VISIT - 20 * HOUR
+        assert scheduler.run_once() == 0 and not attempts
+        clock.now = VISIT - 2 * HOUR
+        assert scheduler.run_once() == 0 and len(attempts) == 1
+        assert scheduler.scheduled() == 1
+        clock.now += 60
+        assert scheduler.run_once() == 1 and len(attempts) == 2
+        assert scheduler.scheduled() == 0
+        scheduler.close()
+
+
+def test_batch_size_limits_one_pass():
+    with tempfile.TemporaryDirectory() as tmp:
+        clock, sent = Clock(VISIT - 48 * HOUR), Sent()
+        scheduler = make(os.path.join(tmp, "state.db"), clock, sent, offsets=(2 * HOUR,), batch_size=2)
+        for record_id in range(5):
+            scheduler.schedule(record_id, "telegram", record_id, VISIT)
+        clock.now = VISIT - 2 * HOUR
+        assert [scheduler.run_once() for _ in range(4)] == [2, 2, 1, 0]
+        assert sorted(chat for _, chat, _ in sent) == [0, 1, 2, 3, 4]
+        scheduler.close()
+
+
+
+def test_process_sends_only_reminders_of_its_channels():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.db")
+        clock = Clock(VISIT - 48 * HOUR)
+        telegram_sent, whatsapp_sent = Sent(), Sent()
+        telegram = make(path, clock, telegram_sent, offsets=(2 * HOUR,), served=lambda ch: ch == "telegram")
+        whatsapp = make(path, clock, whatsapp_sent, offsets=(2 * HOUR,), served=lambda ch: ch == "whatsapp")
+        telegram.schedule(1, "telegram", 42, VISIT)
+        telegram.schedule(2, "whatsapp", "7999@c.us", VISIT)
+        whatsapp.reload()
+        clock.now = VISIT - 2 * HOUR
+        assert telegram.run_once() == 1 and [chat for _, chat, _ in telegram_sent] == [42]
+        # Напоминание в WhatsApp осталось ждать процесс WhatsApp, попытка не потрачена
+        assert telegram.scheduled() == 1
+        assert whatsapp.run_once() == 1 and [chat for _, chat, _ in whatsapp_sent] == ["7999@c.us"]
+        assert whatsapp.scheduled() == 0
+        telegram.close()
+        whatsapp.close()
+
+
+def test_naive_datetime_is_salon_time():
+    """Процесс в UTC (Docker), салон в Москве: 20:00 записи — это 17:00 UTC"""
+    visit = datetime(2030, 3, 17, 17, 0, tzinfo=timezone.utc).timestamp()
+    with tempfile.TemporaryDirectory() as tmp:
+        clock, sent = Clock(visit - 48 * HOUR), Sent()
+        scheduler = make(os.path.join(tmp, "state.db"), clock, sent, offsets=(2 * HOUR,))
+        payload = {"datetime": "2030-03-17 20:00", "service_title": "Стрижка", "master_name": "Полина"}
+        scheduler.on_write(OutboxEntry(1, "k1", record_writes.CREATE_RECORD, payload, "telegram", 42, DONE, 1,
+                                       False, {"record_id": 7}, None, 0, 0))
+        assert scheduler.next_due() == visit - 2 * HOUR
+        # Время YClients со смещением не зависит от пояса салона
+        assert scheduler.schedule_records("telegram", 42, [{"id": 8, "datetime": "2030-03-17T20:00:00+03:00"}]) == 1
+        clock.now = visit - 2 * HOUR
+        assert scheduler.run_once() == 2
+        assert all("17.03 в 20:00" in text for _, _, text in sent)
+        scheduler.close()
+
+
+def test_reminders_require_salon_tz():
+    saved = {name: os.environ.pop(name, None) for name in ("SALON_TZ", "REMINDER_OFFSETS")}
+    try:
+        try:
+            shared.reminders()
+        except ValueError as e:
+            assert "SALON_TZ" in str(e)
+        else:
+            raise AssertionError("reminders started without SALON_TZ")
+        os.environ["REMINDER_OFFSETS"] = ""
+        assert shared.reminders() is None
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Reminder tests passed!")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Тест общего runtime: каналы в одном event loop, общие ресурсы и сессии
+"""
+import asyncio
+
+import shared
+from channels import Channel
+from run_bots import run_channels
+
+
+class FakeChannel(Channel):
+    def __init__(self, name, crash_after=None):
+        self.name = name
+        self.crash_after = crash_after
+        self.stopped = False
+
+    async def run(self, stop_event):
+        try:
+            if self.crash_after is not None:
+                await asyncio.sleep(self.crash_after)
+                raise RuntimeError("connection lost")
+            await stop_event.wait()
+        finally:
+            self.stopped = True
+
+
+def test_channels_share_loop_and_stop_together():
+    async def scenario():
+        stop_event = asyncio.Event()
+        channels = [FakeChannel("telegram"), FakeChannel("whatsapp")]
+        asyncio.get_running_loop().call_later(0.05, stop_event.set)
+        clean = await run_channels(channels, stop_event)
+        return clean, channels
+
+    clean, channels = asyncio.run(scenario())
+    assert clean
+    assert all(channel.stopped for channel in channels)
+
+
+def test_crashed_channel_stops_the_others():
+    async def scenario():
+        channels = [FakeChannel("telegram"), FakeChannel("whatsapp", crash_after=0.01)]
+        clean = await asyncio.wait_for(run_channels(channels, asyncio.Event()), 5)
+        return clean, channels
+
+    clean, channels = asyncio.run(scenario())
+    assert not clean
+    assert all(channel.stopped for channel in channels)
+
+
+def test_shared_resources_are_singletons():
+    assert shared.blocking_pool() is shared.blocking_pool()
+    assert shared.groq_session() is shared.groq_session()
+    assert shared.yclients() is shared.yclients()
+    assert shared.tenants() is shared.tenants()
+    # Каталог любого салона ходит в API через один общий клиент и его пул соединений
+    assert shared.catalog_cache().client.client is shared.yclients()
+
+    sessions = shared.session_store()
+    assert sessions is shared.session_store()
+    for n in range(20):
+        sessions.add_memory(42, "user", f"сообщение {n}")
+    sessions.add_memory("7900@c.us", "user", "привет")
+    # История ограничена MEMORY_TURNS, а ключи Telegram и WhatsApp не пересекаются
+    assert len(sessions.memory[42]) == sessions.memory_turns * 2
+    assert sessions.history(42).endswith("user: сообщение 19")
+    assert sessions.history("7900@c.us") == "user: привет"
+
+
+if __name__ == "__main__":
+    test_channels_share_loop_and_stop_together()
+    test_crashed_channel_stops_the_others()
+    test_shared_resources_are_singletons()
+    print("✅ Runtime tests passed")
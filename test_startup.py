@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Тест прогрева при старте и разбора вывода -X importtime (без обращения к API)
+"""
+import time
+import threading
+
+from bench_startup import packages, parse_importtime
+from startup import prewarm
+
+
+def test_prewarm_runs_steps_in_parallel_and_survives_failures():
+    started = threading.Barrier(2, timeout=2)
+
+    def catalog():
+        started.wait()  # оба шага идут одновременно
+
+    def parser():
+        started.wait()
+
+    def groq():
+        raise ConnectionError("no network")
+
+    timings = prewarm({"catalog": catalog, "parser": parser, "groq": groq}, timeout=5)
+    assert timings["catalog"] is not None and timings["parser"] is not None
+    assert timings["groq"] is None
+
+
+def test_prewarm_does_not_wait_past_timeout():
+    release = threading.Event()
+    started = time.perf_counter()
+    timings = prewarm({"slow": lambda: release.wait(5)}, timeout=0.1)
+    assert time.perf_counter() - started < 1
+    assert timings == {"slow": None}
+    release.set()
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     _ssl\n"
+        "import time:       300 |        420 |   ssl\n"
+        "import time:        80 |         80 |     requests.compat\n"
+        "import time:       500 |       1000 | app\n"
+    )
+    modules = parse_importtime(stderr)
+    assert [m["module"] for m in modules] == ["_ssl", "ssl", "requests.compat", "app"]
+    assert [m["depth"] for m in modules] == [2, 1, 2, 0]
+    assert modules[-1]["cumulative_us"] == 1000
+    assert list(packages(modules).items())[:2] == [("app", 500), ("ssl", 300)]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Startup tests passed!")
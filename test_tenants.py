@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Тест нескольких салонов в одном процессе: маршрутизация чатов, отдельные
+каталоги и лексиконы, общий клиент с бюджетом запросов на салон
+"""
+import time
+import asyncio
+
+from blocking_pool import BlockingPool
+from render_cache import RenderCache
+from tenants import RateBudget, TenantRegistry, parse_routes
+
+SALONS = {
+    1: {"masters": [{"id": 100, "name": "Арина"}, {"id": 101, "name": "Полина"}],
+        "services": [{"id": 10, "title": "Маникюр", "price_min": 1500, "price_max": 1500}]},
+    2: {"masters": [{"id": 200, "name": "Ольга Смирнова"}],
+        "services": [{"id": 20, "title": "Стрижка", "price_min": 900, "price_max": 900},
+                     {"id": 21, "title": "Стрижка мужская", "price_min": 700, "price_max": 700}]},
+}
+
+
+class FakeYClients:
+    """Один клиент на все салоны; считает обращения по company_id"""
+
+    def __init__(self):
+        self.calls = {}
+
+    def _ok(self, company_id, data):
+        self.calls[company_id] = self.calls.get(company_id, 0) + 1
+        return {"success": True, "data": data}
+
+    def my_companies(self):
+        return self._ok(None, [{"id": 1}, {"id": 2}])
+
+    def company_services(self, company_id):
+        return self._ok(company_id, SALONS[company_id]["services"])
+
+    def get_service_details(self, company_id, staff_id=None):
+        return self._ok(company_id, SALONS[company_id]["services"])
+
+    def company_masters(self, company_id):
+        return self._ok(company_id, SALONS[company_id]["masters"])
+
+
+def make_registry(**kwargs):
+    return TenantRegistry(FakeYClients(), routes=parse_routes("telegram=1,whatsapp=2,telegram:77=2"), **kwargs)
+
+
+def test_chats_are_routed_to_their_salon():
+    registry = make_registry()
+    assert registry.resolve("telegram", 5).company_id == 1
+    assert registry.resolve("telegram", 77).company_id == 2
+    assert registry.resolve("whatsapp", "7900@c.us").company_id == 2
+    registry.bind("whatsapp", "7900@c.us", 1)
+    assert registry.resolve("whatsapp", "7900@c.us").company_id == 1
+    # Без настроек — первый салон из my_companies, как раньше
+    assert TenantRegistry(FakeYClients()).get().company_id == 1
+
+    first, second = registry.get(1).catalog.get(), registry.get(2).catalog.get()
+    assert [m["id"] for m in first.masters] == [100, 101]
+    assert [m["id"] for m in second.masters] == [200]
+    # Один салон — один кэш и одна загрузка каталога
+    assert registry.get(2) is registry.resolve("whatsapp", "other@c.us")
+    assert len(registry.tenants()) == 2
+
+
+def test_current_salon_follows_message_into_pool_threads():
+    registry = make_registry()
+    pool = BlockingPool(4, name="tenants-test")
+
+    async def handle(channel, chat_id):
+        with registry.activate(channel, chat_id):
+            catalog = await pool.run(registry.catalog.get)
+            return catalog.company_id
+
+    async def scenario():
+        return await asyncio.gather(handle("telegram", 5), handle("telegram", 77), handle("whatsapp", "x"))
+
+    try:
+        assert asyncio.run(scenario()) == [1, 2, 2]
+    finally:
+        pool.shutdown()
+    # Вне сообщения — салон по умолчанию
+    assert registry.current() is registry.get()
+
+
+def test_lexicon_uses_salon_catalog():
+    registry = make_registry()
+    first, second = registry.get(1).lexicon, registry.get(2).lexicon
+    assert first.find_master("хочу к Арине на маникюр")["id"] == 100
+    assert first.find_master("к Ольге") is None
+    assert second.find_master("можно к Ольге?")["id"] == 200
+    assert second.find_service("мужская стрижка")["id"] == 20
+    assert second.find_service("стрижка мужская завтра")["id"] == 21
+
+    parsed = {"service": None, "master": None, "datetime": "2025-10-26 12:00", "has_all_info": False}
+    parsed = registry.get(2).lexicon.refine(parsed, "запишите к Ольге на стрижку")
+    assert parsed["master"] == "Ольга Смирнова" and parsed["service"] == "Стрижка"
+    assert parsed["has_all_info"]
+    # Лексикон строится один раз на версию каталога
+    assert registry.get(2).lexicon is second
+
+
+def test_rate_budget_is_per_salon():
+    client = FakeYClients()
+    registry = TenantRegistry(client, rate=20, burst=2)
+    noisy, quiet = registry.get(1).client, registry.get(2).client
+
+    started = time.perf_counter()
+    for _ in range(6):
+        noisy.company_masters(1)
+    noisy_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(2):
+        quiet.company_masters(2)
+    quiet_time = time.perf_counter() - started
+
+    # 2 сразу из запаса, ещё 4 по 50 мс; соседний салон не ждёт
+    assert noisy_time >= 0.18, noisy_time
+    assert quiet_time < 0.05, quiet_time
+    assert client.calls == {1: 6, 2: 2}
+    assert registry.get(1).client.client is registry.get(2).client.client is client
+
+
+def test_rate_budget_refills():
+    budget = RateBudget(rate=100, burst=1, name="tenant.test")
+    budget.acquire()
+    started = time.perf_counter()
+    budget.acquire()
+    assert 0.005 <= time.perf_counter() - started < 0.1
+
+
+def test_render_cache_keeps_pages_of_every_salon():
+    registry = make_registry()
+    pages = RenderCache()
+    pages.register("masters", lambda catalog, offset: (catalog.masters[0]["name"], None))
+    registry.add_listener(pages.prewarm)
+    before = pages.stats()  # счётчики hits/misses общие для процесса
+
+    first, second = registry.get(1).catalog.get(), registry.get(2).catalog.get()
+    assert pages.get(first, "masters") == ("Арина", None)
+    assert pages.get(second, "masters") == ("Ольга Смирнова", None)
+    stats = pages.stats()
+    assert stats["pages"] == 2
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (2, 2)
+
+
+
+def test_stored_routes_are_cached_between_updates():
+    class CountingStore:
+        def __init__(self):
+            self.data, self.reads = {}, 0
+
+        def get(self, namespace, key):
+            self.reads += 1
+            return self.data.get((namespace, key))
+
+        def set(self, namespace, key, value):
+            self.data[(namespace, key)] = value
+
+    store = CountingStore()
+    registry = make_registry(store=store)
+    other_replica = make_registry(store=store)
+    for _ in range(5):
+        assert registry.company_for("telegram", 5) == 1
+    assert store.reads == 1
+    other_replica.bind("telegram", 5, 2)
+    # Привязка другой реплики видна после routes_ttl, без SQLite на каждый апдейт
+    assert registry.company_for("telegram", 5) == 1
+    assert make_registry(store=store, routes_ttl=0).company_for("telegram", 5) == 2
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Tenant tests passed!")
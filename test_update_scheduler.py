@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Тест планировщика апдейтов: порядок внутри чата, параллельность между чатами, backpressure
+"""
+import time
+import asyncio
+import threading
+
+import metrics
+from update_scheduler import KeyedScheduler, ThreadedScheduler
+
+
+def test_order_within_key_parallel_across_keys():
+    async def scenario():
+        scheduler = KeyedScheduler(max_workers=4, max_pending=100)
+        await scheduler.start()
+        log = []
+
+        async def job(chat, n):
+            await asyncio.sleep(0.02 if n == 0 else 0)
+            log.append((chat, n))
+
+        started = time.perf_counter()
+        for n in range(5):
+            for chat in ("a", "b", "c"):
+                await scheduler.submit(chat, lambda chat=chat, n=n: job(chat, n))
+        await scheduler.stop()
+        return log, time.perf_counter() - started
+
+    log, elapsed = asyncio.run(scenario())
+    for chat in ("a", "b", "c"):
+        assert [n for c, n in log if c == chat] == list(range(5))
+    # Три медленных первых апдейта шли параллельно, а не друг за другом
+    assert elapsed < 0.06
+
+
+def test_backpressure_blocks_submit():
+    async def scenario():
+        scheduler = KeyedScheduler(max_workers=1, max_pending=2)
+        await scheduler.start()
+        release = asyncio.Event()
+        await scheduler.submit("a", release.wait)
+        await scheduler.submit("b", release.wait)
+        third = asyncio.create_task(scheduler.submit("c", release.wait))
+        await asyncio.sleep(0.02)
+        blocked = not third.done()
+        release.set()
+        await third
+        await scheduler.stop()
+        return blocked
+
+    assert asyncio.run(scenario())
+
+
+def test_job_errors_are_returned():
+    async def scenario():
+        scheduler = KeyedScheduler(max_workers=2)
+        await scheduler.start()
+
+        async def boom():
+            raise ValueError("boom")
+
+        try:
+            await scheduler.run("a", boom())
+        except ValueError:
+            return True
+        finally:
+            await scheduler.stop()
+        return False
+
+    assert asyncio.run(scenario())
+
+
+def test_threaded_scheduler_keeps_sender_order():
+    scheduler = ThreadedScheduler(max_workers=4, max_pending=50)
+    scheduler.start()
+    log = []
+    lock = threading.Lock()
+
+    def handle(sender, n):
+        time.sleep(0.005 if n % 2 == 0 else 0)
+        with lock:
+            log.append((sender, n))
+
+    for n in range(6):
+        for sender in ("79990000001", "79990000002"):
+            scheduler.submit(sender, handle, sender, n)
+    scheduler.stop()
+    for sender in ("79990000001", "79990000002"):
+        assert [n for s, n in log if s == sender] == list(range(6))
+
+
+def test_threaded_scheduler_metrics_and_quick_ack():
+    """submit() возвращается сразу, а задержка и глубина очереди видны в метриках"""
+    scheduler = ThreadedScheduler(max_workers=2, max_pending=50, name="test-whatsapp")
+    scheduler.start()
+
+    def slow(_):
+        time.sleep(0.02)
+
+    started = time.perf_counter()
+    for n in range(4):
+        scheduler.submit("79990000001", slow, n)
+    ack_time = time.perf_counter() - started
+    depth = metrics.snapshot()["gauges"]["test-whatsapp.queued"]
+    scheduler.stop()
+
+    snap = metrics.snapshot()
+    assert ack_time < 0.02
+    assert depth >= 2
+    assert snap["counters"]["test-whatsapp.processed"] == 4
+    assert snap["histograms"]["test-whatsapp.latency_seconds"]["count"] == 4
+    assert snap["histograms"]["test-whatsapp.latency_seconds"]["max"] >= 0.06
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
+    print("🎉 Scheduler tests passed!")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Тест webhook-сервера: POST записанных апдейтов, проверка секрета, backpressure,
+некорректный Content-Length, слишком длинные заголовки и доступ к /metrics
+"""
+import asyncio
+
+from webhook_server import SECRET_HEADER, WebhookServer, post_update
+
+SECRET = "test-secret"
+UPDATE = {
+    "update_id": 1001,
+    "message": {
+        "message_id": 1,
+        "date": 1760000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+        "text": "хочу записаться на маникюр",
+    },
+}
+
+
+class RecordingServer(WebhookServer):
+    """Вместо хендлеров Telegram просто запоминает апдейты"""
+
+    def __init__(self, **kwargs):
+        super().__init__(application=None, host="127.0.0.1", port=0, secret_token=SECRET, **kwargs)
+        self.received = []
+        self.release = asyncio.Event()
+
+    async def dispatch(self, payload):
+        await self.release.wait()
+        self.received.append(payload["update_id"])
+
+
+async def _post(server, payload, secret=SECRET, path="/telegram"):
+    url = f"http://127.0.0.1:{server.port}{path}"
+    return await asyncio.to_thread(post_update, url, payload, secret)
+
+
+def test_webhook_accepts_and_validates():
+    async def scenario():
+        server = RecordingServer()
+        await server.start()
+        try:
+            assert await _post(server, UPDATE) == 200
+            assert await _post(server, UPDATE, secret="wrong") == 403
+            assert await _post(server, UPDATE, path="/other") == 404
+            assert await _post(server, {"no": "update"}) == 400
+            server.release.set()
+        finally:
+            await server.stop()
+        return server.received
+
+    assert asyncio.run(scenario()) == [1001]
+
+
+def test_webhook_backpressure():
+    async def scenario():
+        server = RecordingServer(max_pending=2)
+        await server.start()
+        try:
+            statuses = [await _post(server, dict(UPDATE, update_id=i)) for i in range(3)]
+            server.release.set()
+        finally:
+            await server.stop()
+        return statuses, sorted(server.received)
+
+    statuses, received = asyncio.run(scenario())
+    assert statuses == [200, 200, 503]
+    assert received == [0, 1]
+
+
+async def _raw(server, request: bytes) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        return int((await reader.readline()).split()[1])
+    finally:
+        writer.close()
+
+
+def test_webhook_rejects_bad_content_length():
+    async def scenario():
+        server = RecordingServer()
+        await server.start()
+        try:
+            return [await _raw(server, f"POST /telegram HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+                    for length in ("abc", "-5", "1e3")]
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == [400, 400, 400]
+
+
+def test_webhook_rejects_oversized_headers():
+    async def scenario():
+        server = RecordingServer()
+        await server.start()
+        try:
+            # Заголовки больше буфера StreamReader (64 КБ): 431, а не молча закрытое соединение
+            cookie = "x" * 70 * 1024
+            return (await _raw(server, f"POST /telegram HTTP/1.1\r\nCookie: {cookie}\r\n\r\n".encode()),
+                    await _raw(server, b"GET /healthz HTTP/1.1\r\nConnection: close\r\n\r\n"))
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == (431, 200)
+
+
+def test_metrics_require_secret():
+    async def scenario():
+        server = RecordingServer()
+        await server.start()
+        try:
+            request = "GET /metrics HTTP/1.1\r\nConnection: close\r\n{}\r\n"
+            return (await _raw(server, request.format("").encode()),
+                    await _raw(server, request.format(f"{SECRET_HEADER}: wrong\r\n").encode()),
+                    await _raw(server, request.format(f"{SECRET_HEADER}: {SECRET}\r\n").encode()),
+                    await _raw(server, b"GET /healthz HTTP/1.1\r\nConnection: close\r\n\r\n"))
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == (403, 403, 200, 200)
+
+
+if __name__ == "__main__":
+    test_webhook_accepts_and_validates()
+    print("✅ test_webhook_accepts_and_validates")
+    test_webhook_backpressure()
+    print("✅ test_webhook_backpressure")
+    test_webhook_rejects_bad_content_length()
+    print("✅ test_webhook_rejects_bad_content_length")
+    test_webhook_rejects_oversized_headers()
+    print("✅ test_webhook_rejects_oversized_headers")
+    test_metrics_require_secret()
+    print("✅ test_metrics_require_secret")
+    print("🎉 Webhook tests passed!")
@@ -0,0 +1,265 @@
+# update_scheduler.py
+"""
+Планировщик апдейтов: разные чаты обрабатываются параллельно,
+апдейты одного чата — строго по очереди (важно для UserMemory).
+
+KeyedScheduler             — асинхронные очереди по ключу + общий пул воркеров
+ChatOrderedUpdateProcessor — подключение к python-telegram-bot (concurrent_updates)
+ThreadedScheduler          — тот же планировщик для синхронного кода (WhatsApp)
+"""
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple, Union
+
+import metrics
+
+log = logging.getLogger()
+
+Job = Union[Awaitable[Any], Callable[[], Awaitable[Any]]]
+
+
+class KeyedScheduler:
+    """Очередь на каждый ключ, не больше max_workers задач одновременно.
+
+    submit() ждёт, если в планировщике уже max_pending задач — так
+    источник апдейтов притормаживает вместо неограниченного роста очередей.
+    Метрики публикуются с префиксом name: глубина очереди, ожидание в
+    очереди, время обработки и полная задержка от постановки до результата.
+    """
+
+    def __init__(self, max_workers: int = 16, max_pending: int = 1000, name: str = "updates"):
+        if max_workers < 1 or max_pending < 1:
+            raise ValueError("max_workers and max_pending must be positive")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.name = name
+        self._queues: Dict[Hashable, Deque[Tuple[Job, asyncio.Future, float]]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._workers = []
+        self._pending = 0
+        self._active = 0
+        self._processed = metrics.counter(f"{name}.processed")
+        self._failed = metrics.counter(f"{name}.failed")
+        self._wait = metrics.histogram(f"{name}.queue_wait_seconds")
+        self._run_time = metrics.histogram(f"{name}.run_seconds")
+        self._latency = metrics.histogram(f"{name}.latency_seconds")
+        metrics.gauge(f"{name}.pending", lambda: self._pending)
+        metrics.gauge(f"{name}.queued", lambda: self._pending - self._active)
+        metrics.gauge(f"{name}.active", lambda: self._active)
+        metrics.gauge(f"{name}.keys", lambda: len(self._queues))
+
+    # --- жизненный цикл ---
+    async def start(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_workers)]
+        log.info(f"🧵 Update scheduler started: {self.max_workers} workers, {self.max_pending} max pending")
+
+    async def stop(self, drain: bool = True):
+        if not self._workers:
+            return
+        if drain:
+            await self.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for jobs in self._queues.values():
+            for job, future, _ in jobs:
+                _close(job)
+                if not future.done():
+                    future.cancel()
+        self._queues.clear()
+
+    async def join(self):
+        """Дождаться, пока все принятые задачи будут выполнены"""
+        while self._pending:
+            await asyncio.sleep(0.01)
+
+    # --- постановка задач ---
+    async def submit(self, key: Hashable, job: Job) -> asyncio.Future:
+        """Поставить задачу в очередь ключа; возвращает future с её результатом"""
+        if not self._workers:
+            raise RuntimeError("Scheduler is not started")
+        await self._slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        entry = (job, future, time.perf_counter())
+        queue = self._queues.get(key)
+        if queue is None:
+            # Ключ не в работе — ставим его в очередь готовых
+            self._queues[key] = deque([entry])
+            self._ready.put_nowait(key)
+        else:
+            queue.append(entry)
+        return future
+
+    async def run(self, key: Hashable, job: Job) -> Any:
+        """submit() и дождаться результата"""
+        return await (await self.submit(key, job))
+
+    # --- воркеры ---
+    async def _worker(self, index: int):
+        while True:
+            key = await self._ready.get()
+            queue = self._queues[key]
+            job, future, enqueued = queue.popleft()
+            self._active += 1
+            started = time.perf_counter()
+            self._wait.observe(started - enqueued)
+            try:
+                result = await (job() if callable(job) else job)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self._failed.inc()
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                finished = time.perf_counter()
+                self._run_time.observe(finished - started)
+                self._latency.observe(finished - enqueued)
+                self._processed.inc()
+                self._active -= 1
+                self._pending -= 1
+                self._slots.release()
+                if queue:
+                    # Следующий апдейт этого чата — в конец очереди, чтобы не обижать остальных
+                    self._ready.put_nowait(key)
+                else:
+                    del self._queues[key]
+
+    # --- состояние ---
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.max_workers,
+            "active": self._active,
+            "pending": self._pending,
+            "queued": self._pending - self._active,
+            "keys": len(self._queues),
+            "max_pending": self.max_pending,
+        }
+
+
+def _close(job: Job):
+    if asyncio.iscoroutine(job):
+        job.close()
+
+
+def update_key(update: Any) -> Hashable:
+    """Ключ очередности для апдейта Telegram: чат, иначе пользователь, иначе сам апдейт"""
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return ("user", user.id)
+    return ("update", getattr(update, "update_id", id(update)))
+
+
+try:
+    from telegram.ext import BaseUpdateProcessor
+except ImportError:  # python-telegram-bot не установлен (WhatsApp-only окружение)
+    BaseUpdateProcessor = None
+
+if BaseUpdateProcessor is not None:
+    class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+        """Update processor для Application.builder().concurrent_updates(...)
+
+        Семафор базового класса ограничивает число принятых апдейтов (max_pending),
+        реальную параллельность задаёт max_workers планировщика.
+        """
+
+        def __init__(self, max_workers: int = 16, max_pending: int = 1000, name: str = "telegram"):
+            super().__init__(max_concurrent_updates=max_pending)
+            self.scheduler = KeyedScheduler(max_workers=max_workers, max_pending=max_pending, name=name)
+
+        async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+            await self.scheduler.run(update_key(update), coroutine)
+
+        async def initialize(self) -> None:
+            await self.scheduler.start()
+
+        async def shutdown(self) -> None:
+            await self.scheduler.stop()
+
+
+class ThreadedScheduler:
+    """KeyedScheduler в отдельном потоке со своим event loop.
+
+    Для синхронных точек входа (Green API): submit() кладёт fn(*args) в очередь
+    ключа и сразу возвращает управление; если очередь полна — блокирует
+    вызывающий поток до освобождения места.
+    """
+
+    def __init__(self, max_workers: int = 16, max_pending: int = 1000, name: str = "scheduler",
+                 pool=None):
+        # name — имя потока и префикс метрик
+        self.scheduler = KeyedScheduler(max_workers=max_workers, max_pending=max_pending, name=name)
+        self.name = name
+        self.pool = pool  # BlockingPool; без него — стандартный executor asyncio
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread:
+            return
+        started = threading.Event()
+
+        def runner():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.scheduler.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=runner, name=self.name, daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self, drain: bool = True, timeout: Optional[float] = 30):
+        if not self._thread:
+            return
+        asyncio.run_coroutine_threadsafe(self.scheduler.stop(drain=drain), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args: Any):
+        """Выполнить синхронную fn(*args) в очереди ключа (в пуле потоков)"""
+        if not self._thread:
+            raise RuntimeError("Scheduler is not started")
+
+        async def job():
+            try:
+                if self.pool is not None:
+                    await self.pool.run(fn, *args)
+                else:
+                    await asyncio.to_thread(fn, *args)
+            except Exception as e:
+                metrics.counter(f"{self.name}.failed").inc()
+                log.error(f"❌ Error in scheduled job for {key}: {e}")
+
+        asyncio.run_coroutine_threadsafe(self.scheduler.submit(key, job), self._loop).result()
+
+    def stats(self) -> Dict[str, int]:
+        return self.scheduler.stats()
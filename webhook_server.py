@@ -0,0 +1,282 @@
+# webhook_server.py
+"""
+Встроенный асинхронный HTTP-сервер для webhook-режима Telegram.
+
+Принимает POST с JSON-апдейтом, проверяет заголовок
+X-Telegram-Bot-Api-Secret-Token и передаёт апдейт в те же хендлеры
+Application, что и long polling. Параллельность и порядок внутри чата
+задаёт update processor приложения (см. update_scheduler.py).
+
+GET /healthz открыт всем, GET /metrics — только с тем же секретным
+заголовком: порт webhook публичный.
+
+Локальная проверка записанного апдейта:
+    python webhook_server.py update.json --url http://localhost:8000/telegram --secret <WEBHOOK_SECRET>
+"""
+import sys
+import json
+import hmac
+import asyncio
+import logging
+import argparse
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+import metrics
+
+log = logging.getLogger()
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_BYTES = 1024 * 1024
+READ_TIMEOUT = 30
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+}
+
+
+class WebhookServer:
+    """HTTP-приёмник апдейтов Telegram поверх asyncio.start_server"""
+
+    def __init__(self, application, *, host: str = "0.0.0.0", port: int = 8000,
+                 path: str = "/telegram", secret_token: Optional[str] = None,
+                 max_pending: int = 1000):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self._tasks: Set[asyncio.Task] = set()
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # --- жизненный цикл ---
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+        log.info(f"🌐 Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # Закрываем простаивающие keep-alive соединения, чтобы их обработчики завершились сами
+        connections = dict(self._connections)
+        for writer in connections.values():
+            writer.close()
+        if connections:
+            await asyncio.wait(connections, timeout=READ_TIMEOUT)
+        # Даём начатым апдейтам доработать
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        log.info("🛑 Webhook server stopped")
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    # --- диспетчеризация ---
+    async def dispatch(self, payload: Dict[str, Any]):
+        """Декодировать апдейт и прогнать его через хендлеры Application"""
+        from telegram import Update
+
+        update = Update.de_json(payload, self.application.bot)
+        # Тот же путь, что и у апдейтов из update_queue при polling
+        await self.application.update_processor.process_update(
+            update, self.application.process_update(update)
+        )
+
+    def _spawn(self, payload: Dict[str, Any]):
+        task = asyncio.create_task(self.dispatch(payload))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            log.error(f"❌ Error processing webhook update: {task.exception()}")
+
+    # --- HTTP ---
+    def _check_secret(self, headers: Dict[str, str]) -> bool:
+        if not self.secret_token:
+            return True
+        return hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret_token)
+
+    def _route(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        path = target.split("?", 1)[0]
+        if path == "/healthz":
+            return (200 if method in ("GET", "HEAD") else 405), b""
+        if path == "/metrics" and method == "GET":
+            if not self.secret_token or not self._check_secret(headers):
+                return 403, b""
+            return 200, json.dumps(metrics.snapshot(), ensure_ascii=False).encode("utf-8")
+        return self._route_update(method, path, headers, body), b""
+
+    def _route_update(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> int:
+        if path != self.path:
+            return 404
+        if method != "POST":
+            return 405
+        if not self._check_secret(headers):
+            log.warning("⚠️ Webhook request with invalid secret token")
+            return 403
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(payload, dict) or "update_id" not in payload:
+            return 400
+        if self.pending >= self.max_pending:
+            # Telegram повторит доставку позже
+            log.warning(f"⚠️ Webhook backpressure: {self.pending} updates pending")
+            return 503
+        self._spawn(payload)
+        return 200
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, status = request
+                content = b""
+                if status is None:
+                    status, content = self._route(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and status != 413
+                self._write_response(writer, status, keep_alive, content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            log.error(f"❌ Webhook connection error: {e}")
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[Tuple]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), READ_TIMEOUT)
+        except asyncio.IncompleteReadError:
+            return None
+        except (asyncio.LimitOverrunError, ValueError):
+            # Заголовки длиннее буфера StreamReader (64 КБ): остаток не дочитан — отвечаем и закрываем
+            return "", "", {"connection": "close"}, b"", 431
+        lines = head.decode("latin-1").split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3:
+            return "", "", {"connection": "close"}, b"", 400
+        method, target, _ = parts
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length", "0") or "0"
+        if not (length.isascii() and length.isdigit()):
+            # Где кончается тело, неизвестно — соединение дальше не читаем
+            return method, target, dict(headers, connection="close"), b"", 400
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            return method, target, headers, b"", 413
+        body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+        return method, target, headers, body, None
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, keep_alive: bool, content: bytes = b""):
+        body = content or STATUS_TEXT.get(status, "").encode()
+        content_type = "application/json" if content else "text/plain"
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+
+
+async def serve_webhook(application, *, url: Optional[str], host: str, port: int, path: str,
+                        secret_token: Optional[str], max_pending: int = 1000,
+                        stop_event: Optional[asyncio.Event] = None,
+                        on_started: Optional[Callable[[], Any]] = None):
+    """Запустить Application в webhook-режиме до stop_event (или навсегда);
+    on_started() — когда бот уже может отправлять сообщения"""
+    from telegram import Update
+
+    server = WebhookServer(application, host=host, port=port, path=path,
+                           secret_token=secret_token, max_pending=max_pending)
+    stop_event = stop_event or asyncio.Event()
+    async with application:
+        await application.start()
+        if on_started is not None:
+            on_started()
+        if url:
+            await application.bot.set_webhook(
+                url=url.rstrip("/") + path,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            log.info(f"✅ Webhook registered: {url.rstrip('/')}{path}")
+        else:
+            log.warning("⚠️ WEBHOOK_URL not set, webhook is not registered (local mode)")
+        await server.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+
+
+# ===================== LOCAL REPLAY ===================
+def post_update(url: str, payload: Dict[str, Any], secret_token: Optional[str] = None) -> int:
+    """POST записанного апдейта на webhook, возвращает HTTP-статус"""
+    import urllib.request
+    import urllib.error
+
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    if secret_token:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret_token)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram updates to the webhook")
+    parser.add_argument("files", nargs="+", help="JSON file with one update or a list of updates")
+    parser.add_argument("--url", default="http://localhost:8000/telegram")
+    parser.add_argument("--secret", default=None)
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.files:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for payload in data if isinstance(data, list) else [data]:
+            status = post_update(args.url, payload, args.secret)
+            print(f"{'✅' if status == 200 else '❌'} update {payload.get('update_id')} -> HTTP {status}")
+            failed += status != 200
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,33 @@
 """
 WhatsApp Bot using Green API
 """
+from __future__ import annotations
+
 import os
+import asyncio
+import signal
 import logging
-import requests
-from collections import defaultdict
-from typing import Dict, List
+from typing import TYPE_CHECKING, Dict, List, Optional
 from dotenv import load_dotenv
-from whatsapp_chatbot_python import GreenAPIBot, Notification
-from yclients_client import YClientsClient, YClientsError
+from update_scheduler import ThreadedScheduler
+from bridge_driver import BridgeDriver, BridgeMessage
+from channels import Channel, GreenAPIChannel, WhatsAppBridgeChannel
+from outbox import OutboxEntry
+import channels
+import metrics
+import outbox
+import record_writes
+import shared
+import llm_cache
+import faq_index
+import prompt_builder
+import booking_tool
+import model_router
+import deadlines
+import startup
+
+if TYPE_CHECKING:
+    from whatsapp_chatbot_python import Notification
 
 # Load environment variables
 load_dotenv()
@@ -20,16 +39,25 @@ logging.basicConfig(
 )
 log = logging.getLogger(__name__)
 
+# Transport: green_api (cloud Green API) or bridge (own whatsapp_bridge.js on whatsapp-web.js)
+WHATSAPP_TRANSPORT = os.getenv("WHATSAPP_TRANSPORT", "green_api").lower()
+WHATSAPP_BRIDGE_COMMAND = os.getenv("WHATSAPP_BRIDGE_COMMAND", "node whatsapp_bridge.js").split()
+
 # Green API configuration
 GREEN_API_ID = os.getenv("GREEN_API_ID")
 GREEN_API_TOKEN = os.getenv("GREEN_API_TOKEN")
 
-if not GREEN_API_ID or not GREEN_API_TOKEN:
+if WHATSAPP_TRANSPORT == "green_api" and (not GREEN_API_ID or not GREEN_API_TOKEN):
     log.error("❌ GREEN_API_ID or GREEN_API_TOKEN not found in .env file")
     exit(1)
 
 # Initialize WhatsApp bot
-bot = GreenAPIBot(GREEN_API_ID, GREEN_API_TOKEN)
+# (the Green API SDK is only imported when it is the selected transport)
+if WHATSAPP_TRANSPORT == "green_api":
+    from whatsapp_chatbot_python import GreenAPIBot
+    bot = GreenAPIBot(GREEN_API_ID, GREEN_API_TOKEN)
+else:
+    bot = None
 
 # Initialize YClients client
 YCLIENTS_PARTNER_TOKEN = os.getenv("YCLIENTS_PARTNER_TOKEN")
@@ -40,18 +68,35 @@ if not YCLIENTS_PARTNER_TOKEN or not YCLIENTS_USER_TOKEN or not GROQ_API_KEY:
     log.error("❌ Missing required environment variables for YClients or Groq API")
     exit(1)
 
-yclients = YClientsClient(YCLIENTS_PARTNER_TOKEN, YCLIENTS_USER_TOKEN)
+# Shared resources: the same client, pools, catalog and sessions as app.py
+# when both channels run in one process (run_bots.py). Catalog and client
+# belong to the salon of the chat being handled (tenants.py).
+tenants = shared.tenants()
+yclients = tenants.client
+catalog_cache = shared.catalog_cache()
+responses = shared.response_cache()  # LLM answers to repeated questions (llm_cache.py)
+prompts = shared.prompt_builder()  # prompts within PROMPT_TOKEN_BUDGET tokens (prompt_builder.py)
+router = shared.model_router()  # small model for short chat, large for booking (model_router.py)
+UPDATE_DEADLINE = shared.update_deadline()  # seconds to answer one message (deadlines.py)
 
 # Configuration
 BASE = "https://api.groq.com/openai/v1/chat/completions"
-MODEL = "openai/gpt-oss-120b"
 MEMORY_TURNS = 6
 
+# Параллельная обработка: разные отправители параллельно, один отправитель — по очереди
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "32"))
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "1000"))
+BLOCKING_POOL_WORKERS = shared.pool_size()
+blocking = shared.blocking_pool()
+scheduler = ThreadedScheduler(UPDATE_WORKERS, UPDATE_MAX_PENDING, name="whatsapp", pool=blocking)
+METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", "60"))  # 0 — не писать метрики в лог
+
 # Global storage for user data
-UserMemory: Dict[str, List[tuple]] = defaultdict(list)
-UserPhone: Dict[str, str] = {}
-UserRecords: Dict[str, List[Dict]] = defaultdict(list)
-UserAuth: Dict[str, Dict] = defaultdict(dict)
+sessions = shared.session_store()
+UserMemory = sessions.memory
+UserPhone: Dict[str, str] = sessions.phones
+UserRecords: Dict[str, List[Dict]] = sessions.records
+UserAuth: Dict[str, Dict] = sessions.auth
 
 # Booking keywords for NLP
 BOOKING_KEYWORDS = [
@@ -65,232 +110,228 @@ BOOKING_KEYWORDS = [
     ":", "часов", "в ", "на "  # czas
 ]
 
-BOOKING_PROMPT = """
+# Prompts are split into a static prefix (system: instructions and the catalog,
+# identical for every user of a salon, so Groq caches its processing) and a
+# per-user suffix (history and message)
+BOOKING_SYSTEM_PROMPT = """
 Ты помощник по записи к мастерам. Анализируй ВСЮ историю разговора и определи:
 1. Какая услуга нужна
 2. Есть ли предпочтения по мастеру  
 3. Желаемая дата и время
 
-История разговора:
-{{history}}
-
-Доступные данные (ТОЧНЫЕ ДАННЫЕ ИЗ API):
-{{api_data}}
-
-Сообщение пользователя: {{message}}
-
 КРИТИЧЕСКИ ВАЖНО: 
-- Используй ТОЛЬКО услуги и мастеров из "Доступные данные" выше
+- Используй ТОЛЬКО услуги и мастеров из "Доступные данные"
 - НЕ ВЫДУМЫВАЙ услуги - используй только те что есть в списке
 - НЕ ИСПОЛЬЗУЙ форматирование ** - только обычный текст
 - НЕ ПРИДУМЫВАЙ цены - используй только те что указаны в API
 - Если в истории есть информация об услуге, мастере и времени - СОЗДАЙ ЗАПИСЬ
 - Если пользователь повторно пишет "хочу записаться" - проверь историю на наличие всех данных
-- Если есть все данные (услуга, мастер, дата и время) - ответь в формате:
-ЗАПИСЬ: [услуга] | [мастер] | [дата время]
-
-Например: ЗАПИСЬ: Маникюр с покрытием гель-лак | Арина | 2025-10-26 12:00
+- Если есть все данные (услуга, мастер, дата и время) - вызови функцию create_booking:
+service_id и staff_id - числа из [service_id ...] и [staff_id ...] в списках ниже,
+datetime - в формате YYYY-MM-DD HH:MM, например 2025-10-26 12:00
+- НЕ ПИШИ данные записи текстом - запись создаёт только вызов create_booking
 
 Если данных недостаточно, уточни недостающую информацию.
+
+Доступные данные (ТОЧНЫЕ ДАННЫЕ ИЗ API):
+{{api_data}}
+"""
+
+BOOKING_USER_PROMPT = """{{api_data}}
+История разговора:
+{{history}}
+
+Сообщение пользователя: {{message}}
 """
 
-CHAT_PROMPT = """
+CHAT_SYSTEM_PROMPT = """
 Ты дружелюбный помощник на русском.
+Ответь кратко по делу.
+"""
+
+CHAT_USER_PROMPT = """
 История чата:
 {{history}}
 
 Сообщение:
 {{message}}
-Ответь кратко по делу.
 """
 
 def get_company_id():
     """Get the first available company ID"""
-    log.info("🏢 API CALL: Getting companies from YClients...")
-    try:
-        companies = yclients.my_companies()
-        log.info(f"🏢 API RESPONSE: {companies}")
-        if companies.get("data") and len(companies["data"]) > 0:
-            company_id = companies["data"][0]["id"]
-            log.info(f"✅ Company ID found: {company_id}")
-            return company_id
-        log.warning("⚠️ No companies found in response")
-        return None
-    except YClientsError as e:
-        log.error(f"❌ YClients API Error getting company: {e}")
-        return None
-
-def get_services_data():
-    """Get services data from YClients API"""
+    return catalog_cache.get().company_id
+
+def add_memory(user_id: str, role: str, content: str):
+    """Add message to user memory (only the last MEMORY_TURNS conversations are kept)"""
+    sessions.add_memory(user_id, role, content)
+
+def groq_message(messages: List[Dict], tier: model_router.Tier, tools: Optional[List[Dict]] = None) -> Dict:
+    """One Groq chat completion: the assistant message with content and, given tools,
+    tool_calls (raises on HTTP errors)"""
+    payload = {
+        "model": tier.model,
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": tier.max_tokens
+    }
+    if tools:
+        payload["tools"] = tools
+        payload["tool_choice"] = "auto"
+
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+
+    response = shared.groq_session().post(BASE, json=payload, headers=headers, timeout=tier.timeout)
+    response.raise_for_status()
+
+    result = response.json()
+    prompt_builder.record_usage(result)
+    return result['choices'][0]['message']
+
+def routed_message(intent: str, text: str, messages: List[Dict], tools: Optional[List[Dict]] = None) -> Dict:
+    """Groq completion on the model tier the router picks for this intent (falls back on timeout)"""
+    return router.complete(intent, text, lambda tier: groq_message(messages, tier, tools))[0]
+
+def ask_groq(system: str, user: str, user_id: str, text: str, standalone_ok: bool = False,
+             tools: Optional[List[Dict]] = None, intent: str = model_router.CHAT) -> Dict:
+    """Assistant message for system/user templates (see prompt_builder.build_messages)
+
+    Answers that don't depend on the conversation come from the LLM response
+    cache (llm_cache.py): the user's first message, or with standalone_ok any
+    message that makes sense without history. Those are asked without history.
+    """
+    tenant = tenants.current()
+    catalog, lexicon = tenant.catalog.get(), tenant.lexicon
+    turns = sessions.messages(user_id)[:-1]  # the current message is already in memory
+    if turns and not (standalone_ok and llm_cache.standalone(text)):
+        built = prompts.build_messages(system, user, text, turns, catalog, lexicon)
+        log.info(f"🤖 Prompt ~{built.tokens} tokens {built.sections}")
+        return routed_message(intent, text, built.messages, tools)
+
+    built = prompts.build_messages(system, user, text, (), catalog, lexicon)
+    key = responses.key(text, catalog_cache.version, system, user, router.small.model, router.large.model)
+    # A create_booking call books a slot (and the text may say "завтра") — never reuse it
+    return responses.cached(key, lambda: routed_message(intent, text, built.messages, tools),
+                            cacheable=lambda message: bool(message.get('content')) and not message.get('tool_calls'))
+
+def call_groq_api(system: str, user: str, user_id: str, text: str, standalone_ok: bool = False) -> str:
+    """Call Groq API for a text answer (see ask_groq)"""
     try:
-        company_id = get_company_id()
-        if not company_id:
-            return "Ошибка получения данных компании"
-        
-        # Get services using the same method as Telegram bot
-        services_response = yclients.company_services(company_id)
-        services_data = services_response.get("data", [])
-        
-        # Get masters using the same method as Telegram bot
-        masters_response = yclients.company_staff(company_id)
-        masters_data = masters_response.get("data", [])
-        
-        services_text = "Доступные услуги:\n"
-        for service in services_data:
-            title = service.get('title', 'Без названия')
-            price_min = service.get('price_min', 0)
-            price_max = service.get('price_max', 0)
-            if price_min == price_max:
-                services_text += f"- {title} ({price_min} руб.)\n"
-            else:
-                services_text += f"- {title} ({price_min}-{price_max} руб.)\n"
-        
-        masters_text = "\nДоступные мастера:\n"
-        for master in masters_data:
-            name = master.get('name', 'Без имени')
-            masters_text += f"- {name}\n"
-        
-        return services_text + masters_text
+        return (ask_groq(system, user, user_id, text, standalone_ok).get('content') or '').strip()
+    except deadlines.DeadlineExceeded:
+        # Groq was too slow for this message's deadline — answer without the LLM
+        return deadlines.degraded_answer(tenants.current().faq, text)
     except Exception as e:
-        log.error(f"Error getting services data: {e}")
-        return "Ошибка получения данных услуг"
+        log.error(f"Error calling Groq API: {e}")
+        return "Извините, произошла ошибка при обработке запроса."
 
-def add_memory(user_id: str, role: str, content: str):
-        """Add message to user memory"""
-        UserMemory[user_id].append((role, content))
-    
-    # Keep only last MEMORY_TURNS conversations
-        if len(UserMemory[user_id]) > MEMORY_TURNS * 2:
-            UserMemory[user_id] = UserMemory[user_id][-MEMORY_TURNS * 2:]
-
-def get_memory_history(user_id: str) -> str:
-    """Get conversation history for user"""
-    history = UserMemory.get(user_id, [])
-    return "\n".join([f"{role}: {content}" for role, content in history])
-
-def call_groq_api(prompt: str, user_id: str) -> str:
-    """Call Groq API for AI response"""
+def answer_faq(user_id: str, text: str, booking: bool = False) -> str:
+    """Template answer from the salon's FAQ index (faq_index.py) when history doesn't matter;
+    for a booking message only when it has no date and time"""
+    previous = max(0, len(sessions.messages(user_id)) - 1)
+    if not llm_cache.context_free(previous, text):
+        return ""
+    index = tenants.current().faq
+    return (faq_index.booking_question_answer(index, text) if booking else index.answer(text)) or ""
+
+def booking_reply(user_id: str, text: str) -> str:
+    """Booking prompt with the create_booking tool; a validated call creates the record"""
     try:
-        history = get_memory_history(user_id)
-        api_data = get_services_data()
-        
-        # Replace placeholders in prompt
-        formatted_prompt = prompt.replace("{{history}}", history).replace("{{api_data}}", api_data)
-        
-        payload = {
-            "model": MODEL,
-            "messages": [
-                {"role": "user", "content": formatted_prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 500
-        }
-        
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.post(BASE, json=payload, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        result = response.json()
-        return result['choices'][0]['message']['content'].strip()
-        
+        message = ask_groq(BOOKING_SYSTEM_PROMPT, BOOKING_USER_PROMPT, user_id, text,
+                           tools=booking_tool.TOOLS, intent=model_router.BOOKING)
+    except deadlines.DeadlineExceeded:
+        return deadlines.degraded_answer(booking=True)
     except Exception as e:
         log.error(f"Error calling Groq API: {e}")
         return "Извините, произошла ошибка при обработке запроса."
+    try:
+        arguments = booking_tool.arguments(message)
+        if arguments is None:
+            return (message.get('content') or '').strip()
+        return create_booking(user_id, booking_tool.validate(arguments, tenants.current().catalog.get()))
+    except booking_tool.BookingError as e:
+        return str(e)
 
 def is_booking_request(text: str) -> bool:
     """Check if message contains booking keywords"""
     text_lower = text.lower()
     return any(keyword in text_lower for keyword in BOOKING_KEYWORDS)
 
-def parse_booking_data(text: str) -> Dict:
-    """Parse booking data from text"""
-    # Simple parsing logic - can be enhanced
-    parsed = {}
-    
-    # Look for service names
-    services_data = get_services_data()
-    for line in services_data.split('\n'):
-        if line.startswith('- ') and 'руб' in line:
-            service_name = line.split(' (')[0].replace('- ', '')
-            if service_name.lower() in text.lower():
-                parsed['service'] = service_name
-            break
-    
-    # Look for master names
-    masters_data = get_services_data()
-    for line in masters_data.split('\n'):
-        if line.startswith('- ') and 'руб' not in line:
-            master_name = line.replace('- ', '')
-            if master_name.lower() in text.lower():
-                parsed['master'] = master_name
-            break
-    
-    # Look for date/time patterns
-    import re
-    date_patterns = [
-        r'(\d{1,2}):(\d{2})',  # HH:MM
-        r'(\d{1,2})\s+(октября|ноября|декабря|января|февраля|марта|апреля|мая|июня|июля|августа|сентября)',
-        r'(\d{4}-\d{2}-\d{2})',  # YYYY-MM-DD
-    ]
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, text)
-        if match:
-            parsed['datetime'] = match.group(0)
-            break
-    
-    return parsed
-
-def create_booking(user_id: str, parsed_data: Dict) -> str:
-    """Create booking using YClients API"""
+def create_booking(user_id: str, booking: booking_tool.Booking) -> str:
+    """Queue the booking in the YClients outbox (service and master already validated by booking_tool).
+
+    The record is created by an outbox worker; on_write_finished sends the confirmation.
+    """
     try:
         company_id = get_company_id()
         if not company_id:
             return "Ошибка: не удалось получить ID компании"
         
         # Use user_id as phone (it's already the phone number from WhatsApp)
-        user_phone = user_id
-        
-        # Create booking data
-        booking_data = {
-            "client": {
-                "name": f"WhatsApp User {user_id[:8]}",
-                "phone": user_phone
-            },
-            "services": [],
-            "datetime": parsed_data.get('datetime', ''),
-            "comment": f"Запись через WhatsApp бота"
-        }
-        
-        # Add service if found
-        if 'service' in parsed_data:
-            services = yclients.get_services(company_id)
-            for service in services:
-                if service['title'] == parsed_data['service']:
-                    booking_data["services"].append({
-                        "id": service['id'],
-                        "price": service['price_min']
-                    })
-                    break
-        
-        # Create booking
-        result = yclients.create_booking(company_id, booking_data)
+        service, master = booking.service, booking.master
+        payload = record_writes.booking_payload(
+            company_id, service, master, booking.date_time,
+            client_name=f"WhatsApp User {user_id[:8]}",
+            client_phone=user_id,
+            comment="Запись через WhatsApp бота",
+            seance_length=service.get('length') or None,
+        )
+        key = record_writes.booking_key("whatsapp", user_id, service['id'], master['id'], booking.date_time)
+        entry = shared.outbox().enqueue(record_writes.CREATE_RECORD, payload, key, channel="whatsapp", chat_id=user_id)
         
-        if result:
-            return f"✅ Запись успешно создана!\nУслуга: {parsed_data.get('service', 'Не указана')}\nМастер: {parsed_data.get('master', 'Любой доступный')}\nВремя: {parsed_data.get('datetime', 'Не указано')}"
-        else:
-            return "❌ Не удалось создать запись. Попробуйте позже."
+        details = f"Услуга: {service.get('title', 'Не указана')}\nМастер: {master.get('name', 'Любой доступный')}\nВремя: {booking.date_time}"
+        if entry.status == outbox.DONE:
+            return f"✅ Эта запись уже создана.\n{details}"
+        return f"⏳ Оформляю запись...\n{details}\nПодтверждение придёт отдельным сообщением."
         
     except Exception as e:
         log.error(f"Error creating booking: {e}")
         return "❌ Произошла ошибка при создании записи."
 
-@bot.router.message()
+def on_write_finished(entry: OutboxEntry) -> None:
+    """Confirmation for a booking made from WhatsApp (called by an outbox worker)"""
+    if entry.channel != "whatsapp" or entry.kind != record_writes.CREATE_RECORD:
+        return
+    p = entry.payload
+    if entry.status == outbox.DONE:
+        text = (f"✅ Запись успешно создана!\nУслуга: {p['service_title'] or 'Не указана'}\n"
+                f"Мастер: {p['master_name'] or 'Любой доступный'}\nВремя: {p['datetime']}")
+    else:
+        log.error(f"Error creating booking: {entry.error}")
+        text = "❌ Не удалось создать запись. Попробуйте позже."
+    add_memory(entry.chat_id, "assistant", text)
+    channels.send_threadsafe("whatsapp", entry.chat_id, text)
+
+def start_writes():
+    """Outbox workers and reminders start once WhatsApp can send messages (channel ready)"""
+    writes = shared.outbox()  # YClients writes go through the outbox queue (outbox.py)
+    writes.add_listener(on_write_finished)
+    writes.serve("whatsapp")
+    writes.start()
+    reminders = shared.reminders()
+    if reminders is not None:
+        reminders.start()
+
+def get_sender_id(notification: Notification) -> str:
+    """Try different attributes to get sender info"""
+    return getattr(notification, 'sender_id', None) or getattr(notification, 'sender_phone', None) or getattr(notification, 'sender', None) or 'unknown'
+
 def message_handler(notification: Notification) -> None:
+    """Queue incoming WhatsApp message and return at once.
+
+    Green API deletes (acknowledges) the notification as soon as this handler
+    returns, so polling never waits for Groq/YClients. Messages of one sender
+    are handled in order by the worker pool; queue depth and processing
+    latency are exported as whatsapp.* metrics.
+    """
+    scheduler.submit(get_sender_id(notification), handle_message, notification)
+
+if bot is not None:
+    bot.router.message()(message_handler)
+
+def handle_message(notification: Notification) -> None:
     """Handle incoming WhatsApp messages"""
     try:
         text = notification.message_text
@@ -298,60 +339,100 @@ def message_handler(notification: Notification) -> None:
         # Debug: print all available attributes
         log.info(f"🔍 Notification attributes: {dir(notification)}")
         
-        # Try different attributes to get sender info
-        user_id = getattr(notification, 'sender_id', None) or getattr(notification, 'sender_phone', None) or getattr(notification, 'sender', None) or 'unknown'
+        user_id = get_sender_id(notification)
         
         log.info(f"📱 WhatsApp message from {user_id}: {text}")
         
-        add_memory(user_id, "user", text)
-        
-        # Check if it's a booking request
-        if is_booking_request(text):
-            # Use booking prompt
-            response = call_groq_api(BOOKING_PROMPT, user_id)
-            
-            # Check if response contains booking data
-            if "ЗАПИСЬ:" in response:
-                # Parse booking data
-                booking_line = response.split("ЗАПИСЬ:")[1].strip()
-                parts = booking_line.split(" | ")
-                
-                if len(parts) >= 3:
-                    parsed_data = {
-                        'service': parts[0].strip(),
-                        'master': parts[1].strip(),
-                        'datetime': parts[2].strip()
-                    }
-                    
-                    # Create booking
-                    booking_result = create_booking(user_id, parsed_data)
-                    response = booking_result
-                else:
-                    response = "Не удалось распознать данные для записи. Попробуйте еще раз."
-        else:
-            # Use chat prompt
-            response = call_groq_api(CHAT_PROMPT, user_id)
-        
-        add_memory(user_id, "assistant", response)
-        
         # Send response
-        notification.answer(response)
+        notification.answer(build_reply(user_id, text))
         
     except Exception as e:
         log.error(f"❌ Error handling WhatsApp message: {e}")
         notification.answer("❌ Произошла ошибка. Попробуйте позже.")
 
+async def handle_bridge_message(message: BridgeMessage) -> None:
+    """Handle a message delivered by whatsapp_bridge.js (same logic as Green API)"""
+    log.info(f"📱 WhatsApp message from {message.sender}: {message.message_text}")
+    try:
+        response = await blocking.run(build_reply, message.sender, message.message_text)
+    except Exception as e:
+        log.error(f"❌ Error handling WhatsApp message: {e}")
+        response = "❌ Произошла ошибка. Попробуйте позже."
+    await message.answer(response)
+
+def build_reply(user_id: str, text: str) -> str:
+    """Answer for one incoming message in the salon this chat belongs to"""
+    with tenants.activate("whatsapp", user_id), deadlines.activate(UPDATE_DEADLINE):
+        return answer_message(user_id, text)
+
+def answer_message(user_id: str, text: str) -> str:
+    """Answer for one incoming message (updates the user's memory)"""
+    add_memory(user_id, "user", text)
+
+    # Check if it's a booking request; a question without date and time ("как записаться?")
+    # matches booking keywords too and is answered from the FAQ index
+    if is_booking_request(text):
+        response = answer_faq(user_id, text, booking=True) or booking_reply(user_id, text)
+    else:
+        # Frequent questions (prices, masters, how to book) are answered from the FAQ index
+        response = answer_faq(user_id, text) or call_groq_api(CHAT_SYSTEM_PROMPT, CHAT_USER_PROMPT, user_id, text,
+                                                             standalone_ok=True)
+
+    add_memory(user_id, "assistant", response)
+    return response
+
+def build_channel() -> Channel:
+    """WhatsApp channel for the configured transport (also used by run_bots.py)"""
+    if WHATSAPP_TRANSPORT == "bridge":
+        driver = BridgeDriver(handle_bridge_message, command=WHATSAPP_BRIDGE_COMMAND,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),
+                              workers=UPDATE_WORKERS, max_pending=UPDATE_MAX_PENDING)
+        channel = WhatsAppBridgeChannel(driver)
+    else:
+        channel = GreenAPIChannel(bot, scheduler, blocking)
+    channel.on_ready = start_writes
+    return channel
+
+async def run_bridge():
+    """WhatsApp via whatsapp_bridge.js; the bridge is restarted after crashes until SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            pass
+    await build_channel().run(stop_event)
+
 def main():
     """Start WhatsApp bot"""
     log.info("🚀 Starting WhatsApp Bot...")
+    if METRICS_LOG_INTERVAL > 0:
+        metrics.start_reporter(METRICS_LOG_INTERVAL)
+    # Catalog, parser and HTTP pools are ready before the first message
+    if startup.enabled():
+        startup.prewarm()
+    if WHATSAPP_TRANSPORT == "bridge":
+        log.info("🔌 Transport: whatsapp_bridge.js")
+        try:
+            asyncio.run(run_bridge())
+        finally:
+            blocking.shutdown(wait=False)
+        return
     log.info(f"🔍 Green API ID: {GREEN_API_ID[:10]}...")
-    
+
+    # Outbox confirmations are sent from worker threads, so the plain (blocking) API call is fine
+    channels.register_sender("whatsapp", bot.api.sending.sendMessage)
+    start_writes()
+    scheduler.start()
     try:
         bot.run_forever()
     except KeyboardInterrupt:
         log.info("🛑 WhatsApp Bot stopped by user")
     except Exception as e:
         log.error(f"❌ WhatsApp Bot error: {e}")
+    finally:
+        scheduler.stop()
 
 if __name__ == "__main__":
     main()
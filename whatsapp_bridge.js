@@ -2,11 +2,42 @@
 /**
  * WhatsApp Bridge - Node.js bridge dla Python bota
  * Używa whatsapp-web.js do komunikacji z WhatsApp
+ *
+ * Protocol (NDJSON): one JSON object per line in both directions.
+ *   stdout -> Python: {type: 'qr'|'ready'|'message'|'ack'|'pong'|'error', ...}
+ *   stdin  <- Python: {type: 'send', id, chatId, message}
+ *                     {type: 'send_batch', messages: [{id, chatId, message}, ...]}
+ *                     {type: 'ping', id}
+ * Every sent message gets {type: 'ack', id, ok, error?} with the same id.
+ * Logs and the terminal QR code go to stderr so they never corrupt stdout.
  */
 
 const { Client, LocalAuth, MessageMedia } = require('whatsapp-web.js');
 const qrcode = require('qrcode-terminal');
 
+// ===================== OUTPUT (NDJSON) =====================
+// Events emitted within one event loop tick are flushed with a single write()
+let outbox = [];
+let flushScheduled = false;
+
+function emit(event) {
+    outbox.push(JSON.stringify(event));
+    if (!flushScheduled) {
+        flushScheduled = true;
+        setImmediate(flush);
+    }
+}
+
+function flush() {
+    flushScheduled = false;
+    if (outbox.length === 0) {
+        return;
+    }
+    const chunk = outbox.join('\n') + '\n';
+    outbox = [];
+    process.stdout.write(chunk);
+}
+
 // Create WhatsApp client
 const client = new Client({
     authStrategy: new LocalAuth(),
@@ -18,21 +49,21 @@ const client = new Client({
 
 // QR Code handler
 client.on('qr', (qr) => {
-    console.log(JSON.stringify({
+    emit({
         type: 'qr',
         qr: qr
-    }));
-    
+    });
+
     // Also display QR code in terminal
-    qrcode.generate(qr, { small: true });
+    qrcode.generate(qr, { small: true }, (code) => process.stderr.write(code + '\n'));
 });
 
 // Ready handler
 client.on('ready', () => {
-    console.log(JSON.stringify({
+    emit({
         type: 'ready',
         message: 'WhatsApp Bot is ready!'
-    }));
+    });
 });
 
 // Message handler
@@ -42,21 +73,21 @@ client.on('message', async (message) => {
         if (message.from.includes('@g.us') || message.from.includes('status@broadcast')) {
             return;
         }
-        
+
         // Skip messages from the bot itself
         if (message.fromMe) {
             return;
         }
-        
+
         // Send message data to Python bot
-        console.log(JSON.stringify({
+        emit({
             type: 'message',
             message: message.body,
             sender: message.from,
             chatId: message.from,
             timestamp: message.timestamp
-        }));
-        
+        });
+
     } catch (error) {
         console.error('Error handling message:', error);
     }
@@ -67,17 +98,61 @@ client.on('error', (error) => {
     console.error('WhatsApp Client Error:', error);
 });
 
-// Listen for messages from Python bot
-process.stdin.on('data', async (data) => {
-    try {
-        const command = JSON.parse(data.toString().trim());
-        
-        if (command.type === 'send') {
-            await client.sendMessage(command.chatId, command.message);
+// ===================== SENDING =====================
+// Messages to one chat are sent in order, different chats are sent concurrently
+const chatChains = new Map();
+
+function sendOrdered(item) {
+    const previous = chatChains.get(item.chatId) || Promise.resolve();
+    const current = previous
+        .then(() => client.sendMessage(item.chatId, item.message))
+        .then(
+            () => emit({ type: 'ack', id: item.id, ok: true }),
+            (error) => emit({ type: 'ack', id: item.id, ok: false, error: String(error && error.message || error) })
+        );
+    chatChains.set(item.chatId, current);
+    current.then(() => {
+        if (chatChains.get(item.chatId) === current) {
+            chatChains.delete(item.chatId);
+        }
+    });
+    return current;
+}
+
+function handleCommand(command) {
+    if (command.type === 'send') {
+        sendOrdered(command);
+    } else if (command.type === 'send_batch') {
+        for (const item of command.messages || []) {
+            sendOrdered(item);
+        }
+    } else if (command.type === 'ping') {
+        emit({ type: 'pong', id: command.id });
+    } else {
+        emit({ type: 'error', id: command.id, error: `Unknown command type: ${command.type}` });
+    }
+}
+
+// ===================== INPUT (NDJSON) =====================
+// Commands may arrive coalesced in one chunk or split across several chunks
+let inputBuffer = '';
+
+process.stdin.setEncoding('utf8');
+process.stdin.on('data', (data) => {
+    inputBuffer += data;
+    let newline;
+    while ((newline = inputBuffer.indexOf('\n')) !== -1) {
+        const line = inputBuffer.slice(0, newline).trim();
+        inputBuffer = inputBuffer.slice(newline + 1);
+        if (!line) {
+            continue;
+        }
+        try {
+            handleCommand(JSON.parse(line));
+        } catch (error) {
+            console.error('Error processing command:', error);
+            emit({ type: 'error', error: `Invalid command: ${error.message}` });
         }
-        
-    } catch (error) {
-        console.error('Error processing command:', error);
     }
 });
 
@@ -85,14 +160,13 @@ process.stdin.on('data', async (data) => {
 client.initialize();
 
 // Handle process termination
-process.on('SIGINT', async () => {
-    console.log('Shutting down WhatsApp client...');
+async function shutdown() {
+    console.error('Shutting down WhatsApp client...');
+    flush();
     await client.destroy();
     process.exit(0);
-});
+}
 
-process.on('SIGTERM', async () => {
-    console.log('Shutting down WhatsApp client...');
-    await client.destroy();
-    process.exit(0);
-});
+process.on('SIGINT', shutdown);
+process.on('SIGTERM', shutdown);
+process.stdin.on('end', shutdown);
@@ -1,5 +1,6 @@
 # yclients_client.py
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Any, Dict, Optional
 
 BASE = "https://api.yclients.com/api/v1"
@@ -12,11 +13,13 @@ class YClientsError(RuntimeError):
         self.meta = meta
 
 class YClientsClient:
-    def __init__(self, partner_token: str, user_token: str, timeout: int = 30):
+    def __init__(self, partner_token: str, user_token: str, timeout: int = 30, pool_maxsize: int = 10):
         self.partner_token = partner_token
         self.user_token = user_token
         self.timeout = timeout
         self.session = requests.Session()
+        # Пул соединений под число потоков, которые ходят в API параллельно
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
         # Все вызовы используют объединённый заголовок:
         self.session.headers.update({
             "Accept": ACCEPT,
@@ -98,9 +101,9 @@ class YClientsClient:
         # список мастеров
         return self.get(f"/staff/{company_id}")
 
-    def company_records(self, company_id: int) -> Dict[str, Any]:
-        # список записей компании
-        return self.get(f"/records/{company_id}")
+    def company_records(self, company_id: int, **params) -> Dict[str, Any]:
+        # список записей компании; фильтры: staff_id, client_id, start_date, end_date (YYYY-MM-DD)
+        return self.get(f"/records/{company_id}", params=params or None)
 
     def find_client_by_phone(self, company_id: int, phone: str) -> Dict[str, Any]:
         # поиск клиента по телефону (форматируй телефон так, как хранится в YClients)